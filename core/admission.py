@@ -0,0 +1,377 @@
+"""
+File d'admission des appels de génération au modèle local.
+
+La GUI, le Relay, l'API REST, le planificateur et les workflows d'agents
+envoient leurs requêtes au même serveur Ollama, qui les traite une à une
+(ou OLLAMA_NUM_PARALLEL à la fois). Une tâche planifiée ou un workflow de
+quatre agents en parallèle pouvait ainsi bloquer un chat interactif
+pendant plusieurs minutes.
+
+Chaque appel /api/chat ou /api/generate du client partagé
+(core/ollama_client.py) passe par cette file avant d'être envoyé :
+
+  - classes de priorité : interactive > relay > api > batch (planifié,
+    workflows). Un créneau libéré va à la classe la plus prioritaire ;
+  - partage équitable entre sessions d'une même classe (tourniquet : un
+    appel par session à tour de rôle) ;
+  - annulation coopérative : un appel en attente dont le callback
+    is_interrupted renvoie True quitte la file (RequestCancelled) ;
+  - métriques : profondeur de file et temps d'attente par classe
+    (/api/stats, clé « admission »).
+
+Le demandeur déclare sa classe autour de son traitement :
+
+    with admission_context("relay", session_id="mobile", is_interrupted=cb):
+        engine.process_query_stream(...)
+
+Le contexte suit l'appel (contextvars) jusqu'au client Ollama, y compris
+dans les coroutines et les pools qui copient le contexte (copy_context).
+Un appel sans contexte est traité comme interactif.
+
+Créneaux simultanés : llm.local.admission.max_concurrent (1 par défaut,
+à aligner sur OLLAMA_NUM_PARALLEL).
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterator, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from core.config import get_config
+from utils.logger import setup_logger
+
+logger = setup_logger("admission")
+
+# Rang de chaque classe : plus petit = plus prioritaire
+PRIORITIES: Dict[str, int] = {"interactive": 0, "relay": 1, "api": 2, "batch": 3}
+DEFAULT_PRIORITY = "interactive"
+
+# Endpoints soumis à l'admission (les autres — /api/tags, /api/show,
+# embeddings — passent directement)
+_GENERATION_PATHS = ("/api/chat", "/api/generate")
+
+_DEFAULT_MAX_CONCURRENT = 1
+# Intervalle de vérification de is_interrupted pendant l'attente
+_POLL_SECONDS = 0.1
+
+
+class RequestCancelled(requests.RequestException):
+    """Appel retiré de la file d'admission (interruption demandée)."""
+
+
+@dataclass(frozen=True)
+class AdmissionRequest:
+    """Classe, session et callback d'interruption d'un traitement."""
+
+    priority: str = DEFAULT_PRIORITY
+    session_id: str = "default"
+    is_interrupted: Optional[Callable[[], bool]] = None
+
+    def interrupted(self) -> bool:
+        if self.is_interrupted is None:
+            return False
+        try:
+            return bool(self.is_interrupted())
+        except Exception:  # pylint: disable=broad-except
+            return False
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar("admission_request", default=None)
+
+
+@contextmanager
+def admission_context(
+    priority: str = DEFAULT_PRIORITY,
+    session_id: Optional[str] = None,
+    is_interrupted: Optional[Callable[[], bool]] = None,
+) -> Iterator[AdmissionRequest]:
+    """Déclare la classe de priorité des appels au modèle faits dans ce bloc."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Priorité inconnue : {priority!r} (attendu : {', '.join(PRIORITIES)})")
+    request = AdmissionRequest(priority, session_id or priority, is_interrupted)
+    token = _current.set(request)
+    try:
+        yield request
+    finally:
+        _current.reset(token)
+
+
+def current_request() -> AdmissionRequest:
+    """Demande déclarée par l'appelant (interactive par défaut)."""
+    return _current.get() or AdmissionRequest()
+
+
+def is_generation_url(url: str) -> bool:
+    return urlsplit(url).path.rstrip("/").endswith(_GENERATION_PATHS)
+
+
+class _Waiter:
+    __slots__ = ("request", "enqueued", "event", "loop", "future")
+
+    def __init__(self, request: AdmissionRequest) -> None:
+        self.request = request
+        self.enqueued = time.perf_counter()
+        self.event: Optional[threading.Event] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.future: Optional["asyncio.Future"] = None
+
+
+class AdmissionTicket:
+    """Créneau obtenu ; à rendre une fois avec AdmissionQueue.release()."""
+
+    __slots__ = ("request", "thread_id", "waited", "released")
+
+    def __init__(self, request: AdmissionRequest, thread_id: Optional[int], waited: float) -> None:
+        self.request = request
+        self.thread_id = thread_id
+        self.waited = waited
+        self.released = False
+
+
+class AdmissionQueue:
+    """Créneaux de génération attribués par priorité puis par session."""
+
+    def __init__(self, max_concurrent: int = _DEFAULT_MAX_CONCURRENT) -> None:
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.active = 0
+        self._lock = threading.Lock()
+        # Par rang : session → appels en attente (ordre des sessions = tourniquet)
+        self._queues: Dict[int, "OrderedDict[str, Deque[_Waiter]]"] = {
+            rank: OrderedDict() for rank in PRIORITIES.values()
+        }
+        # Créneaux détenus par thread : un appel imbriqué du même thread
+        # (flux ouvert + appel dans un callback) ne peut pas s'attendre lui-même
+        self._held: Dict[int, int] = {}
+        self._stats: Dict[str, Dict[str, float]] = {
+            name: {"admitted": 0, "cancelled": 0, "total_wait": 0.0, "max_wait": 0.0}
+            for name in PRIORITIES
+        }
+
+    # ------------------------------------------------------------------
+    # File
+    # ------------------------------------------------------------------
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        sessions = self._queues[PRIORITIES[waiter.request.priority]]
+        sessions.setdefault(waiter.request.session_id, deque()).append(waiter)
+
+    def _remove(self, waiter: _Waiter) -> bool:
+        """Retire un appel encore en attente (False s'il a déjà été servi)."""
+        sessions = self._queues[PRIORITIES[waiter.request.priority]]
+        pending = sessions.get(waiter.request.session_id)
+        if not pending or waiter not in pending:
+            return False
+        pending.remove(waiter)
+        if not pending:
+            del sessions[waiter.request.session_id]
+        return True
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        for rank in sorted(self._queues):
+            sessions = self._queues[rank]
+            if not sessions:
+                continue
+            session_id, pending = next(iter(sessions.items()))
+            waiter = pending.popleft()
+            if pending:
+                sessions.move_to_end(session_id)
+            else:
+                del sessions[session_id]
+            return waiter
+        return None
+
+    def _dispatch(self) -> None:
+        """Attribue les créneaux libres. Appeler sous self._lock."""
+        while self.active < self.max_concurrent:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            if waiter.event is not None:
+                self.active += 1
+                waiter.event.set()
+            elif waiter.loop is not None and not waiter.loop.is_closed():
+                self.active += 1
+                waiter.loop.call_soon_threadsafe(self._grant, waiter.future)
+
+    def _grant(self, future: "asyncio.Future") -> None:
+        if future.done():
+            # Coroutine annulée entre-temps : le créneau transmis est rendu
+            with self._lock:
+                self.active = max(0, self.active - 1)
+                self._dispatch()
+        else:
+            future.set_result(None)
+
+    def _admitted(self, waiter: _Waiter, thread_id: Optional[int]) -> AdmissionTicket:
+        """Appeler sous self._lock une fois le créneau compté dans active."""
+        waited = time.perf_counter() - waiter.enqueued
+        stats = self._stats[waiter.request.priority]
+        stats["admitted"] += 1
+        stats["total_wait"] += waited
+        stats["max_wait"] = max(stats["max_wait"], waited)
+        if thread_id is not None:
+            self._held[thread_id] = self._held.get(thread_id, 0) + 1
+        if waited >= 1.0:
+            logger.info(
+                "Appel %s (session %s) admis après %.1f s d'attente",
+                waiter.request.priority, waiter.request.session_id, waited,
+            )
+        return AdmissionTicket(waiter.request, thread_id, waited)
+
+    def _cancelled(self, waiter: _Waiter) -> RequestCancelled:
+        self._stats[waiter.request.priority]["cancelled"] += 1
+        return RequestCancelled(
+            f"Appel {waiter.request.priority} annulé en file d'attente "
+            f"(session {waiter.request.session_id})"
+        )
+
+    # ------------------------------------------------------------------
+    # Acquisition / libération
+    # ------------------------------------------------------------------
+
+    def acquire(self, request: Optional[AdmissionRequest] = None, wait: bool = True) -> AdmissionTicket:
+        """
+        Attend un créneau (thread appelant bloqué). wait=False l'obtient
+        immédiatement, même au-delà de la limite (appel synchrone depuis
+        une boucle asyncio, qui ne doit pas bloquer).
+
+        Raises:
+            RequestCancelled: interruption demandée pendant l'attente.
+        """
+        request = request or current_request()
+        thread_id = threading.get_ident()
+        waiter = _Waiter(request)
+        with self._lock:
+            idle = self.active < self.max_concurrent and not any(self._queues.values())
+            if not wait or idle or self._held.get(thread_id):
+                self.active += 1
+                return self._admitted(waiter, thread_id)
+            waiter.event = threading.Event()
+            self._enqueue(waiter)
+
+        while not waiter.event.wait(_POLL_SECONDS):
+            if not request.interrupted():
+                continue
+            with self._lock:
+                if self._remove(waiter):
+                    raise self._cancelled(waiter)
+            # Servi entre-temps : le créneau est attribué, on le garde
+            break
+        with self._lock:
+            return self._admitted(waiter, thread_id)
+
+    async def acquire_async(self, request: Optional[AdmissionRequest] = None) -> AdmissionTicket:
+        """Attend un créneau sans bloquer la boucle asyncio."""
+        request = request or current_request()
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(request)
+        with self._lock:
+            if self.active < self.max_concurrent and not any(self._queues.values()):
+                self.active += 1
+                return self._admitted(waiter, None)
+            waiter.loop = loop
+            waiter.future = loop.create_future()
+            self._enqueue(waiter)
+
+        try:
+            while True:
+                done, _pending = await asyncio.wait({waiter.future}, timeout=_POLL_SECONDS)
+                if done:
+                    break
+                if request.interrupted():
+                    with self._lock:
+                        if self._remove(waiter):
+                            raise self._cancelled(waiter)
+        except asyncio.CancelledError:
+            with self._lock:
+                if not self._remove(waiter):
+                    if waiter.future.done():
+                        # Créneau déjà attribué : le rendre
+                        self.active = max(0, self.active - 1)
+                        self._dispatch()
+                    else:
+                        # Attribution en route : _grant le rendra
+                        waiter.future.cancel()
+            raise
+        with self._lock:
+            return self._admitted(waiter, None)
+
+    def release(self, ticket: AdmissionTicket) -> None:
+        """Rend le créneau (sans effet au deuxième appel)."""
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket.thread_id is not None:
+                held = self._held.get(ticket.thread_id, 0) - 1
+                if held > 0:
+                    self._held[ticket.thread_id] = held
+                else:
+                    self._held.pop(ticket.thread_id, None)
+            self.active = max(0, self.active - 1)
+            self._dispatch()
+
+    # ------------------------------------------------------------------
+    # Statistiques
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Créneaux occupés, profondeur de file et attentes par classe."""
+        with self._lock:
+            classes: Dict[str, Dict[str, Any]] = {}
+            for name, rank in PRIORITIES.items():
+                sessions = self._queues[rank]
+                stats = self._stats[name]
+                admitted = int(stats["admitted"])
+                classes[name] = {
+                    "waiting": sum(len(p) for p in sessions.values()),
+                    "waiting_sessions": len(sessions),
+                    "admitted": admitted,
+                    "cancelled": int(stats["cancelled"]),
+                    "avg_wait_seconds": round(stats["total_wait"] / admitted, 4) if admitted else 0.0,
+                    "max_wait_seconds": round(stats["max_wait"], 4),
+                }
+            return {
+                "max_concurrent": self.max_concurrent,
+                "active": self.active,
+                "queue_depth": sum(c["waiting"] for c in classes.values()),
+                "classes": classes,
+            }
+
+
+_queue: Optional[AdmissionQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_admission_queue() -> AdmissionQueue:
+    """File partagée par le processus (configurée depuis llm.local.admission.*)."""
+    global _queue  # pylint: disable=global-statement
+    with _queue_lock:
+        if _queue is None:
+            try:
+                limit = int(get_config().get("llm.local.admission.max_concurrent", _DEFAULT_MAX_CONCURRENT))
+            except Exception:
+                limit = _DEFAULT_MAX_CONCURRENT
+            _queue = AdmissionQueue(max_concurrent=limit)
+        return _queue
+
+
+def run_in_context(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """fn enveloppée pour s'exécuter dans une copie du contexte courant
+    (classe d'admission transmise à un thread ou un pool). Chaque appel
+    reçoit sa propre copie : l'enveloppe peut tourner dans plusieurs
+    threads à la fois."""
+    context = contextvars.copy_context()
+
+    def _run(*args: Any, **kwargs: Any) -> Any:
+        return context.copy().run(fn, *args, **kwargs)
+
+    return _run
+
@@ -31,6 +31,7 @@ from typing import Any, Awaitable, Callable, Dict, List, Optional
 
 import requests
 
+from core.ollama_client import OllamaHTTPError, get_ollama_client
 from utils.logger import setup_logger
 
 logger = setup_logger("AgenticExecutor")
@@ -615,22 +616,11 @@ class AgenticExecutor:
         segment_index: int,
         on_chunk: Callable[..., None],
     ) -> str:
-        """Appelle Ollama /api/chat en streaming, retourne le texte complet."""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            None,
-            self._sync_call_llm_streaming,
-            messages,
-            segment_index,
-            on_chunk,
-        )
+        """Appelle Ollama /api/chat en streaming, retourne le texte complet.
 
-    def _sync_call_llm_streaming(
-        self,
-        messages: List[Dict[str, str]],
-        segment_index: int,
-        on_chunk: Callable[..., None],
-    ) -> str:
+        Passe par la face asyncio du client Ollama partagé : le flux est lu
+        sur la boucle du Relay, sans occuper de thread pendant la génération.
+        """
         data = {
             "model": self._model,
             "messages": messages,
@@ -648,38 +638,27 @@ class AgenticExecutor:
         last_chunk_pushed_at = 0.0
 
         try:
-            with requests.post(
-                self._chat_url,
-                json=data,
-                timeout=self.LLM_TIMEOUT_SECONDS,
-                stream=True,
-            ) as resp:
-                if resp.status_code != 200:
-                    err = f"[Erreur LLM HTTP {resp.status_code}]"
-                    logger.error("Ollama HTTP %d: %s", resp.status_code, resp.text[:200])
-                    return err
-                for raw_line in resp.iter_lines():
-                    if not raw_line:
-                        continue
-                    try:
-                        chunk = json.loads(raw_line)
-                    except json.JSONDecodeError:
-                        continue
-                    msg = chunk.get("message", {})
-                    token = msg.get("content", "")
-                    if not token:
-                        continue
-                    full_response += token
-
-                    # Throttle des chunks vers l'UI : 50ms.
-                    now = time.time()
-                    if now - last_chunk_pushed_at >= 0.05:
-                        last_chunk_pushed_at = now
-                        # On retire à la volée les blocs <tool_use> (et tout
-                        # bloc ouvert sans fermeture) pour éviter d'afficher
-                        # du JSON brut pendant que le modèle écrit le bloc.
-                        visible = strip_tool_use_for_display(full_response)
-                        _safe_on_chunk(on_chunk, visible, segment_index)
+            async for chunk in get_ollama_client().astream(
+                self._chat_url, data, timeout=self.LLM_TIMEOUT_SECONDS,
+            ):
+                msg = chunk.get("message", {})
+                token = msg.get("content", "")
+                if not token:
+                    continue
+                full_response += token
+
+                # Throttle des chunks vers l'UI : 50ms.
+                now = time.time()
+                if now - last_chunk_pushed_at >= 0.05:
+                    last_chunk_pushed_at = now
+                    # On retire à la volée les blocs <tool_use> (et tout
+                    # bloc ouvert sans fermeture) pour éviter d'afficher
+                    # du JSON brut pendant que le modèle écrit le bloc.
+                    visible = strip_tool_use_for_display(full_response)
+                    _safe_on_chunk(on_chunk, visible, segment_index)
+        except OllamaHTTPError as exc:
+            logger.error("Ollama HTTP %d: %s", exc.status, exc.body[:200])
+            return f"[Erreur LLM HTTP {exc.status}]"
         except requests.RequestException as exc:
             logger.error("Erreur appel Ollama : %s", exc)
             return f"[Erreur LLM : {exc}]"
@@ -6,8 +6,10 @@ Gère l'orchestration entre les différents modules
 import asyncio
 import concurrent.futures
 import glob
+import json
 import os
 import re as _re
+import sqlite3
 import tempfile
 import threading
 import shutil
@@ -15,8 +17,6 @@ from pathlib import Path
 from datetime import datetime as _dt
 from typing import Any, Dict, List, Optional, Tuple
 
-import requests as _req
-
 from generators.code_generator import CodeGenerator as OllamaCodeGenerator
 from generators.document_generator import DocumentGenerator
 from memory.vector_memory import VectorMemory
@@ -37,9 +37,14 @@ from utils.file_manager import FileManager
 from utils.logger import setup_logger
 
 from .chat_orchestrator import ChatOrchestrator
+from .admission import run_in_context
 from .config import get_config
+from .context_gathering import ContextGathering
+from .ollama_client import get_ollama_client
 from .conversation import ConversationManager
 from .mcp_client import MCPManager
+from .response_cache import get_response_cache, has_side_effects
+from .tracing import annotate, traced
 from .validation import validate_input
 
 try:
@@ -242,6 +247,7 @@ class AIEngine:
         _re.IGNORECASE,
     )
 
+    @traced("routing.image_generation")
     def is_image_generation_request(self, query: str) -> bool:
         """True si la requête demande de GÉNÉRER une image (pas d'en analyser une)."""
         if not query or not isinstance(query, str):
@@ -443,8 +449,13 @@ class AIEngine:
                 ws_cfg = full_config.get_section("workspaces") or {}
                 self.session_manager = SessionManager(
                     workspaces_dir=ws_cfg.get("directory", "data/workspaces"),
+                    compact_every=int(ws_cfg.get("compact_every", 500)),
                 )
                 self.logger.info("✅ SessionManager initialisé")
+                # Résumés d'historique du LLM local mis en cache par workspace
+                llm = getattr(self.local_ai, "local_llm", None)
+                if llm is not None and hasattr(llm, "workspace_resolver"):
+                    llm.workspace_resolver = self.session_manager.get_current_workspace
             except Exception as e:
                 self.logger.warning("⚠️ SessionManager indisponible: %s", e)
 
@@ -615,6 +626,7 @@ class AIEngine:
                     "required": ["query"],
                 },
                 callable_fn=web_search,
+                read_only=True,
             )
         except Exception as exc:
             self.logger.warning("Outil web_search non disponible : %s", exc)
@@ -666,6 +678,7 @@ class AIEngine:
                     "required": ["query"],
                 },
                 callable_fn=search_memory,
+                read_only=True,
             )
         except Exception as exc:
             self.logger.warning("Outil search_memory non disponible : %s", exc)
@@ -723,6 +736,7 @@ class AIEngine:
                     "required": ["query"],
                 },
                 callable_fn=search_codebase,
+                read_only=True,
             )
         except Exception as exc:
             self.logger.warning("Outil search_codebase non disponible : %s", exc)
@@ -799,6 +813,7 @@ class AIEngine:
                 "required": ["path"],
             },
             callable_fn=read_local_file,
+            read_only=True,
         )
 
         # ----------------------------------------------------------------
@@ -837,6 +852,7 @@ class AIEngine:
                 },
             },
             callable_fn=list_directory,
+            read_only=True,
         )
 
         # ----------------------------------------------------------------
@@ -888,6 +904,7 @@ class AIEngine:
                 "required": ["query"],
             },
             callable_fn=search_local_files,
+            read_only=True,
         )
 
         # ----------------------------------------------------------------
@@ -1084,6 +1101,7 @@ class AIEngine:
                 "required": ["description"],
             },
             callable_fn=generate_code,
+            read_only=True,
         )
 
         # ----------------------------------------------------------------
@@ -1114,6 +1132,7 @@ class AIEngine:
                 "required": ["expression"],
             },
             callable_fn=calculate,
+            read_only=True,
         )
 
         # ----------------------------------------------------------------
@@ -1143,6 +1162,7 @@ class AIEngine:
             "✅ MCPManager initialisé — %d outil(s) disponible(s)", total_tools
         )
 
+    @traced("ai_engine.process_text", kind="request")
     def process_text(self, text: str, context: Optional[Dict[str, Any]] = None) -> str:
         """
         Interface synchrone avec validation des entrées
@@ -1203,6 +1223,36 @@ class AIEngine:
         except (AttributeError, TypeError, ValueError, OSError) as e:
             self.logger.warning("Échange non mémorisé : %s", e)
 
+    def _cached_response(self, llm, prompt: str, context: str) -> Optional[str]:
+        """Réponse du cache de réponses (core/response_cache.py), si activé."""
+        cache = get_response_cache()
+        if cache is None:
+            return None
+        try:
+            return cache.lookup(
+                getattr(llm, "model", "local"), prompt, context,
+                getattr(llm, "gen_temperature", None),
+            )
+        except sqlite3.Error as e:
+            self.logger.warning("Cache de réponses ignoré : %s", e)
+            return None
+
+    def _cache_response(
+        self, llm, prompt: str, context: str, response: str, tools_run: Tuple[str, ...] = ()
+    ) -> None:
+        """Met la réponse en cache, sauf si un outil à effet de bord a tourné."""
+        cache = get_response_cache()
+        if cache is None or not isinstance(response, str):
+            return
+        try:
+            cache.store(
+                getattr(llm, "model", "local"), prompt, response, context,
+                getattr(llm, "gen_temperature", None),
+                side_effects=has_side_effects(tools_run, self.mcp_manager.is_read_only),
+            )
+        except sqlite3.Error as e:
+            self.logger.warning("Réponse non mise en cache : %s", e)
+
     def _generate_with_local_model(
         self, text: str, context: Optional[Dict[str, Any]] = None
     ) -> Tuple[str, bool]:
@@ -1217,8 +1267,29 @@ class AIEngine:
             (réponse, échange déjà mémorisé par le modèle). Le second élément
             vaut False si la génération a échoué : rien n'a alors été mémorisé.
         """
+        # Cache de réponses (opt-in) : même question, même contexte → pas de
+        # génération. Comme en streaming, la clé couvre tout ce qui entoure la
+        # question : contexte fourni, documents injectés dans le prompt
+        # système (CustomAIModel.generate_response) et historique du modèle.
+        llm = getattr(self.local_ai, "local_llm", None)
+        documents = getattr(self.conversation_memory, "stored_documents", None) or {}
+        cache_context = "\n".join(
+            [json.dumps(context or {}, sort_keys=True, default=str),
+             json.dumps(sorted(documents), default=str)]
+            + [f"{m.get('role')}: {m.get('content')}"
+               for m in getattr(llm, "conversation_history", None) or []]
+        )
+        cached = self._cached_response(llm, text, cache_context)
+        if cached is not None:
+            # L'historique du modèle suit l'échange ; process_text le mémorise
+            if llm is not None and hasattr(llm, "add_to_history"):
+                llm.add_to_history("user", text)
+                llm.add_to_history("assistant", cached)
+            return cached, False
         try:
-            return self.local_ai.generate_response(text, context), True
+            response = self.local_ai.generate_response(text, context)
+            self._cache_response(llm, text, cache_context, response)
+            return response, True
         except Exception as e:  # noqa: BLE001 - frontière avec un backend externe
             # Le backend LLM (Ollama, réseau, désérialisation) peut lever
             # n'importe quelle exception : on la convertit en message lisible
@@ -1496,6 +1567,7 @@ Que voulez-vous que je fasse pour vous ?""",
             self.logger.error("Erreur initialisation LLM: %s", e)
             return False
 
+    @traced("ai_engine.process_query", kind="request")
     async def process_query(
         self, query: str, context: Optional[Dict] = None, is_interrupted_callback=None
     ) -> Dict[str, Any]:
@@ -1510,11 +1582,14 @@ Que voulez-vous que je fasse pour vous ?""",
         Returns:
             Réponse structurée de l'IA
         """
+        gathering: Optional[ContextGathering] = None
         try:
             self.logger.info("Traitement de la requête: %s...", query[:100])
 
-            # Détection automatique de la langue de l'utilisateur
-            self._current_lang_instruction = self._get_lang_instruction(query)
+            # Détection de langue et sources de contexte lancées en parallèle ;
+            # seule la langue est attendue ici
+            gathering = self._start_context_gathering(query, context)
+            self._current_lang_instruction = gathering.result("language")
 
             # 0.a. Génération d'image (SORTIE image) — prioritaire sur MCP.
             if self.is_image_generation_request(query):
@@ -1545,7 +1620,7 @@ Que voulez-vous que je fasse pour vous ?""",
                 and self.local_ai.local_llm.is_ollama_available
             ):
                 response = await self._handle_with_mcp_tools(
-                    query, context, is_interrupted_callback
+                    query, context, is_interrupted_callback, gathering=gathering
                 )
                 if response.get("success"):
                     self.conversation_manager.add_exchange(query, response)
@@ -1579,7 +1654,13 @@ Que voulez-vous que je fasse pour vous ?""",
                 "message": f"Désolé, une erreur s'est produite: {str(e)}",
                 "success": False,
             }
+        finally:
+            # Image, fichier, routage classique : chemins qui ne lisent pas le
+            # contexte collecté
+            if gathering is not None:
+                gathering.cancel()
 
+    @traced("routing.query_type")
     def _analyze_query_type(self, query: str) -> str:
         """
         Analyse le type de requête
@@ -1738,10 +1819,72 @@ Que voulez-vous que je fasse pour vous ?""",
 
         return full_context
 
-    def _inject_knowledge_base_context(self, query: str, system_prompt: str) -> str:
+    def _start_context_gathering(self, query: str, context: Optional[Dict]) -> ContextGathering:
         """
-        Injecte les faits pertinents de la base de connaissances dans le
-        system prompt pour favoriser des réponses factuelles.
+        Lance en parallèle la détection de langue et les sources de contexte
+        de la requête (core/context_gathering.py), dès son arrivée.
+        Les résultats sont lus par _request_context.
+
+        Les documents chargés sont toujours attendus (pas d'échéance) : leur
+        présence décide de la réponse directe sans outils, et l'utilisateur
+        les a fournis explicitement pour cette question.
+        """
+        return ContextGathering({
+            "language": (lambda: self._get_lang_instruction(query), self._LANG_SUFFIXES["fr"]),
+            "knowledge_base": (lambda: self._knowledge_base_context(query), ""),
+            "codebase": (lambda: self._codebase_context(query), ""),
+            "documents": (lambda: self._documents_context(query, context), ""),
+        }, timeouts={"documents": None})
+
+    def _request_context(
+        self,
+        query: str,
+        context: Optional[Dict],
+        gathering: Optional[ContextGathering] = None,
+    ) -> Tuple[str, bool]:
+        """
+        Contexte propre à la requête : faits de la base de connaissances,
+        dossier projet attaché et documents chargés.
+
+        Il n'est plus concaténé au system prompt : LocalLLM / ChatOrchestrator
+        l'envoient après l'historique (core/prompt_assembly.py), ce qui garde
+        le prompt système identique d'une requête à l'autre et permet à Ollama
+        de réutiliser son cache KV. Retourne (texte, documents_présents).
+
+        gathering : collecte lancée à l'arrivée de la requête ; à défaut, une
+        collecte est lancée ici. Une source abandonnée (échéance dépassée)
+        est simplement absente du contexte ; les documents sont attendus.
+        """
+        if gathering is None:
+            gathering = self._start_context_gathering(query, context)
+        results = gathering.results()
+        documents = results["documents"]
+        blocks = [results["knowledge_base"], results["codebase"], documents]
+        return "\n\n".join(b for b in blocks if b), bool(documents)
+
+    def _documents_context(self, query: str, context: Optional[Dict]) -> str:
+        """Extraits des documents chargés pertinents pour la requête ("" sinon)."""
+        full_context = self._prepare_context(query, context)
+        if not full_context.get("stored_documents"):
+            return ""
+        relevant_docs = self._select_relevant_docs(query, full_context["stored_documents"])
+        doc_sections = []
+        for doc_name, doc_data in relevant_docs.items():
+            doc_content = doc_data.get("content", "") if isinstance(doc_data, dict) else str(doc_data)
+            if doc_content:
+                doc_sections.append(f"=== {doc_name} ===\n{doc_content[:8000]}")
+        if not doc_sections:
+            return ""
+        return (
+            "Contenu des documents chargés par l'utilisateur "
+            "(disponible comme contexte — utilise ces données si la question porte sur ce contenu, sinon réponds normalement depuis tes connaissances) :\n"
+            + "\n\n".join(doc_sections)
+        )
+
+    def _knowledge_base_context(self, query: str) -> str:
+        """
+        Faits pertinents de la base de connaissances, pour favoriser des
+        réponses factuelles ("" si aucun).
 
         Injecte à la fois les faits pertinents à la requête courante ET les
         faits les plus récents tous catégories confondues (plafonné), afin
@@ -1750,7 +1893,7 @@ Que voulez-vous que je fasse pour vous ?""",
         """
         kb = getattr(self, "knowledge_base", None)
         if kb is None:
-            return system_prompt
+            return ""
 
         collected: Dict[Any, Dict[str, Any]] = {}
 
@@ -1775,7 +1918,7 @@ Que voulez-vous que je fasse pour vous ?""",
             self.logger.warning("Lecture base de connaissances indisponible: %s", exc)
 
         if not collected:
-            return system_prompt
+            return ""
 
         lines = ["[Base de connaissances]"]
         for fact in list(collected.values())[:8]:
@@ -1790,9 +1933,7 @@ Que voulez-vous que je fasse pour vous ?""",
             lines.append(f"- [{category}] {key}: {value} (confiance: {confidence_pct}%)")
 
         return (
-            system_prompt
-            + "\n\n"
-            + "FAITS UTILISATEUR (mémoire persistante — traite-les comme des choses que tu sais déjà) :\n"
+            "FAITS UTILISATEUR (mémoire persistante — traite-les comme des choses que tu sais déjà) :\n"
             + "\n".join(lines)
             + "\n\n"
             + "Règles STRICTES pour l'utilisation de ces faits :\n"
@@ -1810,32 +1951,35 @@ Que voulez-vous que je fasse pour vous ?""",
             "'tu es sûr ?' → 'Oui, c'est bien toi qui me l'as indiqué.'"
         )
 
-    def _inject_codebase_context(self, query: str, system_prompt: str) -> str:
+    def _codebase_context(self, query: str) -> str:
         """
-        Injecte le contexte du DOSSIER PROJET attaché au workspace courant.
+        Contexte du DOSSIER PROJET attaché au workspace courant ("" si aucun).
 
         Récupération RAG au moment de la question : si un dossier (codebase /
         dossier de docs) est attaché au workspace actif, on remonte les passages
-        les plus pertinents (plafonné par optimization.rag.max_retrieved_chunks)
-        et on les ajoute au system prompt. Utilisé sur les voies de réponse sans
-        appel d'outil (la voie MCP dispose en plus de l'outil search_codebase).
+        les plus pertinents (plafonné par optimization.rag.max_retrieved_chunks).
+        Utilisé sur les voies de réponse sans appel d'outil (la voie MCP dispose
+        en plus de l'outil search_codebase).
         """
         indexer = self.get_folder_indexer()
         if indexer is None or self.session_manager is None:
-            return system_prompt
+            return ""
         try:
             ws_id = self.session_manager.get_current_workspace()
             if not ws_id or not indexer.list_folders(ws_id):
-                return system_prompt
+                return ""
+            # Surveillance en direct (folder_indexer.watch) : les fichiers
+            # modifiés sont réindexés au fil de l'eau, sans reindex complet.
+            indexer.ensure_watching(ws_id)
             status = indexer.get_status(ws_id)
             context = indexer.get_relevant_context(ws_id, query)
         except Exception as exc:
             self.logger.warning("Injection contexte codebase indisponible: %s", exc)
-            return system_prompt
+            return ""
 
         folders = status.get("folders", []) if isinstance(status, dict) else []
         if not folders:
-            return system_prompt
+            return ""
 
         # Bloc 1 : chemins + liste de fichiers du/des dossier(s) attaché(s). C'est
         # CE que l'utilisateur désigne par « le dossier attaché / le projet / les
@@ -1868,12 +2012,17 @@ Que voulez-vous que je fasse pour vous ?""",
         )
 
         if context and context.strip():
+            # Les extraits sont plafonnés à la part « contexte injecté » du
+            # budget de tokens du modèle, pour laisser la place à l'historique.
+            budget = getattr(getattr(self.local_ai, "local_llm", None), "context_budget", None)
+            if budget is not None:
+                context = budget.truncate(context, budget.context_tokens)
             block += (
                 "\nEXTRAITS PERTINENTS (déjà indexés, traite-les comme du contenu "
                 "que tu connais) :\n" + context + "\n"
             )
 
-        return system_prompt + "\n\n" + block
+        return block
 
     # Signaux d'intention « question sur le dossier projet attaché ». Conservateur
     # pour ne pas détourner des requêtes sans rapport.
@@ -2035,11 +2184,22 @@ Que voulez-vous que je fasse pour vous ?""",
         # Si aucune correspondance → retourner tous les documents (pas de filtre)
         return matched if matched else stored_documents
 
+    @staticmethod
+    async def _run_blocking(fn, *args, **kwargs):
+        """Exécute un appel LLM synchrone sans bloquer la boucle asyncio.
+
+        Les requêtes HTTP passent par le client Ollama partagé (sessions
+        keep-alive, créneaux bornés) ; seule l'attente quitte la boucle.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, run_in_context(lambda: fn(*args, **kwargs)))
+
     async def _handle_with_mcp_tools(
         self,
         query: str,
         context: Optional[Dict],
         is_interrupted_callback=None,
+        gathering: Optional[ContextGathering] = None,
     ) -> Dict[str, Any]:
         """
         Traite une requête via la boucle agentique Ollama + outils MCP.
@@ -2064,27 +2224,12 @@ Que voulez-vous que je fasse pour vous ?""",
                 f"{getattr(self, '_current_lang_instruction', self._LANG_SUFFIXES['fr'])} "
                 "Si tu utilises un outil, synthétise les résultats dans une réponse claire."
             )
-            system_prompt = self._inject_knowledge_base_context(query, system_prompt)
-            system_prompt = self._inject_codebase_context(query, system_prompt)
-
-            # Ajouter le contexte des documents chargés si disponible
-            full_context = self._prepare_context(query, context)
-            if full_context.get("stored_documents"):
-                relevant_docs = self._select_relevant_docs(query, full_context["stored_documents"])
-                doc_sections = []
-                for doc_name, doc_data in relevant_docs.items():
-                    doc_content = doc_data.get("content", "") if isinstance(doc_data, dict) else str(doc_data)
-                    if doc_content:
-                        doc_sections.append(f"=== {doc_name} ===\n{doc_content[:8000]}")
-                if doc_sections:
-                    # Le contenu est déjà injecté dans le prompt : aucun outil nécessaire.
-                    # Vider tools pour forcer une réponse directe sans appel d'outil.
-                    tools = []
-                    system_prompt += (
-                        "\n\nContenu des documents chargés par l'utilisateur "
-                        "(disponible comme contexte — utilise ces données si la question porte sur ce contenu, sinon réponds normalement depuis tes connaissances) :\n"
-                        + "\n\n".join(doc_sections)
-                    )
+            # Faits, dossier projet et documents : envoyés après l'historique
+            request_context, has_documents = self._request_context(query, context, gathering)
+            if has_documents:
+                # Le contenu est déjà injecté dans le prompt : aucun outil nécessaire.
+                # Vider tools pour forcer une réponse directe sans appel d'outil.
+                tools = []
 
             # Outil d'interruption vérification
             def tool_executor(tool_name: str, arguments: dict) -> str:
@@ -2092,11 +2237,15 @@ Que voulez-vous que je fasse pour vous ?""",
                     return "[Interrompu par l'utilisateur]"
                 return self.mcp_manager.execute_tool_sync(tool_name, arguments)
 
-            result = llm.generate_with_tools(
+            # Boucle outils synchrone : hors de la boucle asyncio appelante
+            result = await self._run_blocking(
+                llm.generate_with_tools,
                 prompt=query,
                 tools=tools,
                 tool_executor=tool_executor,
                 system_prompt=system_prompt,
+                context=request_context,
+                is_read_only=self.mcp_manager.is_read_only,
             )
 
             if result.get("success") and result.get("response"):
@@ -2137,26 +2286,12 @@ Que voulez-vous que je fasse pour vous ?""",
                 "Utilise les outils quand c'est pertinent, avec des chemins absolus si besoin. "
                 f"{getattr(self, '_current_lang_instruction', self._LANG_SUFFIXES['fr'])}"
             )
-            system_prompt = self._inject_knowledge_base_context(query, system_prompt)
-            system_prompt = self._inject_codebase_context(query, system_prompt)
-
-            full_context = self._prepare_context(query, context)
-            if full_context.get("stored_documents"):
-                relevant_docs = self._select_relevant_docs(query, full_context["stored_documents"])
-                doc_sections = []
-                for doc_name, doc_data in relevant_docs.items():
-                    doc_content = doc_data.get("content", "") if isinstance(doc_data, dict) else str(doc_data)
-                    if doc_content:
-                        doc_sections.append(f"=== {doc_name} ===\n{doc_content[:8000]}")
-                if doc_sections:
-                    # Le contenu est déjà injecté dans le prompt : aucun outil nécessaire.
-                    # Vider tools pour forcer une réponse directe sans appel d'outil.
-                    tools = []
-                    system_prompt += (
-                        "\n\nContenu des documents chargés par l'utilisateur "
-                        "(disponible comme contexte — utilise ces données si la question porte sur ce contenu, sinon réponds normalement depuis tes connaissances) :\n"
-                        + "\n\n".join(doc_sections)
-                    )
+            # Faits, dossier projet et documents : envoyés après l'historique
+            request_context, has_documents = self._request_context(query, context)
+            if has_documents:
+                # Le contenu est déjà injecté dans le prompt : aucun outil nécessaire.
+                # Vider tools pour forcer une réponse directe sans appel d'outil.
+                tools = []
 
             def tool_executor(tool_name: str, arguments: dict) -> str:
                 if is_interrupted_callback and is_interrupted_callback():
@@ -2170,6 +2305,8 @@ Que voulez-vous que je fasse pour vous ?""",
                 system_prompt=system_prompt,
                 on_token=on_token,
                 on_tool_call=on_tool_call,
+                context=request_context,
+                is_read_only=self.mcp_manager.is_read_only,
             )
 
             if result.get("success") and result.get("response"):
@@ -2286,6 +2423,7 @@ Que voulez-vous que je fasse pour vous ?""",
         "présente toi", "dis moi qui tu es",
     ]
 
+    @traced("routing.conversational")
     def _is_conversational(self, query: str) -> bool:
         """Retourne True si la requête est purement conversationnelle.
         Dans ce cas, les outils ne doivent PAS être fournis au LLM.
@@ -2447,7 +2585,7 @@ Que voulez-vous que je fasse pour vous ?""",
         try:
             url = getattr(llm, "ollama_url", "http://localhost:11434/api/generate")
             ping_url = url.replace("/api/generate", "")
-            resp = _req.get(ping_url, timeout=2)
+            resp = get_ollama_client().get(ping_url, timeout=2)
             alive = resp.status_code == 200
             if alive and not getattr(llm, "is_ollama_available", False):
                 # Ollama est maintenant disponible — mettre à jour le flag en cache
@@ -2457,6 +2595,7 @@ Que voulez-vous que je fasse pour vous ?""",
         except Exception:
             return getattr(llm, "is_ollama_available", False)
 
+    @traced("ai_engine.process_query_stream", kind="request")
     def process_query_stream(
         self,
         user_input: str,
@@ -2481,13 +2620,12 @@ Que voulez-vous que je fasse pour vous ?""",
           3. Stream final Ollama avec le résultat de l'outil injecté
           4. Fallback → CustomAIModel
         """
-        # Détection automatique de la langue de l'utilisateur
-        self._current_lang_instruction = self._get_lang_instruction(user_input)
-
         # ----------------------------------------------------------------
         # 1. Vision (ENTRÉE image)
         # ----------------------------------------------------------------
         if image_base64:
+            annotate(route="vision")
+            self._current_lang_instruction = self._get_lang_instruction(user_input)
             return self.local_ai.generate_response_stream(
                 user_input,
                 on_token=on_token,
@@ -2504,6 +2642,8 @@ Que voulez-vous que je fasse pour vous ?""",
         # si aucun backend (message clair, comme le fallback Ollama).
         # ----------------------------------------------------------------
         if self.is_image_generation_request(user_input):
+            annotate(route="image_generation")
+            self._current_lang_instruction = self._get_lang_instruction(user_input)
             print("🎨 [AIEngine] Intention de génération d'image détectée")
             result = self._run_image_generation(
                 user_input,
@@ -2514,12 +2654,20 @@ Que voulez-vous que je fasse pour vous ?""",
             )
             return result.get("message", "")
 
+        # Détection de langue, base de connaissances, dossier projet et
+        # documents : lancés en parallèle dès maintenant (chacun avec son
+        # échéance), fusionnés par _request_context avant l'appel au modèle
+        gathering = self._start_context_gathering(user_input, context)
+        self._current_lang_instruction = gathering.result("language")
+
         llm = getattr(self.local_ai, "local_llm", None)
         # Rafraîchir le flag si nécessaire (cas : Ollama démarré après le lancement de l'app)
         if llm is not None and not getattr(llm, "is_ollama_available", False):
             llm.is_ollama_available = self.is_ollama_active()
         if llm is None or not llm.is_ollama_available:
             # Pas d'Ollama → fallback direct
+            annotate(route="fallback")
+            gathering.cancel()
             return self.local_ai.generate_response_stream(
                 user_input, on_token=on_token, context=context
             )
@@ -2569,27 +2717,12 @@ Que voulez-vous que je fasse pour vous ?""",
                 f"{getattr(self, '_current_lang_instruction', self._LANG_SUFFIXES['fr'])} "
                 "Sois direct et précis. Pour les requêtes de code, génère toujours le code complet sans te limiter."
             )
-            system_prompt = self._inject_knowledge_base_context(user_input, system_prompt)
-            system_prompt = self._inject_codebase_context(user_input, system_prompt)
-
-            # Ajouter le contexte des documents chargés
-            full_context = self._prepare_context(user_input, context)
-            if full_context.get("stored_documents"):
-                relevant_docs = self._select_relevant_docs(user_input, full_context["stored_documents"])
-                doc_sections = []
-                for doc_name, doc_data in relevant_docs.items():
-                    doc_content = doc_data.get("content", "") if isinstance(doc_data, dict) else str(doc_data)
-                    if doc_content:
-                        doc_sections.append(f"=== {doc_name} ===\n{doc_content[:8000]}")
-                if doc_sections:
-                    # Le contenu est déjà injecté dans le prompt : aucun outil nécessaire.
-                    # Vider tools pour forcer une réponse directe sans appel d'outil.
-                    tools = []
-                    system_prompt += (
-                        "\n\nContenu des documents chargés par l'utilisateur "
-                        "(disponible comme contexte — utilise ces données si la question porte sur ce contenu, sinon réponds normalement depuis tes connaissances) :\n"
-                        + "\n\n".join(doc_sections)
-                    )
+            # Faits, dossier projet et documents : envoyés après l'historique
+            request_context, has_documents = self._request_context(user_input, context, gathering)
+            if has_documents:
+                # Le contenu est déjà injecté dans le prompt : aucun outil nécessaire.
+                # Vider tools pour forcer une réponse directe sans appel d'outil.
+                tools = []
 
             # ----------------------------------------------------------------
             # 2.1. Requêtes sur l'historique de conversation — réponse directe
@@ -2608,6 +2741,7 @@ Que voulez-vous que je fasse pour vous ?""",
             ]
             _q_lower = user_input.lower()
             if any(sig in _q_lower for sig in _history_signals):
+                annotate(route="history")
                 # Source primaire : historique Ollama (réponses LLM)
                 ollama_hist = getattr(llm, "conversation_history", [])
                 history_lines = []
@@ -2646,21 +2780,20 @@ Que voulez-vous que je fasse pour vous ?""",
                             history_lines.append(f"  Assistant : {a[:300]}{'…' if len(a) > 300 else ''}")
                 if history_lines:
                     history_text = "\n".join(history_lines)
-                    history_system = (
-                        system_prompt
-                        + f"\n\nVoici l'historique complet de cette conversation :\n{history_text}"
+                    history_context = (
+                        f"Voici l'historique complet de cette conversation :\n{history_text}"
                         "\n\nRéponds directement en te basant sur cet historique, "
                         "sans utiliser d'outils."
                     )
                 else:
-                    history_system = (
-                        system_prompt
-                        + "\n\nNous n'avons pas encore échangé dans cette session."
+                    history_context = (
+                        "Nous n'avons pas encore échangé dans cette session."
                         " Dis-le à l'utilisateur de façon naturelle."
                     )
                 history_response = llm.generate_stream(
                     prompt=user_input,
-                    system_prompt=history_system,
+                    system_prompt=system_prompt,
+                    context="\n\n".join(c for c in (request_context, history_context) if c),
                     on_token=on_token,
                     is_interrupted_callback=is_interrupted_callback,
                 )
@@ -2679,11 +2812,39 @@ Que voulez-vous que je fasse pour vous ?""",
                 user_input, llm, on_token, is_interrupted_callback,
             )
             if codebase_response:
+                annotate(route="codebase")
                 return codebase_response
 
+            # Cache de réponses (opt-in) : clé sur tout ce qui entoure la
+            # question — prompt système, contexte injecté et historique
+            cache_context = "\n".join(
+                [system_prompt, request_context or ""]
+                + [f"{m.get('role')}: {m.get('content')}"
+                   for m in getattr(llm, "conversation_history", [])]
+            )
+            cached = self._cached_response(llm, user_input, cache_context)
+            if cached is not None:
+                annotate(route="response_cache")
+                if on_token:
+                    on_token(cached)
+                llm.add_to_history("user", user_input)
+                llm.add_to_history("assistant", cached)
+                return cached
+
+            tools_run: List[str] = []
+
+            def finish(response: str) -> str:
+                interrupted = is_interrupted_callback and is_interrupted_callback()
+                if not interrupted:
+                    self._cache_response(
+                        llm, user_input, cache_context, response, tuple(tools_run)
+                    )
+                return response
+
             def tool_executor(tool_name: str, arguments: dict) -> str:
                 if is_interrupted_callback and is_interrupted_callback():
                     return "[Interrompu par l'utilisateur]"
+                tools_run.append(tool_name)
                 if tool_name == "web_search":
                     # Optimiser la requête avant tout affichage ou exécution
                     optimized_q = self._optimize_search_query(user_input, llm)
@@ -2706,6 +2867,7 @@ Que voulez-vous que je fasse pour vous ?""",
             if tools and self._is_conversational(user_input):
                 tools = []
 
+            annotate(route="orchestrator" if tools else "stream")
             if tools:
                 # ── ChatOrchestrator : boucle agentique ReAct avec scratchpad,
                 # détection de boucle, limite de tours et élagage du contexte ──
@@ -2720,6 +2882,8 @@ Que voulez-vous que je fasse pour vous ?""",
                     on_thinking_complete=on_thinking_complete,
                     is_interrupted_callback=is_interrupted_callback,
                     on_tool_call=on_tool_call,
+                    context=request_context,
+                    is_read_only=self.mcp_manager.is_read_only,
                 )
 
                 if orch_result:
@@ -2727,7 +2891,7 @@ Que voulez-vous que je fasse pour vous ?""",
                         "process_query_stream ok (ChatOrchestrator, %d chars)",
                         len(orch_result),
                     )
-                    return orch_result
+                    return finish(orch_result)
 
                 # Si le traitement a été interrompu manuellement, on s'arrête ici
                 if is_interrupted_callback and is_interrupted_callback():
@@ -2745,9 +2909,10 @@ Que voulez-vous que je fasse pour vous ?""",
                     is_interrupted_callback=is_interrupted_callback,
                     on_thinking_token=on_thinking_token,
                     on_thinking_complete=on_thinking_complete,
+                    context=request_context,
                 )
                 if retry:
-                    return retry
+                    return finish(retry)
             else:
                 # Fallback si aucun outil n'est disponible
                 response = llm.generate_stream(
@@ -2757,9 +2922,10 @@ Que voulez-vous que je fasse pour vous ?""",
                     is_interrupted_callback=is_interrupted_callback,
                     on_thinking_token=on_thinking_token,
                     on_thinking_complete=on_thinking_complete,
+                    context=request_context,
                 )
                 if response:
-                    return response
+                    return finish(response)
 
         except Exception as exc:
             self.logger.warning("process_query_stream Ollama stream échoué : %s", exc)
@@ -2772,6 +2938,7 @@ Que voulez-vous que je fasse pour vous ?""",
         # ----------------------------------------------------------------
         # 3. Fallback → CustomAIModel
         # ----------------------------------------------------------------
+        annotate(route="fallback")
         return self.local_ai.generate_response_stream(
             user_input,
             on_token=on_token,
@@ -2794,7 +2961,7 @@ Que voulez-vous que je fasse pour vous ?""",
 
                 prompt += f"\nQuestion: {query}\n\nRéponds en tenant compte du contexte si pertinent."
 
-            response = self.local_ai.generate_response(prompt)
+            response = await self._run_blocking(self.local_ai.generate_response, prompt)
 
             return {"type": "conversation", "message": response, "success": True}
         except (AttributeError, TypeError, ValueError) as e:
@@ -3328,7 +3495,7 @@ Que voulez-vous que je fasse pour vous ?""",
 
                 prompt += f"\nQuestion: {query}\n\nRéponds en tenant compte du contexte si pertinent."
 
-            response = self.local_ai.generate_response(prompt)
+            response = await self._run_blocking(self.local_ai.generate_response, prompt)
 
             return {"type": "general", "message": response, "success": True}
         except (AttributeError, TypeError, ValueError) as e:
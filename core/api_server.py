@@ -11,9 +11,12 @@ import threading
 import time
 from typing import Any, Dict, List, Optional
 
-import requests as http_requests
-
+from core.admission import admission_context, get_admission_queue
 from core.config import get_config
+from core.ollama_client import get_ollama_client
+from core.prompt_assembly import get_prompt_stats
+from core.response_cache import get_response_cache
+from core.tracing import get_tracer
 from memory.vector_memory import VectorMemory
 from utils.logger import setup_logger
 
@@ -23,7 +26,7 @@ from utils.logger import setup_logger
 
 try:
     import uvicorn
-    from fastapi import FastAPI, HTTPException
+    from fastapi import FastAPI, HTTPException, Request
     from fastapi.middleware.cors import CORSMiddleware
     from pydantic import BaseModel, Field, ValidationError
 
@@ -222,7 +225,7 @@ class APIServer:
         # =================================================================
 
         @app.post("/api/chat", tags=["Conversation"])
-        async def chat(request: ChatRequest) -> Dict[str, Any]:
+        async def chat(request: ChatRequest, http_request: Request) -> Dict[str, Any]:
             """
             Envoie un message à l'assistant IA et retourne la réponse.
 
@@ -230,6 +233,10 @@ class APIServer:
             (historique, orchestration, outils MCP, etc.).
             Un prompt système optionnel peut être fourni pour cadrer
             le comportement de l'IA sur cette requête.
+
+            Traité dans un thread, en classe « api » de la file d'admission
+            du modèle (une session par client HTTP) : la boucle du serveur
+            reste libre pendant l'attente et la génération.
             """
             engine = _require_engine()
 
@@ -241,10 +248,16 @@ class APIServer:
                 if request.system_prompt:
                     context["system_prompt"] = request.system_prompt
 
-                response_text = engine.process_text(
-                    request.message,
-                    context=context if context else None,
-                )
+                client = http_request.client.host if http_request.client else "local"
+
+                def _process() -> str:
+                    with admission_context("api", session_id=f"api:{client}"):
+                        return engine.process_text(
+                            request.message,
+                            context=context if context else None,
+                        )
+
+                response_text = await asyncio.get_running_loop().run_in_executor(None, _process)
 
                 return {
                     "response": response_text,
@@ -279,9 +292,7 @@ class APIServer:
 
             try:
                 ollama_base = _resolve_ollama_base_url(engine)
-                resp = http_requests.get(f"{ollama_base}/api/tags", timeout=5)
-                resp.raise_for_status()
-                data = resp.json()
+                data = await get_ollama_client().aget(f"{ollama_base}/api/tags", timeout=5)
 
                 models = [
                     {
@@ -428,6 +439,8 @@ class APIServer:
             # Informations sur la mémoire vectorielle
             memory_info = _get_memory_info()
 
+            response_cache = get_response_cache()
+
             # Uptime du serveur API
             uptime = round(time.time() - self._start_time, 2) if self._start_time else 0.0
 
@@ -438,6 +451,14 @@ class APIServer:
                 "context": context_info,
                 "engine": engine_status,
                 "memory": memory_info,
+                "ollama": get_ollama_client().get_stats(),
+                "prompt": get_prompt_stats().get_stats(),
+                "admission": get_admission_queue().get_stats(),
+                "response_cache": (
+                    response_cache.get_stats() if response_cache is not None
+                    else {"enabled": False}
+                ),
+                "tracing": get_tracer().get_stats(),
             }
 
     # ------------------------------------------------------------------
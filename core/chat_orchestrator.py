@@ -21,12 +21,24 @@ from __future__ import annotations
 
 import json
 import re
-import time
 from datetime import datetime
 from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import requests
 
+from core.context_budget import ContextBudget
+from core.ollama_client import get_ollama_client
+from core.prompt_assembly import (
+    context_message,
+    is_context_message,
+    observe_prompt,
+    stable_tools,
+    with_volatile,
+)
+from core.tool_dispatch import run_tool_calls
+from core.tool_stream import ToolCallStreamParser, iter_chunks
+from core.tracing import traced
+
 # [OPTIM] Retry résilient sur les appels réseau Ollama
 try:
     from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
@@ -40,18 +52,18 @@ except ImportError:
 # ─────────────────────────────────────────────────────────────────────────────
 
 MAX_TOURS: int = 15             # Limite absolue de tours dans la boucle agentique
-MAX_HISTORY_MESSAGES: int = 40  # Élagage sélectif : nb max de messages d'historique
+MAX_HISTORY_MESSAGES: int = 40  # Élagage sélectif : plafond de messages (le budget de tokens prime)
 LOOP_THRESHOLD: int = 2         # Nb d'appels identiques avant détecter boucle élargie
-COMPACT_THRESHOLD: int = 28     # Nb de messages avant compaction (hors system + user)
 PLAN_MIN_QUERY_LEN: int = 55    # Longueur minimale pour déclencher la planification
 MAX_TOOL_USES: int = 5          # Nb max d'appels outils avant synthèse forcée
 
 
 # [OPTIM] Helper résilient pour les appels réseau Ollama (retry sur Timeout/ConnectionError)
 def _resilient_post(url, **kwargs):
-    """requests.post avec retry automatique via tenacity (si disponible)."""
+    """POST via le client Ollama partagé (keep-alive, créneaux), avec retry
+    automatique via tenacity (si disponible)."""
     timeout = kwargs.pop("timeout", 1200)
-    return requests.post(url, timeout=timeout, **kwargs)
+    return get_ollama_client().post(url, timeout=timeout, **kwargs)
 
 
 if TENACITY_AVAILABLE:
@@ -226,6 +238,7 @@ class ChatOrchestrator:
 
     # ---------------------------------------------------------------- run ---
 
+    @traced("chat_orchestrator.run")
     def run(
         self,
         user_input: str,
@@ -238,6 +251,8 @@ class ChatOrchestrator:
         on_thinking_complete: Optional[Callable] = None,
         is_interrupted_callback: Optional[Callable] = None,
         on_tool_call: Optional[Callable] = None,
+        context: Optional[str] = None,
+        is_read_only: Optional[Callable[[str], bool]] = None,
     ) -> Optional[str]:
         """
         Lance la boucle agentique ReAct.
@@ -255,6 +270,12 @@ class ChatOrchestrator:
             on_thinking_token:       callback pour streamer le plan dans le widget
                                      raisonnement (même widget que le Thinking Mode)
             is_interrupted_callback: retourne True si l'utilisateur a cliqué STOP
+            context:                 contexte de la requête (faits, extraits,
+                                     documents), placé après l'historique pour
+                                     que system_prompt reste un préfixe stable
+            is_read_only:            callable(tool_name) → bool ; les appels
+                                     consécutifs à des outils en lecture seule
+                                     d'un même tour s'exécutent en parallèle
 
         Returns:
             Réponse finale (str) ou None si interruption / aucun résultat
@@ -263,6 +284,10 @@ class ChatOrchestrator:
             return None
 
         # ── Initialisation ────────────────────────────────────────────────
+        # Schéma des outils identique d'un tour à l'autre (cache KV Ollama) :
+        # les outils bloqués ou la synthèse forcée sont gérés à l'exécution,
+        # jamais en retirant des outils de la requête.
+        tools = stable_tools(tools)
         scratchpad = Scratchpad(goal=user_input)
         loop_detector = LoopDetector()
         known_tool_names: List[str] = [
@@ -273,17 +298,27 @@ class ChatOrchestrator:
         tool_calls_log: List[Dict] = []
         last_tool_results: Dict[str, str] = {}
         blocked_tools: set = set()  # Outils bloqués définitivement pour cette requête
-        force_synthesis: bool = False  # Quand True, retirer tous les outils
+        force_synthesis: bool = False  # Quand True, les appels d'outils sont ignorés
+
+        # Résumé d'historique prêt (calculé en arrière-plan) : substitué avant
+        # de construire le contexte, sans jamais l'attendre
+        apply_summary = getattr(llm, "apply_pending_summary", None)
+        if callable(apply_summary):
+            apply_summary()
 
         # Contexte de messages — élagage sélectif dès le départ
+        budget = self._context_budget(llm)
         messages: List[Dict] = self._build_initial_messages(
             system_prompt=system_prompt,
             user_input=user_input,
             history=getattr(llm, "conversation_history", []),
+            budget=budget,
+            tools=tools,
+            context=context,
         )
 
         # ── Compaction du contexte si trop long ───────────────────────────
-        messages = self._compact_context_if_needed(messages, llm)
+        messages = self._compact_context_if_needed(messages, llm, budget=budget, tools=tools)
 
         # ── Plan & Execute : pré-planification pour requêtes complexes ────
         # Le plan reste essentiel pour le SCRATCHPAD INTERNE qui guide le modèle
@@ -322,7 +357,7 @@ class ChatOrchestrator:
                 print(f"🛑 [ChatOrchestrator] Tour {tour + 1} — interruption utilisateur")
                 return None
 
-            # Injection du scratchpad dans le system prompt
+            # Scratchpad en fin de prompt (état volatil remplacé à chaque tour)
             # S'il y a un plan ou s'il y a déjà eu des appels d'outils
             if tool_calls_log or scratchpad.plan:
                 messages = self._inject_scratchpad(
@@ -359,17 +394,7 @@ class ChatOrchestrator:
             # Détecte automatiquement les tool_calls (structurés ou textuels).
             # Le streaming vers on_token n'est activé que s'il n'y a pas eu
             # d'appels d'outils précédents (sinon → synthèse séparée).
-            if len(tool_calls_log) >= MAX_TOOL_USES or force_synthesis:
-                tools_for_call = []
-            elif blocked_tools:
-                # Retirer les outils bloqués de la liste
-                tools_for_call = [
-                    t for t in tools
-                    if t.get("function", {}).get("name", "") not in blocked_tools
-                ]
-            else:
-                tools_for_call = tools
-
+            _synthesis_only = len(tool_calls_log) >= MAX_TOOL_USES or force_synthesis
             _stream_direct = on_token if not tool_calls_log else None
             # Raisonnement natif : activé au 1er tour seulement (décision
             # initiale du modèle). Les tours suivants sont des dispatchs
@@ -379,7 +404,7 @@ class ChatOrchestrator:
             response_msg = self._call_ollama_smart_stream(
                 llm=llm,
                 messages=messages,
-                tools=tools_for_call,
+                tools=tools,
                 on_token=_stream_direct,
                 is_interrupted_callback=is_interrupted_callback,
                 on_thinking_token=on_thinking_token,
@@ -401,7 +426,8 @@ class ChatOrchestrator:
             # texte avant/après le JSON (ex: explication en français, code
             # fence markdown ```json ... ```).
             # NB: si le contenu a déjà été streamé vers le GUI, on ne tente
-            # pas CAS A (le buffer initial a vérifié que ce n'est pas du JSON).
+            # pas CAS A (le début de la réponse n'était pas du JSON, voir
+            # core/tool_stream).
             if not tool_calls_in_msg and not _content_was_streamed:
                 _stripped = raw_content.strip()
                 # Retirer les code fences markdown si présentes
@@ -428,6 +454,12 @@ class ChatOrchestrator:
                             }}]
                             print(f"🔧 [CAS A] Text tool call converti : {detected['name']}")
 
+            # Plus d'outils autorisés (limite atteinte ou synthèse forcée) :
+            # les appels éventuels sont ignorés et la synthèse prend le relais.
+            if tool_calls_in_msg and _synthesis_only and tool_calls_log:
+                print("🏁 [ChatOrchestrator] Appel d'outil ignoré → synthèse")
+                tool_calls_in_msg = []
+
             # ── Cas B : réponse directe (pas d'outil) ────────────────────
             if not tool_calls_in_msg:
                 if tool_calls_log:
@@ -444,6 +476,7 @@ class ChatOrchestrator:
                         messages=messages,
                         user_input=user_input,
                         llm=llm,
+                        tools=tools,
                         on_token=on_token,
                         is_interrupted_callback=is_interrupted_callback,
                         tool_calls_log=tool_calls_log,
@@ -465,6 +498,7 @@ class ChatOrchestrator:
                                 system_prompt=system_prompt,
                                 on_token=on_token,
                                 is_interrupted_callback=is_interrupted_callback,
+                                context=context,
                             )
                             return retry_synthesis or synthesis
                     return synthesis
@@ -487,6 +521,7 @@ class ChatOrchestrator:
                                     system_prompt=system_prompt,
                                     on_token=on_token,
                                     is_interrupted_callback=is_interrupted_callback,
+                                    context=context,
                                 )
                                 if retry_response:
                                     return retry_response
@@ -511,10 +546,19 @@ class ChatOrchestrator:
                 "tool_calls": tool_calls_in_msg,
             })
 
-            for tool_call in tool_calls_in_msg:
-                if is_interrupted_callback and is_interrupted_callback():
-                    return None
+            # Trois temps pour exécuter en parallèle les outils indépendants
+            # sans changer l'ordre du contexte :
+            #   1. filtrage et détection de boucle, dans l'ordre du message
+            #   2. exécution (core/tool_dispatch : lectures en parallèle,
+            #      écritures seules et dans l'ordre)
+            #   3. scratchpad, journal et messages « tool », dans l'ordre
+            if is_interrupted_callback and is_interrupted_callback():
+                return None
 
+            # Chaque entrée : ("message", contenu) | ("loop", outil, msg) | ("run", index)
+            slots: List[Tuple] = []
+            pending: List[Tuple[str, Dict]] = []
+            for tool_call in tool_calls_in_msg:
                 func = tool_call.get("function", {})
                 tool_name: str = func.get("name", "")
                 arguments: Dict = self._clean_arguments(func.get("arguments", {}))
@@ -523,6 +567,13 @@ class ChatOrchestrator:
                     continue
 
                 # ── Filtrage des outils non pertinents ────────────────────
+                # Les outils restent dans le schéma envoyé (préfixe stable) :
+                # un outil déjà bloqué est refusé ici, avec une réponse
+                # explicite pour que le modèle change d'approche.
+                if tool_name in blocked_tools:
+                    slots.append(("message", f"Outil '{tool_name}' indisponible pour cette requête."))
+                    continue
+
                 # generate_code : n'autoriser QUE si la requête demande
                 # explicitement du code. Sinon, bloquer.
                 if tool_name == "generate_code":
@@ -540,6 +591,7 @@ class ChatOrchestrator:
                             f"🚫 [ChatOrchestrator] Outil '{tool_name}' bloqué "
                             f"(requête ne demande pas de code)"
                         )
+                        slots.append(("message", f"Outil '{tool_name}' indisponible pour cette requête."))
                         continue
 
                 # calculate : bloquer pour les requêtes de recherche / explication
@@ -558,12 +610,38 @@ class ChatOrchestrator:
                             f"🚫 [ChatOrchestrator] Outil '{tool_name}' bloqué "
                             f"(requête de type recherche/explication)"
                         )
+                        slots.append(("message", f"Outil '{tool_name}' indisponible pour cette requête."))
                         continue
 
                 # ── Vérification de boucle ────────────────────────────────
                 is_loop, loop_msg = loop_detector.check(tool_name, arguments)
                 if is_loop:
                     print(f"🔄 [ChatOrchestrator] Boucle détectée : {tool_name}(…)")
+                    slots.append(("loop", tool_name, loop_msg))
+                    continue
+
+                print(
+                    f"🔧 [ChatOrchestrator] Tour {tour + 1}/{MAX_TOURS} "
+                    f"| {tool_name}({_truncate(json.dumps(arguments, ensure_ascii=False), 80)})"
+                )
+                slots.append(("run", len(pending)))
+                pending.append((tool_name, arguments))
+
+            # ── Exécution des outils ──────────────────────────────────────
+            outcomes = run_tool_calls(
+                pending, tool_executor,
+                is_read_only=is_read_only,
+                is_interrupted=is_interrupted_callback,
+            )
+            if is_interrupted_callback and is_interrupted_callback():
+                return None
+
+            for slot in slots:
+                if slot[0] == "message":
+                    messages.append({"role": "tool", "content": slot[1]})
+                    continue
+                if slot[0] == "loop":
+                    _, tool_name, loop_msg = slot
                     prev_result = last_tool_results.get(tool_name, "Résultat précédent non disponible.")
                     messages.append({
                         "role": "tool",
@@ -575,18 +653,11 @@ class ChatOrchestrator:
                     scratchpad.next_action = "Changer d'approche — boucle détectée, aller vers la synthèse"
                     continue
 
-
-                print(
-                    f"🔧 [ChatOrchestrator] Tour {tour + 1}/{MAX_TOURS} "
-                    f"| {tool_name}({_truncate(json.dumps(arguments, ensure_ascii=False), 80)})"
-                )
-
-                # ── Exécution de l'outil ──────────────────────────────────
-                try:
-                    tool_result = tool_executor(tool_name, arguments)
-                except Exception as exc:
-                    tool_result = f"[Erreur lors de l'exécution de '{tool_name}']: {exc}"
-                    print(f"   ❌ Erreur outil : {exc}")
+                tool_name, arguments = pending[slot[1]]
+                tool_result = outcomes[slot[1]]
+                if isinstance(tool_result, Exception):
+                    print(f"   ❌ Erreur outil : {tool_result}")
+                    tool_result = f"[Erreur lors de l'exécution de '{tool_name}']: {tool_result}"
 
                 result_str = str(tool_result)
                 print(f"   ↳ Résultat [{tour + 1}/{MAX_TOURS}] : {_truncate(result_str, 120)}")
@@ -798,6 +869,7 @@ class ChatOrchestrator:
                 messages=messages,
                 user_input=user_input,
                 llm=llm,
+                tools=tools,
                 on_token=on_token,
                 is_interrupted_callback=is_interrupted_callback,
                 tool_calls_log=tool_calls_log,
@@ -815,6 +887,7 @@ class ChatOrchestrator:
                         system_prompt=system_prompt,
                         on_token=on_token,
                         is_interrupted_callback=is_interrupted_callback,
+                        context=context,
                     )
                     return retry_final_synthesis or result
             return result
@@ -916,7 +989,9 @@ class ChatOrchestrator:
             "stream": True,
             "think": False,
             "keep_alive": "1h",  # [OPTIM] Persistance modèle en VRAM
-            "options": {"temperature": 0.3, "num_ctx": 4096, "num_predict": 300, "num_keep": -1},  # [OPTIM] num_keep: préserver system prompt
+            # Même num_ctx que la boucle : une valeur différente recharge le
+            # modèle et vide son cache KV avant le premier tour
+            "options": {"temperature": 0.3, "num_ctx": llm.gen_num_ctx, "num_predict": 300, "num_keep": -1},  # [OPTIM] num_keep: préserver system prompt
         }
 
         full_content: str = ""
@@ -1018,6 +1093,7 @@ class ChatOrchestrator:
         system_prompt: str,
         on_token: Optional[Callable],
         is_interrupted_callback: Optional[Callable],
+        context: Optional[str] = None,
     ) -> Optional[str]:
         """
         Relance une génération stream simple, sans outils, quand la réponse
@@ -1030,6 +1106,7 @@ class ChatOrchestrator:
                 system_prompt=system_prompt,
                 on_token=on_token,
                 is_interrupted_callback=is_interrupted_callback,
+                context=context,
             )
         except Exception as exc:
             print(f"⚠️  [ChatOrchestrator] _retry_without_tools échoué : {exc}")
@@ -1037,118 +1114,102 @@ class ChatOrchestrator:
 
     # ──────────────────────────── Compaction du contexte ────────────────────
 
+    @staticmethod
+    def _context_budget(llm: Any) -> ContextBudget:
+        """Budget de contexte du LLM (recréé depuis num_ctx si l'instance n'en a pas)."""
+        budget = getattr(llm, "context_budget", None)
+        if isinstance(budget, ContextBudget):
+            return budget
+        return ContextBudget(
+            getattr(llm, "gen_num_ctx", 16384), model=getattr(llm, "model", "")
+        )
+
     def _compact_context_if_needed(
         self,
         messages: List[Dict],
         llm: Any,
+        budget: Optional[ContextBudget] = None,
+        tools: Optional[List[Dict]] = None,
     ) -> List[Dict]:
         """
-        Compacte le contexte quand il dépasse COMPACT_THRESHOLD messages.
-
-        Stratégie (inspirée du diagramme de la vidéo) :
-          1. Détecter que les tokens dépassent le seuil (approx. via nb de messages)
-          2. Résumer les anciens échanges via un appel Ollama
-          3. Créer un bloc de compaction qui remplace ces anciens messages
-          4. La suite de la conversation continue avec le contexte allégé
-
-        Le message système et le message utilisateur courant ne sont jamais supprimés.
+        Compacte le contexte quand il dépasse le seuil de compaction du budget
+        (llm.local.context_budget.compact_ratio × budget de prompt).
+
+        Stratégie (inspirée du diagramme de la vidéo), sans bloquer le tour :
+          1. Détecter que les tokens (tiktoken calibré) dépassent le seuil
+          2. Demander au LLM le résumé des anciens échanges EN ARRIÈRE-PLAN
+             (LocalLLM.schedule_summary) : il remplacera ces messages en tête
+             d'historique avant une prochaine requête
+          3. Pour ce tour, écarter les plus anciens échanges jusqu'au seuil
+
+        Le message système, le contexte de la requête et le message utilisateur
+        courant ne sont jamais supprimés.
         """
-        # Identifier system + user courant (toujours préservés)
-        if len(messages) < 3:
-            return messages
+        budget = budget or self._context_budget(llm)
+        if len(messages) < 3 or not budget.needs_compaction(messages, tools):
+            return messages  # Pas encore nécessaire
 
         system_msg = messages[0] if messages[0].get("role") == "system" else None
-        user_msg = messages[-1]  # Message utilisateur courant
-
-        # Messages intermédiaires (historique)
         start_idx = 1 if system_msg else 0
-        history_msgs = messages[start_idx:-1]
-
-        if len(history_msgs) <= COMPACT_THRESHOLD:
-            return messages  # Pas encore nécessaire
-
-        # Séparer : vieux messages à compacter / récents à conserver
-        split = len(history_msgs) // 2
-        to_compact = history_msgs[:split]
-        to_keep = history_msgs[split:]
-
-        # Construire le texte à résumer
-        summary_input = "\n".join(
-            f"[{m.get('role', '?').upper()}] : {str(m.get('content', ''))[:300]}"
-            for m in to_compact
-        )
-
-        summary_prompt = (
-            "Résume de façon concise (5-8 phrases max) les échanges suivants "
-            "en préservant tous les faits importants, les décisions prises et "
-            "le contexte essentiel pour la suite de la conversation :\n\n"
-            + summary_input
-        )
-
+        # Fin fixe : [contexte de la requête] + message utilisateur courant
+        tail_idx = len(messages) - 1
+        if tail_idx > start_idx and is_context_message(messages[tail_idx - 1]):
+            tail_idx -= 1
+        tail = messages[tail_idx:]
+        history_msgs = messages[start_idx:tail_idx]
+
+        schedule = getattr(llm, "schedule_summary", None)
+        if callable(schedule):
+            try:
+                schedule(force=True)
+            except Exception as exc:
+                print(f"⚠️  [ChatOrchestrator] Résumé d'arrière-plan non lancé : {exc}")
+
+        fixed = ([system_msg] if system_msg else []) + tail
+        history_room = budget.compact_threshold - budget.count_messages(fixed, tools)
+        to_keep = budget.fit_history(history_msgs, max(0, history_room))
+
+        new_messages: List[Dict] = []
+        if system_msg:
+            new_messages.append(system_msg)
+        new_messages.extend(to_keep)
+        new_messages.extend(tail)
         print(
-            f"📦 [ChatOrchestrator] Compaction : {len(to_compact)} messages "
-            f"→ résumé (seuil : {COMPACT_THRESHOLD})"
+            f"📦 [ChatOrchestrator] Compaction (seuil {budget.compact_threshold:,} tokens) : "
+            f"résumé en arrière-plan, {len(history_msgs) - len(to_keep)} anciens messages "
+            "écartés pour ce tour"
         )
-
-        try:
-            summary_data = {
-                "model": llm.model,
-                "messages": [
-                    {"role": "system", "content": "Tu es un assistant de résumé. Sois concis et fidèle."},
-                    {"role": "user", "content": summary_prompt},
-                ],
-                "stream": False,
-                "keep_alive": "1h",  # [OPTIM] Persistance modèle en VRAM
-                "options": {"temperature": 0.1, "num_ctx": 8192, "num_predict": 512, "num_keep": -1},  # [OPTIM] num_keep: préserver system prompt
-            }
-            resp = _resilient_post(llm.chat_url, json=summary_data, timeout=60)
-            if resp.status_code == 200:
-                summary_text = resp.json().get("message", {}).get("content", "")
-                if summary_text:
-                    compaction_block = {
-                        "role": "system",
-                        "content": (
-                            "[BLOC DE COMPACTION — résumé des échanges précédents]\n"
-                            + summary_text
-                        ),
-                    }
-                    # Reconstruire : system + compaction_block + récents + user courant
-                    new_messages: List[Dict] = []
-                    if system_msg:
-                        new_messages.append(system_msg)
-                    new_messages.append(compaction_block)
-                    new_messages.extend(to_keep)
-                    new_messages.append(user_msg)
-                    print(
-                        f"   ↳ Contexte réduit : {len(messages)} → {len(new_messages)} messages"
-                    )
-                    return new_messages
-        except Exception as exc:
-            print(f"⚠️  [ChatOrchestrator] Compaction échouée : {exc}")
-
-        return messages  # Fallback : retourner les messages inchangés
+        return new_messages
 
     def _build_initial_messages(
         self,
         system_prompt: str,
         user_input: str,
         history: List[Dict],
+        budget: Optional[ContextBudget] = None,
+        tools: Optional[List[Dict]] = None,
+        context: Optional[str] = None,
     ) -> List[Dict]:
         """
         Construit la liste initiale de messages en appliquant l'élagage sélectif.
 
         L'élagage sélectif (technique de la vidéo) conserve :
           - Le message système (jamais supprimé)
-          - Les MAX_HISTORY_MESSAGES messages les plus récents de l'historique
+          - Les messages les plus récents de l'historique qui tiennent dans
+            le budget de tokens (au plus MAX_HISTORY_MESSAGES)
+          - Le contexte de la requête, après l'historique
           - Le message utilisateur courant
         """
+        pruned_history = list(history)[-MAX_HISTORY_MESSAGES:]
+        if budget is not None:
+            return budget.fit_messages(system_prompt, pruned_history, user_input, tools, context)
+
         messages: List[Dict] = []
         messages.append({"role": "system", "content": system_prompt})
-
-        # Élagage : garder uniquement les N derniers échanges
-        pruned_history = list(history)[-MAX_HISTORY_MESSAGES:]
         messages.extend(pruned_history)
-
+        context_msg = context_message(context)
+        if context_msg:
+            messages.append(context_msg)
         messages.append({"role": "user", "content": user_input})
         return messages
 
@@ -1159,27 +1220,18 @@ class ChatOrchestrator:
         known_tool_names: Optional[List[str]] = None,
     ) -> List[Dict]:
         """
-        Injecte ou met à jour le bloc <scratchpad> dans le message système.
+        Injecte ou met à jour le bloc <scratchpad> en fin de prompt.
 
         Le scratchpad force le LLM à re-synthétiser son état à chaque tour,
-        évitant la perte de cohérence sur des tâches multi-étapes.
+        évitant la perte de cohérence sur des tâches multi-étapes. Il change
+        à chaque tour : il est donc placé en dernier (état volatil, l'ancien
+        est retiré) et non dans le message système, que le cache KV d'Ollama
+        réutilise d'un tour à l'autre.
 
         Si known_tool_names est fourni, ajoute la liste explicite des outils
         valides pour réduire les hallucinations (modèle inventant 'execute',
         'run_python', 'bash', etc. qui n'existent pas dans le schéma MCP).
         """
-        if not messages or messages[0].get("role") != "system":
-            return messages
-
-        base_content = messages[0]["content"]
-        # Retirer l'ancien scratchpad s'il existe
-        base_content = re.sub(
-            r"\n*<scratchpad>.*?</scratchpad>",
-            "",
-            base_content,
-            flags=re.DOTALL,
-        ).rstrip()
-
         # Liste explicite des outils valides (anti-hallucination)
         tools_whitelist = ""
         if known_tool_names:
@@ -1195,55 +1247,14 @@ class ChatOrchestrator:
                     "passe à l'étape suivante ou conclus avec ta réponse finale."
                 )
 
-        # Ajouter le scratchpad mis à jour
-        new_system = base_content + "\n\n" + scratchpad.to_context_block() + (
+        block = scratchpad.to_context_block() + (
             "\n\n[CONSIGNE STRICTE D'OUTILS] "
             "Sois précis de manière chirurgicale dans le choix de tes outils selon ton plan actuel. "
             "Si l'étape demande un DÉPLACEMENT de fichier (ex: 'déplacer', 'move'), utilise OBLIGATOIREMENT "
             "'move_local_file'. NE RECRÉE PAS un fichier déjà existant avec 'write_local_file'. "
             "Si tu dois chercher, utilise le bon type de recherche, etc."
         ) + tools_whitelist
-
-        updated = list(messages)
-        updated[0] = {"role": "system", "content": new_system}
-        return updated
-
-    def _call_ollama_no_stream(
-        self,
-        llm: Any,
-        messages: List[Dict],
-        tools: List[Dict],
-    ) -> Optional[Dict]:
-        """
-        Effectue un appel Ollama non-streamé et retourne le message de réponse.
-
-        Non-streamé nécessaire pour pouvoir détecter le champ `tool_calls`
-        dans la réponse JSON.
-        """
-        data = {
-            "model": llm.model,
-            "messages": messages,
-            "tools": tools,
-            "stream": False,
-            "think": False,
-            "keep_alive": "1h",  # [OPTIM] Persistance modèle en VRAM
-            "options": {
-                "temperature": llm.gen_temperature,
-                "num_ctx": llm.gen_num_ctx,
-                "num_predict": 4096,
-                "num_keep": -1,  # [OPTIM] Préserver le system prompt entier lors de troncature contexte
-            },
-        }
-        try:
-            resp = _resilient_post(llm.chat_url, json=data, timeout=llm.timeout)
-            if resp.status_code != 200:
-                print(f"⚠️  [ChatOrchestrator] HTTP {resp.status_code}")
-                return None
-            msg = resp.json().get("message", {})
-            return msg
-        except Exception as exc:
-            print(f"⚠️  [ChatOrchestrator] Exception appel Ollama : {exc}")
-            return None
+        return with_volatile(messages, block)
 
     def _call_ollama_smart_stream(
         self,
@@ -1263,13 +1274,13 @@ class ChatOrchestrator:
         Résout le problème du non-streaming : au lieu de bloquer jusqu'à la fin
         de la génération, cette méthode streame les tokens en temps réel.
 
-        Comportement :
-          - Les premiers tokens sont bufferisés (BUFFER_CHARS) pour détecter
-            si le modèle écrit un tool call en texte (CAS A : bug llama3.2/mistral)
-          - Si tool_calls structuré détecté → accumulation silencieuse
-          - Si le buffer ressemble à du JSON → accumulation silencieuse (CAS A)
-          - Si le buffer est du texte naturel → flush + streaming temps réel
-            via on_token
+        Comportement (core/tool_stream.ToolCallStreamParser) :
+          - Texte naturel dès les premiers caractères → streaming temps réel
+            via on_token, sans tampon
+          - Début JSON ({, [{, ```json) → accumulation silencieuse : appel
+            d'outil écrit en texte possible (CAS A : bug llama3.2/mistral),
+            tranché par l'appelant en fin de flux
+          - tool_calls structuré détecté → accumulation silencieuse
 
         Mode raisonnement natif (Qwen3.5) :
           - Activé si enable_thinking=True ET on_thinking_token fourni
@@ -1299,18 +1310,10 @@ class ChatOrchestrator:
             },
         }
 
-        full_content: str = ""
-        tool_calls_collected: List[Dict] = []
-        content_buffer: str = ""
-        buffer_flushed: bool = False
-        buffer_chars = 120  # Seuil avant de décider stream vs accumulation
+        parser = ToolCallStreamParser(on_token)
         thinking_header_sent: bool = False
         thinking_complete_fired: bool = False
 
-        # 📊 Mesure TTFT (Time To First Token) pour diagnostiquer la latence
-        _ttft_start = time.time()
-        _ttft_logged = False
-
         try:
             with _resilient_post(
                 llm.chat_url, json=data, timeout=llm.timeout, stream=True
@@ -1319,15 +1322,9 @@ class ChatOrchestrator:
                     print(f"⚠️  [ChatOrchestrator] smart_stream HTTP {resp.status_code}")
                     return None
 
-                for raw_line in resp.iter_lines():
+                for chunk_data in iter_chunks(resp.iter_lines()):
                     if is_interrupted_callback and is_interrupted_callback():
                         break
-                    if not raw_line:
-                        continue
-                    try:
-                        chunk_data = json.loads(raw_line)
-                    except json.JSONDecodeError:
-                        continue
 
                     msg = chunk_data.get("message", {})
 
@@ -1339,69 +1336,32 @@ class ChatOrchestrator:
                             on_thinking_token(thinking_header)
                         on_thinking_token(thinking_tok)
 
-                    # ── Détection des tool_calls structurés ───────────────
-                    chunk_tc = msg.get("tool_calls")
-                    if chunk_tc:
-                        tool_calls_collected.extend(chunk_tc)
-
-                    # ── Accumulation du contenu ───────────────────────────
-                    token: str = msg.get("content", "")
-                    if token:
-                        if not _ttft_logged:
-                            _ttft_logged = True
-                            print(f"⏱️  [TTFT] smart_stream : {time.time() - _ttft_start:.2f}s avant 1er token")
-                        # Transition raisonnement → réponse : arrêter l'animation
-                        # des dots du widget Raisonnement.
-                        if not thinking_complete_fired and on_thinking_complete:
-                            thinking_complete_fired = True
-                            on_thinking_complete()
-                        full_content += token
-
-                        if tool_calls_collected:
-                            # Tool calls déjà détectés → pas de streaming
-                            pass
-                        elif not buffer_flushed:
-                            # Phase de buffering initial
-                            content_buffer += token
-                            if len(content_buffer) >= buffer_chars:
-                                # Vérifier si le buffer ressemble à du JSON (CAS A)
-                                _stripped = content_buffer.strip()
-                                _stripped = re.sub(r'^```\w*\s*', '', _stripped)
-                                _stripped = re.sub(
-                                    r'\s*```', '', _stripped, count=1
-                                ).strip()
-                                if _stripped.startswith(("{", "[")):
-                                    # JSON probable → ne pas streamer
-                                    pass
-                                else:
-                                    # Texte naturel → flush le buffer
-                                    buffer_flushed = True
-                                    if on_token:
-                                        on_token(content_buffer)
-                        else:
-                            # Buffer flushé → streamer chaque token
-                            if on_token:
-                                result = on_token(token)
-                                if result is False:
-                                    break
+                    # ── Contenu : streamé, ou retenu si appel d'outil ─────
+                    # Transition raisonnement → réponse : arrêter l'animation
+                    # des dots du widget Raisonnement.
+                    if msg.get("content") and not thinking_complete_fired and on_thinking_complete:
+                        thinking_complete_fired = True
+                        on_thinking_complete()
+                    keep_streaming = parser.feed(msg)
 
                     if chunk_data.get("done"):
+                        observe_prompt(
+                            self._context_budget(llm), "orchestrator.stream",
+                            messages, tools, chunk_data,
+                        )
+                        break
+                    if not keep_streaming:
                         break
 
         except Exception as exc:
             print(f"⚠️  [ChatOrchestrator] smart_stream exception : {exc}")
             return None
 
-        # Buffer non flushé et pas de tool calls → flush maintenant
-        if content_buffer and not buffer_flushed and not tool_calls_collected:
-            buffer_flushed = True
-            if on_token:
-                on_token(content_buffer)
-
+        # Contenu retenu (JSON) : non transmis, l'appelant tranche (CAS A / B)
         return {
-            "content": full_content,
-            "tool_calls": tool_calls_collected,
-            "streamed": buffer_flushed,
+            "content": parser.content,
+            "tool_calls": parser.tool_calls,
+            "streamed": parser.streamed,
         }
 
     def _stream_synthesis(
@@ -1414,12 +1374,17 @@ class ChatOrchestrator:
         tool_calls_log: List[Dict],
         on_thinking_token: Optional[Callable] = None,
         on_thinking_complete: Optional[Callable] = None,
+        tools: Optional[List[Dict]] = None,
     ) -> Optional[str]:
         """
         Synthèse streamée après exécution d'outils.
 
-        Le system prompt de synthèse remplace l'original pour que le modèle
-        ne réponde pas « je n'ai pas accès aux données en temps réel ».
+        Les consignes de synthèse remplacent le scratchpad en fin de prompt
+        pour que le modèle ne réponde pas « je n'ai pas accès aux données en
+        temps réel ». Prompt système, outils et num_ctx restent ceux de la
+        boucle : Ollama réutilise son cache KV pour tout le début du prompt.
+        Si le modèle appelle malgré tout un outil sans écrire de réponse, la
+        synthèse est relancée sans outils.
 
         Mode raisonnement natif :
           - Si on_thinking_token est fourni, active le thinking Qwen3.5 sur
@@ -1429,9 +1394,10 @@ class ChatOrchestrator:
             la section « 💡 Synthèse ».
           - on_thinking_complete est appelé au 1er token de la réponse finale.
         """
-        synthesis_system = (
+        synthesis_instructions = (
             "Tu interviens en bout de processus après avoir exécuté avec succès une série d'actions techniques (création de fichiers, recherches, etc.). "
-            "Tu dois maintenant synthétiser ce qui a été fait pour en informer l'utilisateur de manière naturelle et conversationnelle.\n\n"
+            "Tu dois maintenant synthétiser ce qui a été fait pour en informer l'utilisateur de manière naturelle et conversationnelle. "
+            "N'appelle plus aucun outil.\n\n"
             "RÈGLES STRICTES DE COMMUNICATION :\n"
             "1. Ne mentionne JAMAIS ton 'scratchpad', tes 'réflexions internes' ou ton 'plan d'action'. Ce sont des éléments de ton arrière-plan invisible.\n"
             "2. Parle directement à l'utilisateur du résultat de l'action de manière naturelle. Par exemple : 'J'ai créé le fichier X'.\n"
@@ -1446,82 +1412,93 @@ class ChatOrchestrator:
             "Ne mets JAMAIS un nom de source sans son URL. "
             "Reprends les URLs telles quelles depuis les résultats des outils."
         )
-
-        # Remplacer le system prompt original par celui de synthèse
-        msgs: List[Dict] = list(messages)
-        if msgs and msgs[0].get("role") == "system":
-            msgs[0] = {"role": "system", "content": synthesis_system}
-        else:
-            msgs.insert(0, {"role": "system", "content": synthesis_system})
+        msgs: List[Dict] = with_volatile(messages, synthesis_instructions)
 
         # Active le raisonnement natif Qwen3.5 sur la synthèse uniquement quand
         # le widget peut le recevoir. C'est ici que le raisonnement est le plus
         # précieux à exposer (intégration des résultats d'outils).
         native_thinking = on_thinking_token is not None
 
-        data = {
-            "model": llm.model,
-            "messages": msgs,
-            "stream": True,
-            "think": native_thinking,
-            "keep_alive": "1h",  # [OPTIM] Persistance modèle en VRAM
-            "options": {
-                "temperature": llm.gen_temperature,
-                "num_ctx": min(llm.gen_num_ctx, 8192),  # Plafond VRAM préservé lors de la synthèse
-                "num_predict": 2048,
-                "num_keep": -1,  # [OPTIM] Préserver le system prompt entier lors de troncature contexte
-            },
-        }
-
         full_response: str = ""
         thinking_header_sent: bool = False
         thinking_complete_fired: bool = False
-        try:
-            with _resilient_post(
-                llm.chat_url, json=data, timeout=llm.timeout, stream=True
-            ) as resp:
-                if resp.status_code != 200:
-                    print(f"⚠️  [ChatOrchestrator] synthesis stream HTTP {resp.status_code}")
-                    return None
-
-                for raw_line in resp.iter_lines():
-                    if is_interrupted_callback and is_interrupted_callback():
-                        break
-                    if not raw_line:
-                        continue
-                    try:
-                        chunk_data = json.loads(raw_line)
-                    except json.JSONDecodeError:
-                        continue
-
-                    msg = chunk_data.get("message", {})
-
-                    # ── Raisonnement natif sur la synthèse ───────────────
-                    thinking_tok: str = msg.get("thinking", "") if native_thinking else ""
-                    if thinking_tok and on_thinking_token:
-                        if not thinking_header_sent:
-                            thinking_header_sent = True
-                            on_thinking_token("\n\n💡 Synthèse :\n")
-                        on_thinking_token(thinking_tok)
+        for attempt_tools in (tools, None) if tools else (None,):
+            data = {
+                "model": llm.model,
+                "messages": msgs,
+                "stream": True,
+                "think": native_thinking,
+                "keep_alive": "1h",  # [OPTIM] Persistance modèle en VRAM
+                "options": {
+                    "temperature": llm.gen_temperature,
+                    "num_ctx": llm.gen_num_ctx,
+                    "num_predict": 2048,
+                    "num_keep": -1,  # [OPTIM] Préserver le system prompt entier lors de troncature contexte
+                },
+            }
+            if attempt_tools:
+                data["tools"] = attempt_tools
+            tool_called = False
+            interrupted = False
+            try:
+                with _resilient_post(
+                    llm.chat_url, json=data, timeout=llm.timeout, stream=True
+                ) as resp:
+                    if resp.status_code != 200:
+                        print(f"⚠️  [ChatOrchestrator] synthesis stream HTTP {resp.status_code}")
+                        return None
+
+                    for raw_line in resp.iter_lines():
+                        if is_interrupted_callback and is_interrupted_callback():
+                            interrupted = True
+                            break
+                        if not raw_line:
+                            continue
+                        try:
+                            chunk_data = json.loads(raw_line)
+                        except json.JSONDecodeError:
+                            continue
+
+                        msg = chunk_data.get("message", {})
+                        if msg.get("tool_calls"):
+                            tool_called = True
+
+                        # ── Raisonnement natif sur la synthèse ───────────
+                        thinking_tok: str = msg.get("thinking", "") if native_thinking else ""
+                        if thinking_tok and on_thinking_token:
+                            if not thinking_header_sent:
+                                thinking_header_sent = True
+                                on_thinking_token("\n\n💡 Synthèse :\n")
+                            on_thinking_token(thinking_tok)
+
+                        # ── Contenu de la réponse finale ─────────────────
+                        token: str = msg.get("content", "")
+                        if token:
+                            # Transition raisonnement → réponse : arrêter les dots.
+                            if not thinking_complete_fired and on_thinking_complete:
+                                thinking_complete_fired = True
+                                on_thinking_complete()
+                            full_response += token
+                            if on_token:
+                                result = on_token(token)
+                                if result is False:
+                                    interrupted = True
+                                    break
 
-                    # ── Contenu de la réponse finale ─────────────────────
-                    token: str = msg.get("content", "")
-                    if token:
-                        # Transition raisonnement → réponse : arrêter les dots.
-                        if not thinking_complete_fired and on_thinking_complete:
-                            thinking_complete_fired = True
-                            on_thinking_complete()
-                        full_response += token
-                        if on_token:
-                            result = on_token(token)
-                            if result is False:
-                                break
+                        if chunk_data.get("done"):
+                            observe_prompt(
+                                self._context_budget(llm), "orchestrator.synthesis",
+                                msgs, attempt_tools, chunk_data,
+                            )
+                            break
 
-                    if chunk_data.get("done"):
-                        break
+            except Exception as exc:
+                print(f"⚠️  [ChatOrchestrator] synthesis stream error : {exc}")
+                break
 
-        except Exception as exc:
-            print(f"⚠️  [ChatOrchestrator] synthesis stream error : {exc}")
+            if full_response or interrupted or not tool_called:
+                break
+            print("⚠️  [ChatOrchestrator] Appel d'outil pendant la synthèse → relance sans outils")
 
         if full_response:
             llm.add_to_history("user", user_input)
@@ -51,6 +51,7 @@ class CompressionMonitor:
         document_name: str = "",
         content_type: str = "text",
         metadata: Optional[Dict] = None,
+        chunk_sizes: Optional[List[int]] = None,
     ) -> Dict[str, Any]:
         """
         Analyse la compression d'un document
@@ -61,6 +62,8 @@ class CompressionMonitor:
             document_name: Nom du document
             content_type: Type de contenu (text, code, pdf, docx, etc.)
             metadata: Métadonnées additionnelles
+            chunk_sizes: Tailles des chunks (remplace chunks quand ceux-ci ont
+                été produits en flux et ne sont plus en mémoire)
 
         Returns:
             Analyse de compression complète
@@ -70,7 +73,9 @@ class CompressionMonitor:
         original_tokens = len(original_text.split())  # Approximation
 
         # Taille des chunks
-        chunk_sizes = [len(chunk) for chunk in chunks]
+        if chunk_sizes is None:
+            chunk_sizes = [len(chunk) for chunk in chunks]
+        chunk_count = len(chunk_sizes)
         total_chunk_size = sum(chunk_sizes)
 
         # Calcul du ratio de compression
@@ -96,9 +101,9 @@ class CompressionMonitor:
             # Tailles
             "original_size": original_size,
             "original_tokens": original_tokens,
-            "chunk_count": len(chunks),
+            "chunk_count": chunk_count,
             "total_chunk_size": total_chunk_size,
-            "average_chunk_size": total_chunk_size / len(chunks) if chunks else 0,
+            "average_chunk_size": total_chunk_size / chunk_count if chunk_count else 0,
             # Ratios
             "compression_ratio": compression_ratio,
             "compression_ratio_formatted": f"{compression_ratio:.1f}:1",
@@ -118,7 +123,7 @@ class CompressionMonitor:
             "avg_chunk_size": sum(chunk_sizes) / len(chunk_sizes) if chunk_sizes else 0,
             # Qualité
             "quality_score": self._calculate_quality_score(
-                compression_ratio, efficiency, len(chunks)
+                compression_ratio, efficiency, chunk_count
             ),
             # Métadonnées
             "metadata": metadata or {},
@@ -135,7 +140,7 @@ class CompressionMonitor:
             "📊 Compression: %s | Ratio: %s | Chunks: %d | Efficacité: %.1f%%",
             document_name,
             analysis['compression_ratio_formatted'],
-            len(chunks),
+            chunk_count,
             efficiency
         )
 
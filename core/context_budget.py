@@ -0,0 +1,294 @@
+"""
+Budget de contexte en tokens pour les appels Ollama.
+
+LocalLLM et ChatOrchestrator décidaient de l'élagage et de la compaction de
+l'historique à partir d'approximations (≈4 caractères par token, nombre de
+messages). Ce module leur fournit un décompte réel :
+
+  - encodeur tiktoken cl100k_base partagé par le processus (chargé une seule
+    fois ; s'il est absent ou hors ligne, repli ≈4 caractères/token et l'échec
+    est mémorisé pour ne pas retenter le téléchargement à chaque appel) ;
+  - calibration par modèle : cl100k_base n'est pas le tokenizer des modèles
+    Ollama, l'écart est corrigé par une moyenne glissante du rapport
+    prompt_eval_count (renvoyé par Ollama) / estimation locale ;
+  - ContextBudget : répartit la fenêtre num_ctx entre prompt système, contexte
+    injecté (RAG / base de connaissances), historique et réserve de réponse.
+"""
+
+import json
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
+
+from core.config import get_config
+from core.prompt_assembly import context_message
+from utils.logger import setup_logger
+
+try:
+    import tiktoken
+
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+logger = setup_logger("context_budget")
+
+_ENCODING_NAME = "cl100k_base"
+# Gabarit de chat (rôle, balises de début/fin) ajouté par message
+_MESSAGE_OVERHEAD = 4
+_CHARS_PER_TOKEN = 4
+# Rapports prompt_eval_count / estimation acceptés pour la calibration : en
+# dehors, Ollama a tronqué le prompt ou réutilisé son cache KV (le compteur
+# ne couvre alors qu'une partie du prompt) et la mesure n'est pas fiable.
+_CALIBRATION_RANGE = (0.5, 2.0)
+_CALIBRATION_ALPHA = 0.3
+
+_DEFAULT_RESPONSE_RESERVE = 2048
+_DEFAULT_COMPACT_RATIO = 0.85
+_DEFAULT_CONTEXT_SHARE = 0.35
+
+_encoder: Any = None
+_encoder_failed = False
+_encoder_lock = threading.Lock()
+
+_calibration: Dict[str, float] = {}
+_calibration_lock = threading.Lock()
+
+
+def get_token_encoder() -> Any:
+    """Encodeur tiktoken cl100k_base partagé, ou None s'il est indisponible."""
+    global _encoder, _encoder_failed  # pylint: disable=global-statement
+    if _encoder is not None or _encoder_failed or not TIKTOKEN_AVAILABLE:
+        return _encoder
+    with _encoder_lock:
+        if _encoder is None and not _encoder_failed:
+            try:
+                _encoder = tiktoken.get_encoding(_ENCODING_NAME)
+            except Exception as exc:
+                _encoder_failed = True
+                logger.warning(
+                    "Tokenizer %s indisponible (%s) : estimation ≈%d caractères/token",
+                    _ENCODING_NAME, exc, _CHARS_PER_TOKEN,
+                )
+    return _encoder
+
+
+@lru_cache(maxsize=4096)
+def _count_cached(text: str) -> int:
+    encoder = get_token_encoder()
+    if encoder is None:
+        return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def count_tokens(text: str) -> int:
+    """Nombre de tokens cl100k_base d'un texte (non calibré)."""
+    if not text:
+        return 0
+    return _count_cached(text)
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    text = str(message.get("content") or "")
+    if message.get("tool_calls"):
+        text += json.dumps(message["tool_calls"], ensure_ascii=False)
+    return text
+
+
+def count_message_tokens(
+    messages: Sequence[Dict[str, Any]], tools: Optional[List[Dict]] = None
+) -> int:
+    """Tokens (non calibrés) d'une liste de messages /api/chat et de ses outils."""
+    total = sum(count_tokens(_message_text(m)) + _MESSAGE_OVERHEAD for m in messages)
+    if tools:
+        total += count_tokens(json.dumps(tools, ensure_ascii=False))
+    return total
+
+
+def calibration_ratio(model: str) -> float:
+    """Facteur appliqué aux estimations pour ce modèle (1.0 tant qu'aucune mesure)."""
+    with _calibration_lock:
+        return _calibration.get(model, 1.0)
+
+
+def calibrate(model: str, estimated: int, prompt_eval_count: Any) -> None:
+    """Intègre une mesure prompt_eval_count d'Ollama à la calibration du modèle."""
+    try:
+        measured = int(prompt_eval_count or 0)
+    except (TypeError, ValueError):
+        return
+    if not model or estimated <= 0 or measured <= 0:
+        return
+    ratio = measured / estimated
+    low, high = _CALIBRATION_RANGE
+    if not low <= ratio <= high:
+        return
+    with _calibration_lock:
+        previous = _calibration.get(model)
+        _calibration[model] = (
+            ratio if previous is None
+            else previous + _CALIBRATION_ALPHA * (ratio - previous)
+        )
+
+
+class ContextBudget:
+    """
+    Répartition de la fenêtre de contexte d'un modèle.
+
+    La réserve de réponse est retirée de num_ctx ; le reste (prompt_budget)
+    accueille le prompt système, le contexte de la requête, l'historique et
+    le message courant. Les décomptes sont calibrés pour le modèle.
+    """
+
+    def __init__(
+        self,
+        num_ctx: int,
+        model: str = "",
+        response_reserve: Optional[int] = None,
+        compact_ratio: Optional[float] = None,
+        context_share: Optional[float] = None,
+    ):
+        cfg = get_config()
+        if response_reserve is None:
+            response_reserve = int(cfg.get(
+                "llm.local.context_budget.response_reserve", _DEFAULT_RESPONSE_RESERVE
+            ))
+        if compact_ratio is None:
+            compact_ratio = float(cfg.get(
+                "llm.local.context_budget.compact_ratio", _DEFAULT_COMPACT_RATIO
+            ))
+        if context_share is None:
+            context_share = float(cfg.get(
+                "llm.local.context_budget.context_share", _DEFAULT_CONTEXT_SHARE
+            ))
+        self.num_ctx = int(num_ctx)
+        self.model = model
+        # La réserve ne peut pas manger plus de la moitié d'une petite fenêtre
+        self.response_reserve = min(int(response_reserve), self.num_ctx // 2)
+        self.compact_ratio = compact_ratio
+        self.context_share = context_share
+
+    @property
+    def prompt_budget(self) -> int:
+        """Tokens disponibles pour le prompt (fenêtre moins la réserve de réponse)."""
+        return self.num_ctx - self.response_reserve
+
+    @property
+    def context_tokens(self) -> int:
+        """Plafond du contexte injecté (extraits RAG, base de connaissances)."""
+        return int(self.prompt_budget * self.context_share)
+
+    @property
+    def compact_threshold(self) -> int:
+        """Taille de prompt à partir de laquelle l'historique doit être résumé."""
+        return int(self.prompt_budget * self.compact_ratio)
+
+    def _scale(self, tokens: int) -> int:
+        return int(round(tokens * calibration_ratio(self.model)))
+
+    def count(self, text: str) -> int:
+        return self._scale(count_tokens(text))
+
+    def count_messages(
+        self, messages: Sequence[Dict[str, Any]], tools: Optional[List[Dict]] = None
+    ) -> int:
+        return self._scale(count_message_tokens(messages, tools))
+
+    def allocate(
+        self,
+        system_prompt: str = "",
+        user_input: str = "",
+        tools: Optional[List[Dict]] = None,
+        context: Optional[str] = None,
+    ) -> Dict[str, int]:
+        """
+        Répartit prompt_budget : ce qui reste après le prompt système, les
+        outils, le contexte de la requête et le message courant revient à
+        l'historique.
+        """
+        fixed = []
+        if system_prompt:
+            fixed.append({"role": "system", "content": system_prompt})
+        context_msg = context_message(context)
+        if context_msg:
+            fixed.append(context_msg)
+        fixed.append({"role": "user", "content": user_input})
+        fixed_tokens = self.count_messages(fixed, tools)
+        return {
+            "response": self.response_reserve,
+            "fixed": fixed_tokens,
+            "history": max(0, self.prompt_budget - fixed_tokens),
+        }
+
+    def fit_history(
+        self, history: Sequence[Dict[str, Any]], max_tokens: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Garde les messages les plus récents tenant dans max_tokens. Un résumé
+        de tête (message « system » en position 0) est conservé en priorité.
+        """
+        history = list(history)
+        head: List[Dict[str, Any]] = []
+        if history and history[0].get("role") == "system":
+            head_tokens = self.count_messages(history[:1])
+            if head_tokens <= max_tokens:
+                head = history[:1]
+                max_tokens -= head_tokens
+            history = history[1:]
+        kept: List[Dict[str, Any]] = []
+        for message in reversed(history):
+            tokens = self.count_messages([message])
+            if tokens > max_tokens:
+                break
+            kept.append(message)
+            max_tokens -= tokens
+        kept.reverse()
+        return head + kept
+
+    def fit_messages(
+        self,
+        system_prompt: Optional[str],
+        history: Sequence[Dict[str, Any]],
+        user_input: str,
+        tools: Optional[List[Dict]] = None,
+        context: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Messages /api/chat complets, historique élagué pour tenir dans la
+        fenêtre. Le contexte de la requête suit l'historique (préfixe stable,
+        voir core/prompt_assembly.py).
+        """
+        allowance = self.allocate(system_prompt or "", user_input, tools, context)["history"]
+        messages: List[Dict[str, Any]] = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.extend(self.fit_history(history, allowance))
+        context_msg = context_message(context)
+        if context_msg:
+            messages.append(context_msg)
+        messages.append({"role": "user", "content": user_input})
+        return messages
+
+    def needs_compaction(
+        self, messages: Sequence[Dict[str, Any]], tools: Optional[List[Dict]] = None
+    ) -> bool:
+        return self.count_messages(messages, tools) > self.compact_threshold
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Coupe un texte à max_tokens (calibrés), en gardant le début."""
+        if not text or self.count(text) <= max_tokens:
+            return text
+        raw_limit = max(0, int(max_tokens / calibration_ratio(self.model)))
+        encoder = get_token_encoder()
+        if encoder is None:
+            return text[: raw_limit * _CHARS_PER_TOKEN]
+        return encoder.decode(encoder.encode(text, disallowed_special=())[:raw_limit])
+
+    def observe(
+        self,
+        messages: Sequence[Dict[str, Any]],
+        prompt_eval_count: Any,
+        tools: Optional[List[Dict]] = None,
+    ) -> None:
+        """Calibre le modèle à partir du prompt_eval_count d'une réponse Ollama."""
+        calibrate(self.model, count_message_tokens(messages, tools), prompt_eval_count)
@@ -0,0 +1,141 @@
+"""
+Collecte concurrente du contexte d'une requête.
+
+Avant d'appeler le modèle, AIEngine enchaînait détection de langue, faits de
+la base de connaissances (deux requêtes SQLite), contexte du dossier projet
+(list_folders, get_status, embedding + requête Chroma + rerank) et sélection
+des documents. Sur un workspace avec un dépôt attaché, ce prologue en série
+dominait le délai avant le premier token.
+
+ContextGathering lance toutes les sources dès l'arrivée de la requête, chacune
+sur son propre thread (un pool par requête) : une source abandonnée par une
+requête précédente n'occupe jamais le thread d'une source de la requête
+suivante. Chaque source a une échéance propre, comptée depuis le lancement :
+une source trop lente est abandonnée (valeur par défaut, avertissement dans
+les logs) au lieu de retarder le tour. Son thread termine en arrière-plan, son
+résultat est ignoré.
+
+Échéances : ai.context_gathering.timeouts.<source> (secondes),
+ai.context_gathering.default_timeout sinon ; None = pas d'échéance (la source
+est toujours attendue).
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from core.admission import run_in_context
+from core.config import get_config
+from core.tracing import span
+from utils.logger import setup_logger
+
+logger = setup_logger("context_gathering")
+
+_DEFAULT_TIMEOUT = 5.0
+
+
+class ContextGathering:
+    """
+    Sources de contexte exécutées en parallèle.
+
+    sources : {nom: (callable sans argument, valeur par défaut)}. La valeur
+    par défaut est rendue si la source échoue ou dépasse son échéance.
+    timeouts : échéances (secondes) prioritaires sur la configuration ; None
+    pour une source qui doit toujours être attendue.
+    """
+
+    def __init__(
+        self,
+        sources: Dict[str, Tuple[Callable[[], Any], Any]],
+        timeouts: Optional[Dict[str, Optional[float]]] = None,
+    ) -> None:
+        config = get_config()
+        default_timeout = float(config.get("ai.context_gathering.default_timeout", _DEFAULT_TIMEOUT))
+        configured = dict(config.get("ai.context_gathering.timeouts", {}) or {})
+        configured.update(timeouts or {})
+
+        self.started = time.monotonic()
+        self._defaults: Dict[str, Any] = {}
+        self._deadlines: Dict[str, Optional[float]] = {}
+        self._futures: Dict[str, Future] = {}
+        self._durations: Dict[str, float] = {}
+        self._results: Dict[str, Any] = {}
+        self._dropped: set = set()
+        self._lock = threading.Lock()
+
+        # Un thread par source : aucune n'attend derrière une autre, ni derrière
+        # les sources abandonnées des requêtes précédentes
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, len(sources)), thread_name_prefix="context-gather"
+        )
+        for name, (fn, default) in sources.items():
+            timeout = configured.get(name, default_timeout)
+            self._defaults[name] = default
+            self._deadlines[name] = None if timeout is None else self.started + float(timeout)
+            self._futures[name] = self._pool.submit(run_in_context(self._timed), name, fn)
+        # Les threads se terminent avec leur source, sans être attendus
+        self._pool.shutdown(wait=False)
+
+    def _timed(self, name: str, fn: Callable[[], Any]) -> Any:
+        start = time.monotonic()
+        try:
+            with span(f"context.{name}", kind="retrieval"):
+                return fn()
+        finally:
+            with self._lock:
+                self._durations[name] = (time.monotonic() - start) * 1000
+
+    def result(self, name: str) -> Any:
+        """Résultat de la source, en attendant au plus jusqu'à son échéance."""
+        with self._lock:
+            if name in self._results:
+                return self._results[name]
+        future = self._futures[name]
+        deadline = self._deadlines[name]
+        try:
+            value = future.result(
+                timeout=None if deadline is None else max(0.0, deadline - time.monotonic())
+            )
+        except FutureTimeoutError:
+            logger.warning(
+                "Source de contexte '%s' abandonnée (échéance %.1f s dépassée)",
+                name, deadline - self.started,
+            )
+            value = self._defaults[name]
+            with self._lock:
+                self._dropped.add(name)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("Source de contexte '%s' en erreur : %s", name, exc)
+            value = self._defaults[name]
+        with self._lock:
+            self._results[name] = value
+        return value
+
+    def results(self) -> Dict[str, Any]:
+        """Résultats de toutes les sources (dans l'ordre de déclaration)."""
+        values = {name: self.result(name) for name in self._futures}
+        with self._lock:
+            timings = ", ".join(
+                f"{name} abandonnée" if name in self._dropped
+                else f"{name} {self._durations.get(name, 0.0):.0f} ms"
+                for name in self._futures
+            )
+        logger.info(
+            "Contexte collecté en %.0f ms (%s)",
+            (time.monotonic() - self.started) * 1000, timings,
+        )
+        return values
+
+    @property
+    def dropped(self) -> set:
+        """Sources abandonnées pour dépassement d'échéance."""
+        with self._lock:
+            return set(self._dropped)
+
+    def cancel(self) -> None:
+        """Abandonne la collecte (requête traitée autrement) : les sources pas
+        encore démarrées sont annulées, les autres terminent sans être attendues."""
+        for future in self._futures.values():
+            future.cancel()
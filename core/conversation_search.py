@@ -8,9 +8,12 @@ pipeline d'embedding n'est cree.
 
 Principe :
   - L'indexation est incrementale : un manifeste (conversation_index.json) garde
-    le `last_modified` de chaque workspace deja indexe. Au reindex, seuls les
-    workspaces nouveaux/modifies sont re-traites, et les workspaces supprimes
-    sont retires de l'index.
+    le `last_modified` de chaque workspace deja indexe et l'empreinte de chacun
+    de ses messages. Au reindex, seuls les workspaces modifies sont relus, et
+    seuls leurs messages nouveaux/modifies sont encodes (les index disparus
+    sont supprimes) ; les workspaces supprimes sont retires de l'index.
+    Si l'historique n'a fait que s'allonger (meme `history_revision`), seuls
+    les messages ajoutes sont lus (SessionManager.load_history).
   - La recherche est hybride : similarite semantique (+ reranking CrossEncoder
     si dispo, herite de VectorMemory.search_similar) puis post-filtres optionnels
     mot-cle / role / date.
@@ -18,6 +21,7 @@ Principe :
 
 from __future__ import annotations
 
+import hashlib
 import json
 import threading
 from pathlib import Path
@@ -25,6 +29,12 @@ from typing import Any, Dict, List, Optional
 
 from core.config import get_config
 
+try:
+    from core.lexical_index import LexicalIndex
+    LEXICAL_INDEX_AVAILABLE = True
+except Exception:  # pragma: no cover - index inverse optionnel
+    LEXICAL_INDEX_AVAILABLE = False
+
 try:
     from utils.logger import setup_logger
     logger = setup_logger("conversation_search")
@@ -35,7 +45,7 @@ except Exception:  # pragma: no cover - logger optionnel
 
 # Version du schema d'indexation : incrementer force une reindexation complete
 # (utile quand la LOGIQUE d'indexation change, a donnees inchangees).
-_INDEX_SCHEMA = 3
+_INDEX_SCHEMA = 4
 
 # Types techniques (placeholders, images) qui n'ont pas de texte a chercher.
 # Aucun filtre de longueur : tout message non vide est indexable, quel que
@@ -88,6 +98,29 @@ class ConversationSearch:
             storage_dir = Path("memory/vector_store")
         self._manifest_path = storage_dir / "conversation_index.json"
 
+        # Index inverse (mots exacts) tenu a jour avec la collection ; None si
+        # SQLite n'a pas FTS5/trigram -> repli sur le balayage de la collection.
+        # C'est l'index creux "conversation" de VectorMemory (BM25 + trigrammes
+        # dans une seule base) : le texte n'est indexe qu'une fois.
+        self._lexical = None
+        self._lexical_shared = hasattr(vector_memory, "sparse_index")
+        legacy_path = storage_dir / "conversation_lexical.db"
+        if self._lexical_shared:
+            try:
+                self._lexical = vector_memory.sparse_index("conversation")
+            except Exception as exc:
+                logger.warning("Index mot-exact indisponible (balayage complet): %s", exc)
+            for suffix in ("", "-wal", "-shm"):  # ancienne base separee
+                try:
+                    Path(f"{legacy_path}{suffix}").unlink()
+                except OSError:
+                    pass
+        elif LEXICAL_INDEX_AVAILABLE:
+            try:
+                self._lexical = LexicalIndex(str(legacy_path))
+            except Exception as exc:
+                logger.warning("Index mot-exact indisponible (balayage complet): %s", exc)
+
     @staticmethod
     def _cfg(key: str, default):
         """Lit une valeur de config, avec repli silencieux."""
@@ -118,8 +151,13 @@ class ConversationSearch:
     # Manifeste
     # ------------------------------------------------------------------
 
-    def _load_manifest(self) -> Dict[str, str]:
-        """Charge la table {workspace_id: last_modified}.
+    def _load_manifest(self) -> Dict[str, dict]:
+        """Charge la table {workspace_id: etat indexe}.
+
+        Etat d'un workspace : {"last_modified", "name", "messages", "revision",
+        "count"}, ou `messages` associe chaque index de message indexe a
+        l'empreinte de son contenu ({str(index): hash}), `revision` est la
+        revision de l'historique indexe et `count` son nombre de messages.
 
         Renvoie {} si le schema d'indexation a change, ce qui force une
         reindexation complete (les regles d'indexation ont evolue).
@@ -135,9 +173,12 @@ class ConversationSearch:
         if not isinstance(data, dict) or data.get("schema") != _INDEX_SCHEMA:
             return {}  # schema obsolete -> tout reindexer
         workspaces = data.get("workspaces", {})
-        return workspaces if isinstance(workspaces, dict) else {}
+        if not isinstance(workspaces, dict):
+            return {}
+        return {ws_id: entry for ws_id, entry in workspaces.items()
+                if isinstance(entry, dict)}
 
-    def _save_manifest(self, manifest: Dict[str, str]) -> None:
+    def _save_manifest(self, manifest: Dict[str, dict]) -> None:
         try:
             self._manifest_path.parent.mkdir(parents=True, exist_ok=True)
             tmp = self._manifest_path.with_suffix(".json.tmp")
@@ -153,13 +194,14 @@ class ConversationSearch:
     # ------------------------------------------------------------------
 
     @staticmethod
-    def _iter_indexable_messages(history: List[dict]):
+    def _iter_indexable_messages(history: List[dict], start: int = 0):
         """Genere (index, role, text, timestamp) pour les messages indexables.
 
         Indexe TOUT message non vide (utilisateur comme assistant), sans aucun
-        filtre de longueur.
+        filtre de longueur. `start` est l'index du premier message de `history`
+        dans l'historique complet.
         """
-        for idx, msg in enumerate(history):
+        for idx, msg in enumerate(history, start):
             if not isinstance(msg, dict):
                 continue
             if msg.get("type") in _SKIP_TYPES:
@@ -172,6 +214,12 @@ class ConversationSearch:
             timestamp = str(msg.get("timestamp", ""))
             yield idx, role, text, timestamp
 
+    @staticmethod
+    def _message_hash(role: str, text: str, timestamp: str) -> str:
+        """Empreinte d'un message : tout ce qui finit dans l'index (texte + metadonnees)."""
+        payload = "\x1f".join((role, timestamp, text)).encode("utf-8")
+        return hashlib.sha1(payload).hexdigest()
+
     def _delete_workspace_entries(self, workspace_id: str) -> None:
         """Supprime de l'index toutes les entrees d'un workspace."""
         col = self._collection
@@ -181,32 +229,71 @@ class ConversationSearch:
             col.delete(where={"workspace_id": workspace_id})
         except Exception as exc:
             logger.warning("Suppression index workspace '%s' echouee: %s", workspace_id, exc)
+        if self._lexical_shared:
+            self.vector_memory.remove_sparse(
+                "conversation", where={"workspace_id": workspace_id})
+        elif self._lexical is not None:
+            try:
+                self._lexical.delete_group(workspace_id)
+            except Exception as exc:
+                logger.warning("Suppression index mot-exact '%s' echouee: %s",
+                               workspace_id, exc)
+
+    def _index_workspace(self, workspace_id: str, workspace_name: str,
+                         previous: Optional[dict] = None,
+                         revision: Optional[int] = None) -> Optional[dict]:
+        """Met a jour l'index d'un workspace, message par message.
+
+        Compare l'historique courant aux empreintes du dernier passage
+        (`previous["messages"]`) : seuls les messages nouveaux ou modifies sont
+        encodes et ajoutes, seuls les index disparus sont supprimes. Sans etat
+        precedent exploitable (premier passage, reindex force, renommage du
+        workspace), toutes les entrees du workspace sont reconstruites. Si la
+        revision de l'historique n'a pas change depuis le dernier passage, il
+        n'a fait que s'allonger : seuls les messages ajoutes sont lus.
 
-    def _index_workspace(self, workspace_id: str, workspace_name: str) -> int:
-        """(Re)indexe un workspace. Retourne le nombre de messages indexes."""
+        Returns:
+            {"messages": {index: hash}, "added": n, "deleted": n, "count": n},
+            ou None si le workspace n'a pas pu etre traite (l'etat precedent
+            est conserve).
+        """
         col = self._collection
         model = getattr(self.vector_memory, "embedding_model", None)
         if col is None or model is None:
-            return 0
-
-        state = self.session_manager.load_workspace(workspace_id)
-        if not state:
-            return 0
-        history = state.get("conversation_history", state.get("history", []))
+            return None
+
+        old: Optional[Dict[str, str]] = None
+        if previous and previous.get("name") == workspace_name:
+            msgs = previous.get("messages")
+            old = msgs if isinstance(msgs, dict) else None
+
+        start = 0
+        current: Dict[str, str] = {}
+        if (old is not None and revision is not None
+                and previous.get("revision") == revision
+                and isinstance(previous.get("count"), int)
+                and hasattr(self.session_manager, "load_history")):
+            start = previous["count"]
+            history = self.session_manager.load_history(workspace_id, start=start)
+            current = dict(old)
+        else:
+            state = self.session_manager.load_workspace(workspace_id)
+            if not state:
+                return None
+            history = state.get("conversation_history", state.get("history", []))
         if not isinstance(history, list):
-            return 0
-
-        # Repartir de zero pour ce workspace (gere les editions/suppressions)
-        self._delete_workspace_entries(workspace_id)
+            return None
 
         ids: List[str] = []
-        embeddings: List[list] = []
         documents: List[str] = []
         metadatas: List[dict] = []
 
-        for idx, role, text, timestamp in self._iter_indexable_messages(history):
+        for idx, role, text, timestamp in self._iter_indexable_messages(history, start):
+            digest = self._message_hash(role, text, timestamp)
+            current[str(idx)] = digest
+            if old is not None and old.get(str(idx)) == digest:
+                continue  # message deja indexe a l'identique
             ids.append(f"conv_{workspace_id}_{idx}")
-            embeddings.append(model.encode(text).tolist())
             documents.append(text)
             metadatas.append(
                 {
@@ -218,7 +305,33 @@ class ConversationSearch:
                 }
             )
 
+        # Suppressions : tout le workspace (reconstruction) ou seulement les
+        # index disparus / modifies (ces derniers sont re-ajoutes juste apres).
+        deleted = 0
+        if old is None:
+            self._delete_workspace_entries(workspace_id)
+        else:
+            stale = [f"conv_{workspace_id}_{idx}" for idx, digest in old.items()
+                     if current.get(idx) != digest]
+            if stale:
+                try:
+                    col.delete(ids=stale)
+                    if self._lexical_shared:
+                        self.vector_memory.remove_sparse("conversation", ids=stale)
+                    elif self._lexical is not None:
+                        self._lexical.delete(stale)
+                except Exception as exc:
+                    logger.error("Suppression de messages '%s' echouee: %s",
+                                 workspace_id, exc)
+                    return None
+            deleted = sum(1 for idx in old if idx not in current)
+
         if ids:
+            # Embeddings par lots via VectorMemory (cache d'embeddings persistant).
+            if hasattr(self.vector_memory, "encode_batch"):
+                embeddings = self.vector_memory.encode_batch(documents)
+            else:
+                embeddings = [model.encode(text).tolist() for text in documents]
             try:
                 col.add(
                     ids=ids,
@@ -226,33 +339,61 @@ class ConversationSearch:
                     documents=documents,
                     metadatas=metadatas,
                 )
+                if self._lexical_shared:
+                    self.vector_memory.index_sparse("conversation", ids, documents,
+                                                    metadatas)
+                elif self._lexical is not None:
+                    self._lexical.upsert(ids, documents, group_id=workspace_id)
             except Exception as exc:
                 logger.error("Indexation workspace '%s' echouee: %s", workspace_id, exc)
-                return 0
+                # Etat incertain : le prochain passage reconstruira le workspace.
+                return {"messages": None, "added": 0, "deleted": deleted,
+                        "count": None}
 
-        return len(ids)
+        return {"messages": current, "added": len(ids), "deleted": deleted,
+                "count": start + len(history)}
+
+    def _lexical_needs_rebuild(self, manifest: Dict[str, dict]) -> bool:
+        """True si l'index mot-exact est vide alors que des messages sont indexes
+        (premiere execution apres sa creation, base supprimee...)."""
+        if self._lexical is None:
+            return False
+        if not any(entry.get("messages") for entry in manifest.values()):
+            return False
+        try:
+            return self._lexical.count() == 0
+        except Exception:
+            return False
 
     def reindex(self, force: bool = False) -> Dict[str, int]:
         """
         Synchronise l'index avec les workspaces sur disque (incremental).
 
+        Seuls les workspaces dont `last_modified` a change sont relus, et pour
+        eux seuls les messages ajoutes / modifies / supprimes sont traites :
+        le cout est proportionnel au delta, pas a la taille de l'historique.
+
         Args:
-            force: si True, reindexe tous les workspaces sans tenir compte du
-                   manifeste.
+            force: si True, reconstruit tous les workspaces sans tenir compte
+                   du manifeste.
 
         Returns:
-            {"indexed": n_workspaces, "messages": n_messages, "removed": n_supprimes}
+            {"indexed": n_workspaces, "messages": n_messages_encodes,
+             "deleted": n_messages_supprimes, "removed": n_workspaces_supprimes}
         """
+        empty = {"indexed": 0, "messages": 0, "deleted": 0, "removed": 0}
         if not self.is_available():
-            return {"indexed": 0, "messages": 0, "removed": 0}
+            return empty
 
         with self._lock:
             manifest = {} if force else self._load_manifest()
+            if manifest and self._lexical_needs_rebuild(manifest):
+                manifest = {}  # index mot-exact absent/perdu -> tout reconstruire
             try:
                 workspaces = self.session_manager.list_workspaces()
             except Exception as exc:
                 logger.warning("Liste des workspaces indisponible: %s", exc)
-                return {"indexed": 0, "messages": 0, "removed": 0}
+                return empty
 
             current_ids = {ws.get("id") for ws in workspaces if ws.get("id")}
 
@@ -266,26 +407,41 @@ class ConversationSearch:
 
             indexed = 0
             messages = 0
+            deleted = 0
             for ws in workspaces:
                 ws_id = ws.get("id")
                 if not ws_id:
                     continue
                 last_modified = str(ws.get("last_modified", ""))
-                if not force and manifest.get(ws_id) == last_modified:
+                previous = manifest.get(ws_id)
+                if previous and previous.get("last_modified") == last_modified \
+                        and previous.get("messages") is not None:
                     continue  # inchange depuis le dernier index
                 ws_name = ws.get("name", ws_id)
-                n = self._index_workspace(ws_id, ws_name)
-                manifest[ws_id] = last_modified
+                revision = ws.get("history_revision")
+                result = self._index_workspace(ws_id, ws_name, previous, revision)
+                if result is None:
+                    continue
+                manifest[ws_id] = {
+                    "last_modified": last_modified,
+                    "name": ws_name,
+                    "messages": result["messages"],
+                    "revision": revision,
+                    "count": result["count"],
+                }
                 indexed += 1
-                messages += n
+                messages += result["added"]
+                deleted += result["deleted"]
 
             self._save_manifest(manifest)
             if indexed or removed:
                 logger.info(
-                    "Reindex termine: %d workspace(s), %d message(s), %d supprime(s)",
-                    indexed, messages, removed,
+                    "Reindex termine: %d workspace(s), %d message(s) encode(s), "
+                    "%d supprime(s), %d workspace(s) retire(s)",
+                    indexed, messages, deleted, removed,
                 )
-            return {"indexed": indexed, "messages": messages, "removed": removed}
+            return {"indexed": indexed, "messages": messages,
+                    "deleted": deleted, "removed": removed}
 
     # ------------------------------------------------------------------
     # Recherche
@@ -407,13 +563,23 @@ class ConversationSearch:
     def _lexical_full_scan(self, query: str, cap: int = 200) -> List[dict]:
         """Cherche les mots-exacts dans TOUTE la collection (pas seulement les
         plus proches voisins). Insensible a la casse. Retourne des resultats au
-        meme format que search_similar (sans distance)."""
+        meme format que search_similar (sans distance).
+
+        Passe par l'index inverse si disponible : seuls les candidats sont lus
+        dans ChromaDB (par id), qui reste la reference (entrees supprimees ou
+        editees directement ecartees par la verification finale)."""
         col = self._collection
         tokens = self._content_tokens(query)
         if col is None or not tokens:
             return []
         try:
-            data = col.get(include=["documents", "metadatas"])
+            if self._lexical is not None:
+                candidates = self._lexical.search(tokens, limit=cap)
+                if not candidates:
+                    return []
+                data = col.get(ids=candidates, include=["documents", "metadatas"])
+            else:
+                data = col.get(include=["documents", "metadatas"])
         except Exception as exc:
             logger.warning("Balayage mot-exact echoue: %s", exc)
             return []
@@ -475,8 +641,12 @@ class ConversationSearch:
             return kept
 
         try:
-            pairs = [[query, r.get("content", "")] for r in raw]
-            scores = reranker.predict(pairs)
+            if hasattr(self.vector_memory, "rerank_scores"):
+                # Cache LRU partage : les paires deja scorees ce tour-ci sont reutilisees
+                scores = self.vector_memory.rerank_scores(query, raw)
+            else:
+                pairs = [[query, r.get("content", "")] for r in raw]
+                scores = reranker.predict(pairs)
         except Exception as exc:
             logger.warning("Reranking recherche echoue: %s", exc)
             return raw
@@ -0,0 +1,249 @@
+"""
+Cache persistant d'embeddings, adressé par contenu.
+
+Un même texte n'est encodé qu'une seule fois, quel que soit l'indexeur qui le
+demande (VectorMemory, FolderIndexer, ConversationSearch) : fichier présent dans
+deux workspaces, conversation réindexée après l'édition d'un seul message,
+document ré-attaché...
+
+Clé : (nom du modèle, sha256 du texte normalisé). Les vecteurs sont stockés en
+float16 dans une table SQLite (BLOB), avec éviction LRU par nombre d'entrées et
+compteurs hits/misses. Stockage thread-safe : une seule connexion SQLite par
+instance, partagée entre threads sous le verrou de l'instance.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from utils.logger import setup_logger
+
+logger = setup_logger("embedding_cache")
+
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key        TEXT    PRIMARY KEY,
+    model      TEXT    NOT NULL,
+    dim        INTEGER NOT NULL,
+    vector     BLOB    NOT NULL,
+    last_used  REAL    NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_emb_last_used ON embeddings(last_used);
+"""
+
+# Limite de variables d'une requête SQLite (lookup par paquets).
+_SQL_BATCH = 500
+
+
+def normalize_text(text: str) -> str:
+    """Normalise un texte avant hachage (NFC + espaces compactés).
+
+    Les tokenizers des modèles d'embeddings ignorent les variations d'espaces :
+    deux textes qui ne diffèrent que par elles ont le même vecteur.
+    """
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+class EmbeddingCache:
+    """Cache LRU persistant (SQLite) de vecteurs d'embeddings en float16."""
+
+    def __init__(
+        self,
+        db_path: str = "memory/vector_store/embedding_cache.db",
+        max_entries: int = 100000,
+    ) -> None:
+        """
+        Args:
+            db_path: chemin de la base SQLite du cache.
+            max_entries: nombre maximal de vecteurs conservés (éviction LRU).
+        """
+        self._db_path = Path(db_path)
+        self._max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._last_tick = 0.0
+        # Base creee au premier acces (pas de fichier tant que rien n'est encode)
+        self._conn: Optional[sqlite3.Connection] = None
+        logger.info("EmbeddingCache initialisé (db=%s, max=%d)", db_path, self._max_entries)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connexion de l'instance (ouverte au premier accès). Appeler sous self._lock."""
+        if self._conn is None:
+            self._db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self._db_path), timeout=30,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA_SQL)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        """Ferme la connexion SQLite (rouverte au prochain accès)."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _tick(self) -> float:
+        """Horodatage LRU strictement croissant (départage les appels rapprochés)."""
+        self._last_tick = max(time.time(), self._last_tick + 1e-6)
+        return self._last_tick
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        """Clé de cache : modèle + sha256 du texte normalisé."""
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{model_name}:{digest}"
+
+    # ------------------------------------------------------------------
+    # Accès
+    # ------------------------------------------------------------------
+
+    def get_many(self, model_name: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Vecteurs en cache pour chaque texte (None si absent)."""
+        keys = [self.make_key(model_name, t) for t in texts]
+        found: Dict[str, List[float]] = {}
+        with self._lock, self._connect() as conn:
+            now = self._tick()
+            unique = list(dict.fromkeys(keys))
+            for start in range(0, len(unique), _SQL_BATCH):
+                part = unique[start:start + _SQL_BATCH]
+                marks = ",".join("?" * len(part))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", part
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float16).astype(
+                        np.float32).tolist()
+                if rows:
+                    conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        [(now, key) for key, _ in rows],
+                    )
+            hits = sum(1 for k in keys if k in found)
+            self._hits += hits
+            self._misses += len(keys) - hits
+        return [found.get(k) for k in keys]
+
+    def put_many(self, model_name: str, texts: List[str], vectors: List[Any]) -> None:
+        """Enregistre des vecteurs (convertis en float16), puis applique le LRU."""
+        if not texts:
+            return
+        rows = []
+        for text, vec in zip(texts, vectors):
+            arr = np.asarray(vec, dtype=np.float16)
+            rows.append([self.make_key(model_name, text), model_name,
+                         int(arr.shape[-1]), arr.tobytes(), 0.0])
+        with self._lock, self._connect() as conn:
+            now = self._tick()
+            for row in rows:
+                row[4] = now
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Supprime les entrées les moins récemment utilisées au-delà de la limite."""
+        count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self._max_entries
+        if excess <= 0:
+            return
+        conn.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            "SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (excess,),
+        )
+        self._evictions += excess
+
+    def encode(self, model: Any, model_name: str, texts: List[str],
+               batch_size: int = 64) -> List[List[float]]:
+        """Encode des textes en passant par le cache.
+
+        Seuls les textes absents (dédupliqués) sont envoyés au modèle, en un
+        appel par lot ; le résultat garde l'ordre des textes en entrée.
+
+        Args:
+            model: modèle sentence-transformers (méthode encode(list, ...)).
+            model_name: nom du modèle (fait partie de la clé).
+            texts: textes à encoder.
+            batch_size: taille des lots envoyés au modèle.
+
+        Returns:
+            Liste de vecteurs (listes de floats), alignée sur texts.
+        """
+        cached = self.get_many(model_name, texts)
+        missing: Dict[str, str] = {}
+        for text, vec in zip(texts, cached):
+            if vec is None:
+                missing.setdefault(self.make_key(model_name, text), text)
+
+        computed: Dict[str, List[float]] = {}
+        if missing:
+            todo = list(missing.values())
+            for start in range(0, len(todo), batch_size):
+                batch = todo[start:start + batch_size]
+                vectors = model.encode(batch, batch_size=batch_size,
+                                       show_progress_bar=False)
+                vectors = vectors.tolist() if hasattr(vectors, "tolist") else list(vectors)
+                self.put_many(model_name, batch, vectors)
+                for text, vec in zip(batch, vectors):
+                    computed[self.make_key(model_name, text)] = list(vec)
+
+        return [vec if vec is not None else computed[self.make_key(model_name, text)]
+                for text, vec in zip(texts, cached)]
+
+    # ------------------------------------------------------------------
+    # Maintenance / statistiques
+    # ------------------------------------------------------------------
+
+    def clear(self) -> None:
+        """Vide le cache (les compteurs sont remis à zéro)."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM embeddings")
+            self._hits = self._misses = self._evictions = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Statistiques : entrées, hits, misses, taux de hit, évictions."""
+        with self._lock:
+            entries = 0
+            if self._conn is not None or self._db_path.exists():
+                with self._connect() as conn:
+                    entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            total = self._hits + self._misses
+            return {
+                "entries": entries,
+                "max_entries": self._max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / total, 4) if total else 0.0,
+                "evictions": self._evictions,
+            }
+
+
+# Instances partagées par chemin de base (un seul cache par répertoire de stockage).
+_CACHES: Dict[str, EmbeddingCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_embedding_cache(db_path: str, max_entries: int = 100000) -> EmbeddingCache:
+    """Retourne le cache partagé associé à db_path (créé à la demande)."""
+    key = str(Path(db_path).resolve())
+    with _CACHES_LOCK:
+        cache = _CACHES.get(key)
+        if cache is None:
+            cache = EmbeddingCache(db_path, max_entries=max_entries)
+            _CACHES[key] = cache
+        return cache
@@ -9,7 +9,7 @@ Principes (calques sur core.conversation_search, qui fait deja de l'indexation
 incrementale reutilisant ChromaDB) :
   - 100% local. REUTILISE les processeurs existants (utils.file_processor ->
     processors/) pour l'extraction et le chunking de memory.vector_memory
-    (VectorMemory.split_into_chunks). Aucun nouveau pipeline d'embedding.
+    (VectorMemory.iter_chunks, en flux). Aucun nouveau pipeline d'embedding.
   - Stockage dans la collection dediee "codebase" de VectorMemory, chaque chunk
     etiquete par workspace_id / folder_path / file_path -> filtrable et purgeable
     par dossier ou par workspace.
@@ -20,18 +20,27 @@ incrementale reutilisant ChromaDB) :
     exclut par defaut node_modules/, __pycache__/, .git/, .venv/, dist/, etc.
   - Le contexte est lie au workspace : changer de workspace change le contexte
     projet actif (la recherche filtre par workspace_id).
+  - Indexation d'un dossier en PIPELINE (files bornees entre etages) :
+    parcours + hash -> extraction du texte en pool de workers (processus pour
+    PDF/DOCX/Excel, threads pour le texte) -> embeddings par lots -> un seul
+    ecrivain (ChromaDB + manifeste). Nombre de workers reglable dans
+    config.yaml (folder_indexer.workers).
 """
 
 from __future__ import annotations
 
+import bisect
 import fnmatch
 import hashlib
 import json
+import multiprocessing
 import os
+import queue
 import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional
 
 try:
     from core.config import get_config
@@ -77,6 +86,36 @@ _DEFAULT_EXCLUDE_DIRS = {
 # fichier est en general un binaire/asset ou un dump, pas du contexte utile.
 _MAX_FILE_BYTES = 2 * 1024 * 1024  # 2 Mo
 
+# Reglages par defaut du pipeline d'indexation (surcharges par config.yaml,
+# section folder_indexer). workers = 0 -> automatique (min(4, nb de CPU)).
+_DEFAULT_WORKERS = 0
+_DEFAULT_QUEUE_SIZE = 64
+_DEFAULT_EMBED_BATCH = 64
+
+# Marqueur de fin de flux entre etages du pipeline.
+_END = object()
+
+# FileProcessor propre a chaque processus worker (cree a la demande).
+_WORKER_PROCESSOR = None
+
+
+def _extract_in_worker(path: str) -> Dict[str, Any]:
+    """Extraction du texte d'un fichier dans un processus worker.
+
+    Fonction de module (picklable) : le FileProcessor est instancie une fois
+    par processus. Ne renvoie que le necessaire pour limiter la serialisation.
+    """
+    global _WORKER_PROCESSOR  # pylint: disable=global-statement
+    if _WORKER_PROCESSOR is None:
+        from utils.file_processor import FileProcessor
+        _WORKER_PROCESSOR = FileProcessor()
+    result = _WORKER_PROCESSOR.process_file(path)
+    if not isinstance(result, dict):
+        return {"error": "Resultat d'extraction invalide"}
+    if result.get("error"):
+        return {"error": result["error"]}
+    return {"content": result.get("content") or ""}
+
 
 class _GitignoreMatcher:
     """Matcher .gitignore minimal (repli si pathspec absent).
@@ -166,6 +205,31 @@ class FolderIndexer:
         except Exception:
             self._default_n = 3
 
+        try:
+            cfg = get_config()
+            workers = int(cfg.get("folder_indexer.workers", _DEFAULT_WORKERS)) if cfg \
+                else _DEFAULT_WORKERS
+            queue_size = int(cfg.get("folder_indexer.queue_size", _DEFAULT_QUEUE_SIZE)) \
+                if cfg else _DEFAULT_QUEUE_SIZE
+            embed_batch = int(cfg.get("folder_indexer.embed_batch_size",
+                                      _DEFAULT_EMBED_BATCH)) if cfg else _DEFAULT_EMBED_BATCH
+            use_processes = bool(cfg.get("folder_indexer.use_processes", True)) if cfg \
+                else True
+            watch = bool(cfg.get("folder_indexer.watch", False)) if cfg else False
+            debounce = float(cfg.get("folder_indexer.watch_debounce_seconds", 1.5)) \
+                if cfg else 1.5
+        except Exception:
+            workers, queue_size = _DEFAULT_WORKERS, _DEFAULT_QUEUE_SIZE
+            embed_batch, use_processes = _DEFAULT_EMBED_BATCH, True
+            watch, debounce = False, 1.5
+        self._workers = workers if workers > 0 else min(4, os.cpu_count() or 1)
+        self._queue_size = max(1, queue_size)
+        self._embed_batch = max(1, embed_batch)
+        self._use_processes = use_processes
+        self._watch_enabled = watch
+        self._watch_debounce = debounce
+        self._watcher = None  # core.folder_watcher.FolderWatcher (lazy)
+
     # ------------------------------------------------------------------
     # Disponibilite
     # ------------------------------------------------------------------
@@ -258,11 +322,17 @@ class FolderIndexer:
             return False
         return spec.match(rel_posix)
 
-    def _iter_files(self, root: Path) -> List[Path]:
-        """Liste les fichiers indexables du dossier (exclusions appliquees)."""
+    def _iter_files(self, root: Path, start: Optional[Path] = None) -> List[Path]:
+        """Liste les fichiers indexables du dossier (exclusions appliquees).
+
+        Args:
+            root: racine du dossier attache (base des chemins relatifs et du
+                .gitignore).
+            start: sous-dossier de root ou commencer le parcours (defaut : root).
+        """
         spec = self._build_ignore(root)
         files: List[Path] = []
-        for dirpath, dirnames, filenames in os.walk(root):
+        for dirpath, dirnames, filenames in os.walk(start or root):
             current = Path(dirpath)
             # Elaguer les dossiers exclus IN PLACE (evite de descendre node_modules)
             kept = []
@@ -290,6 +360,25 @@ class FolderIndexer:
                 files.append(fpath)
         return files
 
+    def _is_indexable(self, root: Path, fpath: Path, spec) -> bool:
+        """Meme filtre que _iter_files, pour un fichier isole."""
+        rel = fpath.relative_to(root).as_posix()
+        parts = rel.split("/")
+        if any(part in _DEFAULT_EXCLUDE_DIRS for part in parts[:-1]):
+            return False
+        for depth in range(1, len(parts)):
+            prefix = "/".join(parts[:depth])
+            if self._is_ignored(spec, prefix + "/") or self._is_ignored(spec, prefix):
+                return False
+        if self._is_ignored(spec, rel):
+            return False
+        if self.file_processor and not self.file_processor.is_supported(str(fpath)):
+            return False
+        try:
+            return fpath.stat().st_size <= _MAX_FILE_BYTES
+        except OSError:
+            return False
+
     # ------------------------------------------------------------------
     # Index par fichier
     # ------------------------------------------------------------------
@@ -326,11 +415,13 @@ class FolderIndexer:
         if col is None:
             return
         try:
-            col.delete(where={"$and": [
+            where = {"$and": [
                 {"workspace_id": workspace_id},
                 {"folder_path": folder_path},
                 {"file_path": rel_path},
-            ]})
+            ]}
+            col.delete(where=where)
+            self._remove_sparse(where)
         except Exception as exc:
             logger.warning("Purge chunks fichier echouee (%s): %s", rel_path, exc)
 
@@ -339,61 +430,326 @@ class FolderIndexer:
         if col is None:
             return
         try:
-            col.delete(where={"$and": [
+            where = {"$and": [
                 {"workspace_id": workspace_id},
                 {"folder_path": folder_path},
-            ]})
+            ]}
+            col.delete(where=where)
+            self._remove_sparse(where)
         except Exception as exc:
             logger.warning("Purge chunks dossier echouee (%s): %s", folder_path, exc)
 
-    def _index_file(self, workspace_id: str, folder_path: str, root: Path,
-                    fpath: Path) -> int:
-        """(Re)indexe un fichier. Retourne le nombre de chunks crees."""
-        col = self._collection
+    def _remove_sparse(self, where: dict) -> None:
+        """Repercute une purge sur l'index BM25 de VectorMemory (recherche hybride)."""
+        if hasattr(self.vector_memory, "remove_sparse"):
+            self.vector_memory.remove_sparse("codebase", where=where)
+
+    def _encode_chunks(self, texts: List[str]) -> List[list]:
+        """Embeddings d'une liste de chunks, par lots si VectorMemory le permet."""
         vm = self.vector_memory
-        rel_path = fpath.relative_to(root).as_posix()
+        if not texts:
+            return []
+        if hasattr(vm, "encode_batch"):
+            return vm.encode_batch(texts)
+        return [vm.embedding_model.encode(t).tolist() for t in texts]
 
-        result = self.file_processor.process_file(str(fpath))
-        if not isinstance(result, dict) or result.get("error"):
-            return 0
-        content = (result.get("content") or "").strip()
-        if not content:
-            return 0
+    def _iter_chunk_texts(self, content: str) -> Iterator[str]:
+        """Chunks d'un contenu, produits en flux si VectorMemory le permet."""
+        vm = self.vector_memory
+        if hasattr(vm, "iter_chunks"):
+            return (text for text, _, _ in vm.iter_chunks(content))
+        return iter(vm.split_into_chunks(content))
 
-        chunks = vm.split_into_chunks(content)
-        if not chunks:
-            return 0
+    def _write_file_chunks(self, workspace_id: str, folder_path: str, rel_path: str,
+                           chunks: List[str], embeddings: List[list],
+                           first_index: int = 0) -> int:
+        """Ecrit des chunks d'un fichier dans la collection. Retourne leur nombre.
+
+        Le premier lot (first_index == 0) remplace les chunks existants du
+        fichier ; les lots suivants d'un fichier decoupe en flux s'y ajoutent.
+        """
+        col = self._collection
 
         # Repartir de zero pour ce fichier (gere editions/suppressions de chunks)
-        self._delete_file_entries(workspace_id, folder_path, rel_path)
+        if first_index == 0:
+            self._delete_file_entries(workspace_id, folder_path, rel_path)
 
         ids: List[str] = []
-        embeddings: List[list] = []
-        documents: List[str] = []
         metadatas: List[dict] = []
         now = datetime.now().isoformat()
-        for i, chunk_text in enumerate(chunks):
+        file_name = rel_path.rsplit("/", 1)[-1]
+        for i in range(first_index, first_index + len(chunks)):
             ids.append(self._chunk_id(workspace_id, folder_path, rel_path, i))
-            embeddings.append(vm.embedding_model.encode(chunk_text).tolist())
-            documents.append(chunk_text)
             metadatas.append({
                 "kind": "codebase",
                 "workspace_id": workspace_id,
                 "folder_path": folder_path,
                 "file_path": rel_path,
-                "file_name": fpath.name,
+                "file_name": file_name,
                 "chunk_index": i,
                 "indexed_at": now,
             })
 
         try:
-            col.add(ids=ids, embeddings=embeddings, documents=documents,
+            col.add(ids=ids, embeddings=embeddings, documents=list(chunks),
                     metadatas=metadatas)
+            if hasattr(self.vector_memory, "index_sparse"):
+                self.vector_memory.index_sparse("codebase", ids, list(chunks), metadatas)
         except Exception as exc:
             logger.error("Indexation fichier '%s' echouee: %s", rel_path, exc)
             return 0
         return len(ids)
 
+    def _index_file(self, workspace_id: str, folder_path: str, root: Path,
+                    fpath: Path) -> Optional[int]:
+        """(Re)indexe un fichier. Retourne le nombre de chunks crees.
+
+        Retourne None si un lot a echoue (embeddings ou ecriture) : l'indexation
+        s'arrete a ce lot, sans quoi les lots suivants completeraient un index
+        troue, et ce qui a ete ecrit du fichier est purge.
+        """
+        rel_path = fpath.relative_to(root).as_posix()
+
+        result = self.file_processor.process_file(str(fpath))
+        if not isinstance(result, dict) or result.get("error"):
+            return 0
+        content = (result.get("content") or "").strip()
+        if not content:
+            return 0
+
+        # Decoupage en flux : un lot de chunks en memoire a la fois
+        written = 0
+        batch: List[str] = []
+        for chunk in self._iter_chunk_texts(content):
+            batch.append(chunk)
+            if len(batch) >= self._embed_batch:
+                if not self._index_file_batch(workspace_id, folder_path, rel_path,
+                                              batch, written):
+                    return None
+                written += len(batch)
+                batch = []
+        if batch:
+            if not self._index_file_batch(workspace_id, folder_path, rel_path,
+                                          batch, written):
+                return None
+            written += len(batch)
+        return written
+
+    def _index_file_batch(self, workspace_id: str, folder_path: str, rel_path: str,
+                          batch: List[str], first_index: int) -> bool:
+        """Encode et ecrit un lot de _index_file. False (fichier purge) si echec."""
+        try:
+            embeddings = self._encode_chunks(batch)
+        except Exception as exc:
+            logger.error("Embeddings fichier '%s' echoues: %s", rel_path, exc)
+            # Echec avant toute ecriture : l'ancienne version reste intacte
+            if first_index:
+                self._delete_file_entries(workspace_id, folder_path, rel_path)
+            return False
+        n = self._write_file_chunks(workspace_id, folder_path, rel_path, batch,
+                                    embeddings, first_index=first_index)
+        if n < len(batch):
+            # Les anciens chunks sont deja purges : ne pas laisser un index troue
+            self._delete_file_entries(workspace_id, folder_path, rel_path)
+            return False
+        return True
+
+    # ------------------------------------------------------------------
+    # Pipeline d'indexation de dossier
+    # ------------------------------------------------------------------
+
+    def _make_process_pool(self) -> Optional[Executor]:
+        """Pool de processus pour l'extraction PDF/DOCX/Excel (CPU-bound).
+
+        Seulement si plusieurs workers sont demandes et que l'extracteur est le
+        FileProcessor standard (reproductible dans un autre processus).
+        """
+        if not self._use_processes or self._workers < 2:
+            return None
+        try:
+            from utils.file_processor import FileProcessor
+        except Exception:
+            return None
+        if type(self.file_processor) is not FileProcessor:  # pylint: disable=unidiomatic-typecheck
+            return None
+        try:
+            # "spawn" : pas de fork d'un processus qui a deja des threads
+            # (etages du pipeline) et torch charge -> risque d'interblocage.
+            return ProcessPoolExecutor(max_workers=self._workers,
+                                       mp_context=multiprocessing.get_context("spawn"))
+        except (OSError, ValueError, NotImplementedError) as exc:
+            logger.warning("Pool de processus indisponible: %s", exc)
+            return None
+
+    def _is_heavy(self, fpath: Path) -> bool:
+        heavy = getattr(self.file_processor, "binary_extensions", ())
+        return fpath.suffix.lower() in heavy
+
+    def _extract_local(self, fpath: Path) -> Dict[str, Any]:
+        result = self.file_processor.process_file(str(fpath))
+        if not isinstance(result, dict):
+            return {"error": "Resultat d'extraction invalide"}
+        return result
+
+    def _produce(self, root: Path, files: List[Path], old_files: Dict[str, Any],
+                 force: bool, extract_q: "queue.Queue", stop: threading.Event) -> None:
+        """Etage 1 : signature + hash de chaque fichier, tri a-indexer / inchange.
+
+        Les fichiers inchanges partent directement a l'ecrivain (via le meme flux,
+        pour que la progression reste exacte) ; les autres sont a extraire.
+        """
+        try:
+            for fpath in files:
+                if stop.is_set():
+                    break
+                rel = fpath.relative_to(root).as_posix()
+                sig = self._file_signature(fpath)
+                if sig is None:
+                    extract_q.put(("gone", rel, None))
+                    continue
+                prev = old_files.get(rel)
+
+                # Chemin rapide : mtime + taille inchanges -> on garde tel quel.
+                if (not force and prev
+                        and prev.get("mtime") == sig["mtime"]
+                        and prev.get("size") == sig["size"]):
+                    extract_q.put(("skip", rel, prev))
+                    continue
+
+                # mtime/taille different : verifier le hash (evite un re-embedding
+                # si le contenu est identique, ex. apres un git checkout).
+                file_hash = self._file_hash(fpath)
+                if (not force and prev and prev.get("hash")
+                        and prev.get("hash") == file_hash):
+                    extract_q.put(("skip", rel, {**sig, "hash": file_hash,
+                                                 "chunks": prev.get("chunks", 0)}))
+                    continue
+
+                extract_q.put(("index", rel, {"path": fpath, **sig, "hash": file_hash}))
+        finally:
+            extract_q.put(_END)
+
+    def _extract(self, extract_q: "queue.Queue", embed_q: "queue.Queue",
+                 stop: threading.Event) -> None:
+        """Etage 2 : extraction du texte en parallele (ordre de soumission conserve).
+
+        Le nombre de futures en vol est borne par la taille des files : un
+        dossier de 20k fichiers ne charge jamais tout son texte en memoire.
+        """
+        process_pool: Optional[Executor] = None
+        pending: "queue.Queue" = queue.Queue(maxsize=self._queue_size)
+
+        def _forward() -> None:
+            while True:
+                item = pending.get()
+                if item is _END:
+                    break
+                kind, rel, info, future = item
+                if future is not None:
+                    try:
+                        info = {**info, "extracted": future.result()}
+                    except Exception as exc:  # pylint: disable=broad-except
+                        info = {**info, "extracted": {"error": str(exc)}}
+                embed_q.put((kind, rel, info))
+
+        forwarder = threading.Thread(target=_forward, name="folder-index-extract",
+                                     daemon=True)
+        forwarder.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self._workers) as thread_pool:
+                while True:
+                    item = extract_q.get()
+                    if item is _END:
+                        break
+                    kind, rel, info = item
+                    if kind != "index" or stop.is_set():
+                        pending.put((kind, rel, info, None))
+                        continue
+                    fpath = info["path"]
+                    if self._is_heavy(fpath):
+                        if process_pool is None:
+                            process_pool = self._make_process_pool() or thread_pool
+                        if process_pool is thread_pool:
+                            future = thread_pool.submit(self._extract_local, fpath)
+                        else:
+                            future = process_pool.submit(_extract_in_worker, str(fpath))
+                    else:
+                        future = thread_pool.submit(self._extract_local, fpath)
+                    pending.put((kind, rel, info, future))
+                pending.put(_END)
+                forwarder.join()
+        finally:
+            if process_pool is not None and isinstance(process_pool, ProcessPoolExecutor):
+                process_pool.shutdown(wait=True, cancel_futures=True)
+            embed_q.put(_END)
+
+    def _embed(self, embed_q: "queue.Queue", write_q: "queue.Queue",
+               stop: threading.Event) -> None:
+        """Etage 3 : chunking + embeddings par lots (plusieurs fichiers par lot).
+
+        Le chunking est consomme en flux : un gros fichier est envoye a
+        l'ecrivain en plusieurs parties ("part"), la derniere restant "index".
+        """
+        batch: List[tuple] = []  # (rel, info, chunks, first_index, last)
+        batch_chunks = 0
+
+        def _flush() -> None:
+            nonlocal batch, batch_chunks
+            if not batch:
+                return
+            texts = [c for _, _, chunks, _, _ in batch for c in chunks]
+            try:
+                vectors = self._encode_chunks(texts) if not stop.is_set() else []
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.error("Embeddings du lot echoues: %s", exc)
+                vectors = []
+            pos = 0
+            for rel, info, chunks, first, last in batch:
+                emb = vectors[pos:pos + len(chunks)]
+                pos += len(chunks)
+                ok = len(emb) == len(chunks)
+                # "failed" : l'ecrivain ne doit ni ecrire ce fichier ni
+                # enregistrer son nouveau hash (il sera retente au prochain index).
+                write_q.put(("index" if last else "part", rel,
+                             {**info, "chunks_text": chunks if ok else [],
+                              "embeddings": emb if ok else [], "first_chunk": first,
+                              "failed": not ok}))
+            batch, batch_chunks = [], 0
+
+        try:
+            while True:
+                item = embed_q.get()
+                if item is _END:
+                    break
+                kind, rel, info = item
+                if kind != "index":
+                    write_q.put((kind, rel, info))
+                    continue
+                extracted = info.pop("extracted", None) or {}
+                content = "" if extracted.get("error") else (
+                    extracted.get("content") or "").strip()
+                if not content:
+                    write_q.put(("index", rel, {**info, "chunks_text": [],
+                                                "embeddings": []}))
+                    continue
+                chunks: List[str] = []
+                first = 0
+                for chunk in self._iter_chunk_texts(content):
+                    chunks.append(chunk)
+                    batch_chunks += 1
+                    if batch_chunks >= self._embed_batch:
+                        batch.append((rel, info, chunks, first, False))
+                        first += len(chunks)
+                        chunks = []
+                        _flush()
+                batch.append((rel, info, chunks, first, True))
+                # Lot plein, ou plus rien en attente : encoder sans attendre.
+                if batch_chunks >= self._embed_batch or embed_q.empty():
+                    _flush()
+            _flush()
+        finally:
+            write_q.put(_END)
+
     # ------------------------------------------------------------------
     # API publique
     # ------------------------------------------------------------------
@@ -415,7 +771,9 @@ class FolderIndexer:
 
         Returns:
             {"status", "folder", "files_indexed", "files_skipped", "files_removed",
-             "chunks", "total_files"} ; "status" = "success" | "error" | "unavailable".
+             "files_failed", "chunks", "total_files"} ;
+            "status" = "success" | "error" | "unavailable". Un fichier dont les
+            embeddings echouent compte dans "files_failed" et sera retente.
         """
         if not self.is_available():
             return {"status": "unavailable", "folder": folder_path,
@@ -443,46 +801,110 @@ class FolderIndexer:
             new_files: Dict[str, Any] = {}
             indexed = skipped = chunks = 0
 
-            for done, fpath in enumerate(files, 1):
-                rel = fpath.relative_to(root).as_posix()
-                if progress_cb:
-                    try:
-                        progress_cb(done, total, rel)
-                    except Exception:
-                        pass
-
-                sig = self._file_signature(fpath)
-                if sig is None:
-                    continue
-                prev = old_files.get(rel)
-
-                # Chemin rapide : mtime + taille inchanges -> on garde tel quel.
-                if (not force and prev
-                        and prev.get("mtime") == sig["mtime"]
-                        and prev.get("size") == sig["size"]):
-                    new_files[rel] = prev
-                    skipped += 1
-                    continue
+            # Pipeline : producteur (hash) -> extraction -> embeddings -> ecrivain.
+            # L'ecrivain est le thread appelant : progress_cb reste appele depuis
+            # ce thread, et ChromaDB + manifeste n'ont qu'un seul ecrivain.
+            extract_q: "queue.Queue" = queue.Queue(maxsize=self._queue_size)
+            embed_q: "queue.Queue" = queue.Queue(maxsize=self._queue_size)
+            write_q: "queue.Queue" = queue.Queue(maxsize=self._queue_size)
+            stop = threading.Event()
+            stages = [
+                threading.Thread(target=self._produce, name="folder-index-walk",
+                                 args=(root, files, old_files, force, extract_q, stop),
+                                 daemon=True),
+                threading.Thread(target=self._extract, name="folder-index-pool",
+                                 args=(extract_q, embed_q, stop), daemon=True),
+                threading.Thread(target=self._embed, name="folder-index-embed",
+                                 args=(embed_q, write_q, stop), daemon=True),
+            ]
+            for stage in stages:
+                stage.start()
+
+            done = failed_count = 0
+            partial: Dict[str, int] = {}  # chunks deja ecrits des fichiers en cours
+            failed: set = set()  # fichiers dont un lot d'embeddings a echoue
+            try:
+                while True:
+                    item = write_q.get()
+                    if item is _END:
+                        break
+                    kind, rel, info = item
+                    if kind == "part":
+                        # Partie d'un fichier decoupe en flux (la fin suit). Apres
+                        # un echec, les parties suivantes ne sont plus ecrites :
+                        # elles s'ajouteraient aux chunks de l'ancienne version.
+                        if info.get("failed"):
+                            failed.add(rel)
+                        elif rel not in failed and info.get("chunks_text"):
+                            written = self._write_file_chunks(
+                                workspace_id, folder_key, rel, info["chunks_text"],
+                                info["embeddings"], first_index=info["first_chunk"])
+                            partial[rel] = partial.get(rel, 0) + written
+                            if written < len(info["chunks_text"]):
+                                failed.add(rel)
+                        continue
+                    done += 1
+                    if progress_cb:
+                        try:
+                            progress_cb(done, total, rel)
+                        except Exception:
+                            pass
+
+                    if kind == "gone":
+                        continue
+                    if kind == "skip":
+                        new_files[rel] = info
+                        skipped += 1
+                        continue
 
-                # mtime/taille different : verifier le hash (evite un re-embedding
-                # si le contenu est identique, ex. apres un git checkout).
-                file_hash = self._file_hash(fpath)
-                if (not force and prev and prev.get("hash")
-                        and prev.get("hash") == file_hash):
-                    new_files[rel] = {**sig, "hash": file_hash,
-                                      "chunks": prev.get("chunks", 0)}
-                    skipped += 1
-                    continue
+                    if info.get("failed") or rel in failed:
+                        # Ne pas enregistrer le nouveau hash : garder l'entree
+                        # precedente si ses chunks sont intacts, sinon purger ce
+                        # qui a ete ecrit et laisser le fichier etre retente.
+                        # (Une ecriture tentee a deja purge les anciens chunks.)
+                        failed.add(rel)
+                        failed_count += 1
+                        if partial.pop(rel, None) is not None:
+                            self._delete_file_entries(workspace_id, folder_key, rel)
+                        elif rel in old_files:
+                            new_files[rel] = old_files[rel]
+                        continue
 
-                n = self._index_file(workspace_id, folder_key, root, fpath)
-                new_files[rel] = {**sig, "hash": file_hash, "chunks": n}
-                indexed += 1
-                chunks += n
+                    chunk_texts = info.get("chunks_text") or []
+                    n = partial.pop(rel, 0)
+                    if chunk_texts:
+                        written = self._write_file_chunks(
+                            workspace_id, folder_key, rel, chunk_texts, info["embeddings"],
+                            first_index=info.get("first_chunk", 0))
+                        if written < len(chunk_texts):
+                            # Ecriture echouee : meme regle qu'un echec d'embeddings
+                            failed.add(rel)
+                            failed_count += 1
+                            self._delete_file_entries(workspace_id, folder_key, rel)
+                            continue
+                        n += written
+                    new_files[rel] = {"mtime": info["mtime"], "size": info["size"],
+                                      "hash": info["hash"], "chunks": n}
+                    indexed += 1
+                    chunks += n
+            finally:
+                # En cas d'erreur cote ecrivain : arreter les etages et vider les
+                # files pour qu'aucun thread ne reste bloque sur un put().
+                stop.set()
+                while any(stage.is_alive() for stage in stages):
+                    for q in (extract_q, embed_q, write_q):
+                        try:
+                            while True:
+                                q.get_nowait()
+                        except queue.Empty:
+                            pass
+                    for stage in stages:
+                        stage.join(timeout=0.05)
 
             # Fichiers disparus depuis le dernier index -> purge de leurs chunks.
             removed = 0
             for rel in list(old_files.keys()):
-                if rel not in new_files:
+                if rel not in new_files and rel not in failed:
                     self._delete_file_entries(workspace_id, folder_key, rel)
                     removed += 1
 
@@ -494,15 +916,19 @@ class FolderIndexer:
             self._save_manifest(workspace_id, manifest)
 
         logger.info(
-            "Index dossier '%s' (ws=%s): %d indexes, %d inchanges, %d retires, %d chunks",
-            folder_key, workspace_id, indexed, skipped, removed, chunks,
+            "Index dossier '%s' (ws=%s): %d indexes, %d inchanges, %d retires, "
+            "%d en echec, %d chunks",
+            folder_key, workspace_id, indexed, skipped, removed, failed_count, chunks,
         )
+        if self._watcher is not None and self._watcher.watched(workspace_id):
+            self._watcher.watch(workspace_id, folder_key)
         return {
             "status": "success",
             "folder": folder_key,
             "files_indexed": indexed,
             "files_skipped": skipped,
             "files_removed": removed,
+            "files_failed": failed_count,
             "chunks": chunks,
             "total_files": len(new_files),
         }
@@ -518,7 +944,8 @@ class FolderIndexer:
         attache ultérieure du dossier entier reste cohérente (fusion).
 
         Returns:
-            {"status", "folder", "file", "total_files", "chunks"}.
+            {"status", "folder", "file", "total_files", "chunks"} ; en cas
+            d'echec d'indexation, "status" = "error" et "files_failed" = 1.
         """
         if not self.is_available():
             return {"status": "unavailable", "file": str(file_path), "chunks": 0}
@@ -548,14 +975,24 @@ class FolderIndexer:
             else:
                 n = self._index_file(workspace_id, folder_key, p.parent, p)
 
-            files[rel] = {**sig, "hash": file_hash, "chunks": n}
-            manifest[folder_key] = {
-                "files": files,
-                "indexed_at": datetime.now().isoformat(),
-                "file_count": len(files),
-            }
-            self._save_manifest(workspace_id, manifest)
-
+            if n is not None:
+                files[rel] = {**sig, "hash": file_hash, "chunks": n}
+            elif prev is not None and prev.get("hash") == file_hash:
+                # Echec d'une reindexation forcee : oublier le hash pour que le
+                # fichier soit retente (sinon l'entree precedente suffit)
+                files[rel] = {**prev, "hash": ""}
+            if n is not None or prev is not None:
+                manifest[folder_key] = {
+                    "files": files,
+                    "indexed_at": datetime.now().isoformat(),
+                    "file_count": len(files),
+                }
+                self._save_manifest(workspace_id, manifest)
+
+        if n is None:
+            return {"status": "error", "folder": folder_key, "file": rel,
+                    "error": "Indexation echouee", "total_files": len(files),
+                    "chunks": 0, "files_failed": 1}
         logger.info("Index fichier '%s' (ws=%s): %d chunks", p.as_posix(),
                     workspace_id, n)
         return {"status": "success", "folder": folder_key, "file": rel,
@@ -592,7 +1029,7 @@ class FolderIndexer:
 
         folders = self.list_folders(workspace_id)
         agg = {"status": "success", "folders": 0, "files_indexed": 0,
-               "files_removed": 0, "chunks": 0, "total_files": 0}
+               "files_removed": 0, "files_failed": 0, "chunks": 0, "total_files": 0}
         for folder in folders:
             r = self.index_folder(workspace_id, folder, force=force,
                                   progress_cb=progress_cb)
@@ -600,10 +1037,173 @@ class FolderIndexer:
                 agg["folders"] += 1
                 agg["files_indexed"] += r.get("files_indexed", 0)
                 agg["files_removed"] += r.get("files_removed", 0)
+                agg["files_failed"] += r.get("files_failed", 0)
                 agg["chunks"] += r.get("chunks", 0)
                 agg["total_files"] += r.get("total_files", 0)
         return agg
 
+    def apply_changes(
+        self, workspace_id: str, folder_path: str, rel_paths: List[str],
+    ) -> Dict[str, Any]:
+        """Met a jour l'index pour une liste de chemins modifies d'un dossier attache.
+
+        Mise a jour O(chemins changes), sans parcourir l'arbre : chaque chemin
+        est examine dans son etat ACTUEL sur le disque (plusieurs evenements sur
+        un meme fichier n'en font qu'un). Fichier present et indexable -> reindexe
+        si son hash a change ; absent ou devenu exclu -> ses chunks sont purges.
+        Un chemin de dossier (cree, deplace, supprime) couvre tout son contenu.
+        Utilise par core.folder_watcher.FolderWatcher.
+
+        Args:
+            workspace_id: workspace cible.
+            folder_path: cle du dossier attache (telle que renvoyee par list_folders).
+            rel_paths: chemins relatifs (POSIX) au dossier attache.
+
+        Returns:
+            {"status", "folder", "files_indexed", "files_removed", "files_skipped",
+             "files_failed", "chunks"} ; "status" = "success" | "unavailable" |
+            "error". Un fichier dont l'indexation echoue compte dans
+            "files_failed" et sera retente au prochain evenement.
+        """
+        res = {"status": "success", "folder": folder_path, "files_indexed": 0,
+               "files_removed": 0, "files_skipped": 0, "files_failed": 0, "chunks": 0}
+        if not self.is_available():
+            return {**res, "status": "unavailable"}
+        root = Path(folder_path)
+        if not root.is_dir():
+            return {**res, "status": "error", "error": "Dossier introuvable"}
+
+        with self._lock:
+            manifest = self._load_manifest(workspace_id)
+            entry = manifest.get(folder_path)
+            if not isinstance(entry, dict):
+                return {**res, "status": "error", "error": "Dossier non attache"}
+            files: Dict[str, Any] = entry.get("files", {})
+            spec = self._build_ignore(root)
+
+            # Etendre les chemins de dossier a leurs fichiers (presents ou indexes).
+            # Les chemins indexes sous un prefixe sont trouves par bisection dans
+            # une liste triee construite au plus une fois, et seulement si un
+            # chemin peut etre un dossier : une rafale de fichiers reste en
+            # O(chemins changes).
+            targets: Dict[str, Optional[Path]] = {}
+            known_sorted: Optional[List[str]] = None
+            for rel in rel_paths:
+                rel = rel.strip("/")
+                if not rel:
+                    continue
+                fpath = root / rel
+                if fpath.is_dir():
+                    for child in self._iter_files(root, start=fpath):
+                        targets[child.relative_to(root).as_posix()] = child
+                elif rel in files or fpath.exists():
+                    targets[rel] = fpath
+                    continue
+                else:
+                    targets[rel] = fpath  # peut-etre un dossier supprime
+                if known_sorted is None:
+                    known_sorted = sorted(files)
+                prefix = rel + "/"
+                pos = bisect.bisect_left(known_sorted, prefix)
+                while pos < len(known_sorted) and known_sorted[pos].startswith(prefix):
+                    targets.setdefault(known_sorted[pos], root / known_sorted[pos])
+                    pos += 1
+
+            for rel, fpath in sorted(targets.items()):
+                prev = files.get(rel)
+                if not fpath.is_file() or not self._is_indexable(root, fpath, spec):
+                    if prev is not None:
+                        self._delete_file_entries(workspace_id, folder_path, rel)
+                        files.pop(rel, None)
+                        res["files_removed"] += 1
+                    continue
+
+                sig = self._file_signature(fpath)
+                if sig is None:
+                    continue
+                file_hash = self._file_hash(fpath)
+                if prev and prev.get("hash") and prev.get("hash") == file_hash:
+                    files[rel] = {**sig, "hash": file_hash,
+                                  "chunks": prev.get("chunks", 0)}
+                    res["files_skipped"] += 1
+                    continue
+
+                n = self._index_file(workspace_id, folder_path, root, fpath)
+                if n is None:
+                    # Comme index_folder : pas de nouveau hash, l'entree
+                    # precedente (ancien hash) fait retenter le fichier
+                    res["files_failed"] += 1
+                    continue
+                files[rel] = {**sig, "hash": file_hash, "chunks": n}
+                res["files_indexed"] += 1
+                res["chunks"] += n
+
+            if res["files_indexed"] or res["files_removed"] or res["files_skipped"]:
+                manifest[folder_path] = {
+                    **entry,
+                    "files": files,
+                    "indexed_at": datetime.now().isoformat(),
+                    "file_count": len(files),
+                }
+                self._save_manifest(workspace_id, manifest)
+        return res
+
+    # ------------------------------------------------------------------
+    # Surveillance en direct (optionnelle)
+    # ------------------------------------------------------------------
+
+    def start_watching(self, workspace_id: str) -> bool:
+        """Surveille les dossiers attaches au workspace et les garde a jour.
+
+        Les modifications sur disque sont appliquees par apply_changes (debounce
+        + coalescence) au lieu d'un reindex complet. Idempotent.
+
+        Returns:
+            True si au moins un dossier du workspace est surveille.
+        """
+        if not self.is_available():
+            return False
+        if self._watcher is None:
+            try:
+                from core.folder_watcher import FolderWatcher
+            except Exception as exc:
+                logger.warning("Surveillance des dossiers indisponible: %s", exc)
+                return False
+            self._watcher = FolderWatcher(self, debounce_seconds=self._watch_debounce)
+        for folder in self.list_folders(workspace_id):
+            self._watcher.watch(workspace_id, folder)
+        if not self._watcher.running:
+            self._watcher.start()
+        return bool(self._watcher.watched(workspace_id))
+
+    def ensure_watching(self, workspace_id: str) -> bool:
+        """start_watching si la surveillance est activee (folder_indexer.watch).
+
+        Seul le workspace actif reste surveille : les dossiers des workspaces
+        precedents sont retires, pour que les surveillances ne s'accumulent pas
+        au fil des changements de workspace.
+        """
+        if not self._watch_enabled:
+            return False
+        if self._watcher is not None:
+            for other in self._watcher.watched_workspaces() - {workspace_id}:
+                self._watcher.unwatch(other)
+        if self._watcher is not None and self._watcher.running:
+            known = set(self._watcher.watched(workspace_id))
+            if known and known == set(self.list_folders(workspace_id)):
+                return True
+        return self.start_watching(workspace_id)
+
+    def stop_watching(self, workspace_id: Optional[str] = None) -> None:
+        """Arrete la surveillance d'un workspace, ou toute la surveillance (None)."""
+        if self._watcher is None:
+            return
+        if workspace_id is None:
+            self._watcher.stop()
+            self._watcher = None
+            return
+        self._watcher.unwatch(workspace_id)
+
     def remove_folder(self, workspace_id: str, folder_path: str) -> bool:
         """Detache un dossier : purge ses chunks et l'efface du manifeste."""
         root = Path(folder_path).expanduser()
@@ -619,12 +1219,19 @@ class FolderIndexer:
                 folder_path if folder_path in manifest else folder_key
             )
             self._delete_folder_entries(workspace_id, key)
+            if self._watcher is not None:
+                self._watcher.unwatch(workspace_id, key)
             existed = key in manifest
             manifest.pop(key, None)
             self._save_manifest(workspace_id, manifest)
         logger.info("Dossier detache '%s' (ws=%s)", folder_key, workspace_id)
         return existed
 
+    def file_signatures(self, workspace_id: str, folder_path: str) -> Dict[str, Any]:
+        """Signatures indexees {chemin relatif: {"mtime", "size", ...}} d'un dossier."""
+        entry = self._load_manifest(workspace_id).get(folder_path)
+        return dict(entry.get("files", {})) if isinstance(entry, dict) else {}
+
     def list_folders(self, workspace_id: str) -> List[str]:
         """Liste les chemins des dossiers attaches au workspace."""
         return list(self._load_manifest(workspace_id).keys())
@@ -0,0 +1,373 @@
+"""
+Surveillance en direct des dossiers attaches a un workspace (@codebase).
+
+Complement de core.folder_indexer : au lieu de re-parcourir tout l'arbre a
+chaque reindex (O(taille de l'arbre)), on s'abonne aux evenements du systeme de
+fichiers et on ne retraite QUE les fichiers modifies (O(fichiers changes)).
+
+Principes :
+  - watchdog (inotify / FSEvents / ReadDirectoryChangesW) si disponible, sinon
+    repli sur un scrutateur par polling (stat des fichiers, sans hash ni
+    extraction). Aucune dependance dure.
+  - Debounce : les rafales (git checkout, formatage de tout un projet, build)
+    sont accumulees jusqu'a un silence de `debounce_seconds` (plafonne par
+    `max_delay_seconds`) puis traitees en un seul passage.
+  - Coalescence : plusieurs evenements sur le meme fichier ne donnent qu'une
+    seule mise a jour ; la decision (indexer / purger) se prend a l'etat
+    final du disque, via FolderIndexer.apply_changes.
+  - Les dossiers exclus (node_modules/, .git/, ...) et le repertoire des
+    workspaces (manifestes ecrits par l'indexeur lui-meme) sont ignores des
+    la reception de l'evenement, ce qui evite toute boucle d'auto-declenchement.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from core.folder_indexer import _DEFAULT_EXCLUDE_DIRS
+
+try:
+    from utils.logger import setup_logger
+    logger = setup_logger("folder_watcher")
+except Exception:  # pragma: no cover - logger optionnel
+    import logging
+    logger = logging.getLogger("folder_watcher")
+
+try:
+    from watchdog.events import FileSystemEventHandler  # type: ignore
+    from watchdog.observers import Observer  # type: ignore
+    WATCHDOG_AVAILABLE = True
+except Exception:
+    WATCHDOG_AVAILABLE = False
+    FileSystemEventHandler = object  # type: ignore[assignment,misc]
+
+
+class _WatchdogHandler(FileSystemEventHandler):  # type: ignore[misc,valid-type]
+    """Relaie les evenements watchdog vers FolderWatcher.notify."""
+
+    def __init__(self, watcher: "FolderWatcher"):
+        super().__init__()
+        self._watcher = watcher
+
+    def on_any_event(self, event):  # noqa: D401 - API watchdog
+        event_type = getattr(event, "event_type", "")
+        if event_type in ("opened", "closed_no_write"):
+            return
+        # « modified » sur un dossier = un enfant a change, deja notifie pour
+        # lui-meme : le relayer forcerait a re-hasher tout le dossier.
+        if getattr(event, "is_directory", False) and event_type == "modified":
+            return
+        self._watcher.notify(event.src_path)
+        dest = getattr(event, "dest_path", None)
+        if dest:
+            self._watcher.notify(dest)
+
+
+class FolderWatcher:
+    """Surveille les dossiers attaches et met l'index a jour de facon incrementale."""
+
+    def __init__(
+        self,
+        indexer: Any,
+        debounce_seconds: float = 1.5,
+        max_delay_seconds: float = 10.0,
+        poll_interval: float = 2.0,
+        use_watchdog: Optional[bool] = None,
+    ) -> None:
+        """
+        Args:
+            indexer: instance de core.folder_indexer.FolderIndexer.
+            debounce_seconds: silence requis avant de traiter une rafale.
+            max_delay_seconds: delai maximal avant traitement, meme si les
+                evenements continuent d'arriver (flux continu).
+            poll_interval: periode du scrutateur de repli (secondes).
+            use_watchdog: force (True/False) ou auto-detecte (None) watchdog.
+        """
+        self.indexer = indexer
+        self.debounce_seconds = max(0.0, float(debounce_seconds))
+        self.max_delay_seconds = max(self.debounce_seconds, float(max_delay_seconds))
+        self.poll_interval = max(0.2, float(poll_interval))
+        self.backend = "watchdog" if (
+            WATCHDOG_AVAILABLE if use_watchdog is None else (use_watchdog and WATCHDOG_AVAILABLE)
+        ) else "polling"
+
+        # (workspace_id, folder_key) -> racine resolue
+        self._roots: Dict[Tuple[str, str], Path] = {}
+        self._watches: Dict[Tuple[str, str], Any] = {}  # handles watchdog
+        self._snapshots: Dict[Tuple[str, str], Dict[str, Tuple[int, int]]] = {}
+
+        self._cond = threading.Condition()
+        self._pending: Set[str] = set()
+        self._first_event = 0.0
+        self._last_event = 0.0
+        self._stop = threading.Event()
+        self._observer = None
+        self._worker: Optional[threading.Thread] = None
+        self._poller: Optional[threading.Thread] = None
+
+        try:
+            self._ignored_root = Path(indexer._workspaces_dir).resolve()  # pylint: disable=protected-access
+        except (OSError, AttributeError):
+            self._ignored_root = None
+
+        self.stats = {"events": 0, "flushes": 0, "files_indexed": 0,
+                      "files_removed": 0, "files_skipped": 0, "files_failed": 0}
+
+    # ------------------------------------------------------------------
+    # Cycle de vie
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Demarre le thread de traitement (et l'observateur / le scrutateur)."""
+        if self._worker is not None:
+            return
+        self._stop.clear()
+        if self.backend == "watchdog":
+            self._observer = Observer()
+            self._observer.daemon = True
+            self._observer.start()
+            for key, root in list(self._roots.items()):
+                self._schedule(key, root)
+        else:
+            self._poller = threading.Thread(target=self._poll_loop,
+                                            name="folder-watch-poll", daemon=True)
+            self._poller.start()
+        self._worker = threading.Thread(target=self._run, name="folder-watch",
+                                        daemon=True)
+        self._worker.start()
+        logger.info("Surveillance des dossiers demarree (%s)", self.backend)
+
+    def stop(self) -> None:
+        """Arrete la surveillance (les evenements en attente sont abandonnes)."""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._observer is not None:
+            try:
+                self._observer.stop()
+                self._observer.join(timeout=2)
+            except Exception:
+                pass
+            self._observer = None
+        for thread in (self._worker, self._poller):
+            if thread is not None:
+                thread.join(timeout=2)
+        self._worker = self._poller = None
+        self._watches.clear()
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._stop.is_set()
+
+    # ------------------------------------------------------------------
+    # Dossiers surveilles
+    # ------------------------------------------------------------------
+
+    def watch(self, workspace_id: str, folder_key: str) -> bool:
+        """Ajoute un dossier attache a la surveillance. False si introuvable."""
+        key = (workspace_id, folder_key)
+        if key in self._roots:
+            return True
+        root = Path(folder_key)
+        if not root.is_dir():
+            return False
+        self._roots[key] = root
+        # Polling : pas de parcours ici (appele depuis le chemin du chat) ; le
+        # scrutateur fait le premier instantane dans son propre thread.
+        if self.backend == "watchdog" and self._observer is not None:
+            self._schedule(key, root)
+        return True
+
+    def unwatch(self, workspace_id: str, folder_key: Optional[str] = None) -> None:
+        """Retire un dossier (ou tous ceux d'un workspace si folder_key est None)."""
+        for key in list(self._roots):
+            if key[0] != workspace_id or (folder_key is not None and key[1] != folder_key):
+                continue
+            self._roots.pop(key, None)
+            self._snapshots.pop(key, None)
+            handle = self._watches.pop(key, None)
+            if handle is not None and self._observer is not None:
+                try:
+                    self._observer.unschedule(handle)
+                except Exception:
+                    pass
+
+    def watched(self, workspace_id: Optional[str] = None) -> List[str]:
+        """Dossiers surveilles (optionnellement limites a un workspace)."""
+        return [folder for ws, folder in list(self._roots)
+                if workspace_id is None or ws == workspace_id]
+
+    def watched_workspaces(self) -> Set[str]:
+        """Workspaces ayant au moins un dossier surveille."""
+        return {ws for ws, _ in list(self._roots)}
+
+    def _schedule(self, key: Tuple[str, str], root: Path) -> None:
+        try:
+            self._watches[key] = self._observer.schedule(
+                _WatchdogHandler(self), str(root), recursive=True)
+        except Exception as exc:
+            logger.warning("Surveillance impossible de '%s': %s", root, exc)
+
+    # ------------------------------------------------------------------
+    # Reception et debounce des evenements
+    # ------------------------------------------------------------------
+
+    def _is_noise(self, path: Path) -> bool:
+        """Evenements a ignorer sans meme les mettre en attente.
+
+        Les dossiers exclus ne sont cherches que dans la partie du chemin
+        RELATIVE a la racine surveillee : un dossier attache sous /srv/build/
+        ou ~/out/ ne doit pas perdre tous ses evenements.
+        """
+        if self._ignored_root is not None:
+            try:
+                path.relative_to(self._ignored_root)
+                return True
+            except ValueError:
+                pass
+        for root in list(self._roots.values()):
+            try:
+                rel_parts = path.relative_to(root).parts
+            except ValueError:
+                continue
+            if not any(part in _DEFAULT_EXCLUDE_DIRS for part in rel_parts):
+                return False
+        return True
+
+    def notify(self, path: str) -> None:
+        """Signale qu'un chemin a change (appele par le backend, ou a la main)."""
+        p = Path(path)
+        if self._is_noise(p):
+            return
+        now = time.monotonic()
+        with self._cond:
+            if not self._pending:
+                self._first_event = now
+            self._pending.add(p.as_posix())
+            self._last_event = now
+            self.stats["events"] += 1
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            with self._cond:
+                while not self._pending and not self._stop.is_set():
+                    self._cond.wait()
+                if self._stop.is_set():
+                    return
+                now = time.monotonic()
+                quiet_at = self._last_event + self.debounce_seconds
+                deadline = self._first_event + self.max_delay_seconds
+                due = min(quiet_at, deadline)
+                if now < due:
+                    self._cond.wait(timeout=due - now)
+                    continue
+            self.flush()
+
+    def flush(self) -> Dict[str, int]:
+        """Traite immediatement les chemins en attente. Retourne les compteurs."""
+        with self._cond:
+            paths, self._pending = self._pending, set()
+        totals = {"files_indexed": 0, "files_removed": 0, "files_skipped": 0,
+                  "files_failed": 0}
+        if not paths:
+            return totals
+
+        # Regrouper par dossier attache (un chemin appartient au dossier le plus
+        # profond qui le contient, pour chaque workspace qui le surveille).
+        groups: Dict[Tuple[str, str], Set[str]] = {}
+        for raw in paths:
+            p = Path(raw)
+            best: Dict[str, Tuple[int, Tuple[str, str], str]] = {}
+            for key, root in list(self._roots.items()):
+                try:
+                    rel = p.relative_to(root).as_posix()
+                except ValueError:
+                    continue
+                if rel == ".":
+                    continue
+                depth = len(root.parts)
+                if key[0] not in best or depth > best[key[0]][0]:
+                    best[key[0]] = (depth, key, rel)
+            for _, key, rel in best.values():
+                groups.setdefault(key, set()).add(rel)
+
+        for (workspace_id, folder_key), rels in groups.items():
+            try:
+                res = self.indexer.apply_changes(workspace_id, folder_key, sorted(rels))
+            except Exception as exc:
+                logger.warning("Mise a jour incrementale echouee (%s): %s",
+                               folder_key, exc)
+                continue
+            for name in totals:
+                totals[name] += int(res.get(name, 0))
+
+        self.stats["flushes"] += 1
+        for name, value in totals.items():
+            self.stats[name] += value
+        if totals["files_indexed"] or totals["files_removed"]:
+            logger.info("Surveillance : %d fichier(s) reindexe(s), %d retire(s)",
+                        totals["files_indexed"], totals["files_removed"])
+        if totals["files_failed"]:
+            logger.warning("Surveillance : %d fichier(s) non reindexe(s) (echec)",
+                           totals["files_failed"])
+        return totals
+
+    # ------------------------------------------------------------------
+    # Repli par polling (sans watchdog)
+    # ------------------------------------------------------------------
+
+    def _scan(self, root: Path) -> Dict[str, Tuple[int, int]]:
+        """Instantane (mtime_ns, taille) des fichiers du dossier, exclusions appliquees."""
+        snapshot: Dict[str, Tuple[int, int]] = {}
+        try:
+            files = self.indexer._iter_files(root)  # pylint: disable=protected-access
+        except Exception:
+            return snapshot
+        for fpath in files:
+            try:
+                st = fpath.stat()
+            except OSError:
+                continue
+            snapshot[fpath.as_posix()] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def _poll_loop(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            for key, root in list(self._roots.items()):
+                before = self._snapshots.get(key)
+                after = self._scan(root)
+                if key not in self._roots:
+                    continue
+                self._snapshots[key] = after
+                if before is None:
+                    # Premier passage : comparer au manifeste de l'indexeur
+                    # (signatures a la seconde) -> rien n'est perdu entre
+                    # l'indexation et ce premier instantane.
+                    before = self._indexed_snapshot(key)
+                    after = {path: (mtime_ns // 1_000_000_000, size)
+                             for path, (mtime_ns, size) in after.items()}
+                for path in set(before) | set(after):
+                    if before.get(path) != after.get(path):
+                        self.notify(path)
+
+    def _indexed_snapshot(self, key: Tuple[str, str]) -> Dict[str, Tuple[int, int]]:
+        """Signatures (mtime en secondes, taille) connues du manifeste d'un dossier."""
+        try:
+            files = self.indexer.file_signatures(*key)
+        except Exception:
+            return {}
+        root = Path(key[1])
+        return {(root / rel).as_posix(): (int(sig.get("mtime", 0)), int(sig.get("size", 0)))
+                for rel, sig in files.items()}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Compteurs de la surveillance (evenements, flushs, fichiers traites)."""
+        with self._cond:
+            pending = len(self._pending)
+        return {**self.stats, "backend": self.backend, "pending": pending,
+                "folders": len(self._roots), "running": self.running}
+
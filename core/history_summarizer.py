@@ -0,0 +1,268 @@
+"""
+Résumé glissant de l'historique de conversation, calculé en arrière-plan.
+
+LocalLLM résumait ses anciens messages dans add_to_history (appel Ollama
+bloquant, jusqu'à 60 s, à la fin d'une réponse streamée) et ChatOrchestrator
+faisait de même au début d'un tour. Désormais :
+
+  - HistorySummarizer prépare le résumé suivant dans un thread de fond dès que
+    l'historique atteint ~80 % de son budget
+    (llm.local.context_budget.prefetch_ratio) ;
+  - LocalLLM substitue le résultat d'un bloc avant la requête suivante,
+    seulement si les messages résumés sont toujours en tête de l'historique ;
+  - SummaryCache conserve les résumés par workspace, indexés par l'empreinte
+    chaînée des messages bruts couverts : une conversation rechargée (rejouée
+    dans l'historique) retrouve ses résumés sans nouvel appel Ollama.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from core.admission import run_in_context
+from utils.logger import setup_logger
+
+logger = setup_logger("history_summarizer")
+
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS summaries (
+    workspace  TEXT    NOT NULL,
+    chain      TEXT    NOT NULL,
+    covered    INTEGER NOT NULL,
+    summary    TEXT    NOT NULL,
+    last_used  REAL    NOT NULL,
+    PRIMARY KEY (workspace, chain)
+);
+
+CREATE INDEX IF NOT EXISTS idx_summaries_last_used ON summaries(last_used);
+"""
+
+_SQL_BATCH = 500
+# Au-delà, un nouveau résumé remplace le précédent au lieu de s'y ajouter
+_MAX_COMBINED_CHARS = 2000
+
+
+def chain_hashes(previous: str, messages: Sequence[Dict[str, Any]]) -> List[str]:
+    """Empreintes chaînées de chaque préfixe de messages, à partir de previous.
+
+    L'empreinte d'un préfixe ne dépend que du contenu brut des messages qu'il
+    couvre : elle est identique après un rechargement de la conversation.
+    """
+    hashes = []
+    current = previous
+    for message in messages:
+        payload = f"{current}\x1f{message.get('role', '')}\x1f{message.get('content', '')}"
+        current = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        hashes.append(current)
+    return hashes
+
+
+def merge_summaries(previous: str, new: str) -> str:
+    """Ajoute un résumé au précédent, sauf si l'ensemble devient trop long."""
+    if not previous:
+        return new
+    combined = f"{previous}\n{new}"
+    return new if len(combined) > _MAX_COMBINED_CHARS else combined
+
+
+class SummaryCache:
+    """Résumés d'historique persistants (SQLite), par workspace, avec éviction LRU."""
+
+    def __init__(self, db_path: str = "data/summary_cache.db", max_entries: int = 5000) -> None:
+        self._db_path = Path(db_path)
+        self._max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connexion de l'instance (ouverte au premier accès). Appeler sous self._lock."""
+        if self._conn is None:
+            self._db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self._db_path), timeout=30,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA_SQL)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        """Ferme la connexion SQLite (rouverte au prochain accès)."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def lookup_longest(self, workspace: str, chains: List[str]) -> Optional[Tuple[int, str]]:
+        """(index, résumé) du plus long préfixe déjà résumé parmi chains, ou None."""
+        found: Dict[str, str] = {}
+        with self._lock, self._connect() as conn:
+            for start in range(0, len(chains), _SQL_BATCH):
+                part = chains[start:start + _SQL_BATCH]
+                marks = ",".join("?" * len(part))
+                rows = conn.execute(
+                    f"SELECT chain, summary FROM summaries "
+                    f"WHERE workspace = ? AND chain IN ({marks})",
+                    [workspace, *part],
+                ).fetchall()
+                found.update(rows)
+            best = max((i for i, c in enumerate(chains) if c in found), default=None)
+            if best is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            conn.execute(
+                "UPDATE summaries SET last_used = ? WHERE workspace = ? AND chain = ?",
+                (time.time(), workspace, chains[best]),
+            )
+        return best, found[chains[best]]
+
+    def put(self, workspace: str, chain: str, covered: int, summary: str) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO summaries (workspace, chain, covered, summary, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (workspace, chain, int(covered), summary, time.time()),
+            )
+            excess = conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0] - self._max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM summaries WHERE rowid IN ("
+                    "SELECT rowid FROM summaries ORDER BY last_used ASC LIMIT ?)",
+                    (excess,),
+                )
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock, self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        return {"entries": entries, "hits": self._hits, "misses": self._misses}
+
+
+_CACHES: Dict[str, SummaryCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_summary_cache(db_path: str) -> SummaryCache:
+    """Retourne le cache partagé associé à db_path (créé à la demande)."""
+    key = str(Path(db_path).resolve())
+    with _CACHES_LOCK:
+        cache = _CACHES.get(key)
+        if cache is None:
+            cache = SummaryCache(db_path)
+            _CACHES[key] = cache
+        return cache
+
+
+class HistorySummarizer:
+    """
+    Calcule un résumé à la fois, dans un thread dédié.
+
+    summarize_fn(messages) → texte du résumé (None si échec) : appel Ollama
+    fourni par le propriétaire (LocalLLM). Le résultat d'un job est un dict
+    {"covered", "chain", "summary", "cached"} où covered est la liste des
+    messages (objets de l'historique) que le résumé remplace.
+    """
+
+    def __init__(
+        self,
+        summarize_fn: Callable[[List[Dict[str, Any]]], Optional[str]],
+        cache: Optional[SummaryCache] = None,
+    ) -> None:
+        self._summarize = summarize_fn
+        self._cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-summary")
+        self._lock = threading.Lock()
+        self._future: Optional[Future] = None
+
+    @property
+    def pending(self) -> bool:
+        with self._lock:
+            return self._future is not None
+
+    def schedule(
+        self,
+        workspace: str,
+        covered: List[Dict[str, Any]],
+        previous_chain: str = "",
+        previous_summary: str = "",
+    ) -> bool:
+        """Lance le résumé de covered (messages bruts qui suivent le résumé
+        précédent). Retourne False si un job est déjà en cours."""
+        if not covered:
+            return False
+        with self._lock:
+            if self._future is not None:
+                return False
+            # Même classe d'admission que la conversation qui l'a demandé
+            self._future = self._executor.submit(
+                run_in_context(self._run), workspace, list(covered), previous_chain, previous_summary
+            )
+        return True
+
+    def _run(
+        self,
+        workspace: str,
+        covered: List[Dict[str, Any]],
+        previous_chain: str,
+        previous_summary: str,
+    ) -> Optional[Dict[str, Any]]:
+        chains = chain_hashes(previous_chain, covered)
+        start, summary = 0, previous_summary
+        if self._cache is not None:
+            try:
+                hit = self._cache.lookup_longest(workspace, chains)
+            except sqlite3.Error as exc:
+                logger.warning("Cache de résumés illisible : %s", exc)
+                hit = None
+            if hit is not None:
+                start, summary = hit[0] + 1, hit[1]
+        cached = start == len(covered)
+        if not cached:
+            new_text = self._summarize(covered[start:])
+            if not new_text:
+                return None
+            summary = merge_summaries(summary, new_text)
+            if self._cache is not None:
+                try:
+                    self._cache.put(workspace, chains[-1], len(covered), summary)
+                except sqlite3.Error as exc:
+                    logger.warning("Cache de résumés non écrit : %s", exc)
+        return {"covered": covered, "chain": chains[-1], "summary": summary, "cached": cached}
+
+    def take_result(self, timeout: Optional[float] = 0) -> Optional[Dict[str, Any]]:
+        """Résultat du job terminé (None s'il tourne encore ou a échoué).
+
+        Non bloquant par défaut ; timeout=None attend la fin du job.
+        """
+        with self._lock:
+            future = self._future
+        if future is None:
+            return None
+        if timeout == 0 and not future.done():
+            return None
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeout:
+            return None
+        except Exception as exc:
+            logger.warning("Résumé d'historique en échec : %s", exc)
+            result = None
+        with self._lock:
+            if self._future is future:
+                self._future = None
+        return result
+
+    def discard(self) -> None:
+        """Oublie le job en cours (historique effacé) ; son résultat est ignoré."""
+        with self._lock:
+            self._future = None
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
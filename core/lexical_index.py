@@ -0,0 +1,280 @@
+"""
+Index inverse persistant (SQLite FTS5) pour la recherche par mots exacts.
+
+Tenu a jour EN MEME TEMPS que la collection ChromaDB correspondante : une
+recherche par mots devient une consultation d'index, dont le cout ne depend
+plus du nombre total d'entrees (plus de `collection.get()` de tout le corpus).
+
+Tokenizer "trigram" : une requete "pip" trouve aussi "pipeline", comme le test
+de sous-chaine qu'il remplace ; insensible a la casse, toutes langues. Les mots
+de moins de 3 caracteres ne sont pas indexables en trigrammes : ils sont
+verifies sur les candidats, ou recherches par balayage SQLite s'ils sont seuls.
+
+Le meme index sert d'index creux (BM25, fonction bm25() de FTS5) pour la
+recherche hybride de VectorMemory, avec un tokenizer par mots ("unicode61").
+Avec substring=True, une seconde table FTS5 trigramme est tenue sur le MEME
+contenu : une seule base sert alors a la fois le classement BM25 et la
+recherche par sous-chaines (cas des conversations).
+
+Si SQLite n'a pas FTS5 / trigram (SQLite < 3.34), le constructeur leve
+sqlite3.OperationalError : l'appelant garde alors son chemin de repli.
+"""
+
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS docs (
+    rowid     INTEGER PRIMARY KEY,
+    id        TEXT    NOT NULL UNIQUE,
+    group_id  TEXT    NOT NULL DEFAULT '',
+    doc       TEXT    NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_docs_group ON docs(group_id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(
+    doc, content='docs', content_rowid='rowid', tokenize='{tokenizer}'
+);
+
+CREATE TRIGGER IF NOT EXISTS docs_ai AFTER INSERT ON docs BEGIN
+    INSERT INTO docs_fts(rowid, doc) VALUES (new.rowid, new.doc);
+END;
+
+CREATE TRIGGER IF NOT EXISTS docs_ad AFTER DELETE ON docs BEGIN
+    INSERT INTO docs_fts(docs_fts, rowid, doc) VALUES ('delete', old.rowid, old.doc);
+END;
+
+CREATE TABLE IF NOT EXISTS info (
+    key    TEXT PRIMARY KEY,
+    value  TEXT NOT NULL
+);
+"""
+
+# Table trigramme complementaire (substring=True) sur le contenu de `docs`.
+_SUBSTRING_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS docs_sub USING fts5(
+    doc, content='docs', content_rowid='rowid', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS docs_sub_ai AFTER INSERT ON docs BEGIN
+    INSERT INTO docs_sub(rowid, doc) VALUES (new.rowid, new.doc);
+END;
+
+CREATE TRIGGER IF NOT EXISTS docs_sub_ad AFTER DELETE ON docs BEGIN
+    INSERT INTO docs_sub(docs_sub, rowid, doc) VALUES ('delete', old.rowid, old.doc);
+END;
+"""
+
+# Longueur minimale d'un terme interrogeable via l'index trigramme.
+_MIN_TRIGRAM = 3
+
+# Tokenizer par mots (BM25) : insensible a la casse et aux accents.
+WORD_TOKENIZER = "unicode61 remove_diacritics 2"
+
+# Mots-outils exclus des requetes BM25 (ils matchent tout le corpus).
+STOPWORDS = {
+    "le", "la", "les", "un", "une", "des", "du", "de", "et", "ou", "en", "au",
+    "aux", "est", "que", "qui", "quoi", "quel", "quelle", "pour", "avec", "dans",
+    "sur", "par", "pas", "ce", "cette", "ces", "il", "elle", "je", "tu", "nous",
+    "vous", "mon", "ma", "mes", "son", "sa", "ses", "the", "a", "an", "and", "or",
+    "of", "to", "in", "on", "for", "with", "is", "are", "what", "who", "how",
+    "this", "that", "it",
+}
+
+_TERM_STRIP = ".,;:!?()[]{}<>\"'`«»“”"
+
+
+def query_terms(*texts: str) -> List[str]:
+    """Termes d'une requete BM25 : mots separes par des blancs, ponctuation
+    de bord retiree, mots-outils ecartes (l'ordre est conserve, sans doublon)."""
+    terms: List[str] = []
+    for text in texts:
+        for raw in (text or "").lower().split():
+            term = raw.strip(_TERM_STRIP)
+            if term and term not in STOPWORDS:
+                terms.append(term)
+    return list(dict.fromkeys(terms))
+
+
+class LexicalIndex:
+    """Index inverse (id -> texte) regroupe par cle (ex. workspace_id)."""
+
+    def __init__(self, db_path: str, tokenizer: str = "trigram",
+                 substring: bool = False) -> None:
+        """
+        Args:
+            db_path: chemin de la base SQLite de l'index.
+            tokenizer: tokenizer FTS5 ("trigram" : sous-chaines ;
+                WORD_TOKENIZER : mots, pour le classement BM25).
+            substring: avec un tokenizer par mots, tient aussi une table
+                trigramme pour search() (sous-chaines).
+        """
+        self._db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._trigram = tokenizer.split()[0] == "trigram"
+        self._substring_table = "docs_fts" if self._trigram else (
+            "docs_sub" if substring else None)
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn: Optional[sqlite3.Connection] = None
+        with self._lock, self._connect() as conn:
+            conn.executescript(_SCHEMA_SQL.format(tokenizer=tokenizer))
+            if self._substring_table == "docs_sub":
+                existed = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'docs_sub'").fetchone()
+                conn.executescript(_SUBSTRING_SQL)
+                if not existed:
+                    # Base creee sans la table trigramme : l'alimenter depuis docs
+                    conn.execute("INSERT INTO docs_sub(docs_sub) VALUES ('rebuild')")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connexion unique de l'index (partagee entre threads sous self._lock)."""
+        if self._conn is None:
+            conn = sqlite3.connect(str(self._db_path), timeout=30,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.create_function("pylower", 1, lambda s: (s or "").lower(),
+                                 deterministic=True)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        """Ferme la connexion SQLite (rouverte au prochain acces)."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ------------------------------------------------------------------
+    # Mise a jour
+    # ------------------------------------------------------------------
+
+    def upsert(self, ids: List[str], documents: List[str], group_id: str = "",
+               groups: Optional[List[str]] = None) -> None:
+        """Ajoute ou remplace des entrees.
+
+        Args:
+            ids: identifiants (ceux de la collection ChromaDB).
+            documents: textes a indexer.
+            group_id: groupe commun a toutes les entrees.
+            groups: groupe par entree (prioritaire sur group_id).
+        """
+        if not ids:
+            return
+        groups = groups if groups is not None else [group_id] * len(ids)
+        with self._lock, self._connect() as conn:
+            conn.executemany("DELETE FROM docs WHERE id = ?", [(i,) for i in ids])
+            conn.executemany(
+                "INSERT INTO docs (id, group_id, doc) VALUES (?, ?, ?)",
+                [(i, g, d or "") for i, g, d in zip(ids, groups, documents)],
+            )
+
+    def delete(self, ids: List[str]) -> None:
+        """Supprime des entrees par identifiant."""
+        if not ids:
+            return
+        with self._lock, self._connect() as conn:
+            conn.executemany("DELETE FROM docs WHERE id = ?", [(i,) for i in ids])
+
+    def delete_group(self, group_id: str) -> None:
+        """Supprime toutes les entrees d'un groupe."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM docs WHERE group_id = ?", (group_id,))
+
+    def delete_group_prefix(self, prefix: str) -> None:
+        """Supprime les entrees dont le groupe commence par `prefix`."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM docs WHERE substr(group_id, 1, ?) = ?",
+                         (len(prefix), prefix))
+
+    def clear(self) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM docs")
+            conn.execute("DELETE FROM info")
+
+    def get_info(self, key: str) -> Optional[str]:
+        """Valeur d'une information de l'index (ex. remplissage termine), ou None."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT value FROM info WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_info(self, key: str, value: str) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)",
+                         (key, value))
+
+    def count(self) -> int:
+        with self._lock, self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # Recherche
+    # ------------------------------------------------------------------
+
+    def search(self, tokens: List[str], limit: int = 200) -> List[str]:
+        """Identifiants des entrees contenant TOUS les termes (insensible a la casse).
+
+        Args:
+            tokens: termes a trouver (sous-chaines, deja en minuscules ou non).
+            limit: nombre maximal d'identifiants retournes.
+
+        Returns:
+            Identifiants, dans l'ordre d'insertion.
+        """
+        tokens = [t.lower() for t in tokens if t]
+        if not tokens:
+            return []
+        table = self._substring_table
+        long_terms = [t for t in tokens if len(t) >= _MIN_TRIGRAM] if table else []
+        short_terms = [t for t in tokens if t not in long_terms]
+        short_sql = "".join(" AND instr(pylower(d.doc), ?) > 0" for _ in short_terms)
+
+        with self._lock, self._connect() as conn:
+            if long_terms:
+                match = " AND ".join('"%s"' % t.replace('"', '""') for t in long_terms)
+                rows = conn.execute(
+                    f"SELECT d.id FROM {table} f JOIN docs d ON d.rowid = f.rowid "
+                    f"WHERE {table} MATCH ?" + short_sql + " ORDER BY d.rowid LIMIT ?",
+                    [match, *short_terms, int(limit)],
+                ).fetchall()
+            else:
+                # Termes trop courts pour les trigrammes : balayage dans SQLite.
+                rows = conn.execute(
+                    "SELECT d.id FROM docs d WHERE 1" + short_sql
+                    + " ORDER BY d.rowid LIMIT ?",
+                    [*short_terms, int(limit)],
+                ).fetchall()
+        return [r[0] for r in rows]
+
+    def rank(self, terms: List[str], limit: int = 50,
+             group_prefix: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Classement BM25 des entrees contenant AU MOINS un des termes.
+
+        Args:
+            terms: termes de la requete (combines en OU).
+            limit: nombre maximal de resultats.
+            group_prefix: restreint aux groupes commencant par ce prefixe.
+
+        Returns:
+            [(id, score)] du plus au moins pertinent (score BM25 positif).
+        """
+        min_len = _MIN_TRIGRAM if self._trigram else 1
+        terms = list(dict.fromkeys(t.lower() for t in terms if len(t) >= min_len))
+        if not terms:
+            return []
+        match = " OR ".join('"%s"' % t.replace('"', '""') for t in terms)
+        sql = ("SELECT d.id, bm25(docs_fts) AS score FROM docs_fts "
+               "JOIN docs d ON d.rowid = docs_fts.rowid WHERE docs_fts MATCH ?")
+        params: list = [match]
+        if group_prefix:
+            sql += " AND substr(d.group_id, 1, ?) = ?"
+            params += [len(group_prefix), group_prefix]
+        sql += " ORDER BY score LIMIT ?"
+        params.append(int(limit))
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        # bm25() de FTS5 est negatif (plus petit = meilleur)
+        return [(r[0], -float(r[1])) for r in rows]
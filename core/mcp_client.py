@@ -14,6 +14,9 @@ import concurrent.futures
 from dataclasses import dataclass, field
 from typing import Any, Callable, Dict, List, Optional
 
+from core.admission import run_in_context
+from core.tracing import span
+
 # MCP SDK (pip install mcp) — optionnel, dégradation gracieuse si absent
 try:
     from mcp import ClientSession, StdioServerParameters
@@ -53,6 +56,8 @@ class LocalTool:
     """Outil in-process : appel direct à une fonction Python."""
     schema: ToolSchema
     callable: Callable[..., str]  # sync ou async
+    # Sans effet de bord : peut s'exécuter en parallèle d'autres appels
+    read_only: bool = False
 
 
 @dataclass
@@ -182,6 +187,7 @@ class MCPManager:
         description: str,
         parameters: Dict[str, Any],
         callable_fn: Callable,
+        read_only: bool = False,
     ):
         """
         Enregistre une fonction Python locale comme outil Ollama.
@@ -191,9 +197,13 @@ class MCPManager:
             description: Description claire pour que le LLM sache quand l'utiliser
             parameters: JSON Schema des paramètres
             callable_fn: Fonction sync ou async à appeler
+            read_only: True si l'outil ne modifie rien (lecture, recherche) :
+                       plusieurs appels peuvent alors s'exécuter en parallèle
         """
         schema = ToolSchema(name=name, description=description, parameters=parameters)
-        self._local_tools[name] = LocalTool(schema=schema, callable=callable_fn)
+        self._local_tools[name] = LocalTool(
+            schema=schema, callable=callable_fn, read_only=read_only
+        )
         print(f"🔧 [MCP] Outil local enregistré : {name}")
 
     # ------------------------------------------------------------------
@@ -295,12 +305,27 @@ class MCPManager:
         """Indique si au moins un outil (local ou externe) est disponible."""
         return bool(self._local_tools or self._external_tools)
 
+    def is_read_only(self, tool_name: str) -> bool:
+        """
+        Indique si un outil peut s'exécuter en parallèle d'autres appels.
+        Les outils MCP externes (effets inconnus) sont toujours sérialisés.
+        """
+        tool = self._local_tools.get(tool_name)
+        return bool(tool and tool.read_only)
+
     # ------------------------------------------------------------------
     # Exécution d'un outil
     # ------------------------------------------------------------------
 
     async def execute_tool_async(self, tool_name: str, arguments: Dict) -> str:
         """Exécute un outil (local ou externe) de manière asynchrone."""
+        with span(f"tool.{tool_name}", kind="tool") as tool_span:
+            result = await self._execute_tool(tool_name, arguments)
+            if isinstance(result, str) and result.startswith("[Erreur"):
+                tool_span.status = "error"
+            return result
+
+    async def _execute_tool(self, tool_name: str, arguments: Dict) -> str:
         # 1. Outil local
         if tool_name in self._local_tools:
             fn = self._local_tools[tool_name].callable
@@ -309,8 +334,9 @@ class MCPManager:
                     return await fn(**arguments)
                 else:
                     # Exécuter la fonction sync dans un thread pour ne pas bloquer
+                    # (copie du contexte : classe d'admission des appels au modèle)
                     loop = asyncio.get_event_loop()
-                    return await loop.run_in_executor(None, lambda: fn(**arguments))
+                    return await loop.run_in_executor(None, run_in_context(lambda: fn(**arguments)))
             except Exception as exc:
                 return f"[Erreur outil '{tool_name}'] {exc}"
 
@@ -333,7 +359,7 @@ class MCPManager:
             # Déjà dans une boucle — sous-thread
             with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
                 return pool.submit(
-                    asyncio.run, self.execute_tool_async(tool_name, arguments)
+                    run_in_context(asyncio.run), self.execute_tool_async(tool_name, arguments)
                 ).result(timeout=60)
         except RuntimeError:
             return asyncio.run(self.execute_tool_async(tool_name, arguments))
@@ -0,0 +1,636 @@
+"""
+Transport HTTP partagé pour Ollama (et les autres serveurs de modèles locaux).
+
+Un seul client par processus, partagé par LocalLLM, ChatOrchestrator,
+AgenticExecutor, ImageGenerator, le Relay et l'API :
+
+  - sessions keep-alive (pool de connexions requests ; aiohttp côté asyncio) :
+    plus de nouvelle connexion TCP par génération, résumé, plan ou tour d'outil ;
+  - nombre de requêtes simultanées borné PAR SERVEUR (llm.local.max_in_flight),
+    commun aux faces synchrone et asyncio, file d'attente FIFO ;
+  - appels de génération (/api/chat, /api/generate) admis au préalable par
+    la file à priorités partagée (core/admission.py) ;
+  - métriques par appel (latence, attente d'un créneau, statut) via get_stats() ;
+  - un span « llm » par génération (core/tracing.py) : attente, premier chunk,
+    prompt_eval / eval et tokens/s lus dans le dernier chunk d'Ollama.
+
+Face synchrone : post() / get() renvoient une requests.Response (en flux, le
+créneau est rendu à la fermeture de la réponse : utiliser `with`).
+Face asyncio : apost() / aget() (réponse JSON) et astream() (lignes JSON d'un
+flux Ollama) n'occupent aucun thread pendant l'attente réseau.
+"""
+
+import asyncio
+import atexit
+import contextvars
+import json
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from core.admission import AdmissionTicket, get_admission_queue, is_generation_url
+from core.config import get_config
+from core.tracing import Span, get_tracer, llm_metrics
+from utils.logger import setup_logger
+
+try:
+    import aiohttp
+
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+logger = setup_logger("ollama_client")
+
+_DEFAULT_MAX_IN_FLIGHT = 4
+_DEFAULT_POOL_SIZE = 8
+# Appels conservés pour get_stats()["recent"]
+_RECENT_CALLS = 50
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def _aiohttp_timeout(timeout: Optional[float]) -> Any:
+    """Même sémantique que requests : délai de connexion et entre deux lectures."""
+    return aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+
+
+def _decode_lines(lines: List[bytes]) -> List[Dict[str, Any]]:
+    """Lignes NDJSON décodées (lignes vides ou invalides ignorées)."""
+    items = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            items.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return items
+
+
+def _as_requests_error(exc: Exception) -> Exception:
+    """Erreurs réseau aiohttp -> exceptions requests (mêmes except des deux faces)."""
+    if isinstance(exc, asyncio.TimeoutError):
+        return requests.Timeout(str(exc) or "timeout")
+    if AIOHTTP_AVAILABLE and isinstance(exc, aiohttp.ClientError):
+        return requests.ConnectionError(str(exc))
+    return exc
+
+
+class OllamaHTTPError(RuntimeError):
+    """Réponse HTTP non-200 d'un appel asyncio (status + début du corps)."""
+
+    def __init__(self, status: int, body: str = "") -> None:
+        super().__init__(f"HTTP {status}: {body[:200]}")
+        self.status = status
+        self.body = body
+
+
+class _InFlightLimiter:
+    """Créneaux de requêtes simultanées, partagés entre threads et boucles asyncio.
+
+    Les attentes sont servies dans l'ordre d'arrivée : un créneau libéré est
+    transmis directement au premier en attente (thread ou coroutine).
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = max(1, int(limit))
+        self.active = 0
+        self._lock = threading.Lock()
+        self._waiters: Deque[Any] = deque()  # threading.Event | (loop, future)
+
+    def acquire(self, wait: bool = True) -> None:
+        """Prend un créneau ; wait=False le prend même au-delà de la limite."""
+        with self._lock:
+            if not wait or (self.active < self.limit and not self._waiters):
+                self.active += 1
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        # Le créneau est transféré par release() : active reste inchangé.
+        event.wait()
+
+    async def acquire_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return
+            future = loop.create_future()
+            waiter = (loop, future)
+            self._waiters.append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            # Sinon le créneau a déjà été transmis : _grant le rend.
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                loop, future = waiter
+                if loop.is_closed():
+                    continue
+                loop.call_soon_threadsafe(self._grant, future)
+                return
+            self.active = max(0, self.active - 1)
+
+    def _grant(self, future: "asyncio.Future") -> None:
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+
+class OllamaClient:
+    """Client HTTP poolé avec limite de requêtes simultanées et métriques."""
+
+    def __init__(self, max_in_flight: int = _DEFAULT_MAX_IN_FLIGHT,
+                 pool_size: int = _DEFAULT_POOL_SIZE) -> None:
+        """
+        Args:
+            max_in_flight: requêtes simultanées maximales par serveur.
+            pool_size: connexions keep-alive conservées par serveur.
+        """
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.pool_size = max(self.max_in_flight, int(pool_size))
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._limiters: Dict[str, _InFlightLimiter] = {}
+        # Une session aiohttp par boucle asyncio (les sessions y sont liées)
+        self._async_sessions: Dict[int, Tuple[asyncio.AbstractEventLoop, Any]] = {}
+
+        self._calls = 0
+        self._errors = 0
+        self._total_seconds = 0.0
+        self._total_wait = 0.0
+        self._by_endpoint: Dict[str, Dict[str, Any]] = {}
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=_RECENT_CALLS)
+        logger.info("OllamaClient initialisé (max_in_flight=%d, pool=%d)",
+                    self.max_in_flight, self.pool_size)
+
+    # ------------------------------------------------------------------
+    # Créneaux et métriques
+    # ------------------------------------------------------------------
+
+    def _limiter(self, url: str) -> _InFlightLimiter:
+        parts = urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = _InFlightLimiter(self.max_in_flight)
+                self._limiters[key] = limiter
+            return limiter
+
+    @staticmethod
+    def _admit(url: str, wait: bool = True) -> Optional[AdmissionTicket]:
+        """Créneau de génération (file à priorités), None hors génération."""
+        if not is_generation_url(url):
+            return None
+        return get_admission_queue().acquire(wait=wait)
+
+    @staticmethod
+    async def _admit_async(url: str) -> Optional[AdmissionTicket]:
+        if not is_generation_url(url):
+            return None
+        return await get_admission_queue().acquire_async()
+
+    @staticmethod
+    def _dismiss(ticket: Optional[AdmissionTicket]) -> None:
+        if ticket is not None:
+            get_admission_queue().release(ticket)
+
+    @staticmethod
+    def _trace_start(url: str, payload: Optional[Dict[str, Any]], stream: bool) -> Optional[Span]:
+        """Span « llm » d'un appel de génération, None pour les autres appels."""
+        if not is_generation_url(url):
+            return None
+        endpoint = urlsplit(url).path.rstrip("/").rsplit("/", 1)[-1]
+        return get_tracer().start_span(
+            f"llm.{endpoint}", kind="llm",
+            model=(payload or {}).get("model"), stream=stream,
+        )
+
+    @staticmethod
+    def _trace_end(span: Optional[Span], status: Optional[int],
+                   body: Optional[Dict[str, Any]] = None,
+                   error: Optional[BaseException] = None) -> None:
+        if span is None:
+            return
+        span.set(status_code=status, **llm_metrics(body))
+        if status is not None and status >= 400:
+            span.status = "error"
+        get_tracer().end_span(span, error=error)
+
+    @staticmethod
+    def _first_chunk(span: Optional[Span]) -> None:
+        """Délai avant le premier chunk du flux (évaluation du prompt comprise)."""
+        if span is not None and "ttft_ms" not in span.attributes:
+            span.set(ttft_ms=round(span.elapsed_ms(), 1))
+
+    def _record(self, url: str, status: Optional[int], started: float,
+                waited: float, stream: bool, error: Optional[str] = None) -> None:
+        seconds = time.perf_counter() - started
+        endpoint = urlsplit(url).path or "/"
+        failed = error is not None or (status is not None and status >= 400)
+        with self._lock:
+            self._calls += 1
+            self._errors += int(failed)
+            self._total_seconds += seconds
+            self._total_wait += waited
+            entry = self._by_endpoint.setdefault(
+                endpoint, {"calls": 0, "errors": 0, "total_seconds": 0.0})
+            entry["calls"] += 1
+            entry["errors"] += int(failed)
+            entry["total_seconds"] += seconds
+            self._recent.append({
+                "endpoint": endpoint,
+                "status": status,
+                "seconds": round(seconds, 4),
+                "wait_seconds": round(waited, 4),
+                "stream": stream,
+                "error": error,
+            })
+
+    # ------------------------------------------------------------------
+    # Face synchrone
+    # ------------------------------------------------------------------
+
+    def request(self, method: str, url: str, timeout: Optional[float] = None,
+                stream: bool = False, **kwargs) -> requests.Response:
+        """Requête HTTP via la session partagée, dans un créneau du serveur.
+
+        En flux (stream=True), le créneau est conservé jusqu'à la fermeture de
+        la réponse (`with client.post(..., stream=True) as resp:`).
+        """
+        limiter = self._limiter(url)
+        started = time.perf_counter()
+        trace = self._trace_start(url, kwargs.get("json"), stream)
+        # Appel synchrone depuis une boucle asyncio : attendre un créneau
+        # bloquerait la boucle (et les flux asyncio qui doivent le libérer).
+        wait = not _in_event_loop()
+        try:
+            ticket = self._admit(url, wait=wait)
+        except BaseException as exc:
+            self._trace_end(trace, None, error=exc)
+            raise
+        limiter.acquire(wait=wait)
+        waited = time.perf_counter() - started
+        if trace is not None:
+            trace.set(queue_wait_ms=round(waited * 1000, 1))
+        try:
+            resp = self._session.request(method, url, timeout=timeout,
+                                         stream=stream, **kwargs)
+        except Exception as exc:
+            limiter.release()
+            self._dismiss(ticket)
+            self._record(url, None, started, waited, stream, error=type(exc).__name__)
+            self._trace_end(trace, None, error=exc)
+            raise
+        if not stream:
+            limiter.release()
+            self._dismiss(ticket)
+            self._record(url, resp.status_code, started, waited, stream)
+            if trace is not None:
+                body = None
+                if resp.status_code == 200:
+                    try:
+                        body = resp.json()
+                    except ValueError:
+                        pass
+                self._trace_end(trace, resp.status_code, body)
+            return resp
+
+        released = threading.Event()
+        status = resp.status_code
+        last_line: List[bytes] = []
+
+        if trace is not None:
+            iter_lines = resp.iter_lines
+
+            def _traced_lines(*args, **kw):
+                for line in iter_lines(*args, **kw):
+                    if line:
+                        self._first_chunk(trace)
+                        last_line[:] = [line]
+                    yield line
+
+            resp.iter_lines = _traced_lines  # type: ignore[method-assign]
+
+        def _finish() -> None:
+            if not released.is_set():
+                released.set()
+                limiter.release()
+                self._dismiss(ticket)
+                self._record(url, status, started, waited, stream)
+                decoded = _decode_lines(last_line)
+                self._trace_end(trace, status, decoded[0] if decoded else None)
+
+        close = resp.close
+
+        def _close() -> None:
+            try:
+                close()
+            finally:
+                _finish()
+
+        resp.close = _close  # type: ignore[method-assign]
+        # Filet de sécurité : réponse abandonnée sans close()
+        weakref.finalize(resp, _finish)
+        return resp
+
+    def post(self, url: str, timeout: Optional[float] = None, **kwargs) -> requests.Response:
+        return self.request("POST", url, timeout=timeout, **kwargs)
+
+    def get(self, url: str, timeout: Optional[float] = None, **kwargs) -> requests.Response:
+        return self.request("GET", url, timeout=timeout, **kwargs)
+
+    # ------------------------------------------------------------------
+    # Face asyncio
+    # ------------------------------------------------------------------
+
+    def _async_session(self) -> Any:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._async_sessions.get(id(loop))
+            if entry is not None and entry[0] is loop and not entry[1].closed:
+                return entry[1]
+            self._purge_closed_loops()
+            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(
+                limit_per_host=self.pool_size, keepalive_timeout=60))
+            self._async_sessions[id(loop)] = (loop, session)
+            return session
+
+    def _purge_closed_loops(self) -> None:
+        """Libère les sessions des boucles terminées (asyncio.run successifs)."""
+        for key, (loop, session) in list(self._async_sessions.items()):
+            if not loop.is_closed():
+                continue
+            del self._async_sessions[key]
+            connector = session.detach() if hasattr(session, "detach") else None
+            if connector is not None:
+                try:
+                    connector._close()  # pylint: disable=protected-access
+                except Exception:
+                    pass
+
+    async def aclose(self) -> None:
+        """Ferme la session aiohttp de la boucle courante."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._async_sessions.pop(id(loop), None)
+        if entry is not None and entry[0] is loop:
+            await entry[1].close()
+
+    async def arequest(self, method: str, url: str,
+                       payload: Optional[Dict[str, Any]] = None,
+                       timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Requête sans bloquer de thread ; renvoie le corps JSON décodé.
+
+        Raises:
+            OllamaHTTPError: statut HTTP différent de 200.
+            requests.RequestException: erreur réseau (comme la face synchrone).
+        """
+        if not AIOHTTP_AVAILABLE:
+            context = contextvars.copy_context()
+            resp = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: context.run(self.request, method, url, json=payload, timeout=timeout))
+            if resp.status_code != 200:
+                raise OllamaHTTPError(resp.status_code, resp.text)
+            return resp.json()
+
+        limiter = self._limiter(url)
+        started = time.perf_counter()
+        trace = self._trace_start(url, payload, False)
+        try:
+            ticket = await self._admit_async(url)
+        except BaseException as exc:
+            self._trace_end(trace, None, error=exc)
+            raise
+        try:
+            await limiter.acquire_async()
+        except BaseException as exc:
+            self._dismiss(ticket)
+            self._trace_end(trace, None, error=exc)
+            raise
+        waited = time.perf_counter() - started
+        if trace is not None:
+            trace.set(queue_wait_ms=round(waited * 1000, 1))
+        status = None
+        try:
+            async with self._async_session().request(
+                method, url, json=payload, timeout=_aiohttp_timeout(timeout),
+            ) as resp:
+                status = resp.status
+                if status != 200:
+                    raise OllamaHTTPError(status, await resp.text())
+                data = await resp.json(content_type=None)
+        except OllamaHTTPError:
+            self._record(url, status, started, waited, False)
+            self._trace_end(trace, status)
+            raise
+        except Exception as exc:
+            self._record(url, status, started, waited, False, error=type(exc).__name__)
+            self._trace_end(trace, status, error=exc)
+            converted = _as_requests_error(exc)
+            if converted is exc:
+                raise
+            raise converted from exc
+        finally:
+            limiter.release()
+            self._dismiss(ticket)
+        self._record(url, status, started, waited, False)
+        self._trace_end(trace, status, data if isinstance(data, dict) else None)
+        return data
+
+    async def apost(self, url: str, payload: Dict[str, Any],
+                    timeout: Optional[float] = None) -> Dict[str, Any]:
+        return await self.arequest("POST", url, payload, timeout=timeout)
+
+    async def aget(self, url: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        return await self.arequest("GET", url, timeout=timeout)
+
+    async def astream(self, url: str, payload: Dict[str, Any],
+                      timeout: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Flux Ollama (NDJSON) : produit chaque ligne JSON décodée.
+
+        Raises:
+            OllamaHTTPError: statut HTTP différent de 200.
+            requests.RequestException: erreur réseau (comme la face synchrone).
+        """
+        if not AIOHTTP_AVAILABLE:
+            async for item in self._astream_in_thread(url, payload, timeout):
+                yield item
+            return
+
+        limiter = self._limiter(url)
+        started = time.perf_counter()
+        trace = self._trace_start(url, payload, True)
+        try:
+            ticket = await self._admit_async(url)
+        except BaseException as exc:
+            self._trace_end(trace, None, error=exc)
+            raise
+        try:
+            await limiter.acquire_async()
+        except BaseException as exc:
+            self._dismiss(ticket)
+            self._trace_end(trace, None, error=exc)
+            raise
+        waited = time.perf_counter() - started
+        if trace is not None:
+            trace.set(queue_wait_ms=round(waited * 1000, 1))
+        status = None
+        error: Optional[str] = None
+        last: Optional[Dict[str, Any]] = None
+        failure: Optional[BaseException] = None
+        try:
+            async with self._async_session().post(
+                url, json=payload, timeout=_aiohttp_timeout(timeout),
+            ) as resp:
+                status = resp.status
+                if status != 200:
+                    raise OllamaHTTPError(status, await resp.text())
+                # Découpage manuel en lignes : la ligne finale d'Ollama
+                # (/api/generate, champ "context") peut dépasser la limite
+                # de longueur de ligne du lecteur aiohttp.
+                pending = b""
+                async for block in resp.content.iter_any():
+                    pending += block
+                    *lines, pending = pending.split(b"\n")
+                    for item in _decode_lines(lines):
+                        self._first_chunk(trace)
+                        last = item
+                        yield item
+                for item in _decode_lines([pending]):
+                    self._first_chunk(trace)
+                    last = item
+                    yield item
+        except OllamaHTTPError:
+            raise
+        except Exception as exc:
+            error = type(exc).__name__
+            failure = exc
+            converted = _as_requests_error(exc)
+            if converted is exc:
+                raise
+            raise converted from exc
+        finally:
+            limiter.release()
+            self._dismiss(ticket)
+            self._record(url, status, started, waited, True, error=error)
+            self._trace_end(trace, status, last, error=failure)
+
+    async def _astream_in_thread(self, url: str, payload: Dict[str, Any],
+                                 timeout: Optional[float]) -> AsyncIterator[Dict[str, Any]]:
+        """Repli sans aiohttp : flux synchrone lu dans un thread."""
+        loop = asyncio.get_running_loop()
+        queue: "asyncio.Queue" = asyncio.Queue()
+        done = object()
+
+        def _pump() -> None:
+            try:
+                with self.post(url, json=payload, timeout=timeout, stream=True) as resp:
+                    if resp.status_code != 200:
+                        raise OllamaHTTPError(resp.status_code, resp.text)
+                    for raw_line in resp.iter_lines():
+                        if raw_line:
+                            try:
+                                item = json.loads(raw_line)
+                            except json.JSONDecodeError:
+                                continue
+                            loop.call_soon_threadsafe(queue.put_nowait, item)
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+            except Exception as exc:  # pylint: disable=broad-except
+                loop.call_soon_threadsafe(queue.put_nowait, exc)
+
+        loop.run_in_executor(None, contextvars.copy_context().run, _pump)
+        while True:
+            item = await queue.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    # ------------------------------------------------------------------
+    # Statistiques
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Appels, erreurs, latence/attente moyennes, requêtes en cours par serveur."""
+        with self._lock:
+            calls = self._calls
+            by_endpoint = {
+                endpoint: {
+                    "calls": e["calls"],
+                    "errors": e["errors"],
+                    "avg_seconds": round(e["total_seconds"] / e["calls"], 4),
+                }
+                for endpoint, e in self._by_endpoint.items()
+            }
+            recent: List[Dict[str, Any]] = list(self._recent)
+            return {
+                "calls": calls,
+                "errors": self._errors,
+                "avg_seconds": round(self._total_seconds / calls, 4) if calls else 0.0,
+                "avg_wait_seconds": round(self._total_wait / calls, 4) if calls else 0.0,
+                "max_in_flight": self.max_in_flight,
+                "in_flight": {key: lim.active for key, lim in self._limiters.items()},
+                "by_endpoint": by_endpoint,
+                "recent": recent,
+            }
+
+
+_CLIENT: Optional[OllamaClient] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def _close_at_exit() -> None:
+    if _CLIENT is not None:
+        with _CLIENT._lock:  # pylint: disable=protected-access
+            _CLIENT._purge_closed_loops()  # pylint: disable=protected-access
+
+
+atexit.register(_close_at_exit)
+
+
+def get_ollama_client() -> OllamaClient:
+    """Retourne le client partagé du processus (configuré depuis llm.local.*)."""
+    global _CLIENT  # pylint: disable=global-statement
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            try:
+                cfg = get_config()
+                max_in_flight = int(cfg.get("llm.local.max_in_flight", _DEFAULT_MAX_IN_FLIGHT))
+                pool_size = int(cfg.get("llm.local.pool_size", _DEFAULT_POOL_SIZE))
+            except Exception:
+                max_in_flight, pool_size = _DEFAULT_MAX_IN_FLIGHT, _DEFAULT_POOL_SIZE
+            _CLIENT = OllamaClient(max_in_flight=max_in_flight, pool_size=pool_size)
+        return _CLIENT
@@ -0,0 +1,223 @@
+"""
+Disposition des prompts /api/chat compatible avec le cache KV d'Ollama.
+
+Ollama ne réévalue que la partie du prompt qui suit le plus long préfixe
+commun avec la requête précédente du même modèle. Le prompt système et le
+schéma des outils (rendus en tête par le gabarit de chat) changeaient à
+chaque requête : faits de la base de connaissances, extraits du dossier
+projet, documents et scratchpad y étaient concaténés, et la synthèse
+remplaçait le message système. Tout le prompt était donc réévalué.
+
+Disposition retenue :
+
+    [système stable + outils] [historique] [contexte de la requête]
+    [message courant] [tours d'outils] [état volatil]
+
+  - prompt système et schéma des outils identiques octet pour octet d'un
+    tour à l'autre (outils triés par nom, clés JSON ordonnées) ;
+  - contexte de la requête (faits, extraits, documents) : message « user »
+    placé après l'historique, constant pendant toute la boucle d'outils ;
+  - état volatil (scratchpad, consignes de synthèse) : dernier message,
+    remplacé à chaque tour.
+
+Les messages ajoutés restent en rôle « user » : le gabarit d'Ollama regroupe
+tous les messages « system » en tête de prompt, ce qui casserait le préfixe.
+
+PromptStats relève prompt_eval_count / prompt_eval_duration de chaque appel
+et estime la part du prompt que le cache pouvait servir, pour vérifier la
+réutilisation du préfixe (/api/stats, clé « prompt »).
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+from utils.logger import setup_logger
+
+if TYPE_CHECKING:
+    from core.context_budget import ContextBudget
+
+logger = setup_logger("prompt_assembly")
+
+CONTEXT_MARKER = "[CONTEXTE DE LA REQUÊTE]"
+VOLATILE_MARKER = "[ÉTAT DE LA TÂCHE]"
+
+_RECENT_CALLS = 50
+
+
+def stable_tools(tools: Optional[List[Dict]]) -> Optional[List[Dict]]:
+    """Schéma des outils sous forme canonique : triés par nom, clés ordonnées."""
+    if not tools:
+        return tools
+    canonical = [json.loads(json.dumps(tool, sort_keys=True)) for tool in tools]
+    return sorted(canonical, key=lambda t: (t.get("function") or {}).get("name", ""))
+
+
+def context_message(context: Optional[str]) -> Optional[Dict[str, str]]:
+    """Message portant le contexte de la requête, ou None s'il est vide."""
+    if not context or not context.strip():
+        return None
+    return {"role": "user", "content": f"{CONTEXT_MARKER}\n{context.strip()}"}
+
+
+def is_context_message(message: Dict[str, Any]) -> bool:
+    return message.get("role") == "user" and str(message.get("content", "")).startswith(CONTEXT_MARKER)
+
+
+def is_volatile(message: Dict[str, Any]) -> bool:
+    return message.get("role") == "user" and str(message.get("content", "")).startswith(VOLATILE_MARKER)
+
+
+def strip_volatile(messages: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Messages sans l'état volatil."""
+    return [m for m in messages if not is_volatile(m)]
+
+
+def with_volatile(messages: Sequence[Dict[str, Any]], content: str) -> List[Dict[str, Any]]:
+    """Remplace l'état volatil par content, en dernière position."""
+    updated = strip_volatile(messages)
+    updated.append({"role": "user", "content": f"{VOLATILE_MARKER}\n{content}"})
+    return updated
+
+
+def _fingerprint(message: Dict[str, Any]) -> str:
+    payload = json.dumps(message, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _signature(
+    messages: Sequence[Dict[str, Any]], tools: Optional[List[Dict]]
+) -> Tuple[str, List[str]]:
+    tools_key = json.dumps(tools or [], sort_keys=True, ensure_ascii=False)
+    return (
+        hashlib.sha1(tools_key.encode("utf-8")).hexdigest(),
+        [_fingerprint(m) for m in messages],
+    )
+
+
+class PromptStats:
+    """
+    Mesures par appel /api/chat : taille estimée du prompt, préfixe
+    réutilisable (messages identiques à l'appel précédent du même modèle)
+    et compteurs renvoyés par Ollama.
+    """
+
+    def __init__(self, max_recent: int = _RECENT_CALLS) -> None:
+        self._lock = threading.Lock()
+        self._last: Dict[str, Tuple[str, List[str]]] = {}
+        self._recent: deque = deque(maxlen=max_recent)
+        self._calls = 0
+        self._prompt_tokens = 0
+        self._reusable_tokens = 0
+        self._prompt_eval_count = 0
+        self._prompt_eval_ms = 0.0
+
+    def _shared_prefix(
+        self, model: str, messages: Sequence[Dict[str, Any]], tools: Optional[List[Dict]]
+    ) -> int:
+        """Nombre de messages de tête identiques à l'appel précédent. Appeler sous self._lock."""
+        signature = _signature(messages, tools)
+        previous = self._last.get(model)
+        self._last[model] = signature
+        if previous is None or previous[0] != signature[0]:
+            return 0
+        shared = 0
+        for before, now in zip(previous[1], signature[1]):
+            if before != now:
+                break
+            shared += 1
+        return shared
+
+    def record(
+        self,
+        budget: "ContextBudget",
+        source: str,
+        messages: Sequence[Dict[str, Any]],
+        tools: Optional[List[Dict]],
+        body: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """Enregistre un appel terminé (body : réponse ou dernier chunk « done »)."""
+        body = body or {}
+        with self._lock:
+            shared = self._shared_prefix(budget.model, messages, tools)
+        prompt_tokens = budget.count_messages(messages, tools)
+        reusable = budget.count_messages(messages[:shared], tools) if shared else 0
+        try:
+            evaluated = int(body.get("prompt_eval_count") or 0)
+        except (TypeError, ValueError):
+            evaluated = 0
+        prompt_eval_ms = float(body.get("prompt_eval_duration") or 0) / 1e6
+        entry = {
+            "source": source,
+            "model": budget.model,
+            "time": time.time(),
+            "messages": len(messages),
+            "prompt_tokens": prompt_tokens,
+            "reusable_tokens": reusable,
+            "prompt_eval_count": evaluated,
+            "prompt_eval_ms": round(prompt_eval_ms, 1),
+            "eval_count": body.get("eval_count", 0),
+            "eval_ms": round(float(body.get("eval_duration") or 0) / 1e6, 1),
+        }
+        with self._lock:
+            self._recent.append(entry)
+            self._calls += 1
+            self._prompt_tokens += prompt_tokens
+            self._reusable_tokens += reusable
+            self._prompt_eval_count += evaluated
+            self._prompt_eval_ms += prompt_eval_ms
+
+        # Avec un préfixe servi par le cache, prompt_eval_count ne couvre que
+        # la fin du prompt : seuls les appels à froid calibrent le budget.
+        if not shared:
+            budget.observe(messages, evaluated, tools)
+
+        logger.info(
+            "[%s] prompt ≈%d tokens (préfixe réutilisable ≈%d), "
+            "prompt_eval_count=%d en %.0f ms",
+            source, prompt_tokens, reusable, evaluated, prompt_eval_ms,
+        )
+        return entry
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = self._calls
+            return {
+                "calls": calls,
+                "prompt_tokens": self._prompt_tokens,
+                "reusable_tokens": self._reusable_tokens,
+                "prefix_reuse_ratio": (
+                    round(self._reusable_tokens / self._prompt_tokens, 3)
+                    if self._prompt_tokens else 0.0
+                ),
+                "prompt_eval_count": self._prompt_eval_count,
+                "avg_prompt_eval_ms": round(self._prompt_eval_ms / calls, 1) if calls else 0.0,
+                "recent": list(self._recent)[-10:],
+            }
+
+
+_stats: Optional[PromptStats] = None
+_stats_lock = threading.Lock()
+
+
+def get_prompt_stats() -> PromptStats:
+    """Instance partagée par le processus."""
+    global _stats  # pylint: disable=global-statement
+    with _stats_lock:
+        if _stats is None:
+            _stats = PromptStats()
+        return _stats
+
+
+def observe_prompt(
+    budget: "ContextBudget",
+    source: str,
+    messages: Sequence[Dict[str, Any]],
+    tools: Optional[List[Dict]],
+    body: Optional[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """Raccourci : enregistre un appel dans les statistiques partagées."""
+    return get_prompt_stats().record(budget, source, messages, tools, body)
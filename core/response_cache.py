@@ -0,0 +1,344 @@
+"""
+Cache sémantique des réponses du modèle (opt-in).
+
+Les tâches planifiées (core/scheduler.py), les clients de l'API (/api/chat) et
+l'utilisateur qui repose la même question payaient une génération complète à
+chaque fois. ResponseCache renvoie la réponse déjà produite pour une question
+identique ou quasi identique, posée au même modèle, avec le même contexte
+injecté et la même température.
+
+Clé : (modèle, sha256 du contexte injecté normalisé, température), puis
+embedding normalisé de la question. Une question au texte normalisé identique
+est servie sans embedding ; sinon la réponse la plus proche est retenue si sa
+similarité cosinus atteint le seuil. Les entrées expirent après ttl_seconds et
+les moins récemment servies sont évincées au-delà de max_entries.
+
+Une réponse produite après un outil à effet de bord (écriture, déplacement,
+suppression de fichier...) n'est jamais mise en cache : la rejouer ne rejouerait
+pas l'action.
+
+Configuration (optimization.cache) : response_cache_enabled (false par
+défaut), response_cache_size, response_cache_similarity, cache_ttl.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from core.config import get_config
+from utils.logger import setup_logger
+
+logger = setup_logger("response_cache")
+
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS responses (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    scope        TEXT    NOT NULL,
+    prompt_hash  TEXT    NOT NULL,
+    embedding    BLOB,
+    response     TEXT    NOT NULL,
+    created_at   REAL    NOT NULL,
+    last_used    REAL    NOT NULL,
+    hits         INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_resp_scope ON responses(scope, prompt_hash);
+CREATE INDEX IF NOT EXISTS idx_resp_last_used ON responses(last_used);
+"""
+
+Encoder = Callable[[List[str]], Optional[Sequence[Sequence[float]]]]
+
+
+def normalize_prompt(text: str) -> str:
+    """Forme canonique d'une question (casse, espaces, ponctuation finale)."""
+    text = unicodedata.normalize("NFC", text or "").casefold()
+    return " ".join(text.split()).rstrip(" ?!.…")
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _default_encoder(texts: List[str]) -> Optional[Sequence[Sequence[float]]]:
+    """Modèle d'embeddings partagé ; None s'il n'est pas chargé."""
+    from core.shared import get_shared_embedding_model  # pylint: disable=import-outside-toplevel
+
+    model = get_shared_embedding_model()
+    if model is None:
+        return None
+    return model.encode(texts, show_progress_bar=False)
+
+
+class ResponseCache:
+    """Cache persistant (SQLite) de réponses, avec recherche par similarité."""
+
+    def __init__(
+        self,
+        db_path: str = "data/response_cache.db",
+        similarity_threshold: float = 0.95,
+        ttl_seconds: float = 3600,
+        max_entries: int = 500,
+        encoder: Optional[Encoder] = _default_encoder,
+    ) -> None:
+        """
+        Args:
+            db_path: chemin de la base SQLite du cache.
+            similarity_threshold: similarité cosinus minimale d'un hit approché.
+            ttl_seconds: durée de vie d'une réponse.
+            max_entries: nombre maximal de réponses conservées (éviction LRU).
+            encoder: textes -> vecteurs ; None limite le cache aux questions
+                au texte normalisé identique.
+        """
+        self._db_path = Path(db_path)
+        self.similarity_threshold = float(similarity_threshold)
+        self.ttl_seconds = float(ttl_seconds)
+        self._max_entries = max(1, int(max_entries))
+        self._encoder = encoder
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._similar_hits = 0
+        self._misses = 0
+        self._bypassed = 0
+        self._evictions = 0
+        # Base créée au premier accès (pas de fichier tant que rien n'est stocké)
+        self._conn: Optional[sqlite3.Connection] = None
+        logger.info(
+            "ResponseCache initialisé (db=%s, seuil=%.2f, ttl=%ds, max=%d)",
+            db_path, self.similarity_threshold, self.ttl_seconds, self._max_entries,
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connexion de l'instance (ouverte au premier accès). Appeler sous self._lock."""
+        if self._conn is None:
+            self._db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self._db_path), check_same_thread=False)
+            self._conn.executescript(_SCHEMA_SQL)
+        return self._conn
+
+    def close(self) -> None:
+        """Ferme la connexion SQLite de l'instance."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @staticmethod
+    def make_scope(model: str, context: str = "", temperature: Optional[float] = None) -> str:
+        """Partie exacte de la clé : modèle, contexte injecté, température."""
+        temp = "" if temperature is None else f"{float(temperature):.2f}"
+        context_hash = _sha256(" ".join((context or "").split()))
+        return f"{model}|{temp}|{context_hash}"
+
+    def _embed(self, prompt: str) -> Optional[np.ndarray]:
+        """Embedding normalisé (norme 1) de la question, None si indisponible."""
+        if self._encoder is None:
+            return None
+        try:
+            vectors = self._encoder([prompt])
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("Embedding de la question impossible : %s", exc)
+            return None
+        if vectors is None or len(vectors) == 0:
+            return None
+        vector = np.asarray(vectors[0], dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else None
+
+    # ------------------------------------------------------------------
+    # Lecture / écriture
+    # ------------------------------------------------------------------
+
+    def lookup(
+        self,
+        model: str,
+        prompt: str,
+        context: str = "",
+        temperature: Optional[float] = None,
+    ) -> Optional[str]:
+        """Réponse en cache pour cette question, ou None.
+
+        Args:
+            model: nom du modèle qui aurait généré la réponse.
+            prompt: question de l'utilisateur (ou tâche d'agent).
+            context: tout ce qui est injecté autour de la question (prompt
+                système, faits, extraits, historique) ; comparé à l'identique.
+            temperature: température de génération.
+        """
+        scope = self.make_scope(model, context, temperature)
+        prompt_hash = _sha256(normalize_prompt(prompt))
+        oldest = time.time() - self.ttl_seconds
+
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT id, response FROM responses "
+                "WHERE scope = ? AND prompt_hash = ? AND created_at >= ? "
+                "ORDER BY created_at DESC LIMIT 1",
+                (scope, prompt_hash, oldest),
+            ).fetchone()
+            has_candidates = row is None and conn.execute(
+                "SELECT 1 FROM responses WHERE scope = ? AND created_at >= ? "
+                "AND embedding IS NOT NULL LIMIT 1",
+                (scope, oldest),
+            ).fetchone() is not None
+
+        similarity = 1.0
+        if row is None and has_candidates:
+            # Encodage hors verrou : quelques dizaines de ms sur CPU
+            query = self._embed(prompt)
+            if query is not None:
+                with self._lock:
+                    candidates = self._connect().execute(
+                        "SELECT id, response, embedding FROM responses "
+                        "WHERE scope = ? AND created_at >= ? AND embedding IS NOT NULL",
+                        (scope, oldest),
+                    ).fetchall()
+                best = None
+                for entry_id, response, blob in candidates:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    if vector.shape != query.shape:
+                        continue
+                    score = float(np.dot(query, vector))
+                    if score >= self.similarity_threshold and (best is None or score > best[0]):
+                        best = (score, entry_id, response)
+                if best is not None:
+                    similarity, entry_id, response = best
+                    row = (entry_id, response)
+
+        with self._lock:
+            if row is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            if similarity < 1.0:
+                self._similar_hits += 1
+            self._connect().execute(
+                "UPDATE responses SET last_used = ?, hits = hits + 1 WHERE id = ?",
+                (time.time(), row[0]),
+            )
+            self._conn.commit()
+        logger.info("Réponse servie depuis le cache (similarité %.3f)", similarity)
+        return row[1]
+
+    def store(
+        self,
+        model: str,
+        prompt: str,
+        response: str,
+        context: str = "",
+        temperature: Optional[float] = None,
+        side_effects: bool = False,
+    ) -> bool:
+        """Met une réponse en cache. Retourne False si elle a été écartée.
+
+        Args:
+            side_effects: un outil à effet de bord a été exécuté pendant la
+                génération ; la réponse n'est alors pas mise en cache.
+        """
+        if side_effects or not (response or "").strip():
+            with self._lock:
+                self._bypassed += 1
+            return False
+
+        scope = self.make_scope(model, context, temperature)
+        prompt_hash = _sha256(normalize_prompt(prompt))
+        vector = self._embed(prompt)
+        blob = vector.astype(np.float32).tobytes() if vector is not None else None
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "DELETE FROM responses WHERE scope = ? AND prompt_hash = ?",
+                (scope, prompt_hash),
+            )
+            conn.execute(
+                "INSERT INTO responses (scope, prompt_hash, embedding, response, "
+                "created_at, last_used, hits) VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (scope, prompt_hash, blob, response, now, now),
+            )
+            self._evict(conn, now)
+            conn.commit()
+        return True
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """Supprime les entrées expirées puis les moins récemment servies."""
+        expired = conn.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        count = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        excess = max(0, count - self._max_entries)
+        if excess:
+            conn.execute(
+                "DELETE FROM responses WHERE id IN ("
+                "SELECT id FROM responses ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+        self._evictions += max(0, expired) + excess
+
+    # ------------------------------------------------------------------
+    # Maintenance / statistiques
+    # ------------------------------------------------------------------
+
+    def clear(self) -> None:
+        """Vide le cache (les compteurs sont remis à zéro)."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+            self._hits = self._similar_hits = self._misses = 0
+            self._bypassed = self._evictions = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Statistiques : entrées, hits (dont approchés), misses, taux de hit."""
+        with self._lock:
+            entries = 0
+            if self._conn is not None or self._db_path.exists():
+                entries = self._connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            total = self._hits + self._misses
+            return {
+                "entries": entries,
+                "max_entries": self._max_entries,
+                "hits": self._hits,
+                "similar_hits": self._similar_hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / total, 4) if total else 0.0,
+                "bypassed": self._bypassed,
+                "evictions": self._evictions,
+            }
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Cache partagé du processus, ou None s'il n'est pas activé (opt-in)."""
+    global _cache  # pylint: disable=global-statement
+    config = get_config()
+    if not config.get("optimization.cache.response_cache_enabled", False):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                db_path=config.get("optimization.cache.response_cache_db", "data/response_cache.db"),
+                similarity_threshold=float(config.get("optimization.cache.response_cache_similarity", 0.95)),
+                ttl_seconds=float(config.get("optimization.cache.cache_ttl", 3600)),
+                max_entries=int(config.get("optimization.cache.response_cache_size", 500)),
+            )
+        return _cache
+
+
+def has_side_effects(tool_names: Iterable[str], is_read_only: Optional[Callable[[str], bool]]) -> bool:
+    """Vrai si l'un des outils exécutés n'est pas déclaré en lecture seule."""
+    names = list(tool_names)
+    if not names:
+        return False
+    if is_read_only is None:
+        return True
+    return any(not is_read_only(name) for name in names)
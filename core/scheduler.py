@@ -40,6 +40,8 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any, Callable, Dict, List, Optional
 
+from core.admission import admission_context
+from core.tracing import span
 from utils.logger import setup_logger
 
 # croniter est optionnel : seules les planifications de type "cron" en ont besoin.
@@ -713,19 +715,23 @@ class SchedulerService:
             " [manqué]" if missed else (" [manuel]" if manual else ""),
         )
         try:
-            if kind == "debate":
-                d = task.get("debate") or {}
-                rounds = int(d.get("rounds", 3) or 3)
-                self.executor.run_debate(
-                    exec_id, d.get("agent_a"), d.get("agent_b"),
-                    task.get("task", ""), rounds, collector.handle,
-                )
-            else:
-                self.executor.run_workflow(
-                    exec_id, task.get("task", ""),
-                    task.get("nodes", []) or [], task.get("connections", []) or [],
-                    collector.handle,
-                )
+            # Tâche de fond : classe « batch » de la file d'admission du modèle,
+            # derrière les conversations interactives, le Relay et l'API
+            with admission_context("batch", session_id=f"scheduler:{task_id}"), \
+                    span("scheduler.task", kind="request", task_id=task_id, task_kind=kind):
+                if kind == "debate":
+                    d = task.get("debate") or {}
+                    rounds = int(d.get("rounds", 3) or 3)
+                    self.executor.run_debate(
+                        exec_id, d.get("agent_a"), d.get("agent_b"),
+                        task.get("task", ""), rounds, collector.handle,
+                    )
+                else:
+                    self.executor.run_workflow(
+                        exec_id, task.get("task", ""),
+                        task.get("nodes", []) or [], task.get("connections", []) or [],
+                        collector.handle,
+                    )
         except Exception as exc:
             logger.exception("Scheduler : échec d'exécution de '%s'", name)
             collector.error = str(exc)
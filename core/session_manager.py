@@ -1,8 +1,19 @@
 """
 Gestionnaire de workspaces et sessions pour My_AI v8.0.0
 Regroupe conversation, documents, agents et parametres dans une unite nommee et sauvegardable.
+
+Dossier d'un workspace :
+  metadata.json  nom, dates, nombre de messages, revision de l'historique
+  state.json     sections d'etat hors historique (documents, dossiers,
+                 agents, parametres, variantes d'edition)
+  history.*      historique de conversation journalise (voir
+                 core/workspace_history.py) : une sauvegarde n'ecrit que les
+                 nouveaux messages.
+Un state.json de l'ancien format (historique inclus) est migre a la
+premiere lecture du workspace.
 """
 
+import copy
 import json
 import re
 import shutil
@@ -14,8 +25,24 @@ from typing import Any, Dict, List, Optional
 
 from utils.logger import setup_logger
 
+from .workspace_history import DEFAULT_COMPACT_EVERY, WorkspaceHistory
+
 logger = setup_logger("session_manager")
 
+# Sections de state.json et leur valeur par defaut. ATTENTION : cette liste
+# est exhaustive, toute cle absente est silencieusement perdue a la
+# sauvegarde. Y ajouter les nouvelles sections d'etat, sinon elles ne
+# survivront pas au rechargement.
+_STATE_SECTIONS: Dict[str, Any] = {
+    "attached_documents": [],
+    "attached_folders": [],
+    "active_agents": [],
+    "settings": {},
+    # Variantes d'edition des messages (cf. MessageEditingMixin),
+    # indexees par le `mid` stable du message utilisateur.
+    "turn_branches": {},
+}
+
 
 def _slugify(text: str) -> str:
     """
@@ -48,17 +75,26 @@ class SessionManager:
     nommee et persistee sur disque au format JSON.
     """
 
-    def __init__(self, workspaces_dir: str = "data/workspaces") -> None:
+    def __init__(
+        self,
+        workspaces_dir: str = "data/workspaces",
+        compact_every: int = DEFAULT_COMPACT_EVERY,
+    ) -> None:
         """
         Initialise le gestionnaire de sessions.
 
         Args:
             workspaces_dir: Chemin du repertoire racine des workspaces
+            compact_every: Messages journalises avant compaction de l'historique
         """
         self._workspaces_dir = Path(workspaces_dir)
         self._workspaces_dir.mkdir(parents=True, exist_ok=True)
         self._current_workspace_id: Optional[str] = None
         self._lock = threading.Lock()
+        self._compact_every = compact_every
+        # Historiques et sections deja lus, par workspace
+        self._histories: Dict[str, WorkspaceHistory] = {}
+        self._sections: Dict[str, Dict[str, Any]] = {}
         logger.info(
             "SessionManager initialise avec repertoire: %s",
             self._workspaces_dir.resolve(),
@@ -102,20 +138,17 @@ class SessionManager:
                 "created_at": now,
                 "last_modified": now,
                 "message_count": 0,
+                "history_revision": 0,
             }
 
-            initial_state = {
-                "conversation_history": [],
-                "attached_documents": [],
-                "attached_folders": [],
-                "active_agents": [],
-                "settings": {},
-                "turn_branches": {},
-                "metadata": metadata,
-            }
+            sections = self._extract_sections({})
+            history = WorkspaceHistory(workspace_path, self._compact_every)
+            history.write_snapshot([])
 
             self._write_json(workspace_path / "metadata.json", metadata)
-            self._write_json(workspace_path / "state.json", initial_state)
+            self._write_json(workspace_path / "state.json", sections)
+            self._histories[workspace_id] = history
+            self._sections[workspace_id] = sections
 
         logger.info("Workspace cree: '%s' (id=%s)", name, workspace_id)
         return workspace_id
@@ -125,7 +158,9 @@ class SessionManager:
         Sauvegarde l'etat complet d'un workspace.
 
         L'etat attendu contient les cles: conversation_history,
-        attached_documents, active_agents, settings, metadata.
+        attached_documents, active_agents, settings, metadata. Seuls les
+        messages ajoutes depuis la derniere sauvegarde sont ecrits ; sans
+        cle conversation_history, l'historique est laisse tel quel.
 
         Args:
             workspace_id: Identifiant du workspace
@@ -152,34 +187,29 @@ class SessionManager:
                     )
                     return False
 
-                metadata["last_modified"] = datetime.now().isoformat()
-                metadata["message_count"] = len(
-                    state.get("conversation_history", [])
-                )
-
-                if "metadata" in state:
-                    user_meta = state["metadata"]
-                    for key in ("name", "description"):
-                        if key in user_meta:
-                            metadata[key] = user_meta[key]
-
-                # ATTENTION : cette liste est exhaustive, toute clé absente est
-                # silencieusement perdue à la sauvegarde. Y ajouter les nouvelles
-                # sections d'état, sinon elles ne survivront pas au rechargement.
-                state_to_save = {
-                    "conversation_history": state.get("conversation_history", []),
-                    "attached_documents": state.get("attached_documents", []),
-                    "attached_folders": state.get("attached_folders", []),
-                    "active_agents": state.get("active_agents", []),
-                    "settings": state.get("settings", {}),
-                    # Variantes d'édition des messages (cf. MessageEditingMixin),
-                    # indexées par le `mid` stable du message utilisateur.
-                    "turn_branches": state.get("turn_branches", {}),
-                    "metadata": metadata,
-                }
-
-                self._write_json(workspace_path / "state.json", state_to_save)
-                self._write_json(workspace_path / "metadata.json", metadata)
+                history = self._history(workspace_path)
+                changed = False
+                if "conversation_history" in state:
+                    outcome = history.save(state.get("conversation_history") or [])
+                    changed = outcome != "unchanged"
+
+                sections = self._extract_sections(state)
+                if sections != self._load_sections(workspace_path):
+                    self._write_json(workspace_path / "state.json", sections)
+                    self._sections[workspace_id] = copy.deepcopy(sections)
+                    changed = True
+
+                user_meta = state.get("metadata") or {}
+                for key in ("name", "description"):
+                    if key in user_meta and metadata.get(key) != user_meta[key]:
+                        metadata[key] = user_meta[key]
+                        changed = True
+
+                if changed or metadata.get("message_count") != history.count:
+                    metadata["last_modified"] = datetime.now().isoformat()
+                    metadata["message_count"] = history.count
+                    metadata["history_revision"] = history.revision
+                    self._write_json(workspace_path / "metadata.json", metadata)
 
             logger.info("Workspace '%s' sauvegarde avec succes", workspace_id)
             return True
@@ -192,12 +222,21 @@ class SessionManager:
             )
             return False
 
-    def load_workspace(self, workspace_id: str) -> Optional[dict]:
+    def load_workspace(
+        self,
+        workspace_id: str,
+        with_history: bool = True,
+        history_limit: Optional[int] = None,
+    ) -> Optional[dict]:
         """
-        Charge l'etat complet d'un workspace depuis le disque.
+        Charge l'etat d'un workspace depuis le disque.
 
         Args:
             workspace_id: Identifiant du workspace a charger
+            with_history: False pour ne charger que les sections et les
+                metadonnees (pas de cle conversation_history)
+            history_limit: Nombre de derniers messages a charger (None : tous) ;
+                l'index du premier est alors dans history_offset
 
         Returns:
             Dictionnaire de l'etat du workspace, ou None si introuvable/corrompu
@@ -210,18 +249,61 @@ class SessionManager:
             )
             return None
 
-        with self._lock:
-            state = self._read_json(workspace_path / "state.json")
-
-        if state is None:
+        try:
+            with self._lock:
+                metadata = self._read_json(workspace_path / "metadata.json") or {}
+                if with_history:
+                    history = self._history(workspace_path)
+                    if history_limit is None:
+                        messages = history.messages()
+                    else:
+                        offset = max(0, history.count - max(0, history_limit))
+                        messages = history.messages(offset)
+                state = copy.deepcopy(self._load_sections(workspace_path))
+        except ValueError as exc:
             logger.error(
-                "Etat corrompu pour le workspace '%s'", workspace_id
+                "Etat corrompu pour le workspace '%s': %s", workspace_id, exc
             )
             return None
 
+        state["metadata"] = metadata
+        if with_history:
+            state["conversation_history"] = messages
+            if history_limit is not None:
+                state["history_offset"] = offset
+
         logger.info("Workspace '%s' charge avec succes", workspace_id)
         return state
 
+    def load_history(
+        self,
+        workspace_id: str,
+        start: int = 0,
+        limit: Optional[int] = None,
+    ) -> Optional[List[dict]]:
+        """
+        Charge une page de l'historique de conversation d'un workspace.
+
+        Args:
+            workspace_id: Identifiant du workspace
+            start: Index du premier message (negatif : compte depuis la fin)
+            limit: Nombre maximal de messages (None : jusqu'a la fin)
+
+        Returns:
+            Liste des messages, ou None si le workspace est introuvable/corrompu
+        """
+        workspace_path = self._workspaces_dir / workspace_id
+        if not workspace_path.is_dir():
+            return None
+        try:
+            with self._lock:
+                return self._history(workspace_path).messages(start, limit)
+        except ValueError as exc:
+            logger.error(
+                "Historique corrompu pour le workspace '%s': %s", workspace_id, exc
+            )
+            return None
+
     def list_workspaces(self) -> List[dict]:
         """
         Liste tous les workspaces disponibles avec leurs informations resumees.
@@ -256,6 +338,7 @@ class SessionManager:
                         "description": metadata.get("description", ""),
                         "last_modified": metadata.get("last_modified", ""),
                         "message_count": metadata.get("message_count", 0),
+                        "history_revision": metadata.get("history_revision", 0),
                     }
                 )
 
@@ -283,6 +366,8 @@ class SessionManager:
         try:
             with self._lock:
                 shutil.rmtree(workspace_path)
+                self._histories.pop(workspace_id, None)
+                self._sections.pop(workspace_id, None)
 
                 if self._current_workspace_id == workspace_id:
                     self._current_workspace_id = None
@@ -334,12 +419,6 @@ class SessionManager:
                 metadata["last_modified"] = datetime.now().isoformat()
                 self._write_json(workspace_path / "metadata.json", metadata)
 
-                state = self._read_json(workspace_path / "state.json")
-                if state and "metadata" in state:
-                    state["metadata"]["name"] = new_name.strip()
-                    state["metadata"]["last_modified"] = metadata["last_modified"]
-                    self._write_json(workspace_path / "state.json", state)
-
             logger.info(
                 "Workspace '%s' renomme: '%s' -> '%s'",
                 workspace_id,
@@ -414,6 +493,63 @@ class SessionManager:
     # Methodes internes
     # ------------------------------------------------------------------
 
+    def _history(self, workspace_path: Path) -> WorkspaceHistory:
+        """
+        Historique d'un workspace, lu une fois puis garde en memoire.
+
+        Migre un state.json de l'ancien format : l'historique passe dans un
+        snapshot, puis state.json est reecrit sans lui. Un crash entre les
+        deux est sans effet : le snapshot fait foi des qu'il existe.
+
+        Raises:
+            ValueError: Si l'historique (ou l'ancien state.json) est illisible
+        """
+        workspace_id = workspace_path.name
+        history = self._histories.get(workspace_id)
+        if history is not None:
+            return history
+
+        history = WorkspaceHistory(workspace_path, self._compact_every)
+        if WorkspaceHistory.exists(workspace_path):
+            history.load()
+        else:
+            legacy: Dict[str, Any] = {}
+            if (workspace_path / "state.json").exists():
+                legacy = self._read_json(workspace_path / "state.json")
+                if legacy is None:
+                    raise ValueError("state.json illisible")
+            messages = legacy.get("conversation_history", legacy.get("history", []))
+            history.write_snapshot(messages if isinstance(messages, list) else [])
+            sections = self._extract_sections(legacy)
+            self._write_json(workspace_path / "state.json", sections)
+            self._sections[workspace_id] = sections
+            logger.info(
+                "Workspace '%s' migre vers l'historique journalise (%d messages)",
+                workspace_id, history.count,
+            )
+        self._histories[workspace_id] = history
+        return history
+
+    def _load_sections(self, workspace_path: Path) -> Dict[str, Any]:
+        """Sections de state.json (hors historique), gardees en memoire."""
+        workspace_id = workspace_path.name
+        sections = self._sections.get(workspace_id)
+        if sections is None:
+            raw = self._read_json(workspace_path / "state.json")
+            if raw is None and (workspace_path / "state.json").exists():
+                raise ValueError("state.json illisible")
+            sections = self._extract_sections(raw or {})
+            self._sections[workspace_id] = sections
+        return sections
+
+    @staticmethod
+    def _extract_sections(state: Dict[str, Any]) -> Dict[str, Any]:
+        """Sections de state.json tirees d'un etat (valeurs par defaut si absentes)."""
+        return {
+            key: copy.deepcopy(state.get(key, default))
+            for key, default in _STATE_SECTIONS.items()
+        }
+
     @staticmethod
     def _write_json(path: Path, data: Dict[str, Any]) -> None:
         """
@@ -0,0 +1,105 @@
+"""
+Exécution des appels d'outils d'un même message du modèle.
+
+Quand Ollama renvoie plusieurs tool_calls dans une réponse, ChatOrchestrator
+et LocalLLM les exécutaient l'un après l'autre, y compris des recherches
+indépendantes (web_search, search_memory, search_codebase, read_local_file).
+run_tool_calls les répartit sur un pool de threads partagé :
+
+  - les appels consécutifs à des outils en lecture seule (MCPManager.is_read_only)
+    s'exécutent en parallèle ;
+  - un outil qui modifie quelque chose (write_local_file, move_local_file,
+    outils MCP externes…) attend la fin des appels précédents et s'exécute
+    seul, dans l'ordre du message ;
+  - les résultats sont rendus dans l'ordre des appels.
+
+Parallélisme maximal : llm.local.tool_concurrency (4 par défaut, 1 = série).
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from core.admission import run_in_context
+from core.config import get_config
+from utils.logger import setup_logger
+
+logger = setup_logger("tool_dispatch")
+
+_DEFAULT_CONCURRENCY = 4
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(size: int) -> ThreadPoolExecutor:
+    """Pool partagé par le processus (recréé si la taille configurée change)."""
+    global _pool, _pool_size  # pylint: disable=global-statement
+    with _pool_lock:
+        if _pool is None or _pool_size != size:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix="tool-call")
+            _pool_size = size
+        return _pool
+
+
+def _batches(
+    calls: Sequence[Tuple[str, Dict[str, Any]]],
+    is_read_only: Optional[Callable[[str], bool]],
+) -> List[List[int]]:
+    """Indices des appels groupés : lectures consécutives ensemble, écritures seules."""
+    batches: List[Tuple[bool, List[int]]] = []
+    for index, (name, _arguments) in enumerate(calls):
+        parallel = bool(is_read_only and is_read_only(name))
+        if parallel and batches and batches[-1][0]:
+            batches[-1][1].append(index)
+        else:
+            batches.append((parallel, [index]))
+    return [indices for _parallel, indices in batches]
+
+
+def run_tool_calls(
+    calls: Sequence[Tuple[str, Dict[str, Any]]],
+    tool_executor: Callable[[str, Dict[str, Any]], Any],
+    is_read_only: Optional[Callable[[str], bool]] = None,
+    is_interrupted: Optional[Callable[[], bool]] = None,
+    max_workers: Optional[int] = None,
+) -> List[Any]:
+    """
+    Exécute calls [(nom, arguments), ...] et retourne leurs résultats dans
+    le même ordre. Une exception levée par un outil est retournée à sa place
+    (l'appelant la formate) ; les appels non lancés après une interruption
+    valent None.
+
+    Sans is_read_only, tous les appels sont sérialisés (comportement historique).
+    """
+    if max_workers is None:
+        max_workers = int(get_config().get("llm.local.tool_concurrency", _DEFAULT_CONCURRENCY))
+    max_workers = max(1, max_workers)
+
+    def _call(index: int) -> Any:
+        name, arguments = calls[index]
+        try:
+            return tool_executor(name, arguments)
+        except Exception as exc:  # pylint: disable=broad-except
+            return exc
+
+    results: List[Any] = [None] * len(calls)
+    for indices in _batches(calls, is_read_only if max_workers > 1 else None):
+        if is_interrupted and is_interrupted():
+            break
+        if len(indices) == 1:
+            results[indices[0]] = _call(indices[0])
+            continue
+        logger.info(
+            "%d appels d'outils en parallèle : %s",
+            len(indices), ", ".join(calls[i][0] for i in indices),
+        )
+        pool = _get_pool(max_workers)
+        call = run_in_context(_call)
+        futures = [(i, pool.submit(call, i)) for i in indices]
+        for i, future in futures:
+            results[i] = future.result()
+    return results
@@ -0,0 +1,132 @@
+"""
+Lecture incrémentale d'une réponse /api/chat streamée quand des outils sont
+proposés au modèle.
+
+Le tour « avec outils » était soit non-streamé (LocalLLM attendait la fin de
+la génération pour lire tool_calls), soit mis en tampon sur 120 caractères
+(ChatOrchestrator) avant de décider. ToolCallStreamParser décide dès les
+premiers caractères significatifs :
+
+  - texte naturel (y compris un bloc de code ```python, un lien [Titre](URL))
+    → transmis immédiatement à on_token, token par token ;
+  - début d'objet JSON ({, [{, ```json {) → retenu : c'est peut-être un appel
+    d'outil écrit en texte (LocalLLM.parse_text_tool_call). Si aucune clé
+    d'appel (« name », « arguments »…) n'apparaît dans les premiers
+    hold_limit caractères, le contenu retenu est libéré et streamé ;
+  - tool_calls structurés dans un chunk → collectés, plus rien n'est
+    transmis.
+
+En fin de flux, l'appelant examine le contenu retenu (streamed=False) : appel
+d'outil textuel, ou réponse à transmettre d'un bloc. Le modèle n'est jamais
+rappelé pour obtenir la réponse d'un tour sans outil.
+"""
+
+import json
+import re
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+_TEXT = "text"
+_HOLD = "hold"
+# Caractères retenus au plus sans clé d'appel d'outil avant de streamer
+_DEFAULT_HOLD_LIMIT = 400
+
+_FENCE = re.compile(r"```(\w*)")
+_TOOL_KEY = re.compile(r'"(?:name|tool|function|arguments|parameters)"\s*:')
+
+
+def classify_prefix(text: str) -> Optional[str]:
+    """
+    Nature du début d'une réponse : "text", "hold" (appel d'outil possible)
+    ou None tant que les caractères reçus ne suffisent pas à trancher.
+    """
+    stripped = text.lstrip()
+    if stripped.startswith("```"):
+        fence = _FENCE.match(stripped)
+        rest = stripped[fence.end():]
+        if not rest:
+            return None
+        if fence.group(1).lower() not in ("", "json"):
+            return _TEXT
+        stripped = rest.lstrip()
+    elif stripped and "```".startswith(stripped):
+        return None
+    if not stripped:
+        return None
+    if stripped[0] == "{":
+        return _HOLD
+    if stripped[0] == "[":
+        inner = stripped[1:].lstrip()
+        if not inner:
+            return None
+        return _HOLD if inner[0] == "{" else _TEXT
+    return _TEXT
+
+
+def iter_chunks(lines: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    """Chunks JSON d'un flux Ollama (lignes vides ou illisibles ignorées)."""
+    for raw_line in lines:
+        if not raw_line:
+            continue
+        try:
+            yield json.loads(raw_line)
+        except json.JSONDecodeError:
+            continue
+
+
+class ToolCallStreamParser:
+    """Tri, au fil du flux, entre réponse en texte et appel d'outil."""
+
+    def __init__(
+        self,
+        on_token: Optional[Callable[[str], Any]] = None,
+        hold_limit: int = _DEFAULT_HOLD_LIMIT,
+    ) -> None:
+        """
+        Args:
+            on_token: reçoit les tokens de texte (un retour False arrête le flux).
+            hold_limit: caractères retenus au plus sans clé d'appel d'outil.
+        """
+        self._on_token = on_token
+        self._hold_limit = hold_limit
+        self._state: Optional[str] = None
+        self._pending = ""
+        self.content = ""
+        self.tool_calls: List[Dict] = []
+        self.streamed = False
+        self.stopped = False
+
+    def feed(self, message: Dict[str, Any]) -> bool:
+        """
+        Traite le champ « message » d'un chunk.
+
+        Returns:
+            False si on_token a demandé l'arrêt du flux.
+        """
+        calls = message.get("tool_calls")
+        if calls:
+            self.tool_calls.extend(calls)
+        token = message.get("content") or ""
+        if not token or self.stopped:
+            return not self.stopped
+        self.content += token
+        if self.tool_calls:
+            return True
+
+        if self._state == _TEXT:
+            return self._emit(token)
+        self._pending += token
+        if self._state is None:
+            self._state = classify_prefix(self._pending)
+        elif (len(self._pending) >= self._hold_limit
+              and not _TOOL_KEY.search(self._pending)):
+            self._state = _TEXT
+        if self._state == _TEXT:
+            pending, self._pending = self._pending, ""
+            return self._emit(pending)
+        return True
+
+    def _emit(self, text: str) -> bool:
+        self.streamed = True
+        if self._on_token is not None and self._on_token(text) is False:
+            self.stopped = True
+        return not self.stopped
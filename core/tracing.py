@@ -0,0 +1,321 @@
+"""
+Traçage des requêtes de bout en bout (spans imbriqués).
+
+Un tour de 12 secondes se décompose en routage, sources de contexte
+(base de connaissances, dossier projet, documents), rerank, appels au modèle
+(attente d'admission, évaluation du prompt, premier token, débit) et
+exécutions d'outils. Chaque étape ouvre un span :
+
+    with span("context.codebase", kind="retrieval") as s:
+        ...
+        s.set(snippets=len(snippets))
+
+Le span courant est porté par un ContextVar : un span ouvert dans un thread
+du pool d'outils ou de collecte du contexte (qui copient le contexte, voir
+core/admission.run_in_context) est rattaché au span de la requête.
+
+Les appels /api/chat et /api/generate du client Ollama partagé ouvrent leur
+propre span « llm » : attente d'un créneau, délai avant le premier chunk
+(TTFT), prompt_eval / eval renvoyés par Ollama et tokens/s.
+
+Chaque span terminé est :
+  - écrit en une ligne JSON dans un fichier tournant (tracing.path,
+    tracing.max_bytes, tracing.backup_count) ;
+  - agrégé par nom (percentiles p50 / p90 / p99 sur les derniers appels),
+    exposé par get_stats() (/api/stats, clé « tracing ») ;
+  - transmis aux écouteurs (add_listener), p. ex. ResourceMonitor.
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from core.config import get_config
+from utils.logger import setup_logger
+
+logger = setup_logger("tracing")
+
+_DEFAULT_PATH = "logs/traces.jsonl"
+_DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+_DEFAULT_BACKUP_COUNT = 5
+# Durées conservées par nom de span pour les percentiles
+_DEFAULT_WINDOW = 500
+# Mesures des spans « llm » agrégées en plus de la durée
+_LLM_METRICS = ("queue_wait_ms", "ttft_ms", "prompt_eval_ms", "tokens_per_sec")
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+@dataclass
+class Span:
+    """Étape chronométrée d'une requête."""
+
+    name: str
+    kind: str = "internal"
+    trace_id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
+    span_id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
+    parent_id: Optional[str] = None
+    started_at: float = field(default_factory=time.time)
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    status: str = "ok"
+    duration_ms: float = 0.0
+    _start: float = field(default_factory=time.perf_counter, repr=False)
+
+    def set(self, **attributes: Any) -> "Span":
+        """Ajoute des attributs au span."""
+        self.attributes.update(attributes)
+        return self
+
+    def elapsed_ms(self) -> float:
+        """Temps écoulé depuis l'ouverture du span."""
+        return (time.perf_counter() - self._start) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "started_at": round(self.started_at, 6),
+            "duration_ms": round(self.duration_ms, 2),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+def current_span() -> Optional[Span]:
+    """Span ouvert dans le contexte courant (None hors requête tracée)."""
+    return _current_span.get()
+
+
+def annotate(**attributes: Any) -> None:
+    """Ajoute des attributs au span courant (sans effet hors requête tracée)."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    """p50 / p90 / p99 (rang le plus proche) et maximum."""
+    ordered = sorted(values)
+    last = len(ordered) - 1
+
+    def rank(q: float) -> float:
+        return round(ordered[min(last, int(q * len(ordered)))], 2)
+
+    return {"p50": rank(0.5), "p90": rank(0.9), "p99": rank(0.99), "max": round(ordered[-1], 2)}
+
+
+def llm_metrics(body: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Compteurs du dernier chunk Ollama (durées en ns) convertis en attributs."""
+    body = body or {}
+    metrics: Dict[str, Any] = {}
+    try:
+        if body.get("prompt_eval_count") is not None:
+            metrics["prompt_eval_count"] = int(body["prompt_eval_count"])
+        if body.get("prompt_eval_duration"):
+            metrics["prompt_eval_ms"] = round(float(body["prompt_eval_duration"]) / 1e6, 1)
+        if body.get("load_duration"):
+            metrics["load_ms"] = round(float(body["load_duration"]) / 1e6, 1)
+        eval_count = int(body.get("eval_count") or 0)
+        eval_ns = float(body.get("eval_duration") or 0)
+    except (TypeError, ValueError):
+        return metrics
+    if eval_count:
+        metrics["eval_count"] = eval_count
+    if eval_ns:
+        metrics["eval_ms"] = round(eval_ns / 1e6, 1)
+        metrics["tokens_per_sec"] = round(eval_count / (eval_ns / 1e9), 2)
+    return metrics
+
+
+class Tracer:
+    """Collecte des spans : fichier JSONL tournant, percentiles, écouteurs."""
+
+    def __init__(
+        self,
+        path: Optional[str] = _DEFAULT_PATH,
+        max_bytes: int = _DEFAULT_MAX_BYTES,
+        backup_count: int = _DEFAULT_BACKUP_COUNT,
+        window: int = _DEFAULT_WINDOW,
+    ) -> None:
+        """
+        Args:
+            path: fichier JSONL des spans (None : aucun fichier).
+            max_bytes: taille à partir de laquelle le fichier tourne.
+            backup_count: nombre d'anciens fichiers conservés.
+            window: nombre de durées conservées par nom pour les percentiles.
+        """
+        self._lock = threading.Lock()
+        self._window = max(1, int(window))
+        self._durations: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._llm: Dict[str, Deque[float]] = {
+            metric: deque(maxlen=self._window) for metric in _LLM_METRICS
+        }
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._handler: Optional[RotatingFileHandler] = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._handler = RotatingFileHandler(
+                path, maxBytes=int(max_bytes), backupCount=int(backup_count),
+                encoding="utf-8", delay=True,
+            )
+            self._handler.setFormatter(logging.Formatter("%(message)s"))
+
+    # ------------------------------------------------------------------
+    # Spans
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def start_span(name: str, kind: str = "internal", **attributes: Any) -> Span:
+        """Ouvre un span rattaché au span courant (sans le rendre courant)."""
+        parent = _current_span.get()
+        if parent is None:
+            return Span(name=name, kind=kind, attributes=attributes)
+        return Span(
+            name=name, kind=kind, trace_id=parent.trace_id,
+            parent_id=parent.span_id, attributes=attributes,
+        )
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None) -> None:
+        """Termine le span : fichier, agrégats et écouteurs."""
+        span.duration_ms = span.elapsed_ms()
+        if error is not None:
+            span.status = "error"
+            span.attributes.setdefault("error", type(error).__name__)
+        record = span.to_dict()
+
+        with self._lock:
+            durations = self._durations.get(span.name)
+            if durations is None:
+                durations = self._durations[span.name] = deque(maxlen=self._window)
+                self._counts[span.name] = {"count": 0, "errors": 0}
+            durations.append(span.duration_ms)
+            self._counts[span.name]["count"] += 1
+            self._counts[span.name]["errors"] += int(span.status != "ok")
+            if span.kind == "llm":
+                for metric in _LLM_METRICS:
+                    value = span.attributes.get(metric)
+                    if isinstance(value, (int, float)):
+                        self._llm[metric].append(float(value))
+            listeners = list(self._listeners)
+
+        if self._handler is not None:
+            try:
+                self._handler.handle(logging.makeLogRecord(
+                    {"msg": json.dumps(record, ensure_ascii=False, default=str)}
+                ))
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.warning("Span non écrit : %s", exc)
+        for listener in listeners:
+            try:
+                listener(record)
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.warning("Écouteur de spans en erreur : %s", exc)
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", **attributes: Any) -> Iterator[Span]:
+        """Span courant le temps du bloc (statut « error » si le bloc lève)."""
+        current = self.start_span(name, kind, **attributes)
+        token = _current_span.set(current)
+        try:
+            yield current
+        except BaseException as exc:
+            _current_span.reset(token)
+            self.end_span(current, error=exc)
+            raise
+        _current_span.reset(token)
+        self.end_span(current)
+
+    # ------------------------------------------------------------------
+    # Écouteurs / statistiques
+    # ------------------------------------------------------------------
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        """Appelé avec chaque span terminé (dictionnaire de to_dict())."""
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Percentiles de durée par nom de span, et mesures des appels au modèle."""
+        with self._lock:
+            spans = {
+                name: {**self._counts[name], **_percentiles(list(durations))}
+                for name, durations in sorted(self._durations.items())
+            }
+            llm = {
+                metric: _percentiles(list(values))
+                for metric, values in self._llm.items() if values
+            }
+        return {"spans": spans, "llm": llm}
+
+    def close(self) -> None:
+        """Ferme le fichier des spans."""
+        if self._handler is not None:
+            self._handler.close()
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Traceur partagé par le processus."""
+    global _tracer  # pylint: disable=global-statement
+    with _tracer_lock:
+        if _tracer is None:
+            config = get_config()
+            enabled = bool(config.get("tracing.enabled", True))
+            _tracer = Tracer(
+                path=config.get("tracing.path", _DEFAULT_PATH) if enabled else None,
+                max_bytes=int(config.get("tracing.max_bytes", _DEFAULT_MAX_BYTES)),
+                backup_count=int(config.get("tracing.backup_count", _DEFAULT_BACKUP_COUNT)),
+                window=int(config.get("tracing.window", _DEFAULT_WINDOW)),
+            )
+        return _tracer
+
+
+def span(name: str, kind: str = "internal", **attributes: Any):
+    """Raccourci : span du traceur partagé (gestionnaire de contexte)."""
+    return get_tracer().span(name, kind, **attributes)
+
+
+def traced(name: str, kind: str = "internal") -> Callable:
+    """Décorateur : un span par appel de la fonction (synchrone ou coroutine)."""
+
+    def decorate(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def run_async(*args, **kwargs):
+                with span(name, kind):
+                    return await fn(*args, **kwargs)
+            return run_async
+
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            with span(name, kind):
+                return fn(*args, **kwargs)
+        return run
+
+    return decorate
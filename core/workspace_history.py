@@ -0,0 +1,227 @@
+"""
+Historique de conversation d'un workspace : snapshot compacte + journal en
+ajout seul.
+
+state.json contenait tout l'historique et etait reecrit en entier a chaque
+sauvegarde (plusieurs Mo pour 5 000 messages). L'historique vit maintenant
+dans deux fichiers du dossier du workspace :
+
+  history.snapshot.json  {"format": 2, "generation": g, "revision": r,
+                          "messages": [...]}  (ecriture atomique)
+  history.journal.jsonl  une ligne par message ajoute depuis le snapshot :
+                         {"g": g, "i": index, "m": message}
+
+Sauvegarder un historique qui prolonge celui du disque n'ajoute au journal
+que les nouveaux messages (un write + fsync). Un historique modifie ailleurs
+qu'a la fin (edition, suppression, troncature) est reecrit dans un nouveau
+snapshot, et la revision augmente. Le journal est compacte dans le snapshot
+tous les compact_every messages (la revision ne change pas).
+
+Reprise apres crash :
+  - ligne de journal tronquee (ecriture interrompue) : ignoree, et le
+    journal est coupe apres la derniere ligne valide ;
+  - lignes d'une generation anterieure (crash entre l'ecriture d'un
+    snapshot et la remise a zero du journal) : ignorees, elles sont deja
+    dans le snapshot.
+"""
+
+import copy
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils.logger import setup_logger
+
+logger = setup_logger("workspace_history")
+
+FORMAT_VERSION = 2
+SNAPSHOT_FILE = "history.snapshot.json"
+JOURNAL_FILE = "history.journal.jsonl"
+# Messages journalises avant compaction dans le snapshot
+DEFAULT_COMPACT_EVERY = 500
+
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, default=str)
+
+
+class WorkspaceHistory:
+    """
+    Historique persistant d'un workspace, garde en memoire une fois lu.
+
+    Non thread-safe : SessionManager serialise les acces avec son verrou.
+    """
+
+    def __init__(self, directory: Path, compact_every: int = DEFAULT_COMPACT_EVERY) -> None:
+        """
+        Args:
+            directory: Dossier du workspace
+            compact_every: Messages journalises avant compaction dans le snapshot
+        """
+        self._snapshot_path = Path(directory) / SNAPSHOT_FILE
+        self._journal_path = Path(directory) / JOURNAL_FILE
+        self._compact_every = max(1, int(compact_every))
+        self.generation = 0
+        self.revision = 0
+        self._messages: List[Dict[str, Any]] = []
+        self._journaled = 0
+
+    @classmethod
+    def exists(cls, directory: Path) -> bool:
+        """True si le workspace a deja ete migre au format journalise."""
+        return (Path(directory) / SNAPSHOT_FILE).is_file()
+
+    @property
+    def count(self) -> int:
+        """Nombre de messages de l'historique."""
+        return len(self._messages)
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+
+    def load(self) -> None:
+        """
+        Lit le snapshot puis rejoue le journal.
+
+        Raises:
+            ValueError: Si le snapshot est illisible
+        """
+        try:
+            with open(self._snapshot_path, "r", encoding="utf-8") as fh:
+                snapshot = json.load(fh)
+        except (json.JSONDecodeError, OSError) as exc:
+            raise ValueError(f"Snapshot illisible: {exc}") from exc
+        if not isinstance(snapshot, dict) or not isinstance(snapshot.get("messages"), list):
+            raise ValueError("Snapshot sans liste de messages")
+        self.generation = int(snapshot.get("generation", 0))
+        self.revision = int(snapshot.get("revision", 0))
+        self._messages = snapshot["messages"]
+        self._journaled = 0
+        self._replay_journal()
+
+    def _replay_journal(self) -> None:
+        if not self._journal_path.is_file():
+            return
+        valid_end = 0
+        torn = False
+        with open(self._journal_path, "rb") as fh:
+            for raw in fh:
+                if not raw.endswith(b"\n"):
+                    torn = True
+                    break
+                try:
+                    record = json.loads(raw)
+                    generation, index, message = record["g"], record["i"], record["m"]
+                except (ValueError, KeyError, TypeError):
+                    torn = True
+                    break
+                valid_end += len(raw)
+                if generation != self.generation or index < len(self._messages):
+                    continue  # deja dans le snapshot
+                if index > len(self._messages):
+                    torn = True
+                    break
+                self._messages.append(message)
+                self._journaled += 1
+        if torn:
+            logger.warning(
+                "Journal '%s' tronque apres %d octets valides (ecriture interrompue)",
+                self._journal_path, valid_end,
+            )
+            with open(self._journal_path, "r+b") as fh:
+                fh.truncate(valid_end)
+
+    def messages(self, start: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Copie d'une page de l'historique.
+
+        Args:
+            start: Index du premier message (negatif : compte depuis la fin)
+            limit: Nombre maximal de messages (None : jusqu'a la fin)
+
+        Returns:
+            Messages copies (l'appelant peut les modifier)
+        """
+        if start < 0:
+            start = max(0, len(self._messages) + start)
+        end = None if limit is None else start + max(0, limit)
+        return copy.deepcopy(self._messages[start:end])
+
+    # ------------------------------------------------------------------
+    # Ecriture
+    # ------------------------------------------------------------------
+
+    def save(self, history: List[Dict[str, Any]]) -> str:
+        """
+        Rend l'historique persistant au moindre cout.
+
+        Args:
+            history: Historique complet courant
+
+        Returns:
+            "unchanged", "appended" (journal ou compaction) ou "rewritten"
+        """
+        stored = len(self._messages)
+        if len(history) >= stored and history[:stored] == self._messages:
+            added = copy.deepcopy(history[stored:])
+            if not added:
+                return "unchanged"
+            if self._journaled + len(added) >= self._compact_every:
+                self.write_snapshot(self._messages + added)
+            else:
+                self._append(added)
+            return "appended"
+        self.revision += 1
+        try:
+            self.write_snapshot(copy.deepcopy(history))
+        except Exception:
+            self.revision -= 1
+            raise
+        return "rewritten"
+
+    def _append(self, added: List[Dict[str, Any]]) -> None:
+        base = len(self._messages)
+        lines = "".join(
+            _dumps({"g": self.generation, "i": base + offset, "m": message}) + "\n"
+            for offset, message in enumerate(added)
+        )
+        with open(self._journal_path, "ab") as fh:
+            size = fh.tell()
+            try:
+                fh.write(lines.encode("utf-8"))
+                fh.flush()
+                os.fsync(fh.fileno())
+            except Exception:
+                # Pas de ligne partielle devant les ajouts suivants
+                fh.truncate(size)
+                raise
+        self._messages.extend(added)
+        self._journaled += len(added)
+
+    def write_snapshot(self, messages: List[Dict[str, Any]]) -> None:
+        """Ecrit un snapshot (nouvelle generation) puis vide le journal."""
+        generation = self.generation + 1
+        tmp_path = self._snapshot_path.with_suffix(".json.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                fh.write(_dumps({
+                    "format": FORMAT_VERSION,
+                    "generation": generation,
+                    "revision": self.revision,
+                    "messages": messages,
+                }))
+                fh.flush()
+                os.fsync(fh.fileno())
+            tmp_path.replace(self._snapshot_path)
+        except Exception:
+            if tmp_path.exists():
+                tmp_path.unlink()
+            raise
+        # Un crash ici laisse des lignes de l'ancienne generation, ignorees.
+        with open(self._journal_path, "w", encoding="utf-8"):
+            pass
+        self.generation = generation
+        self._messages = messages
+        self._journaled = 0
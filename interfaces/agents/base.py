@@ -7,6 +7,7 @@ from interfaces.resource_monitor import ResourceMonitor
 from interfaces.workflow_canvas import WorkflowCanvas  # noqa: F401  (réexport utile)
 from core.agent_orchestrator import AgentOrchestrator
 from core.config import get_default_model as _get_default_model
+from core.tracing import get_tracer
 from models.local_llm import LocalLLM
 
 
@@ -85,6 +86,8 @@ class BaseMixin:
 
         # Resource monitor
         self.resource_monitor = ResourceMonitor(interval=3.0)
+        # Durée et débit de chaque appel au modèle, mesurés par le traceur
+        get_tracer().add_listener(self.resource_monitor.record_span)
         self._resource_bars: dict = {}
         self._sparkline_canvases: dict = {}
         self._resource_labels: dict = {}
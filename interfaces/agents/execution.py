@@ -169,14 +169,11 @@ class ExecutionMixin:
             self._active_section = section
 
             # Exécuter avec streaming
-            t_start = time.time()
             result = self.orchestrator.execute_single_task_stream(
                 agent_type=agent_type,
                 task=task,
                 on_token=self._on_token_received
             )
-            elapsed_ms = (time.time() - t_start) * 1000
-            self.resource_monitor.update_inference(elapsed_ms, 0)
 
             if self.is_interrupted:
                 self._finish_section(section, success=False)
@@ -386,14 +383,11 @@ class ExecutionMixin:
                                 self._append_to_section(_sec, token)
                                 return not self.is_interrupted
 
-                            t_start = time.time()
                             result = self.orchestrator.execute_single_task_stream(
                                 agent_type=nd["agent_type"],
                                 task=agent_task,
                                 on_token=stream_token,
                             )
-                            elapsed = (time.time() - t_start) * 1000
-                            self.resource_monitor.update_inference(elapsed, 0)
 
                             with shared_lock:
                                 shared_results[nid] = result
@@ -461,14 +455,11 @@ class ExecutionMixin:
                                     f"Tâche: {task}"
                                 )
 
-                    t_start = time.time()
                     result = self.orchestrator.execute_single_task_stream(
                         agent_type=nd["agent_type"],
                         task=agent_task,
                         on_token=self._on_token_received,
                     )
-                    elapsed = (time.time() - t_start) * 1000
-                    self.resource_monitor.update_inference(elapsed, 0)
 
                     total_count += 1
                     if result.get("success"):
@@ -493,14 +484,11 @@ class ExecutionMixin:
                 )
                 self._active_section = sec
                 self._set_canvas_node_status(nid, "running")
-                t_start = time.time()
                 result = self.orchestrator.execute_single_task_stream(
                     agent_type=nd["agent_type"],
                     task=task,
                     on_token=self._on_token_received,
                 )
-                elapsed = (time.time() - t_start) * 1000
-                self.resource_monitor.update_inference(elapsed, 0)
                 total_count += 1
                 ok = result.get("success", False)
                 if ok:
@@ -16,6 +16,7 @@ from tkinter import messagebox
 import customtkinter as _ctk
 from PIL import ImageTk
 
+from core.admission import admission_context
 from core.ai_engine import AIEngine
 from core.config import Config
 from core.scheduler import get_scheduler
@@ -23,6 +24,14 @@ from relay.relay_server import RelayServer
 from utils.file_processor import FileProcessor
 from utils.logger import setup_logger
 
+from .markdown_stream import MarkdownStreamTokenizer
+from .transcript import (
+    DEFAULT_MAX_MATERIALIZED,
+    DEFAULT_PAGE_SIZE,
+    RenderModelCache,
+    TranscriptWindow,
+)
+
 # Import des styles (uniquement ce qui est utilisé)
 try:
     from interfaces.modern_styles import (FONT_CONFIG, FONT_SIZES,
@@ -105,9 +114,21 @@ class BaseGUI:
         self.is_searching = False
         self.conversation_history = []
 
-        # ⚡ OPTIMISATION MÉMOIRE: Limiter le nombre de messages affichés
-        self.max_displayed_messages = 100  # Maximum de messages à garder dans l'UI
-        self._message_widgets = []  # Liste des widgets de messages pour nettoyage
+        # ⚡ OPTIMISATION MÉMOIRE: transcript virtualisé (cf. transcript.py) :
+        # seules les bulles proches de la vue existent en widgets
+        transcript_cfg = self.config.get("ui.transcript", {}) or {}
+        self.max_displayed_messages = int(
+            transcript_cfg.get("max_materialized", DEFAULT_MAX_MATERIALIZED)
+        )
+        self._transcript = TranscriptWindow(
+            page_size=int(transcript_cfg.get("page_size", DEFAULT_PAGE_SIZE)),
+            max_materialized=self.max_displayed_messages,
+        )
+        self._transcript_widgets = {}  # index d'historique -> container de bulle
+        self._transcript_spacers = {}  # cales "top" / "bottom"
+        self._transcript_check_id = None
+        self._render_models = RenderModelCache()
+        self._message_widgets = []  # Bulles matérialisées, dans l'ordre
         self._height_adjust_counter = 0  # Compteur pour optimiser update_idletasks
 
         # Attributs pour la génération de fichiers
@@ -183,6 +204,7 @@ class BaseGUI:
         self._streaming_widget = None  # Widget texte du streaming
         self._streaming_container = None  # Container du message streaming
         self._streaming_bubble_created = False  # Bulle déjà créée
+        self._markdown_stream = None  # Tokenizer Markdown alimenté par le thread de génération
 
         # Buttons for file actions
         self.file_plus_btn = None  # Bouton "+" menu fichiers (conversation)
@@ -265,6 +287,7 @@ class BaseGUI:
         self._image_gen_widget = None
 
         # Réserver la ligne dans l'historique (comme la génération de fichier)
+        self._transcript_follow_end()
         self.conversation_history.append(
             {
                 "text": "Génération de l'image en cours…",
@@ -288,6 +311,7 @@ class BaseGUI:
                     column=0, sticky="ew", pady=(0, 12),
                 )
                 msg_container.grid_columnconfigure(0, weight=1)
+                self._transcript_track(len(self.conversation_history) - 1, msg_container)
                 center_frame = self.create_frame(
                     msg_container, fg_color=self.colors["bg_chat"]
                 )
@@ -2166,6 +2190,7 @@ class BaseGUI:
             self._file_generation_widget = None
 
             # Ajouter un placeholder à l'historique IMMÉDIATEMENT pour réserver la ligne
+            self._transcript_follow_end()
             self.conversation_history.append(
                 {
                     "text": f"Création du fichier '{filename}' en cours...",
@@ -2189,6 +2214,9 @@ class BaseGUI:
                         pady=(0, 12),
                     )
                     msg_container.grid_columnconfigure(0, weight=1)
+                    self._transcript_track(
+                        len(self.conversation_history) - 1, msg_container
+                    )
 
                     # Frame de centrage
                     center_frame = self.create_frame(
@@ -2336,11 +2364,14 @@ class BaseGUI:
                             )
                         return interrupted
 
-                    result = loop.run_until_complete(
-                        self.ai_engine.process_query(
-                            user_text, is_interrupted_callback=check_interrupted
+                    with admission_context(
+                        "interactive", session_id="gui", is_interrupted=check_interrupted
+                    ):
+                        result = loop.run_until_complete(
+                            self.ai_engine.process_query(
+                                user_text, is_interrupted_callback=check_interrupted
+                            )
                         )
-                    )
                     loop.close()
 
                     # Arrêter l'animation de points
@@ -2725,11 +2756,16 @@ class BaseGUI:
             self._streaming_complete = False
             self._streaming_mode = True
             self._streaming_bubble_created = False
+            # Markdown découpé ici, hors du thread Tk (cf. markdown_stream.py)
+            markdown_stream = MarkdownStreamTokenizer()
+            self._markdown_stream = markdown_stream
 
             def on_token_received(token):
                 """Callback appelé pour chaque token reçu d'Ollama."""
                 if self.current_request_id != request_id or self.is_interrupted:
                     return False
+                # Avant le buffer : l'animation ne rattrape jamais le tokenizer
+                markdown_stream.feed(token)
                 self._streaming_buffer += token
                 self._streaming_buffer_original += token
                 if not self._streaming_bubble_created:
@@ -2797,6 +2833,8 @@ class BaseGUI:
 
                             self._streaming_buffer = stripped + "\n\n"
                             self._streaming_buffer_original = stripped_orig + "\n\n"
+                            markdown_stream.truncate(len(stripped_orig))
+                            markdown_stream.feed("\n\n")
 
                             # Sécuriser l'index d'animation si le texte vient d'être raccourci d'un tas d'espaces
                             diff = len(self._streaming_buffer) - old_len
@@ -2821,6 +2859,7 @@ class BaseGUI:
                         if old_len > 0 and self._streaming_buffer.endswith('\n'):
                             self._streaming_buffer = self._streaming_buffer.rstrip('\n')
                             self._streaming_buffer_original = self._streaming_buffer_original.rstrip('\n')
+                            markdown_stream.truncate(len(self._streaming_buffer_original))
                             # Sécuriser l'index
                             if hasattr(self, "typing_index") and self.typing_index > len(self._streaming_buffer):
                                 self.typing_index = len(self._streaming_buffer)
@@ -2856,16 +2895,27 @@ class BaseGUI:
             # Note : la génération d'image (texte → image) est interceptée en
             # amont par _handle_image_generation_ui() avec sa propre animation,
             # son bouton STOP et son affichage. Ce chemin ne la gère donc pas.
-            response = self.ai_engine.process_query_stream(
-                user_text,
-                on_token=on_token_received,
-                on_tool_call=on_tool_call,
-                on_thinking_token=on_thinking_token if _show_reasoning else None,
-                on_thinking_complete=on_thinking_complete if _show_reasoning else None,
-                image_base64=image_b64,
-                is_interrupted_callback=lambda: self.is_interrupted or self.current_request_id != request_id,
-                on_delete_confirm=on_delete_confirm,
-            )
+            # Classe d'admission des appels au modèle (core/admission.py) :
+            # message saisi dans la GUI = interactif, message du mobile = relay
+            def is_interrupted():
+                return self.is_interrupted or self.current_request_id != request_id
+
+            from_relay = getattr(self, "_current_message_from_relay", False)
+            with admission_context(
+                "relay" if from_relay else "interactive",
+                session_id="relay" if from_relay else "gui",
+                is_interrupted=is_interrupted,
+            ):
+                response = self.ai_engine.process_query_stream(
+                    user_text,
+                    on_token=on_token_received,
+                    on_tool_call=on_tool_call,
+                    on_thinking_token=on_thinking_token if _show_reasoning else None,
+                    on_thinking_complete=on_thinking_complete if _show_reasoning else None,
+                    image_base64=image_b64,
+                    is_interrupted_callback=is_interrupted,
+                    on_delete_confirm=on_delete_confirm,
+                )
 
             # Marquer le streaming comme terminé SEULEMENT si cette requête est
             # encore active. Un thread obsolète (request_id périmé) ne doit PAS
@@ -2880,6 +2930,7 @@ class BaseGUI:
                 # (fallback classique sans Ollama), l'afficher d'un bloc
                 if not self._streaming_bubble_created and response:
                     on_token_received(response)
+                markdown_stream.close()
             else:
                 print(
                     f"⏭ [STREAM] Requête obsolète {request_id} ignorée "
@@ -2966,6 +3017,7 @@ class BaseGUI:
             # Vider l'interface de chat
             for widget in self.chat_frame.winfo_children():
                 widget.destroy()
+            self._reset_transcript()
 
             # Effacer la mémoire de l'IA (conversation)
             if hasattr(self.ai_engine, "clear_conversation"):
@@ -1,7 +1,11 @@
 """Chat area and scrolling mixin for ModernAIGUI."""
 
 import tkinter as tk
+from datetime import datetime
 from tkinter import ttk
+from uuid import uuid4
+
+from .transcript import PLACEHOLDER_TYPES as _PLACEHOLDER_TYPES
 
 try:
     import customtkinter as ctk
@@ -11,6 +15,11 @@ except ImportError:
     CTK_AVAILABLE = False
     ctk = tk
 
+# Marge basse des bulles (pady de la grille), comptée dans les hauteurs mesurées
+_BUBBLE_PADY = 12
+# Fraction de la vue à partir de laquelle la page voisine est matérialisée
+_VIEWPORT_MARGIN = 0.15
+
 
 class ChatAreaMixin:
     """Conversation area and scrolling helpers."""
@@ -112,30 +121,271 @@ class ChatAreaMixin:
         except Exception as e:
             print(f"[DEBUG] Erreur réactivation scroll: {e}")
 
-    def _cleanup_old_messages(self):
-        """⚡ OPTIMISATION MÉMOIRE: Supprime les vieux messages pour limiter l'usage mémoire"""
+    # ── Transcript virtualisé (cf. interfaces/gui/transcript.py) ───────────
+
+    def _transcript_busy(self):
+        """True pendant une réponse : le mode instantané de add_message_bubble
+        réutilise l'état d'animation (typing_widget...), et les widgets du
+        direct (indicateurs, raisonnement) occupent le bas de la grille."""
+        return bool(
+            getattr(self, "typing_widget", None) is not None
+            or getattr(self, "_streaming_mode", False)
+            or getattr(self, "is_thinking", False)
+        )
+
+    def _render_transcript(self, history):
+        """Reconstruit la zone de chat depuis un historique complet.
+
+        Seuls les derniers messages sont matérialisés ; les autres le seront
+        au fil du scroll. Remplace la boucle add_message_bubble(instant=True)
+        du chargement de session et de `_rerender_all`.
+        """
         try:
-            if len(self._message_widgets) > self.max_displayed_messages:
-                # Calculer combien supprimer (garder les max_displayed_messages derniers)
-                num_to_remove = len(self._message_widgets) - self.max_displayed_messages
+            for widget in self.chat_frame.winfo_children():
+                widget.destroy()
+        except Exception as exc:
+            print(f"⚠️ [Transcript] Nettoyage du chat échoué : {exc}")
+        self._reset_transcript()
+        self.current_message_container = None
+        self.conversation_history = list(history)
+
+        last_user = next((m for m in reversed(history) if m.get("is_user")), None)
+        last_ai = next((m for m in reversed(history) if not m.get("is_user")), None)
+        if last_user is not None:
+            self._last_user_query = last_user.get("text", "")
+        if last_ai is not None:
+            self._last_ai_response = last_ai.get("text", "")
+
+        indices = self._transcript.reset(len(history))
+        self._transcript_materialize(indices, keep_current=False)
+        self._update_transcript_spacers()
+
+    def _reset_transcript(self):
+        """Oublie les bulles matérialisées (les widgets sont déjà détruits)."""
+        self._transcript_widgets = {}
+        self._transcript_spacers = {}
+        self._message_widgets = []
+        self._transcript.reset(0)
+
+    @staticmethod
+    def _history_entry(msg):
+        """Entrée de conversation_history reconstruite depuis un message
+        sauvegardé (session) ou conservé (changement de branche).
+
+        Returns:
+            L'entrée, ou None si le message n'a pas de texte à afficher
+        """
+        content = msg.get("text", msg.get("content", ""))
+        if not content:
+            return None
+        # `mid` est repropagé tel quel : les variantes d'édition y sont
+        # rattachées, le régénérer les détacherait.
+        return {
+            "text": content,
+            "is_user": msg.get("is_user", msg.get("role", "user") == "user"),
+            "timestamp": msg.get("timestamp") or datetime.now(),
+            "type": "image" if msg.get("type") == "image" else "text",
+            "attachments": list(msg.get("attachments") or []),
+            "image_path": msg.get("image_path"),
+            "mid": msg.get("mid") or uuid4().hex,
+        }
+
+    def _transcript_track(self, index, container):
+        """Enregistre la bulle créée en direct à la ligne `index` de la grille.
+
+        Remplace l'ancien `_cleanup_old_messages`, qui détruisait les vieilles
+        bulles ET tronquait conversation_history : la session sauvegardée
+        perdait alors ses premiers messages.
+        """
+        self._transcript_widgets[index] = container
+        released = self._transcript.trim(len(self.conversation_history), keep_end=True)
+        self._transcript_release(released)
+        self._sync_message_widgets()
+        if released:
+            self._update_transcript_spacers()
+
+    def _transcript_follow_end(self):
+        """À appeler avant d'ajouter un message en direct : si le bas de la
+        conversation a été libéré (lecture vers le haut), revient à la fin."""
+        window = self._transcript
+        if window.follows_end:
+            return
+        count = len(self.conversation_history)
+        self._transcript_release(range(*window.bounds(count)))
+        self._transcript_materialize(window.jump_to_end(count))
+        self._update_transcript_spacers()
+
+    def _transcript_reveal(self, index):
+        """Matérialise la page autour du message `index` (recherche)."""
+        window = self._transcript
+        count = len(self.conversation_history)
+        start, end = window.bounds(count)
+        if start <= index < end or not 0 <= index < count:
+            return
+        if self._transcript_busy():
+            return
+        self._transcript_release(range(start, end))
+        self._transcript_materialize(window.jump_to(index, count))
+        self._update_transcript_spacers()
+
+    def _transcript_materialize(self, indices, keep_current=True):
+        """Crée les bulles des messages `indices` (mode instantané)."""
+        saved = getattr(self, "current_message_container", None)
+        for index in indices:
+            if index in self._transcript_widgets:
+                continue
+            container = self._materialize_message(index)
+            if container is not None:
+                self._transcript_widgets[index] = container
+        if keep_current:
+            self.current_message_container = saved
+        self._sync_message_widgets()
+
+    def _materialize_message(self, index):
+        """Bulle d'un message de l'historique, ou None (placeholder, vide)."""
+        entry = self.conversation_history[index]
+        kind = entry.get("type")
+        try:
+            if kind == "image" and entry.get("image_path"):
+                try:
+                    return self._create_image_bubble(index, entry["image_path"])
+                except Exception as exc:
+                    # Image déplacée/supprimée : afficher sa légende texte
+                    print(f"⚠️ [Transcript] Image {entry['image_path']} : {exc}")
+            if kind in _PLACEHOLDER_TYPES or not entry.get("text"):
+                return None
+            return self._create_message_bubble(
+                index, instant=True, feedback_query=self._preceding_user_text(index)
+            )
+        except Exception as exc:
+            print(f"⚠️ [Transcript] Message {index} non affiché : {exc}")
+            return None
+
+    def _preceding_user_text(self, index):
+        for entry in reversed(self.conversation_history[:index]):
+            if entry.get("is_user"):
+                return entry.get("text", "")
+        return None
+
+    def _transcript_release(self, indices):
+        """Détruit les bulles `indices` en mémorisant leur hauteur."""
+        for index in indices:
+            container = self._transcript_widgets.pop(index, None)
+            if container is None:
+                continue
+            try:
+                if container.winfo_exists():
+                    self._transcript.record_height(
+                        index, container.winfo_height() + _BUBBLE_PADY
+                    )
+                    container.destroy()
+            except Exception:
+                pass
+        self._sync_message_widgets()
 
-                # Supprimer les vieux widgets
-                for i in range(num_to_remove):
-                    widget = self._message_widgets[i]
-                    if widget and widget.winfo_exists():
-                        widget.destroy()
+    def _sync_message_widgets(self):
+        """_message_widgets : bulles matérialisées, dans l'ordre de l'historique."""
+        widgets = self._transcript_widgets
+        self._message_widgets = [widgets[i] for i in sorted(widgets)]
 
-                # Mettre à jour la liste
-                self._message_widgets = self._message_widgets[num_to_remove:]
+    def _update_transcript_spacers(self):
+        """Cales en tête (ligne 0) et en fin (ligne `end`) de la fenêtre.
 
-                # Aussi nettoyer l'historique de conversation dans l'UI
-                if len(self.conversation_history) > self.max_displayed_messages:
-                    self.conversation_history = self.conversation_history[-self.max_displayed_messages:]
+        Les lignes de la grille sont les indices de conversation_history ; les
+        messages hors fenêtre n'ont pas de widget, donc la ligne 0 (haut) et
+        la ligne `end` (bas) sont libres pour les cales.
+        """
+        count = len(self.conversation_history)
+        start, end = self._transcript.bounds(count)
+        wanted = {}
+        if start > 0:
+            wanted["top"] = (0, self._transcript.height(range(0, start)))
+        if end < count:
+            wanted["bottom"] = (end, self._transcript.height(range(end, count)))
+        for name in ("top", "bottom"):
+            spacer = self._transcript_spacers.get(name)
+            if name not in wanted:
+                if spacer is not None:
+                    spacer.destroy()
+                    del self._transcript_spacers[name]
+                continue
+            row, height = wanted[name]
+            if spacer is None or not spacer.winfo_exists():
+                spacer = tk.Frame(
+                    self.chat_frame, bg=self.colors["bg_chat"], highlightthickness=0
+                )
+                self._transcript_spacers[name] = spacer
+            spacer.configure(height=max(1, height))
+            spacer.grid(row=row, column=0, sticky="ew")
+
+    def _install_transcript_scroll_hook(self, canvas, scrollbar):
+        """Relaie les changements de vue du canvas à la fenêtre virtualisée."""
+
+        def on_yview(first, last):
+            scrollbar.set(first, last)
+            if getattr(self, "_transcript_check_id", None) is None:
+                self._transcript_check_id = self.root.after_idle(
+                    self._check_transcript_viewport
+                )
+
+        canvas.configure(yscrollcommand=on_yview)
+
+    def _check_transcript_viewport(self):
+        """Matérialise la page voisine quand la vue approche d'une cale."""
+        self._transcript_check_id = None
+        window = self._transcript
+        count = len(self.conversation_history)
+        start, end = window.bounds(count)
+        if start == 0 and end == count:
+            return
+        canvas = self._get_parent_canvas() or getattr(self, "_chat_canvas", None)
+        if canvas is None:
+            return
+        if self._transcript_busy():
+            # Réessayer à la fin de la réponse en cours
+            self._transcript_check_id = self.root.after(
+                300, self._check_transcript_viewport
+            )
+            return
+        try:
+            first, last = canvas.yview()
+        except Exception:
+            return
+        if first <= _VIEWPORT_MARGIN and start > 0:
+            self._transcript_extend_up(canvas)
+        elif last >= 1.0 - _VIEWPORT_MARGIN and end < count:
+            self._transcript_materialize(window.extend_down(count))
+            self._transcript_release(window.trim(count, keep_end=True))
+            self._update_transcript_spacers()
+
+    def _transcript_extend_up(self, canvas):
+        """Matérialise la page précédente sans déplacer ce qui est à l'écran."""
+        window = self._transcript
+        count = len(self.conversation_history)
+        anchor = self._transcript_widgets.get(window.bounds(count)[0])
+        try:
+            top_px = canvas.canvasy(0)
+            anchor_y = anchor.winfo_y() if anchor is not None else None
+        except Exception:
+            top_px, anchor_y = None, None
 
-                print(f"🧹 [MEMORY] Nettoyé {num_to_remove} vieux messages pour optimiser la mémoire")
+        self._transcript_materialize(window.extend_up())
+        self._transcript_release(window.trim(count, keep_end=False))
+        self._update_transcript_spacers()
 
-        except Exception as e:
-            print(f"⚠️ [MEMORY] Erreur nettoyage messages: {e}")
+        if anchor_y is None or top_px is None:
+            return
+        try:
+            canvas.update_idletasks()
+            bbox = canvas.bbox("all")
+            if bbox:
+                canvas.configure(scrollregion=bbox)
+                total = bbox[3] - bbox[1]
+                shift = anchor.winfo_y() - anchor_y
+                if total > 0:
+                    canvas.yview_moveto((top_px + shift) / total)
+        except Exception:
+            pass
 
     def create_conversation_area_in_frame(self, parent):
         """Crée la zone de conversation dans un frame spécifique"""
@@ -188,6 +438,8 @@ class ChatAreaMixin:
 
             canvas.grid(row=0, column=0, sticky="nsew")
             scrollbar.grid(row=0, column=1, sticky="ns")
+            self._chat_canvas = canvas
+            self._install_transcript_scroll_hook(canvas, scrollbar)
 
             # Mise à jour du scroll
             def configure_scroll(_event):
@@ -197,6 +449,10 @@ class ChatAreaMixin:
 
         self.chat_frame.grid(row=0, column=0, sticky="nsew", padx=10, pady=10)
         self.chat_frame.grid_columnconfigure(0, weight=1)
+        # pylint: disable=protected-access
+        chat_scrollbar = getattr(self.chat_frame, "_scrollbar", None)
+        if self.use_ctk and chat_scrollbar is not None and self._get_parent_canvas():
+            self._install_transcript_scroll_hook(self._get_parent_canvas(), chat_scrollbar)
 
         # Zone d'animation de réflexion
         self.thinking_frame = self.create_frame(
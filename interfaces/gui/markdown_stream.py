@@ -0,0 +1,322 @@
+"""Tokenizer Markdown incrémental du streaming (sans dépendance Tk).
+
+Pendant le streaming, ``_apply_unified_progressive_formatting`` était appelé
+à chaque retour à la ligne, à chaque ``*`` ou `````, et tous les 50
+caractères : chaque appel relançait des ``text_widget.search`` sur le widget
+(les titres depuis ``1.0``) et testait les tags de chaque occurrence avec
+``_is_position_in_code_block``. Le coût d'une frame croissait avec la
+longueur de la réponse.
+
+``MarkdownStreamTokenizer`` consomme le buffer de streaming une seule fois,
+au fil des tokens, dans le thread de génération (``on_token_received``). Il
+garde son état entre deux tokens (ligne en cours, bloc de code ouvert,
+tableau en construction) et émet des ``MarkdownRun`` en offsets du buffer
+original :
+
+  - en ligne (dès qu'un marqueur fermant est suivi d'un caractère connu) :
+    ``bold``, ``italic``, ``code``, ``link`` ;
+  - à la fin d'une ligne : ``title_1..3``, ``bullet``, ``hr`` ;
+  - à la fermeture d'un bloc : ``table`` (lignes brutes) et ``code_block``.
+
+Une ligne complète ne change plus : le widget (cf.
+``StreamingMixin._apply_markdown_stream_runs``) n'applique que les runs
+nouveaux, sur la ligne en cours d'écriture, sans jamais rescanner le texte
+déjà affiché.
+"""
+
+import bisect
+import re
+import threading
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+INLINE_TAGS = frozenset({"bold", "italic", "code", "link"})
+
+_LINK_RE = re.compile(r"\[([^\]]+)\]\(([^)]+)\)")
+_CODE_RE = re.compile(r"`([^`\n]{1,100})`")
+_BOLD_RE = re.compile(r"\*\*([^*\n]{1,200}?)\*\*")
+_ITALIC_RE = re.compile(r"(?<!\*)\*([^*\s][^*\n]{0,199}?)\*(?!\*)")
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+)$")
+_HR_RE = re.compile(r"^[ \t]*([-_*])\1{2,}[ \t]*$")
+_BULLET_RE = re.compile(r"^(\s*)[*\-+] ")
+_FENCE_OPEN_RE = re.compile(r"^```([\w+#.-]*)(?:\s.*)?$")
+_TABLE_SEPARATOR_RE = re.compile(r"^\|?[\s\-:|\s]+\|?$")
+# Caractère neutre masquant les zones déjà attribuées (code, liens)
+_MASK = "\x00"
+
+
+@dataclass(frozen=True)
+class MarkdownRun:
+    """Zone formatée, en offsets du buffer original.
+
+    Attributes:
+        line: Début de la ligne où le run s'applique (pour ``table``, la
+            première ligne qui suit le tableau)
+        start: Début du texte formaté
+        end: Fin du texte formaté (exclue)
+        tag: Tag Tk (``bold``, ``title_2``...) ou type de bloc
+        hidden: Marqueurs (début, fin) retirés de l'affichage
+        replacement: Texte inséré à la place du marqueur (puces)
+        rows: Lignes brutes d'un tableau
+        language: Langage d'un bloc de code
+    """
+
+    line: int
+    start: int
+    end: int
+    tag: str
+    hidden: Tuple[Tuple[int, int], ...] = ()
+    replacement: str = ""
+    rows: Tuple[str, ...] = ()
+    language: str = ""
+
+    @property
+    def inline(self) -> bool:
+        return self.tag in INLINE_TAGS
+
+
+class MarkdownStreamTokenizer:
+    """Découpe le buffer de streaming en runs Markdown, au fil des tokens.
+
+    ``feed`` est appelé par le thread de génération, ``runs_since`` et
+    ``line_start`` par le thread Tk : un verrou protège l'état partagé.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._runs: List[MarkdownRun] = []
+        self._line_starts: List[int] = [0]
+        self._lines: List[str] = []
+        self._partial = ""
+        # Runs déjà émis pour la ligne en cours (avant sa fin)
+        self._partial_emitted: set = set()
+        self._length = 0
+        # (langage, début du contenu) d'un bloc ``` ouvert
+        self._fence: Optional[Tuple[str, int]] = None
+        # (début, ligne) d'une ligne avec « | » qui peut être un en-tête
+        self._table_header: Optional[Tuple[int, str]] = None
+        # (début, lignes) d'un tableau en construction
+        self._table: Optional[Tuple[int, List[str]]] = None
+        self.closed = False
+
+    @property
+    def length(self) -> int:
+        """Nombre de caractères consommés."""
+        return self._length
+
+    def feed(self, chunk: str) -> None:
+        """Consomme un token (à appeler AVANT de l'ajouter au buffer affiché)."""
+        if not chunk:
+            return
+        with self._lock:
+            self._length += len(chunk)
+            pieces = chunk.split("\n")
+            for piece in pieces[:-1]:
+                line = self._partial + piece
+                start = self._line_starts[-1]
+                self._partial = ""
+                self._complete_line(line, start)
+                self._lines.append(line)
+                self._line_starts.append(start + len(line) + 1)
+            self._partial += pieces[-1]
+            if self._partial:
+                self._scan_partial()
+
+    def close(self) -> None:
+        """Fin du streaming : la dernière ligne (sans ``\\n``) est complète."""
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            start = self._line_starts[-1]
+            line, self._partial = self._partial, ""
+            self._complete_line(line, start)
+            self._close_table(start + len(line))
+
+    def truncate(self, length: int) -> None:
+        """Recule après un ``rstrip`` du buffer (sauts de ligne finaux retirés).
+
+        Les runs déjà émis ne sont pas retirés : le widget vérifie les
+        marqueurs avant d'appliquer un run.
+        """
+        with self._lock:
+            if length >= self._length:
+                return
+            index = bisect.bisect_right(self._line_starts, length) - 1
+            start = self._line_starts[index]
+            line = self._lines[index] if index < len(self._lines) else self._partial
+            del self._line_starts[index + 1:]
+            del self._lines[index:]
+            # L'état (bloc de code, tableau) n'est pas rembobiné : le texte
+            # retiré ne contient que des sauts de ligne.
+            self._partial = line[:length - start]
+            self._length = length
+            self._partial_emitted.clear()
+
+    def runs_since(self, cursor: int) -> Tuple[List[MarkdownRun], int]:
+        """Runs émis depuis ``cursor`` et le nouveau curseur."""
+        with self._lock:
+            return self._runs[cursor:], len(self._runs)
+
+    def line_start(self, offset: int) -> int:
+        """Début (offset) de la ligne qui contient ``offset``."""
+        with self._lock:
+            index = bisect.bisect_right(self._line_starts, offset) - 1
+            return self._line_starts[max(0, index)]
+
+    # ------------------------------------------------------------------
+    # Lignes
+    # ------------------------------------------------------------------
+
+    def _scan_partial(self) -> None:
+        if self._fence is not None or self._table is not None:
+            return
+        start = self._line_starts[-1]
+        for run in self._inline_runs(self._partial, start, complete=False):
+            key = (run.start, run.end, run.tag)
+            if key not in self._partial_emitted:
+                self._partial_emitted.add(key)
+                self._runs.append(run)
+
+    def _complete_line(self, line: str, start: int) -> None:
+        emitted, self._partial_emitted = self._partial_emitted, set()
+
+        if self._fence is not None:
+            if line.startswith("```") and not line[3:4].isalpha():
+                language, content_start = self._fence
+                self._fence = None
+                self._runs.append(MarkdownRun(
+                    line=start, start=content_start, end=max(content_start, start - 1),
+                    tag="code_block", language=language,
+                ))
+            return
+
+        fence = _FENCE_OPEN_RE.match(line)
+        if fence:
+            self._close_table(start)
+            self._table_header = None
+            self._fence = (fence.group(1).lower(), start + len(line) + 1)
+            return
+
+        if self._table is not None:
+            if "|" in line and not self._is_table_separator(line):
+                self._table[1].append(line)
+                return
+            self._close_table(start)
+
+        header, self._table_header = self._table_header, None
+        if header is not None and self._is_table_separator(line):
+            self._table = (header[0], [header[1], line])
+            return
+        if "|" in line:
+            self._table_header = (start, line)
+
+        for run in self._inline_runs(line, start, complete=True):
+            if (run.start, run.end, run.tag) not in emitted:
+                self._runs.append(run)
+        block = self._line_run(line, start)
+        if block is not None:
+            self._runs.append(block)
+
+    def _close_table(self, line: int) -> None:
+        if self._table is None:
+            return
+        table_start, rows = self._table
+        self._table = None
+        self._runs.append(MarkdownRun(
+            line=line, start=table_start, end=max(table_start, line - 1),
+            tag="table", rows=tuple(rows),
+        ))
+
+    @staticmethod
+    def _is_table_separator(line: str) -> bool:
+        return "-" in line and bool(_TABLE_SEPARATOR_RE.match(line.strip()))
+
+    @staticmethod
+    def _line_run(line: str, start: int) -> Optional[MarkdownRun]:
+        heading = _HEADING_RE.match(line)
+        if heading:
+            level = min(len(heading.group(1)), 3)
+            text_start = heading.start(2)
+            hidden = [(start, start + text_start)]
+            position = line.find("**", text_start)
+            while position != -1:
+                hidden.append((start + position, start + position + 2))
+                position = line.find("**", position + 2)
+            return MarkdownRun(
+                line=start, start=start + text_start, end=start + len(line),
+                tag=f"title_{level}", hidden=tuple(hidden),
+            )
+        if _HR_RE.match(line):
+            return MarkdownRun(
+                line=start, start=start, end=start + len(line), tag="hr",
+                hidden=((start, start + len(line)),),
+            )
+        bullet = _BULLET_RE.match(line)
+        if bullet:
+            marker = start + len(bullet.group(1))
+            return MarkdownRun(
+                line=start, start=marker, end=start + len(line), tag="bullet",
+                hidden=((marker, marker + 2),), replacement=" • ",
+            )
+        return None
+
+    # ------------------------------------------------------------------
+    # Formatage en ligne
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _inline_runs(line: str, start: int, complete: bool) -> List[MarkdownRun]:
+        """Runs en ligne de ``line``, triés par fin.
+
+        Sur une ligne incomplète, un run n'est émis que si le caractère qui
+        suit son marqueur fermant est connu (``*a*`` peut devenir ``*a**``).
+        """
+        runs: List[MarkdownRun] = []
+        masked = list(line)
+
+        # Les liens sont sautés par l'animation même dans un titre ou une
+        # cellule : leurs marqueurs décalent toujours les colonnes.
+        for match in _LINK_RE.finditer(line):
+            title_end = match.end(1)
+            runs.append(MarkdownRun(
+                line=start, start=start + match.start(1), end=start + title_end,
+                tag="link",
+                hidden=((start + match.start(), start + match.start(1)),
+                        (start + title_end, start + match.end())),
+            ))
+            for column in (match.start(), *range(title_end, match.end())):
+                masked[column] = _MASK
+
+        stripped = line.lstrip()
+        # Titres (ligne entière, en fin de ligne) et lignes de tableau
+        # (cellules formatées par _insert_formatted_table) : pas de runs
+        if not line.startswith("#") and not stripped.startswith("|"):
+            text = "".join(masked)
+            for match in _CODE_RE.finditer(text):
+                runs.append(MarkdownRun(
+                    line=start, start=start + match.start(1), end=start + match.end(1),
+                    tag="code",
+                    hidden=((start + match.start(), start + match.start(1)),
+                            (start + match.end(1), start + match.end())),
+                ))
+                masked[match.start():match.end()] = _MASK * (match.end() - match.start())
+
+            for pattern, tag, width in ((_BOLD_RE, "bold", 2), (_ITALIC_RE, "italic", 1)):
+                text = "".join(masked)
+                for match in pattern.finditer(text):
+                    runs.append(MarkdownRun(
+                        line=start, start=start + match.start(1), end=start + match.end(1),
+                        tag=tag,
+                        hidden=((start + match.start(), start + match.start(1)),
+                                (start + match.end(1), start + match.end())),
+                    ))
+                    for column in (*range(match.start(), match.start(1)),
+                                   *range(match.end(1), match.end())):
+                        masked[column] = _MASK
+
+        if not complete:
+            limit = start + len(line)
+            runs = [run for run in runs if run.hidden[-1][1] < limit]
+        runs.sort(key=lambda run: run.hidden[-1][1])
+        return runs
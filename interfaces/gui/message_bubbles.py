@@ -22,6 +22,8 @@ from core.rlhf_manager import get_rlhf_manager
 # Détection des artifacts (HTML/SVG rendables) pour le bouton « Aperçu »
 from interfaces.artifacts import detect_artifacts
 
+from .transcript import BubbleRenderModel
+
 
 class MessageBubblesMixin:
     """Methods for creating user/AI message bubbles and copy UI."""
@@ -373,6 +375,9 @@ class MessageBubblesMixin:
         else:
             self._last_ai_response = text
 
+        # Revenir en bas de la conversation si le lecteur l'a quittée
+        self._transcript_follow_end()
+
         # Ajouter à l'historique
         self.conversation_history.append(
             {
@@ -385,34 +390,49 @@ class MessageBubblesMixin:
                 "mid": mid or uuid4().hex,
             }
         )
+        index = len(self.conversation_history) - 1
+        msg_container = self._create_message_bubble(
+            index,
+            instant=instant,
+            feedback_query=getattr(self, "_last_user_query", None),
+        )
+        # Fenêtre virtualisée : libère les bulles les plus anciennes au-delà
+        # de la limite (l'historique, lui, reste complet)
+        self._transcript_track(index, msg_container)
+        if is_user:
+            # Scroll utilisateur : scroller uniquement si le bas n'est pas visible
+            self.root.after(50, self._scroll_if_needed_user())
+
+    def _create_message_bubble(self, index, instant=False, feedback_query=None):
+        """Crée la bulle du message `index` de conversation_history.
+
+        Utilisé pour les messages en direct (add_message_bubble) et pour
+        re-matérialiser un message qui revient dans la fenêtre visible
+        (cf. ChatAreaMixin._materialize_message) ; la bulle occupe la ligne
+        `index` de la grille.
+
+        Returns:
+            Le container de la bulle
+        """
+        entry = self.conversation_history[index]
+        text = entry.get("text", "")
+        is_user = entry.get("is_user", True)
 
         # Container principal avec espacement OPTIMAL
         msg_container = self.create_frame(
             self.chat_frame, fg_color=self.colors["bg_chat"]
         )
-        msg_container.grid(
-            row=len(self.conversation_history) - 1, column=0, sticky="ew", pady=(0, 12)
-        )
+        msg_container.grid(row=index, column=0, sticky="ew", pady=(0, 12))
         msg_container.grid_columnconfigure(0, weight=1)
 
-        # ⚡ OPTIMISATION: Tracker ce widget pour nettoyage ultérieur
-        self._message_widgets.append(msg_container)
-
-        # ⚡ OPTIMISATION MÉMOIRE: Nettoyer les vieux messages si trop nombreux
-        self._cleanup_old_messages()
-
         if is_user:
             self.create_user_message_bubble(msg_container, text)
             # Hook édition/branchement : attache les contrôles ✏️ / ‹ k/n ›
             if hasattr(self, "_register_bubble"):
                 try:
-                    self._register_bubble(
-                        len(self.conversation_history) - 1, msg_container, True, text
-                    )
+                    self._register_bubble(index, msg_container, True, text)
                 except Exception as exc:
                     print(f"⚠️ [Edit] _register_bubble échoué : {exc}")
-            # Scroll utilisateur : scroller uniquement si le bas n'est pas visible
-            self.root.after(50, self._scroll_if_needed_user())
         else:
             # Crée la bulle IA mais insère le texte vide, puis lance l'animation de frappe
             # Frame de centrage
@@ -443,8 +463,8 @@ class MessageBubblesMixin:
             message_container.grid_columnconfigure(0, weight=1)
 
             # STOCKER la query et response dans le container pour les boutons de feedback
-            message_container.feedback_query = getattr(self, "_last_user_query", None)
-            message_container.feedback_response = text  # Le texte actuel passé à add_message_bubble
+            message_container.feedback_query = feedback_query
+            message_container.feedback_response = text  # Le texte du message
             # Texte brut (= text ici, fences intactes) pour la détection d'artifacts
             message_container.artifact_source = text
 
@@ -662,13 +682,17 @@ class MessageBubblesMixin:
                 self._formatted_bold_contents = set()
                 self._configure_all_formatting_tags(text_widget)
                 text_widget.configure(state="normal")
-                processed_text, link_mapping = self._preprocess_links_for_animation(text)
+                # Pré-traitement mis en cache : une bulle re-matérialisée
+                # au scroll ne repasse pas les regex
+                model = self._bubble_render_model(text)
+                processed_text = model.display_text
                 text_widget.insert("1.0", processed_text)
-                if link_mapping:
-                    self._pending_links = link_mapping
-                self._table_blocks = self._preanalyze_markdown_tables(processed_text)
+                # Liens de CE message uniquement (la liste s'accumulait d'une
+                # bulle à l'autre et chaque bulle recherchait tous les liens)
+                self._pending_links = [dict(link) for link in model.links]
+                self._table_blocks = model.tables
                 self._formatted_tables = set()
-                self._code_blocks_map = self._preanalyze_code_blocks(processed_text)
+                self._code_blocks_map = model.code_blocks
                 self.typing_text = ""
                 self._format_markdown_tables_in_widget(text_widget, processed_text)
                 self._apply_unified_progressive_formatting(text_widget, full_scan=True)
@@ -691,6 +715,23 @@ class MessageBubblesMixin:
                 # Démarrer l'animation de frappe avec hauteur dynamique
                 self.start_typing_animation_dynamic(text_widget, text)
 
+        return msg_container
+
+    def _bubble_render_model(self, text):
+        """Pré-traitement (liens, tableaux, blocs de code) d'un message IA."""
+        model = self._render_models.get(text)
+        if model is None:
+            self._pending_links = []
+            display_text, links = self._preprocess_links_for_animation(text)
+            model = BubbleRenderModel(
+                display_text=display_text,
+                links=list(links),
+                tables=self._preanalyze_markdown_tables(display_text),
+                code_blocks=self._preanalyze_code_blocks(display_text),
+            )
+            self._render_models.put(text, model)
+        return model
+
     def display_generated_image(self, image_path, max_width=420):
         """🎨 Affiche une image générée (texte → image) dans une bulle du chat.
 
@@ -699,7 +740,7 @@ class MessageBubblesMixin:
         (toujours sur le thread Tk via root.after).
         """
         try:
-            from PIL import Image
+            from PIL import Image  # noqa: F401  (disponibilité de Pillow)
         except ImportError:
             self.add_message_bubble(
                 "⚠️ **Pillow** est requis pour afficher l'image générée "
@@ -717,107 +758,118 @@ class MessageBubblesMixin:
             )
             return
 
+        self._transcript_follow_end()
+        index = len(self.conversation_history)
         try:
-            img = Image.open(image_path)
-            w, h = img.size
-            # Redimensionner pour l'affichage (conserve le ratio)
-            if w > max_width:
-                ratio = max_width / float(w)
-                disp_size = (max_width, int(h * ratio))
-            else:
-                disp_size = (w, h)
-
-            # Conteneur de message (même grille que les bulles)
-            msg_container = self.create_frame(
-                self.chat_frame, fg_color=self.colors["bg_chat"]
-            )
-            msg_container.grid(
-                row=len(self.conversation_history), column=0, sticky="ew", pady=(0, 12)
-            )
-            msg_container.grid_columnconfigure(0, weight=1)
-            self._message_widgets.append(msg_container)
-            # Tracer dans l'historique (type image) pour le scroll/nettoyage
-            self.conversation_history.append(
-                {
-                    "text": f"[Image générée] {os.path.basename(image_path)}",
-                    "is_user": False,
-                    "timestamp": datetime.now(),
-                    "type": "image",
-                    "image_path": image_path,
-                    "mid": uuid4().hex,
-                }
+            msg_container = self._create_image_bubble(index, image_path, max_width)
+        except Exception as exc:
+            traceback.print_exc()
+            self.add_message_bubble(
+                f"⚠️ Erreur d'affichage de l'image générée : {exc}\n"
+                f"Image sauvegardée : `{image_path}`",
+                is_user=False,
+                instant=True,
             )
+            return
+        # Tracer dans l'historique (type image) pour le scroll/nettoyage
+        self.conversation_history.append(
+            {
+                "text": f"[Image générée] {os.path.basename(image_path)}",
+                "is_user": False,
+                "timestamp": datetime.now(),
+                "type": "image",
+                "image_path": image_path,
+                "mid": uuid4().hex,
+            }
+        )
+        self._transcript_track(index, msg_container)
+        self.root.after(50, lambda: self._scroll_if_needed_user() if hasattr(self, "_scroll_if_needed_user") else None)
+        print(f"🎨 [GUI] Image affichée dans le chat : {image_path}")
 
-            center_frame = self.create_frame(
-                msg_container, fg_color=self.colors["bg_chat"]
-            )
-            center_frame.grid(row=0, column=0, padx=(250, 250), pady=(0, 0), sticky="ew")
-            center_frame.grid_columnconfigure(0, weight=0)
-            center_frame.grid_columnconfigure(1, weight=1)
+    def _create_image_bubble(self, index, image_path, max_width=420):
+        """Crée la bulle d'une image générée à la ligne `index` de la grille.
 
-            icon_label = self.create_label(
-                center_frame,
-                text="🎨",
-                font=("Segoe UI", 16),
-                fg_color=self.colors["bg_chat"],
-                text_color=self.colors["accent"],
-            )
-            icon_label.grid(row=0, column=0, sticky="nw", padx=(0, 10), pady=(1, 0))
+        Returns:
+            Le container de la bulle (exception si l'image est illisible)
+        """
+        from PIL import Image
+
+        img = Image.open(image_path)
+        w, h = img.size
+        # Redimensionner pour l'affichage (conserve le ratio)
+        if w > max_width:
+            ratio = max_width / float(w)
+            disp_size = (max_width, int(h * ratio))
+        else:
+            disp_size = (w, h)
 
-            if self.use_ctk and CTK_AVAILABLE:
-                ctk_img = ctk.CTkImage(light_image=img, dark_image=img, size=disp_size)
-                img_label = ctk.CTkLabel(center_frame, image=ctk_img, text="")
-                # Conserver une référence pour éviter le ramasse-miettes
-                img_label.image_ref = ctk_img
-            else:
-                from PIL import ImageTk
+        # Conteneur de message (même grille que les bulles)
+        msg_container = self.create_frame(
+            self.chat_frame, fg_color=self.colors["bg_chat"]
+        )
+        msg_container.grid(row=index, column=0, sticky="ew", pady=(0, 12))
+        msg_container.grid_columnconfigure(0, weight=1)
 
-                tk_img = ImageTk.PhotoImage(img.resize(disp_size))
-                img_label = tk.Label(
-                    center_frame, image=tk_img, bg=self.colors["bg_chat"]
-                )
-                img_label.image_ref = tk_img
+        center_frame = self.create_frame(
+            msg_container, fg_color=self.colors["bg_chat"]
+        )
+        center_frame.grid(row=0, column=0, padx=(250, 250), pady=(0, 0), sticky="ew")
+        center_frame.grid_columnconfigure(0, weight=0)
+        center_frame.grid_columnconfigure(1, weight=1)
 
-            img_label.grid(row=0, column=1, sticky="w", padx=0, pady=(2, 2))
+        icon_label = self.create_label(
+            center_frame,
+            text="🎨",
+            font=("Segoe UI", 16),
+            fg_color=self.colors["bg_chat"],
+            text_color=self.colors["accent"],
+        )
+        icon_label.grid(row=0, column=0, sticky="nw", padx=(0, 10), pady=(1, 0))
 
-            # Clic : ouvrir l'image en taille réelle avec l'app système
-            def _open_full(_e=None, p=image_path):
-                try:
-                    if sys.platform == "win32":
-                        os.startfile(p)  # noqa: B606
-                    elif sys.platform == "darwin":
-                        subprocess.Popen(["open", p])
-                    else:
-                        subprocess.Popen(["xdg-open", p])
-                except Exception as exc:
-                    print(f"⚠️ [GUI] Ouverture image échouée : {exc}")
+        if self.use_ctk and CTK_AVAILABLE:
+            ctk_img = ctk.CTkImage(light_image=img, dark_image=img, size=disp_size)
+            img_label = ctk.CTkLabel(center_frame, image=ctk_img, text="")
+            # Conserver une référence pour éviter le ramasse-miettes
+            img_label.image_ref = ctk_img
+        else:
+            from PIL import ImageTk
 
-            img_label.bind("<Button-1>", _open_full)
+            tk_img = ImageTk.PhotoImage(img.resize(disp_size))
+            img_label = tk.Label(
+                center_frame, image=tk_img, bg=self.colors["bg_chat"]
+            )
+            img_label.image_ref = tk_img
+
+        img_label.grid(row=0, column=1, sticky="w", padx=0, pady=(2, 2))
+
+        # Clic : ouvrir l'image en taille réelle avec l'app système
+        def _open_full(_e=None, p=image_path):
             try:
-                img_label.configure(cursor="hand2")
-            except Exception:
-                pass
+                if sys.platform == "win32":
+                    os.startfile(p)  # noqa: B606
+                elif sys.platform == "darwin":
+                    subprocess.Popen(["open", p])
+                else:
+                    subprocess.Popen(["xdg-open", p])
+            except Exception as exc:
+                print(f"⚠️ [GUI] Ouverture image échouée : {exc}")
 
-            # Légende discrète sous l'image
-            caption = self.create_label(
-                center_frame,
-                text=f"📁 {os.path.basename(image_path)} — clic pour agrandir",
-                font=("Segoe UI", 9),
-                fg_color=self.colors["bg_chat"],
-                text_color=self.colors.get("text_secondary", "#888888"),
-            )
-            caption.grid(row=1, column=1, sticky="w", padx=2, pady=(2, 0))
+        img_label.bind("<Button-1>", _open_full)
+        try:
+            img_label.configure(cursor="hand2")
+        except Exception:
+            pass
 
-            self.root.after(50, lambda: self._scroll_if_needed_user() if hasattr(self, "_scroll_if_needed_user") else None)
-            print(f"🎨 [GUI] Image affichée dans le chat : {image_path}")
-        except Exception as exc:
-            traceback.print_exc()
-            self.add_message_bubble(
-                f"⚠️ Erreur d'affichage de l'image générée : {exc}\n"
-                f"Image sauvegardée : `{image_path}`",
-                is_user=False,
-                instant=True,
-            )
+        # Légende discrète sous l'image
+        caption = self.create_label(
+            center_frame,
+            text=f"📁 {os.path.basename(image_path)} — clic pour agrandir",
+            font=("Segoe UI", 9),
+            fg_color=self.colors["bg_chat"],
+            text_color=self.colors.get("text_secondary", "#888888"),
+        )
+        caption.grid(row=1, column=1, sticky="w", padx=2, pady=(2, 0))
+        return msg_container
 
     def create_user_message_bubble(self, parent, text):
         """Version avec hauteur précise et sélection activée pour les messages utilisateur"""
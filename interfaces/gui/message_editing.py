@@ -33,9 +33,8 @@ variante courante, puis regénère. Les messages situés en aval d'un tour édit
 en milieu de conversation sont remplacés (comportement de branche, façon
 ChatGPT) — l'utilisateur est prévenu avant.
 
-Le rendu s'appuie sur ``add_message_bubble(..., instant=True)`` (même chemin que
-le chargement de session) pour reconstruire l'affichage après un changement de
-branche.
+Le rendu s'appuie sur ``_render_transcript`` (même chemin que le chargement de
+session) pour reconstruire l'affichage après un changement de branche.
 """
 
 import os
@@ -476,34 +475,15 @@ class MessageEditingMixin:
     # ── Reconstruction de l'affichage ───────────────────────────────────────
 
     def _rerender_all(self):
-        """Détruit toutes les bulles et reconstruit depuis conversation_history."""
-        snapshot = list(self.conversation_history)
-        try:
-            for w in self.chat_frame.winfo_children():
-                w.destroy()
-        except Exception as exc:
-            print(f"⚠️ [Edit] Nettoyage du chat échoué : {exc}")
-
-        self.conversation_history = []
-        self._message_widgets = []
-        self.current_message_container = None
-
-        for msg in snapshot:
+        """Reconstruit l'affichage depuis conversation_history."""
+        entries = []
+        for msg in self.conversation_history:
             if msg.get("type") == "file_generation_placeholder":
                 continue
-            content = msg.get("text", "")
-            if not content:
-                continue
-            # `mid` est repropagé : le régénérer détacherait les branches des
-            # messages auxquels elles appartiennent.
-            self.add_message_bubble(
-                content,
-                is_user=msg.get("is_user", True),
-                instant=True,
-                attachments=msg.get("attachments"),
-                image_path=msg.get("image_path"),
-                mid=msg.get("mid"),
-            )
+            entry = self._history_entry(msg)
+            if entry is not None:
+                entries.append(entry)
+        self._render_transcript(entries)
 
         self._rewind_engine_history()
         try:
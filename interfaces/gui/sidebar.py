@@ -703,6 +703,13 @@ class SidebarMixin:
     def _highlight_in_chat(self, excerpt: str, query: str = None):
         """Surligne (style sélection bleue) le passage trouvé et le fait défiler
         à l'écran, après ouverture de la conversation source."""
+        # Le message peut être hors de la fenêtre de bulles matérialisées
+        needle = self._norm_text(excerpt)[:60]
+        if needle and hasattr(self, "_transcript_reveal"):
+            for index, msg in enumerate(self.conversation_history):
+                if needle in self._norm_text(msg.get("text", "")):
+                    self._transcript_reveal(index)
+                    break
         found = self._find_result_widget(excerpt)
         if not found:
             return
@@ -1060,7 +1067,7 @@ class SidebarMixin:
         if sm is None:
             return
         try:
-            state = sm.load_workspace(ws_id) or {}
+            state = sm.load_workspace(ws_id, with_history=False) or {}
             folders = state.get("attached_folders", [])
             if folder_key not in folders:
                 folders.append(folder_key)
@@ -1075,7 +1082,7 @@ class SidebarMixin:
         if sm is None:
             return
         try:
-            state = sm.load_workspace(ws_id) or {}
+            state = sm.load_workspace(ws_id, with_history=False) or {}
             folders = state.get("attached_folders", [])
             resolved = str(Path(folder_path))
             state["attached_folders"] = [
@@ -1115,8 +1122,9 @@ class SidebarMixin:
         current_ws = sm.get_current_workspace()
         if current_ws:
             # Conserver les clés déjà stockées (dossiers projet, réglages...) :
-            # save_workspace réécrit l'état complet.
-            state = sm.load_workspace(current_ws) or {}
+            # save_workspace réécrit toutes les sections. Seuls les messages
+            # ajoutés depuis la dernière sauvegarde sont écrits sur le disque.
+            state = sm.load_workspace(current_ws, with_history=False) or {}
             state["conversation_history"] = getattr(self, "conversation_history", [])
             # Variantes d'édition : sans elles, les flèches ‹ › disparaissent
             # au rechargement et les versions alternatives sont perdues.
@@ -1154,27 +1162,15 @@ class SidebarMixin:
                 # Enlever l'écran d'accueil pour montrer la conversation
                 if hasattr(self, "_dismiss_home_screen"):
                     self._dismiss_home_screen()
-                # add_message_bubble ajoute aussi à conversation_history.
-                # `mid` est repropagé tel quel : les variantes d'édition y sont
-                # rattachées, le régénérer les détacherait.
-                for msg in history:
-                    is_user = msg.get("is_user", msg.get("role", "user") == "user")
-                    content = msg.get("text", msg.get("content", ""))
-                    if content:
-                        self.add_message_bubble(
-                            content,
-                            is_user=is_user,
-                            instant=True,
-                            attachments=msg.get("attachments"),
-                            image_path=msg.get("image_path"),
-                            mid=msg.get("mid"),
-                        )
-                # Restaurer les variantes d'édition APRÈS les bulles : les
-                # contrôles ‹ › sont créés pendant add_message_bubble et lisent
-                # déjà _turn_branches.
+                # Restaurer les variantes d'édition AVANT le rendu : les
+                # contrôles ‹ › sont créés avec les bulles et lisent
+                # _turn_branches.
                 self._turn_branches = state.get("turn_branches") or {}
-                if self._turn_branches:
-                    self._rerender_all()
+                # Seuls les derniers messages sont matérialisés en bulles, les
+                # autres le sont au scroll (cf. ChatAreaMixin._render_transcript)
+                entries = [self._history_entry(msg) for msg in history]
+                self._render_transcript([e for e in entries if e is not None])
+                self.root.after(60, self.scroll_to_bottom)
             sm.set_current_workspace(workspace_id)
             self.show_notification(
                 "✅ Session chargée", "success", 2000
@@ -46,6 +46,7 @@ class StreamingMixin:
             )
 
             # Ajouter un placeholder dans l'historique
+            self._transcript_follow_end()
             self.conversation_history.append(
                 {
                     "text": "",  # Sera mis à jour à la fin
@@ -67,6 +68,7 @@ class StreamingMixin:
             )
             self._reasoning_widget_row = None  # Reset après usage
             msg_container.grid_columnconfigure(0, weight=1)
+            self._transcript_track(_base_row, msg_container)
 
             # Frame de centrage
             center_frame = self.create_frame(
@@ -189,6 +191,15 @@ class StreamingMixin:
             {}
         )  # Pour tracker l'évolution des tableaux (attribut temporaire de streaming)
 
+        # 📝 Runs du tokenizer Markdown (cf. _apply_markdown_stream_runs)
+        self._md_stream_cursor = 0
+        self._md_stream_pending = []
+        # Marqueurs ``` retirés du buffer : offset original = typing_index + removed
+        self._md_stream_removed = 0
+        self._md_stream_line = -1
+        self._md_stream_hidden = []
+        self._md_stream_applied = set()
+
         # 🎨 Progressive code block tracking
         self._streaming_in_code_block = False
         self._streaming_code_language = ""
@@ -322,9 +333,11 @@ class StreamingMixin:
                 # IMPORTANT: désactivé pendant qu'un lien Markdown est en cours
                 # d'affichage, sinon le titre serait inséré sans le tag link_temp
                 # et le `](url)` apparaîtrait en texte brut.
+                # Les fins de ligne passent aussi par le chemin caractère par
+                # caractère : les runs de ligne (titres, puces) s'y appliquent.
                 batch_size = min(25, remaining)
                 for _bi in range(batch_size):
-                    if self._streaming_buffer[self.typing_index + _bi] in ('`', '['):
+                    if self._streaming_buffer[self.typing_index + _bi] in ('`', '[', '\n'):
                         batch_size = _bi
                         break
 
@@ -335,20 +348,17 @@ class StreamingMixin:
                     self.typing_widget.insert("end", chunk)
                     self.typing_index += batch_size
 
-                    # Déclencher le formatage sur les marqueurs Markdown courants
-                    if any(c in chunk for c in ('\n', '*', '#')):
-                        self._apply_unified_progressive_formatting(self.typing_widget)
-                        self.adjust_text_widget_height(self.typing_widget)
-                        self.root.after(2, self._smart_scroll_follow_animation)
-                    elif self.typing_index % 60 == 0:
+                    # Gras / italique fermés dans le segment
+                    self._apply_markdown_stream_runs(self.typing_widget)
+                    if self.typing_index % 60 < batch_size:
                         self.adjust_text_widget_height(self.typing_widget)
                         self.root.after(2, self._smart_scroll_follow_animation)
 
                     self.typing_widget.configure(state="disabled")
                     self.root.after(5, self._continue_streaming_typing_animation)
                     return
-                # batch_size == 0 : prochain char est '`' ou '[' → laisser
-                # le chemin caractère par caractère ci-dessous le traiter.
+                # batch_size == 0 : prochain char est '`', '[' ou '\n' →
+                # laisser le chemin caractère par caractère ci-dessous le traiter.
 
             # Vérifier si on a des caractères à afficher
             if self.typing_index < buffer_length:
@@ -413,6 +423,10 @@ class StreamingMixin:
                     else:
                         tag_to_use = token_type
 
+                # Ligne terminée : titres, puces, règles et tableaux avant le \n
+                if char == "\n":
+                    self._apply_markdown_stream_runs(self.typing_widget, line_complete=True)
+
                 # Insérer le caractère
                 self.typing_widget.insert("end", char, tag_to_use)
                 self.typing_index += 1
@@ -444,38 +458,10 @@ class StreamingMixin:
                 if code_block_just_closed:
                     self._apply_streaming_syntax_coloring()
 
-                # Formatage progressif (gras, italique, code inline)
-                should_format = False
-                if char == "*":
-                    current_content = self.typing_widget.get("1.0", "end-1c")
-                    if current_content.endswith("**") and len(current_content) >= 4:
-                        bold_pattern = r"\*\*([^*\n]{1,200}?)\*\*$"
-                        if re.search(bold_pattern, current_content):
-                            should_format = True
-                    # Détecter *texte* (italique) — un seul * non précédé de *
-                    if not should_format and current_content.endswith("*") and not current_content.endswith("**"):
-                        italic_pattern = r"(?<!\*)\*([^*\n]{1,200}?)\*$"
-                        if re.search(italic_pattern, current_content):
-                            should_format = True
-                elif char == "`":
-                    current_content = self.typing_widget.get("1.0", "end-1c")
-                    code_pattern = r"`([^`\n]+)`$"
-                    if re.search(code_pattern, current_content):
-                        should_format = True
-                elif char == "\n":
-                    should_format = True
-                    # Mettre à jour la pré-analyse des tableaux avec le contenu actuel
-                    self._table_blocks = self._preanalyze_markdown_tables(
-                        self._streaming_buffer[: self.typing_index]
-                    )
-                    self._check_and_format_table_line(
-                        self.typing_widget, self.typing_index
-                    )
-                elif self.typing_index % 50 == 0:
-                    should_format = True
-
-                if should_format:
-                    self._apply_unified_progressive_formatting(self.typing_widget)
+                # Formatage progressif (gras, italique, code inline) : seuls
+                # les runs nouveaux de la ligne en cours sont appliqués
+                if char != "\n":
+                    self._apply_markdown_stream_runs(self.typing_widget)
 
                 # Ajuster la hauteur aux retours à la ligne
                 if char == "\n":
@@ -573,6 +559,7 @@ class StreamingMixin:
             # Mettre à jour l'index d'écriture pour compenser les suppressions
             chars_removed = opening_len + 3  # ```langage\n + ```
             self.typing_index -= chars_removed
+            self._md_stream_removed += chars_removed
 
             # Mettre à jour le buffer en supprimant les balises de CE bloc
             # Chercher le même bloc dans le buffer
@@ -602,6 +589,125 @@ class StreamingMixin:
             print(f"⚠️ [STREAM] Erreur coloration bloc: {e}")
             traceback.print_exc()
 
+    # ================================================================
+    # 📝 MARKDOWN INCRÉMENTAL (runs de interfaces/gui/markdown_stream.py)
+    # ================================================================
+
+    def _apply_markdown_stream_runs(self, text_widget, line_complete=False):
+        """
+        Applique les runs du tokenizer sur la ligne en cours d'écriture.
+
+        Appelé après chaque insertion (runs en ligne dont le marqueur fermant
+        est affiché), et avec line_complete=True juste avant d'insérer le
+        \\n qui termine la ligne (titres, puces, règles, tableaux). Seule la
+        dernière ligne du widget est lue ou modifiée : le coût d'une frame ne
+        dépend pas de la longueur de la réponse.
+        """
+        stream = getattr(self, "_markdown_stream", None)
+        if stream is None:
+            return
+        runs, self._md_stream_cursor = stream.runs_since(self._md_stream_cursor)
+        self._md_stream_pending.extend(runs)
+        if not self._md_stream_pending:
+            return
+
+        offset = self.typing_index + self._md_stream_removed
+        line = stream.line_start(offset)
+        if line != self._md_stream_line:
+            self._md_stream_line = line
+            self._md_stream_hidden = []
+            self._md_stream_applied = set()
+
+        # Les runs arrivent dans l'ordre des lignes : on s'arrête à la
+        # première ligne pas encore affichée.
+        ready, waiting = [], []
+        pending = self._md_stream_pending
+        for position, run in enumerate(pending):
+            if run.line > line:
+                waiting.extend(pending[position:])
+                break
+            if run.line == line and run.tag != "code_block":
+                if run.inline and run.hidden[-1][1] <= offset:
+                    ready.append(run)
+                elif not run.inline and line_complete:
+                    ready.append(run)
+                else:
+                    waiting.append(run)
+            # Lignes déjà passées (bloc de code, rattrapage) : ignorés,
+            # le formatage final (full_scan) s'en charge.
+        self._md_stream_pending = waiting
+        if not ready:
+            return
+
+        source = getattr(self, "_streaming_buffer_original", "")
+        line_index = text_widget.index("end-1c linestart")
+        # Tableau en dernier : il réécrit les lignes précédentes
+        ready.sort(key=lambda run: run.tag == "table")
+        for run in ready:
+            key = (run.start, run.end, run.tag)
+            if key in self._md_stream_applied:
+                continue
+            self._md_stream_applied.add(key)
+            try:
+                self._apply_markdown_stream_run(text_widget, run, line, line_index, source)
+            except tk.TclError as e:
+                print(f"⚠️ [STREAM] Run markdown '{run.tag}' ignoré: {e}")
+
+    def _markdown_stream_index(self, line_index, line, offset):
+        """Index Tk d'un offset du buffer original sur la ligne en cours."""
+        column = offset - line
+        column -= sum(end - start for start, end in self._md_stream_hidden if end - line <= column)
+        return f"{line_index}+{column}c"
+
+    def _apply_markdown_stream_run(self, text_widget, run, line, line_index, source):
+        """Applique un run (les marqueurs attendus doivent être affichés)."""
+        if run.tag == "link":
+            # Titre déjà inséré avec link_temp, [ et ](url) jamais affichés
+            self._md_stream_hidden.extend(run.hidden)
+            return
+        if run.tag == "table":
+            self._format_completed_table(
+                text_widget, {"lines": [{"content": row} for row in run.rows]}
+            )
+            text_widget.configure(state="normal")
+            return
+
+        markers = [
+            (self._markdown_stream_index(line_index, line, start),
+             self._markdown_stream_index(line_index, line, end),
+             source[start:end])
+            for start, end in run.hidden
+        ]
+        # Texte désynchronisé (buffer retouché pendant l'animation) : le
+        # formatage final s'en chargera
+        if any(text_widget.get(first, last) != text for first, last, text in markers):
+            return
+
+        if run.tag == "hr":
+            text_widget.delete(markers[0][0], markers[0][1])
+            self._insert_horizontal_rule(text_widget, position=markers[0][0])
+            self._md_stream_hidden.extend(run.hidden)
+            return
+
+        for first, last, _text in reversed(markers):
+            text_widget.delete(first, last)
+        if run.replacement:
+            text_widget.insert(markers[0][0], run.replacement, "normal")
+        self._md_stream_hidden.extend(run.hidden)
+        if run.tag == "bullet":
+            return
+
+        content_start = self._markdown_stream_index(line_index, line, run.start)
+        content_end = self._markdown_stream_index(line_index, line, run.end)
+        # "normal" est configuré après les tags de formatage : il masquerait
+        # leur police
+        for tag in ("normal", "bold", "italic", "code"):
+            text_widget.tag_remove(tag, content_start, content_end)
+        text_widget.tag_add(run.tag, content_start, content_end)
+        if run.tag == "bold" and self._link_tags_in_range(text_widget, content_start, content_end):
+            self._configure_bold_link_tag(text_widget)
+            text_widget.tag_add("bold_link", content_start, content_end)
+
     # ================================================================
     # 🎨 PROGRESSIVE CODE BLOCK METHODS
     # ================================================================
@@ -665,6 +771,7 @@ class StreamingMixin:
             # Remove marker from buffer (keeps buffer/widget in sync)
             self._streaming_buffer = buffer[:idx] + buffer[idx + marker_length:]
             self.typing_text = self._streaming_buffer
+            self._md_stream_removed += marker_length
             # typing_index stays the same — first code char is now at idx
 
             self._streaming_in_code_block = True
@@ -703,6 +810,7 @@ class StreamingMixin:
                         # Remove closing ``` from buffer
                         self._streaming_buffer = buffer[:idx] + buffer[idx + 3:]
                         self.typing_text = self._streaming_buffer
+                        self._md_stream_removed += 3
 
                         # Final syntax highlighting
                         self._finalize_progressive_code_block()
@@ -1779,6 +1887,7 @@ class StreamingMixin:
             self._streaming_buffer = ""
             self._streaming_buffer_original = ""
             self._streaming_complete = False
+            self._md_stream_pending = []
 
             # Nettoyage des variables d'animation (comme finish_typing_animation_dynamic)
             if hasattr(self, "typing_widget"):
@@ -1815,6 +1924,7 @@ class StreamingMixin:
             # widget raisonnement occupe une *vraie* row dans le grid.
             # Cela évite les collisions de row entre la bulle streaming qui
             # suit et le prochain message utilisateur.
+            self._transcript_follow_end()
             self.conversation_history.append(
                 {
                     "text": "",
@@ -1841,6 +1951,7 @@ class StreamingMixin:
                 pady=(0, 4),
             )
             self._reasoning_container.grid_columnconfigure(0, weight=1)
+            self._transcript_track(self._reasoning_widget_row, self._reasoning_container)
 
             # Frame de centrage — même padding 250px que les bulles IA
             center_frame = self.create_frame(
@@ -0,0 +1,169 @@
+"""Fenêtre de rendu virtualisée de la conversation (sans dépendance Tk).
+
+Chaque message affiché coûtait un widget Text formaté (markdown, coloration
+syntaxique) créé dès le chargement : ouvrir un workspace de 1 000 messages
+construisait 1 000 bulles avant de rendre la main. ``conversation_history``
+reste complet, mais seule une fenêtre contiguë de messages ``[start, end)``
+est matérialisée en widgets (cf. ``ChatAreaMixin._render_transcript``) :
+
+  - à l'ouverture, les ``page_size`` derniers messages ;
+  - en approchant du haut (ou du bas) de la zone de scroll, la page voisine
+    est matérialisée, et les bulles les plus éloignées sont détruites pour
+    ne jamais dépasser ``max_materialized`` widgets ;
+  - les messages hors fenêtre sont remplacés par deux cales (espaceurs) dont
+    la hauteur est la somme des hauteurs mesurées, ou estimées pour les
+    messages jamais affichés.
+
+``TranscriptWindow`` ne fait que la comptabilité (indices, hauteurs) ; la
+création et la destruction des widgets restent dans les mixins.
+``RenderModelCache`` garde le pré-traitement des messages (liens, tableaux,
+blocs de code) pour qu'une bulle re-matérialisée ne repasse pas les regex.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 20
+DEFAULT_MAX_MATERIALIZED = 60
+# Hauteur supposée (px) d'un message encore jamais affiché
+DEFAULT_ESTIMATED_HEIGHT = 90
+DEFAULT_MODEL_CACHE_SIZE = 2000
+# Entrées d'historique sans bulle à recréer (widgets éphémères du direct)
+PLACEHOLDER_TYPES = frozenset({
+    "file_generation_placeholder",
+    "image_generation_placeholder",
+    "reasoning_widget",
+})
+
+
+class TranscriptWindow:
+    """Indices des messages matérialisés et hauteurs des autres."""
+
+    def __init__(
+        self,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        max_materialized: int = DEFAULT_MAX_MATERIALIZED,
+    ):
+        self.page_size = max(1, int(page_size))
+        self.max_materialized = max(self.page_size, int(max_materialized))
+        self.start = 0
+        # None : la fenêtre suit la fin de l'historique (messages en direct)
+        self.end: Optional[int] = None
+        self._heights: Dict[int, int] = {}
+
+    def bounds(self, count: int) -> Tuple[int, int]:
+        """(start, end) effectifs pour un historique de `count` messages."""
+        end = count if self.end is None else min(self.end, count)
+        return min(self.start, end), end
+
+    @property
+    def follows_end(self) -> bool:
+        return self.end is None
+
+    def reset(self, count: int) -> range:
+        """Repart sur la dernière page ; renvoie les indices à matérialiser."""
+        self._heights.clear()
+        return self.jump_to_end(count)
+
+    def jump_to_end(self, count: int) -> range:
+        """Fenêtre sur la dernière page (hauteurs mesurées conservées)."""
+        self.start = max(0, count - self.page_size)
+        self.end = None
+        return range(self.start, count)
+
+    def jump_to(self, index: int, count: int) -> range:
+        """Fenêtre d'une page centrée sur `index` ; renvoie les indices à matérialiser."""
+        start = max(0, min(index - self.page_size // 2, count - self.page_size))
+        end = min(count, start + self.page_size)
+        self.start = start
+        self.end = None if end >= count else end
+        return range(start, end)
+
+    def extend_up(self) -> range:
+        """Page précédente à matérialiser (vide si la fenêtre part de 0)."""
+        new_start = max(0, self.start - self.page_size)
+        added = range(new_start, self.start)
+        self.start = new_start
+        return added
+
+    def extend_down(self, count: int) -> range:
+        """Page suivante à matérialiser ; la fenêtre rejoint la fin si elle l'atteint."""
+        if self.end is None:
+            return range(0)
+        new_end = min(count, self.end + self.page_size)
+        added = range(self.end, new_end)
+        self.end = None if new_end >= count else new_end
+        return added
+
+    def trim(self, count: int, keep_end: bool) -> range:
+        """Indices à libérer pour revenir à max_materialized.
+
+        Args:
+            count: Taille de l'historique
+            keep_end: True pour libérer le haut (lecture vers le bas),
+                False pour libérer le bas (lecture vers le haut)
+        """
+        start, end = self.bounds(count)
+        excess = (end - start) - self.max_materialized
+        if excess <= 0:
+            return range(0)
+        if keep_end:
+            self.start = start + excess
+            return range(start, start + excess)
+        self.end = end - excess
+        return range(end - excess, end)
+
+    # ------------------------------------------------------------------
+    # Hauteurs
+    # ------------------------------------------------------------------
+
+    def record_height(self, index: int, height: int) -> None:
+        if height > 0:
+            self._heights[index] = int(height)
+
+    def estimated_height(self) -> int:
+        """Moyenne des hauteurs mesurées (valeur par défaut sans mesure)."""
+        if not self._heights:
+            return DEFAULT_ESTIMATED_HEIGHT
+        return int(sum(self._heights.values()) / len(self._heights))
+
+    def height(self, indices: range) -> int:
+        """Hauteur (px) occupée par des messages non matérialisés."""
+        if not indices:
+            return 0
+        estimate = self.estimated_height()
+        return sum(self._heights.get(i, estimate) for i in indices)
+
+
+@dataclass
+class BubbleRenderModel:
+    """Pré-traitement d'un message IA, réutilisé à chaque matérialisation."""
+
+    display_text: str
+    links: List[Dict[str, str]] = field(default_factory=list)
+    tables: List[Any] = field(default_factory=list)
+    code_blocks: Dict[Any, Any] = field(default_factory=dict)
+
+
+class RenderModelCache:
+    """Cache LRU texte brut -> BubbleRenderModel."""
+
+    def __init__(self, max_entries: int = DEFAULT_MODEL_CACHE_SIZE):
+        self._max_entries = max(1, int(max_entries))
+        self._models: "OrderedDict[str, BubbleRenderModel]" = OrderedDict()
+
+    def get(self, text: str) -> Optional[BubbleRenderModel]:
+        model = self._models.get(text)
+        if model is not None:
+            self._models.move_to_end(text)
+        return model
+
+    def put(self, text: str, model: BubbleRenderModel) -> None:
+        self._models[text] = model
+        self._models.move_to_end(text)
+        while len(self._models) > self._max_entries:
+            self._models.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._models)
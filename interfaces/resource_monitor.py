@@ -108,6 +108,16 @@ class ResourceMonitor:
             self._metrics["tokens_per_sec"] = tokens_per_sec
             self._push_history("tps", tokens_per_sec)
 
+    def record_span(self, span: dict):
+        """Écouteur du traceur (core/tracing.py) : chaque appel au modèle terminé."""
+        if span.get("kind") != "llm" or span.get("status") != "ok":
+            return
+        attributes = span.get("attributes", {})
+        self.update_inference(
+            float(span.get("duration_ms", 0.0)),
+            float(attributes.get("tokens_per_sec", 0.0)),
+        )
+
     # ── Boucle de collecte ─────────────────────────────────────────
 
     def _loop(self):
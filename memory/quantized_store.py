@@ -0,0 +1,570 @@
+"""
+Quantized Store - Stockage vectoriel compact (int8 / float16) sur disque
+
+Alternative optionnelle à une collection ChromaDB pour la collection "codebase"
+(dossiers attachés via core.folder_indexer), qui grossit le plus vite :
+
+- Vecteurs normalisés, quantifiés en int8 (échelle par ligne) ou en float16,
+  dans une matrice memory-mappée : ~4x (int8) / ~2x (float16) moins de disque et
+  de RAM que les vecteurs float32 d'origine.
+- Métadonnées et textes dans une petite base SQLite à côté (sidecar).
+- Recherche approchée : les vecteurs float32 d'origine ne sont pas conservés.
+  En int8, passage grossier sur toute la matrice avec la requête quantifiée
+  elle aussi, puis re-classement des meilleurs candidats avec la requête
+  float32 (asymétrique : les vecteurs restent déquantifiés). En float16, un
+  seul passage suffit (requête float32 dès le départ).
+- Compaction sûre : la matrice compactée est écrite dans des fichiers
+  temporaires, la renumérotation SQLite est validée avec une marque
+  "compact_pending", puis les fichiers sont remplacés (os.replace). Un arrêt
+  brutal entre les deux est terminé à la réouverture.
+
+Expose le sous-ensemble de l'API d'une collection ChromaDB utilisé par le
+projet (add / upsert / update / delete / get / query / count), filtres `where`
+d'égalité compris : VectorMemory peut l'utiliser à la place de Chroma sans que
+FolderIndexer ne change.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS rows (
+    row       INTEGER PRIMARY KEY,
+    id        TEXT    NOT NULL UNIQUE,
+    document  TEXT,
+    metadata  TEXT    NOT NULL DEFAULT '{}'
+);
+
+CREATE TABLE IF NOT EXISTS info (
+    key    TEXT PRIMARY KEY,
+    value  TEXT NOT NULL
+);
+"""
+
+_DTYPES = {"int8": np.int8, "float16": np.float16}
+
+
+def _where_sql(where: Optional[Dict[str, Any]]) -> Tuple[str, list]:
+    """Traduit un filtre `where` ChromaDB (égalités, $ne, $in, $and, $or) en SQL."""
+    if not where:
+        return "1", []
+    clauses, params = [], []
+    for key, value in where.items():
+        if key in ("$and", "$or"):
+            parts = [_where_sql(sub) for sub in value]
+            joiner = " AND " if key == "$and" else " OR "
+            clauses.append("(" + joiner.join(p[0] for p in parts) + ")")
+            for p in parts:
+                params.extend(p[1])
+            continue
+        column = "json_extract(metadata, ?)"
+        path = f'$."{key}"'
+        if isinstance(value, dict):
+            op, operand = next(iter(value.items()))
+            if op == "$eq":
+                clauses.append(f"{column} = ?")
+                params += [path, operand]
+            elif op == "$ne":
+                clauses.append(f"({column} IS NULL OR {column} != ?)")
+                params += [path, path, operand]
+            elif op in ("$in", "$nin"):
+                marks = ",".join("?" * len(operand)) or "NULL"
+                neg = "NOT " if op == "$nin" else ""
+                clauses.append(f"{column} {neg}IN ({marks})")
+                params += [path, *operand]
+            else:
+                raise ValueError(f"Opérateur where non supporté: {op}")
+        else:
+            clauses.append(f"{column} = ?")
+            params += [path, value]
+    return " AND ".join(clauses) or "1", params
+
+
+class QuantizedCollection:
+    """Collection vectorielle quantifiée, memory-mappée, compatible Chroma (partiel)."""
+
+    def __init__(
+        self,
+        path: str,
+        dtype: str = "int8",
+        rescore_factor: int = 4,
+        block_rows: int = 65536,
+    ):
+        """
+        Args:
+            path: Répertoire du store (vectors.<dtype>, scales.f32, meta.db)
+            dtype: "int8" ou "float16" (une base existante garde son type)
+            rescore_factor: Candidats re-classés avec la requête float32 =
+                n_results x facteur (int8 seulement)
+            block_rows: Lignes traitées par bloc lors du passage grossier
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.rescore_factor = max(1, int(rescore_factor))
+        self.block_rows = max(1024, int(block_rows))
+        self._lock = threading.RLock()
+
+        self._conn = sqlite3.connect(str(self.path / "meta.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA_SQL)
+
+        info = dict(self._conn.execute("SELECT key, value FROM info").fetchall())
+        stored_dtype = info.get("dtype")
+        if stored_dtype and stored_dtype != dtype:
+            print(f"⚠️ Store quantifié existant en {stored_dtype} (demandé: {dtype})")
+        self.dtype = stored_dtype or dtype
+        if self.dtype not in _DTYPES:
+            raise ValueError(f"dtype non supporté: {self.dtype}")
+        self.dim = int(info.get("dim", 0))
+        self._capacity = int(info.get("capacity", 0))
+        self._next_row = int(info.get("next_row", 0))
+        if info.get("compact_pending"):
+            self._finish_compact()  # arrêt pendant une compaction validée
+        else:
+            for tmp in self._compact_files().values():
+                if tmp.exists():
+                    tmp.unlink()  # compaction interrompue avant validation
+
+        self._vectors: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        self._alive: Optional[np.ndarray] = None
+        if self.dim:
+            self._map()
+
+    # ------------------------------------------------------------------
+    # Fichiers memory-mappés
+    # ------------------------------------------------------------------
+
+    @property
+    def _vectors_file(self) -> Path:
+        return self.path / f"vectors.{self.dtype}"
+
+    @property
+    def _scales_file(self) -> Path:
+        return self.path / "scales.f32"
+
+    def _save_info(self) -> None:
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)",
+            [("dtype", self.dtype), ("dim", str(self.dim)),
+             ("capacity", str(self._capacity)), ("next_row", str(self._next_row))],
+        )
+
+    def _map(self) -> None:
+        """(Re)ouvre les matrices à la capacité courante."""
+        itemsize = np.dtype(_DTYPES[self.dtype]).itemsize
+        files = [(self._vectors_file, self.dim * itemsize)]
+        if self.dtype == "int8":
+            files.append((self._scales_file, 4))
+        for file, row_bytes in files:
+            with open(file, "ab") as fh:
+                size = self._capacity * row_bytes
+                if fh.tell() < size:
+                    fh.truncate(size)
+        self._vectors = self._scales = None
+        if self._capacity:
+            self._vectors = np.memmap(self._vectors_file, dtype=_DTYPES[self.dtype],
+                                      mode="r+", shape=(self._capacity, self.dim))
+            if self.dtype == "int8":
+                self._scales = np.memmap(self._scales_file, dtype=np.float32,
+                                         mode="r+", shape=(self._capacity,))
+        self._alive = None
+
+    def _ensure_capacity(self, rows_needed: int) -> None:
+        if self._next_row + rows_needed <= self._capacity:
+            return
+        # Croissance de 25% (amortie, sans doubler l'espace disque réservé)
+        capacity = max(1024, self._next_row + rows_needed, int(self._capacity * 1.25))
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._capacity = capacity
+        self._map()
+
+    def _alive_rows(self) -> np.ndarray:
+        """Numéros de lignes vivantes (mis en cache jusqu'à la prochaine écriture)."""
+        if self._alive is None:
+            rows = self._conn.execute("SELECT row FROM rows ORDER BY row").fetchall()
+            self._alive = np.fromiter((r[0] for r in rows), dtype=np.int64,
+                                      count=len(rows))
+        return self._alive
+
+    # ------------------------------------------------------------------
+    # Quantification
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _quantize(self, unit: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.dtype == "float16":
+            return unit.astype(np.float16), None
+        scales = np.abs(unit).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(unit / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def _dequantize(self, rows: np.ndarray) -> np.ndarray:
+        block = np.asarray(self._vectors[rows], dtype=np.float32)
+        if self._scales is not None:
+            block *= np.asarray(self._scales[rows], dtype=np.float32)[:, None]
+        return block
+
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+
+    def add(
+        self,
+        ids: List[str],
+        embeddings: List[Any],
+        documents: Optional[List[str]] = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        """Ajoute des entrées (un id existant est remplacé)."""
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("embeddings doit être une matrice (len(ids), dim)")
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+        with self._lock:
+            if not self.dim:
+                self.dim = int(vectors.shape[1])
+                self._map()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Dimension {vectors.shape[1]} != {self.dim}")
+            self._delete_ids(ids)
+            self._ensure_capacity(len(ids))
+            codes, scales = self._quantize(self._normalize(vectors))
+            start = self._next_row
+            self._vectors[start:start + len(ids)] = codes
+            if scales is not None:
+                self._scales[start:start + len(ids)] = scales
+            self._next_row += len(ids)
+            self._conn.executemany(
+                "INSERT INTO rows (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                [(start + i, _id, documents[i], json.dumps(metadatas[i] or {}))
+                 for i, _id in enumerate(ids)],
+            )
+            self._save_info()
+            self._conn.commit()
+            self._vectors.flush()
+            self._alive = None
+
+    upsert = add
+
+    def update(
+        self,
+        ids: List[str],
+        embeddings: Optional[List[Any]] = None,
+        documents: Optional[List[str]] = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        """Met à jour des entrées existantes (champs fournis seulement)."""
+        with self._lock:
+            current = self.get(ids=ids, include=["documents", "metadatas", "embeddings"])
+            if not current["ids"]:
+                return
+            pos = {i: k for k, i in enumerate(ids)}
+            new_ids, new_vecs, new_docs, new_metas = [], [], [], []
+            for k, _id in enumerate(current["ids"]):
+                j = pos[_id]
+                new_ids.append(_id)
+                new_vecs.append(embeddings[j] if embeddings is not None
+                                else current["embeddings"][k])
+                new_docs.append(documents[j] if documents is not None
+                                else current["documents"][k])
+                new_metas.append(metadatas[j] if metadatas is not None
+                                 else current["metadatas"][k])
+            self.add(new_ids, new_vecs, new_docs, new_metas)
+
+    def _delete_ids(self, ids: List[str]) -> None:
+        self._conn.executemany("DELETE FROM rows WHERE id = ?", [(i,) for i in ids])
+
+    def delete(self, ids: Optional[List[str]] = None,
+               where: Optional[Dict[str, Any]] = None) -> None:
+        """Supprime par ids et/ou par filtre de métadonnées."""
+        with self._lock:
+            if ids:
+                self._delete_ids(ids)
+            if where:
+                sql, params = _where_sql(where)
+                self._conn.execute(f"DELETE FROM rows WHERE {sql}", params)
+            self._conn.commit()
+            self._alive = None
+            self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        """Compacte quand plus de 30% des lignes allouées sont mortes."""
+        dead = self._next_row - len(self._alive_rows())
+        if dead > 1024 and dead > 0.3 * self._next_row:
+            self.compact()
+
+    def _compact_files(self) -> Dict[Path, Path]:
+        """Fichier final -> fichier temporaire de compaction."""
+        return {file: file.with_name(file.name + ".compact")
+                for file in (self._vectors_file, self._scales_file)}
+
+    def compact(self) -> None:
+        """Réécrit la matrice sans les lignes supprimées.
+
+        Ordre résistant aux arrêts brutaux : (1) matrice compactée écrite et
+        synchronisée dans des fichiers temporaires, (2) renumérotation des
+        lignes + marque "compact_pending" validées dans une même transaction,
+        (3) remplacement des fichiers. Avant (2), rien n'a changé ; après (2),
+        la réouverture termine l'étape (3).
+        """
+        with self._lock:
+            rows = self._alive_rows()
+            if not self.dim or len(rows) == self._next_row:
+                return
+            capacity = max(1024, len(rows))
+            temps = self._compact_files()
+            previous = (self._next_row, self._capacity)
+            try:
+                sources = [(self._vectors_file, self._vectors, _DTYPES[self.dtype],
+                            (capacity, self.dim))]
+                if self._scales is not None:
+                    sources.append((self._scales_file, self._scales, np.float32,
+                                    (capacity,)))
+                for final, source, dtype, shape in sources:
+                    out = np.memmap(temps[final], dtype=dtype, mode="w+", shape=shape)
+                    for start in range(0, len(rows), self.block_rows):
+                        part = rows[start:start + self.block_rows]
+                        out[start:start + len(part)] = source[part]
+                    out.flush()
+                    del out
+                    with open(temps[final], "rb+") as fh:
+                        os.fsync(fh.fileno())
+
+                self._conn.execute("UPDATE rows SET row = -row - 1")
+                self._conn.executemany(
+                    "UPDATE rows SET row = ? WHERE row = ?",
+                    [(new, -int(old) - 1) for new, old in enumerate(rows)],
+                )
+                self._next_row, self._capacity = len(rows), capacity
+                self._save_info()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO info (key, value) VALUES ('compact_pending', '1')")
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                self._next_row, self._capacity = previous
+                for tmp in temps.values():
+                    if tmp.exists():
+                        tmp.unlink()
+                raise
+            self._finish_compact()
+
+    def _finish_compact(self) -> None:
+        """Remplace les matrices par leurs versions compactées (étape 3)."""
+        self._vectors = self._scales = None
+        for final, tmp in self._compact_files().items():
+            if tmp.exists():
+                os.replace(tmp, final)
+        self._conn.execute("DELETE FROM info WHERE key = 'compact_pending'")
+        self._conn.commit()
+        if self.dim:
+            self._map()
+        self._alive = None
+
+    def clear(self) -> None:
+        """Vide le store."""
+        with self._lock:
+            self._conn.execute("DELETE FROM rows")
+            self._conn.commit()
+            self._alive = None
+            self.compact()
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> Dict[str, Any]:
+        """Entrées par ids et/ou filtre (format de retour de Collection.get)."""
+        include = include if include is not None else ["documents", "metadatas"]
+        sql, params = _where_sql(where)
+        if ids is not None:
+            if not ids:
+                return {"ids": [], "documents": [], "metadatas": []}
+            sql += " AND id IN (%s)" % ",".join("?" * len(ids))
+            params += list(ids)
+        sql = f"SELECT row, id, document, metadata FROM rows WHERE {sql} ORDER BY row"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [int(limit), int(offset)]
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            out: Dict[str, Any] = {"ids": [r[1] for r in rows]}
+            if "documents" in include:
+                out["documents"] = [r[2] for r in rows]
+            if "metadatas" in include:
+                out["metadatas"] = [json.loads(r[3]) for r in rows]
+            if "embeddings" in include:
+                out["embeddings"] = (
+                    self._dequantize(np.array([r[0] for r in rows], dtype=np.int64)).tolist()
+                    if rows else []
+                )
+        return out
+
+    def query(
+        self,
+        query_embeddings: List[Any],
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+    ) -> Dict[str, List[list]]:
+        """Plus proches voisins (distance cosinus, comme l'espace "cosine" de Chroma)."""
+        out: Dict[str, List[list]] = {"ids": [], "documents": [], "metadatas": [],
+                                      "distances": []}
+        with self._lock:
+            if not self.dim:
+                for key in out:
+                    out[key] = [[] for _ in query_embeddings]
+                return out
+            if where:
+                sql, params = _where_sql(where)
+                candidates = np.fromiter(
+                    (r[0] for r in self._conn.execute(
+                        f"SELECT row FROM rows WHERE {sql} ORDER BY row", params)),
+                    dtype=np.int64,
+                )
+            else:
+                candidates = self._alive_rows()
+
+            for q in query_embeddings:
+                rows, dists = self._search(np.asarray(q, dtype=np.float32),
+                                           candidates, n_results)
+                got = self._rows_by_number(rows)
+                out["ids"].append([got[r][0] for r in rows])
+                out["documents"].append([got[r][1] for r in rows])
+                out["metadatas"].append([got[r][2] for r in rows])
+                out["distances"].append(dists)
+        return out
+
+    def _search(self, query: np.ndarray, candidates: np.ndarray,
+                n_results: int) -> Tuple[List[int], List[float]]:
+        if not len(candidates) or n_results <= 0:
+            return [], []
+        norm = np.linalg.norm(query)
+        query = query / norm if norm else query
+
+        # 1) Passage grossier (requête quantifiée comme les lignes en mode int8 ;
+        # en float16 la requête float32 sert directement : pas de second tri)
+        if self.dtype == "int8":
+            q_scale = max(float(np.abs(query).max()) / 127.0, 1e-12)
+            coarse_query = np.rint(query / q_scale).astype(np.float32) * q_scale
+            n_coarse = min(len(candidates), n_results * self.rescore_factor)
+        else:
+            coarse_query = query
+            n_coarse = min(len(candidates), n_results)
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, len(candidates), self.block_rows):
+            rows = candidates[start:start + self.block_rows]
+            scores = self._dequantize(rows) @ coarse_query
+            rows = np.concatenate([best_rows, rows])
+            scores = np.concatenate([best_scores, scores])
+            if len(scores) > n_coarse:
+                keep = np.argpartition(-scores, n_coarse - 1)[:n_coarse]
+                rows, scores = rows[keep], scores[keep]
+            best_rows, best_scores = rows, scores
+
+        # 2) Re-classement des candidats : cosinus requête float32 / vecteur
+        # déquantifié, renormalisé (la quantification altère un peu la norme).
+        # Approché : seuls les vecteurs quantifiés sont conservés.
+        rows = np.sort(best_rows)
+        vectors = self._dequantize(rows)
+        norms = np.linalg.norm(vectors, axis=1)
+        norms[norms == 0] = 1.0
+        cosine = (vectors @ query) / norms
+        order = np.argsort(-cosine)[:n_results]
+        return [int(rows[i]) for i in order], [float(1.0 - cosine[i]) for i in order]
+
+    def _rows_by_number(self, rows: List[int]) -> Dict[int, tuple]:
+        if not rows:
+            return {}
+        marks = ",".join("?" * len(rows))
+        got = self._conn.execute(
+            f"SELECT row, id, document, metadata FROM rows WHERE row IN ({marks})", rows
+        ).fetchall()
+        return {r[0]: (r[1], r[2], json.loads(r[3])) for r in got}
+
+    # ------------------------------------------------------------------
+    # Statistiques
+    # ------------------------------------------------------------------
+
+    def disk_bytes(self) -> int:
+        """Taille sur disque (matrices + sidecar SQLite)."""
+        return sum(f.stat().st_size for f in self.path.iterdir() if f.is_file())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": f"quantized-{self.dtype}",
+            "entries": self.count(),
+            "dim": self.dim,
+            "allocated_rows": self._next_row,
+            "disk_mb": round(self.disk_bytes() / (1024 * 1024), 2),
+        }
+
+
+def migrate_from_chroma(source, target: QuantizedCollection, page: int = 1000) -> int:
+    """Copie une collection ChromaDB (vecteurs, textes, métadonnées) dans un store
+    quantifié. Retourne le nombre d'entrées migrées."""
+    offset, total = 0, 0
+    while True:
+        data = source.get(include=["embeddings", "documents", "metadatas"],
+                          limit=page, offset=offset)
+        ids = data.get("ids") or []
+        if not len(ids):
+            break
+        target.add(ids, data["embeddings"], data.get("documents"), data.get("metadatas"))
+        total += len(ids)
+        offset += len(ids)
+        if len(ids) < page:
+            break
+    return total
+
+
+def measure_recall(
+    vectors: np.ndarray, store: QuantizedCollection, ids: List[str],
+    k: int = 10, n_queries: int = 100, seed: int = 0,
+) -> float:
+    """Recall@k du store quantifié par rapport à une recherche exacte float32.
+
+    Les requêtes sont des vecteurs du corpus lui-même (légèrement bruités).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if not len(vectors):
+        return 1.0
+    rng = np.random.default_rng(seed)
+    unit = QuantizedCollection._normalize(vectors)
+    picks = rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)
+    hits = 0
+    for p in picks:
+        q = unit[p] + rng.normal(0, 0.05, size=unit.shape[1]).astype(np.float32)
+        exact = {ids[i] for i in np.argsort(-(unit @ q))[:k]}
+        got = set(store.query([q.tolist()], n_results=k)["ids"][0])
+        hits += len(exact & got)
+    return hits / (len(picks) * min(k, len(vectors)))
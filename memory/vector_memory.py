@@ -7,14 +7,18 @@ Supporte ChromaDB et FAISS, tokenization correcte (tiktoken), chiffrement AES-25
 import hashlib
 import os
 import re
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 import huggingface_hub.constants as _hf_constants
 import transformers.utils.hub as _tf_hub
 
 from core.config import get_config
+from core.context_budget import get_token_encoder
 try:
     from core.network import configure_network_environment, build_network_error_help
 except ImportError:
@@ -42,6 +46,35 @@ except ImportError:
         """Fallback si imports échouent"""
         return None
 
+try:
+    from core.tracing import traced
+except ImportError:
+
+    def traced(_name, _kind="internal"):
+        """Fallback : pas de traçage."""
+        return lambda fn: fn
+
+try:
+    from core.embedding_cache import get_embedding_cache
+
+    EMBEDDING_CACHE_AVAILABLE = True
+except ImportError:
+    EMBEDDING_CACHE_AVAILABLE = False
+
+try:
+    from memory.quantized_store import QuantizedCollection
+
+    QUANTIZED_STORE_AVAILABLE = True
+except ImportError:
+    QUANTIZED_STORE_AVAILABLE = False
+
+try:
+    from core.lexical_index import WORD_TOKENIZER, LexicalIndex, query_terms
+
+    SPARSE_INDEX_AVAILABLE = True
+except ImportError:
+    SPARSE_INDEX_AVAILABLE = False
+
 # Note: Le mode offline HuggingFace est géré intelligemment dans core.shared
 # Il télécharge automatiquement le modèle au premier lancement si nécessaire
 
@@ -82,6 +115,46 @@ except ImportError:
     ENCRYPTION_AVAILABLE = False
     print("⚠️ Cryptography non disponible. Installez: pip install cryptography")
 
+# Marque écrite dans l'index BM25 après la dernière page de son remplissage.
+_SPARSE_BACKFILL_KEY = "backfill_complete"
+
+# Index creux (BM25) : clés de métadonnées qui forment le groupe d'une entrée,
+# de la plus large à la plus fine (suppression / filtrage par préfixe).
+_SPARSE_GROUP_KEYS = {
+    "document": ("document_id",),
+    "conversation": ("workspace_id",),
+    "codebase": ("workspace_id", "folder_path", "file_path"),
+}
+
+# Découpage en flux : taille (en caractères) des segments tokenisés à la fois,
+# tokens de fin de tampon retenus (leur découpage peut dépendre de la suite
+# du texte) et nombre de chunks encodés/stockés par lot à l'ingestion.
+_STREAM_SEGMENT_CHARS = 65536
+_STREAM_TOKEN_GUARD = 16
+_INGEST_FLUSH_CHUNKS = 1024
+
+_WORD_RE = re.compile(r"\S+")
+
+
+def _iter_text_segments(text: Union[str, Iterable[str]],
+                        segment_chars: int) -> Iterator[str]:
+    """Segments successifs d'un texte (str coupée de préférence sur un blanc,
+    ou itérable de morceaux déjà lus, ex. fichier ouvert en lecture)."""
+    if not isinstance(text, str):
+        for segment in text:
+            if segment:
+                yield segment
+        return
+    start = 0
+    while start < len(text):
+        end = min(start + segment_chars, len(text))
+        if end < len(text):
+            space = text.rfind(" ", start + segment_chars // 2, end)
+            if space > start:
+                end = space + 1
+        yield text[start:end]
+        start = end
+
 
 class VectorMemory:
     """
@@ -103,6 +176,7 @@ class VectorMemory:
         storage_dir: str = "memory/vector_store",
         enable_encryption: bool = False,
         encryption_key: Optional[str] = None,
+        embedding_batch_size: Optional[int] = None,
     ):
         """
         Initialise le gestionnaire de mémoire vectorielle
@@ -114,6 +188,8 @@ class VectorMemory:
             storage_dir: Répertoire de stockage
             enable_encryption: Activer le chiffrement AES-256
             encryption_key: Clé de chiffrement (générée si None)
+            embedding_batch_size: Taille des mini-batchs d'encodage à l'ingestion
+                (lit optimization.rag.embedding_batch_size, 64 par défaut)
         """
         if max_tokens is None:
             try:
@@ -122,9 +198,18 @@ class VectorMemory:
             except Exception:
                 max_tokens = 1000000
 
+        if embedding_batch_size is None:
+            try:
+                embedding_batch_size = get_config().get(
+                    "optimization.rag.embedding_batch_size", 64
+                )
+            except Exception:
+                embedding_batch_size = 64
+
         self.max_tokens = max_tokens
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.embedding_batch_size = max(1, int(embedding_batch_size or 64))
         self.current_tokens = 0
 
         # Configuration du stockage
@@ -137,25 +222,47 @@ class VectorMemory:
             self._init_encryption(encryption_key)
 
         # Tokenizer (vrai comptage de tokens via tiktoken - cl100k_base, compatible Llama 3)
-        if TOKENIZER_AVAILABLE:
-            try:
-                self.tokenizer = tiktoken.get_encoding("cl100k_base")
-                print("✅ Tokenizer tiktoken (cl100k_base) chargé")
-            except Exception as e:
-                print(f"⚠️ Erreur chargement tokenizer tiktoken: {e}")
-                self.tokenizer = None
-        else:
-            self.tokenizer = None
+        # Encodeur partagé avec le budget de contexte (core/context_budget.py) :
+        # chargé une seule fois par processus, échec hors ligne mémorisé.
+        self.tokenizer = get_token_encoder() if TOKENIZER_AVAILABLE else None
+        if self.tokenizer is not None:
+            print("✅ Tokenizer tiktoken (cl100k_base) chargé")
+        elif TOKENIZER_AVAILABLE:
+            print("⚠️ Erreur chargement tokenizer tiktoken (cl100k_base)")
 
         # Modèle d'embeddings partagé (déjà chargé au démarrage dans core.shared)
         self.embedding_model = get_shared_embedding_model()
 
+        # Cache d'embeddings persistant adressé par contenu (partagé par tous
+        # les indexeurs qui passent par encode_batch)
+        self.embedding_cache = None
+        self.embedding_model_name = "sentence-transformers/all-MiniLM-L6-v2"
+        if EMBEDDING_CACHE_AVAILABLE:
+            self._init_embedding_cache()
+
         # [OPTIM] Cross-Encoder pour reranking sémantique fin (RAG avancé)
         # Stratégie identique à core.shared : offline first, download si nécessaire
         self.reranker = None
         if CROSSENCODER_AVAILABLE:
             self._load_reranker()
 
+        # [OPTIM] Cache LRU des scores de reranking : une même paire (requête,
+        # chunk) n'est scorée qu'une fois (recherches répétées d'un même tour)
+        try:
+            cfg = get_config()
+            self.rerank_batch_size = int(cfg.get("optimization.rag.rerank_batch_size", 32))
+            self.rerank_cache_size = int(cfg.get("optimization.rag.rerank_cache_size", 2048))
+            self.rerank_skip_margin = float(
+                cfg.get("optimization.rag.rerank_skip_margin", 0.0)
+            )
+        except Exception:
+            self.rerank_batch_size, self.rerank_cache_size = 32, 2048
+            self.rerank_skip_margin = 0.0
+        self.rerank_batch_size = max(1, self.rerank_batch_size)
+        self._rerank_cache: "OrderedDict[tuple, float]" = OrderedDict()
+        self._rerank_lock = threading.Lock()
+        self.rerank_stats = {"cache_hits": 0, "cache_misses": 0, "skipped": 0}
+
         # Base vectorielle ChromaDB
         if CHROMADB_AVAILABLE:
             try:
@@ -195,6 +302,34 @@ class VectorMemory:
             self.document_collection = None
             self.codebase_collection = None
 
+        # [OPTIM] Store compact optionnel pour la collection codebase : matrice
+        # int8/float16 memory-mappée au lieu des vecteurs float32 de ChromaDB
+        # (migration : tools/migrate_codebase_store.py)
+        try:
+            codebase_store = str(
+                get_config().get("optimization.rag.codebase_store", "chroma")
+            ).lower()
+        except Exception:
+            codebase_store = "chroma"
+        if codebase_store in ("int8", "float16") and QUANTIZED_STORE_AVAILABLE:
+            try:
+                self.codebase_collection = QuantizedCollection(
+                    str(self.storage_dir / "codebase_quantized"), dtype=codebase_store
+                )
+                print(f"✅ Store codebase quantifié ({codebase_store}) initialisé")
+            except Exception as e:
+                print(f"⚠️ Store codebase quantifié indisponible: {e}")
+
+        # [OPTIM] Recherche hybride : index creux BM25 par collection (SQLite
+        # FTS5), ouverts à la demande, fusionnés au dense par Reciprocal Rank Fusion
+        self._sparse_indexes: Dict[str, Any] = {}
+        try:
+            cfg = get_config()
+            self.search_mode = str(cfg.get("optimization.rag.search_mode", "dense"))
+            self.rrf_k = int(cfg.get("optimization.rag.rrf_k", 60))
+        except Exception:
+            self.search_mode, self.rrf_k = "dense", 60
+
         # Métadonnées et statistiques
         self.documents = {}
         self.stats = {
@@ -203,6 +338,7 @@ class VectorMemory:
             "total_tokens": 0,
             "last_updated": None,
             "encryption_enabled": self.enable_encryption,
+            "last_ingest_chunks_per_second": 0.0,
         }
 
         # Moniteur de compression
@@ -269,6 +405,27 @@ class VectorMemory:
             except Exception:
                 pass
 
+    def _init_embedding_cache(self):
+        """Ouvre le cache d'embeddings (optimization.cache dans config.yaml)."""
+        try:
+            cfg = get_config()
+            enabled = cfg.get("optimization.cache.enabled", True)
+            max_entries = int(cfg.get("optimization.cache.embedding_cache_size", 100000))
+            self.embedding_model_name = str(
+                cfg.get("optimization.rag.embedding_model", self.embedding_model_name)
+            )
+        except Exception:
+            enabled, max_entries = True, 100000
+        if not enabled:
+            return
+        try:
+            self.embedding_cache = get_embedding_cache(
+                str(self.storage_dir / "embedding_cache.db"), max_entries=max_entries
+            )
+        except Exception as e:
+            print(f"⚠️ Cache d'embeddings indisponible: {e}")
+            self.embedding_cache = None
+
     def _init_encryption(self, encryption_key: Optional[str] = None):
         """Initialise le système de chiffrement AES-256"""
         if not ENCRYPTION_AVAILABLE:
@@ -313,6 +470,9 @@ class VectorMemory:
         """
         Compte le nombre réel de tokens (pas de mots)
 
+        Les textes longs sont comptés segment par segment (coupés sur un blanc)
+        pour ne jamais matérialiser la liste complète des tokens.
+
         Args:
             text: Texte à analyser
 
@@ -321,8 +481,12 @@ class VectorMemory:
         """
         if self.tokenizer:
             # Vrai comptage avec tiktoken
-            tokens = self.tokenizer.encode(text)
-            return len(tokens)
+            if len(text) <= _STREAM_SEGMENT_CHARS:
+                return len(self.tokenizer.encode(text))
+            return sum(
+                len(self.tokenizer.encode(segment))
+                for segment in _iter_text_segments(text, _STREAM_SEGMENT_CHARS)
+            )
         else:
             # Fallback: approximation (1 mot ≈ 0.75 tokens)
             words = text.split()
@@ -338,37 +502,239 @@ class VectorMemory:
         Returns:
             Liste de chunks
         """
+        return [chunk for chunk, _, _ in self.iter_chunks(text)]
+
+    def split_into_chunks_with_counts(self, text: str) -> List[Tuple[str, int]]:
+        """
+        Divise le texte en chunks et conserve le nombre de tokens de chacun
+
+        Le découpage produit déjà les tokens de chaque fenêtre : on garde leur
+        nombre pour éviter de ré-encoder chaque chunk décodé (count_tokens).
+
+        Args:
+            text: Texte à diviser
+
+        Returns:
+            Liste de tuples (chunk, nombre de tokens)
+        """
+        return [(chunk, count) for chunk, count, _ in self.iter_chunks(text)]
+
+    def iter_chunks(
+        self, text: Union[str, Iterable[str]], segment_chars: Optional[int] = None
+    ) -> Iterator[Tuple[str, int, Tuple[int, int]]]:
+        """
+        Découpe le texte en chunks avec chevauchement, à la demande (générateur)
+
+        Le texte est lu et tokenisé par segments : seuls le segment courant et
+        la fenêtre en cours sont en mémoire, quelle que soit la taille du texte.
+        Les fenêtres sont celles du découpage complet (taille chunk_size, pas
+        chunk_size - chunk_overlap).
+
+        Args:
+            text: Texte, ou itérable de morceaux de texte (ex. fichier ouvert)
+            segment_chars: Taille des segments lus à la fois (en caractères)
+
+        Yields:
+            (chunk, nombre de tokens, (début, fin) en caractères dans le texte)
+        """
+        segment_chars = max(1, int(segment_chars or _STREAM_SEGMENT_CHARS))
+        segments = _iter_text_segments(text, segment_chars)
         if self.tokenizer:
-            # Découpage basé sur les vrais tokens (tiktoken)
-            tokens = self.tokenizer.encode(text)
-            chunks = []
+            return self._iter_token_chunks(segments, segment_chars)
+        return self._iter_word_chunks(segments)
+
+    def _iter_token_chunks(
+        self, segments: Iterator[str], segment_chars: int
+    ) -> Iterator[Tuple[str, int, Tuple[int, int]]]:
+        """Fenêtres de tokens (tiktoken) sur un texte lu par segments."""
+        size = self.chunk_size
+        step = max(1, self.chunk_size - self.chunk_overlap)
+        buffer, base = "", 0
+        wanted = segment_chars
+        exhausted = False
+
+        while True:
+            while not exhausted and len(buffer) < wanted:
+                segment = next(segments, None)
+                if segment is None:
+                    exhausted = True
+                else:
+                    buffer += segment
+
+            tokens = self.tokenizer.encode(buffer)
+            _, offsets = self.tokenizer.decode_with_offsets(tokens)
+            # Les derniers tokens du tampon peuvent changer avec la suite du
+            # texte : une fenêtre qui les touche attend le segment suivant.
+            limit = len(tokens) if exhausted else len(tokens) - _STREAM_TOKEN_GUARD
 
             start = 0
-            while start < len(tokens):
-                end = min(start + self.chunk_size, len(tokens))
-                chunk_tokens = tokens[start:end]
-                chunk_text = self.tokenizer.decode(chunk_tokens)
-                chunks.append(chunk_text)
+            while start < len(tokens) and (exhausted or start + size <= limit):
+                end = min(start + size, len(tokens))
+                char_end = offsets[end] if end < len(tokens) else len(buffer)
+                yield (
+                    self.tokenizer.decode(tokens[start:end]),
+                    end - start,
+                    (base + offsets[start], base + char_end),
+                )
+                start += step
+
+            if exhausted:
+                return
+            if start == 0:
+                # Pas encore de quoi remplir une fenêtre : lire davantage
+                wanted += segment_chars
+                continue
+
+            # Ne garder que le texte à partir de la prochaine fenêtre
+            cut = offsets[start] if start < len(tokens) else len(buffer)
+            buffer = buffer[cut:]
+            base += cut
+            wanted = segment_chars
+
+    def _iter_word_chunks(
+        self, segments: Iterator[str]
+    ) -> Iterator[Tuple[str, int, Tuple[int, int]]]:
+        """Fallback sans tiktoken : fenêtres de mots (1 mot ≈ 0.75 tokens)."""
+        word_chunk_size = max(1, int(self.chunk_size / 0.75))  # Approximation
+        word_step = max(1, word_chunk_size - int(self.chunk_overlap / 0.75))
+        words: List[Tuple[str, int, int]] = []  # (mot, début, fin)
+        carry, carry_start = "", 0
+
+        def _window() -> Tuple[str, int, Tuple[int, int]]:
+            window = words[:word_chunk_size]
+            return (
+                " ".join(word for word, _, _ in window),
+                int(len(window) * 0.75),
+                (window[0][1], window[-1][2]),
+            )
 
-                # Avancer avec chevauchement
-                start += self.chunk_size - self.chunk_overlap
+        for segment in segments:
+            buffer = carry + segment
+            keep = len(buffer)
+            for match in _WORD_RE.finditer(buffer):
+                if match.end() == len(buffer):
+                    # Mot peut-être coupé par la fin du segment
+                    keep = match.start()
+                    break
+                words.append((match.group(), carry_start + match.start(),
+                              carry_start + match.end()))
+                if len(words) >= word_chunk_size:
+                    yield _window()
+                    del words[:word_step]
+            carry, carry_start = buffer[keep:], carry_start + keep
+
+        if carry:
+            words.append((carry, carry_start, carry_start + len(carry)))
+        while words:
+            yield _window()
+            del words[:word_step]
+
+    def encode_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        Encode une liste de textes par mini-batchs (un appel modèle par batch)
 
-            return chunks
-        else:
-            # Fallback: découpage par mots
-            words = text.split()
-            chunks = []
-            word_chunk_size = int(self.chunk_size / 0.75)  # Approximation
-            word_overlap = int(self.chunk_overlap / 0.75)
+        Passe par le cache d'embeddings persistant s'il est actif.
 
-            start = 0
-            while start < len(words):
-                end = min(start + word_chunk_size, len(words))
-                chunk_words = words[start:end]
-                chunks.append(" ".join(chunk_words))
-                start += word_chunk_size - word_overlap
+        Args:
+            texts: Textes à encoder
 
-            return chunks
+        Returns:
+            Liste d'embeddings (listes de floats), [] si embeddings indisponibles
+        """
+        if not self.embedding_model or not texts:
+            return []
+
+        # [OPTIM] Cache adressé par contenu : seuls les textes jamais vus
+        # (pour ce modèle) sont réellement encodés
+        if self.embedding_cache is not None:
+            try:
+                return self.embedding_cache.encode(
+                    self.embedding_model, self.embedding_model_name, texts,
+                    batch_size=self.embedding_batch_size,
+                )
+            except Exception as e:
+                print(f"⚠️ Cache d'embeddings ignoré: {e}")
+
+        embeddings: List[List[float]] = []
+        for start in range(0, len(texts), self.embedding_batch_size):
+            batch = texts[start:start + self.embedding_batch_size]
+            vectors = self.embedding_model.encode(
+                batch, batch_size=self.embedding_batch_size, show_progress_bar=False
+            )
+            embeddings.extend(vectors.tolist())
+        return embeddings
+
+    def _max_add_batch_size(self) -> int:
+        """Taille maximale d'un collection.add accepté par ChromaDB."""
+        try:
+            return int(self.chroma_client.get_max_batch_size())
+        except Exception:
+            return 5000
+
+    def _store_document_chunks(
+        self,
+        doc_id: str,
+        document_name: str,
+        metadata: Optional[Dict[str, Any]],
+        created: str,
+        first_index: int,
+        chunks: List[Tuple[str, int, Tuple[int, int]]],
+    ) -> List[str]:
+        """
+        Encode et stocke un lot de chunks d'un document (ingestion en flux)
+
+        Args:
+            doc_id: Identifiant du document
+            document_name: Nom du document
+            metadata: Métadonnées additionnelles
+            created: Horodatage commun aux chunks du document
+            first_index: Index du premier chunk du lot dans le document
+            chunks: Tuples (chunk, nombre de tokens, offsets) produits par iter_chunks
+
+        Returns:
+            Identifiants des chunks du lot
+        """
+        texts = [chunk_text for chunk_text, _, _ in chunks]
+
+        # [OPTIM] Embeddings par mini-batchs au lieu d'un encode par chunk
+        embeddings_list = self.encode_batch(texts)
+
+        chunk_ids = []
+        stored_texts = []
+        chunk_metadatas = []
+        for i, (chunk_text, chunk_tokens, (char_start, char_end)) in enumerate(
+            chunks, start=first_index
+        ):
+            chunk_ids.append(f"{doc_id}_chunk_{i}")
+
+            # Chiffrer si activé
+            stored_texts.append(
+                self._encrypt(chunk_text) if self.enable_encryption else chunk_text
+            )
+            chunk_metadatas.append({
+                "document_id": doc_id,
+                "document_name": document_name,
+                "chunk_index": i,
+                "tokens": chunk_tokens,
+                "char_start": char_start,
+                "char_end": char_end,
+                "created": created,
+                "encrypted": self.enable_encryption,
+                **(metadata or {}),
+            })
+            self.current_tokens += chunk_tokens
+
+        # [OPTIM] Stockage ChromaDB en un collection.add groupé par lot
+        if self.document_collection and embeddings_list:
+            self.document_collection.add(
+                ids=chunk_ids,
+                embeddings=embeddings_list,
+                documents=stored_texts,
+                metadatas=chunk_metadatas,
+            )
+            self.index_sparse("document", chunk_ids, texts, chunk_metadatas)
+
+        return chunk_ids
 
     def add_document(
         self,
@@ -407,61 +773,45 @@ class VectorMemory:
             if self.current_tokens + total_tokens > self.max_tokens:
                 self._cleanup_old_documents(total_tokens)
 
-            # Diviser en chunks
-            chunks = self.split_into_chunks(content)
+            # [OPTIM] Découpage en flux : les chunks sont encodés et stockés par
+            # lots au fil du découpage, la mémoire ne dépend pas de la taille
+            # du document (le nombre de tokens de chaque chunk est réutilisé)
+            ingest_start = time.perf_counter()
+            created = datetime.now().isoformat()
+            chunk_ids: List[str] = []
+            chunk_sizes: List[int] = []
+            pending: List[Tuple[str, int, Tuple[int, int]]] = []
+            flush_every = max(1, min(_INGEST_FLUSH_CHUNKS, self._max_add_batch_size()))
+
+            for chunk in self.iter_chunks(content):
+                pending.append(chunk)
+                chunk_sizes.append(len(chunk[0]))
+                if len(pending) >= flush_every:
+                    chunk_ids.extend(self._store_document_chunks(
+                        doc_id, document_name, metadata, created, len(chunk_ids), pending
+                    ))
+                    pending = []
+            if pending:
+                chunk_ids.extend(self._store_document_chunks(
+                    doc_id, document_name, metadata, created, len(chunk_ids), pending
+                ))
 
             # Analyser la compression avec le moniteur (après création des chunks)
             compression_analysis = None
             if self.compression_monitor:
                 compression_analysis = self.compression_monitor.analyze_compression(
                     original_text=content,
-                    chunks=chunks,
+                    chunks=[],
                     document_name=document_name,
                     content_type=metadata.get("type", "text") if metadata else "text",
-                    metadata=metadata
+                    metadata=metadata,
+                    chunk_sizes=chunk_sizes,
                 )
 
-            # Générer embeddings et stocker
-            chunk_ids = []
-            embeddings_list = []
-
-            for i, chunk_text in enumerate(chunks):
-                chunk_id = f"{doc_id}_chunk_{i}"
-                chunk_tokens = self.count_tokens(chunk_text)
-
-                # Chiffrer si activé
-                stored_text = (
-                    self._encrypt(chunk_text) if self.enable_encryption else chunk_text
-                )
-
-                # Générer embedding
-                if self.embedding_model:
-                    embedding = self.embedding_model.encode(chunk_text).tolist()
-                    embeddings_list.append(embedding)
-                else:
-                    embedding = None
-
-                # Stocker dans ChromaDB
-                if self.document_collection and embedding:
-                    chunk_metadata = {
-                        "document_id": doc_id,
-                        "document_name": document_name,
-                        "chunk_index": i,
-                        "tokens": chunk_tokens,
-                        "created": datetime.now().isoformat(),
-                        "encrypted": self.enable_encryption,
-                        **(metadata or {}),
-                    }
-
-                    self.document_collection.add(
-                        ids=[chunk_id],
-                        embeddings=[embedding],
-                        documents=[stored_text],
-                        metadatas=[chunk_metadata],
-                    )
-
-                chunk_ids.append(chunk_id)
-                self.current_tokens += chunk_tokens
+            ingest_seconds = time.perf_counter() - ingest_start
+            chunks_per_second = (
+                len(chunk_ids) / ingest_seconds if ingest_seconds > 0 else 0.0
+            )
 
             # Enregistrer métadonnées document
             self.documents[doc_id] = {
@@ -473,17 +823,23 @@ class VectorMemory:
 
             # Mettre à jour statistiques
             self.stats["documents_added"] += 1
-            self.stats["chunks_created"] += len(chunks)
+            self.stats["chunks_created"] += len(chunk_ids)
             self.stats["total_tokens"] = self.current_tokens
             self.stats["last_updated"] = datetime.now().isoformat()
+            self.stats["last_ingest_chunks_per_second"] = round(chunks_per_second, 2)
 
             # Préparer le résultat
             result = {
                 "document_id": doc_id,
                 "document_name": document_name,
-                "chunks_created": len(chunks),
+                "chunks_created": len(chunk_ids),
                 "tokens_added": total_tokens,
                 "status": "success",
+                "throughput": {
+                    "chunks_per_second": round(chunks_per_second, 2),
+                    "ingest_seconds": round(ingest_seconds, 4),
+                    "embedding_batch_size": self.embedding_batch_size,
+                },
             }
 
             # Ajouter les métriques de compression si disponibles
@@ -503,6 +859,7 @@ class VectorMemory:
     def search_similar(
         self, query: str, n_results: int = 5, collection_type: str = "document",
         rerank: bool = True, where: Optional[Dict[str, Any]] = None,
+        mode: Optional[str] = None, keywords: Optional[List[str]] = None,
     ) -> List[Dict[str, Any]]:
         """
         Recherche sémantique par similarité avec reranking optionnel
@@ -514,6 +871,10 @@ class VectorMemory:
             rerank: Si True et CrossEncoder dispo, sur-échantillonne puis reranke
             where: Filtre de métadonnées ChromaDB (ex. {"workspace_id": "..."}),
                 appliqué côté base avant le reranking. None = aucun filtre.
+            mode: "dense" (embeddings seuls) ou "hybrid" (dense + BM25 fusionnés
+                par RRF). None = optimization.rag.search_mode.
+            keywords: Termes supplémentaires pour la partie BM25 (mode hybride)
+                — mots-clés exacts, identifiants, numéros de version...
 
         Returns:
             Liste de résultats avec scores
@@ -530,6 +891,7 @@ class VectorMemory:
         try:
             # [OPTIM] Sur-échantillonnage : récupérer 3x plus de candidats pour le reranking
             fetch_n = n_results * 3 if (rerank and self.reranker) else n_results
+            hybrid = (mode or self.search_mode).lower() == "hybrid"
 
             # Générer embedding de la requête
             query_embedding = self.embedding_model.encode(query).tolist()
@@ -562,24 +924,292 @@ class VectorMemory:
                         }
                     )
 
+            # [OPTIM] Fusion avec le classement BM25 (mode hybride)
+            if hybrid:
+                formatted_results = self._fuse_sparse(
+                    query, keywords, formatted_results, collection_type,
+                    collection, where, fetch_n,
+                )
+
             # [OPTIM] Reranking via CrossEncoder pour précision sémantique fine
-            if rerank and self.reranker and len(formatted_results) > n_results:
-                pairs = [[query, r["content"]] for r in formatted_results]
-                scores = self.reranker.predict(pairs)
+            # (évité si l'écart dense autour du top-k est déjà décisif)
+            if (rerank and self.reranker and len(formatted_results) > n_results
+                    and self._dense_margin_is_decisive(formatted_results, n_results)):
+                self.rerank_stats["skipped"] += 1
+                formatted_results.sort(key=lambda r: r["distance"])
+            elif rerank and self.reranker and len(formatted_results) > n_results:
+                scores = self.rerank_scores(query, formatted_results)
                 for idx, result in enumerate(formatted_results):
                     result["rerank_score"] = float(scores[idx])
                 formatted_results.sort(key=lambda r: r["rerank_score"], reverse=True)
                 formatted_results = formatted_results[:n_results]
                 print(f"🔀 [OPTIM] Reranking: {fetch_n} candidats → top {n_results}")
 
-            return formatted_results
+            return formatted_results[:n_results]
 
         except Exception as e:
             print(f"⚠️ Erreur recherche: {e}")
             return []
 
+    @traced("rerank", kind="retrieval")
+    def rerank_scores(self, query: str, results: List[Dict[str, Any]]) -> List[float]:
+        """Scores CrossEncoder de (query, result["content"]), via le cache LRU.
+
+        Clé : (hash de la requête, chunk_id, hash du contenu) — un chunk édité
+        est donc re-scoré. Seules les paires absentes du cache sont envoyées au
+        modèle, par lots de `rerank_batch_size`.
+
+        Args:
+            query: Requête de recherche
+            results: Résultats au format search_similar (content, chunk_id)
+
+        Returns:
+            Liste de scores alignée sur results
+        """
+        if not self.reranker or not results:
+            return []
+        query_key = hashlib.sha1(query.encode("utf-8")).hexdigest()
+        keys = [
+            (query_key, r.get("chunk_id"), hash(r.get("content", "")))
+            for r in results
+        ]
+        scores: List[Optional[float]] = [None] * len(results)
+        with self._rerank_lock:
+            for i, key in enumerate(keys):
+                if key in self._rerank_cache:
+                    self._rerank_cache.move_to_end(key)
+                    scores[i] = self._rerank_cache[key]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        self.rerank_stats["cache_hits"] += len(results) - len(missing)
+        self.rerank_stats["cache_misses"] += len(missing)
+
+        if missing:
+            pairs = [[query, results[i].get("content", "")] for i in missing]
+            predicted = self.reranker.predict(
+                pairs, batch_size=self.rerank_batch_size, show_progress_bar=False
+            )
+            with self._rerank_lock:
+                for i, score in zip(missing, predicted):
+                    scores[i] = float(score)
+                    if self.rerank_cache_size > 0:
+                        self._rerank_cache[keys[i]] = scores[i]
+                        self._rerank_cache.move_to_end(keys[i])
+                while len(self._rerank_cache) > max(0, self.rerank_cache_size):
+                    self._rerank_cache.popitem(last=False)
+        return [float(score) for score in scores]
+
+    def _dense_margin_is_decisive(
+        self, results: List[Dict[str, Any]], n_results: int
+    ) -> bool:
+        """True si le top-k dense est nettement séparé du candidat suivant
+        (écart de distance >= rerank_skip_margin) : le reranking ne changerait
+        pas l'ensemble retenu. Désactivé si la marge vaut 0."""
+        if self.rerank_skip_margin <= 0:
+            return False
+        distances = [r.get("distance") for r in results]
+        if any(d is None for d in distances):
+            return False  # candidats BM25 seuls (mode hybride) : pas de distance
+        ordered = sorted(distances)
+        return ordered[n_results] - ordered[n_results - 1] >= self.rerank_skip_margin
+
+    # ------------------------------------------------------------------
+    # [OPTIM] Index creux BM25 (recherche hybride)
+    # ------------------------------------------------------------------
+
+    def sparse_index(self, collection_type: str):
+        """Index BM25 d'une collection (ouvert à la demande), ou None.
+
+        None si FTS5 est indisponible, ou pour les documents chiffrés (l'index
+        stockerait le texte en clair sur disque). Tant que l'index n'a pas
+        enregistré la fin de son remplissage depuis la collection ChromaDB
+        existante (création, ou remplissage interrompu), il est (re)rempli.
+
+        L'index des conversations tient aussi une table trigramme : c'est le
+        même index qui sert la recherche par mots exacts de ConversationSearch.
+        """
+        if not SPARSE_INDEX_AVAILABLE or collection_type not in _SPARSE_GROUP_KEYS:
+            return None
+        if collection_type == "document" and self.enable_encryption:
+            return None
+        if collection_type in self._sparse_indexes:
+            return self._sparse_indexes[collection_type]
+
+        path = self.storage_dir / "sparse" / f"{collection_type}.db"
+        try:
+            index = LexicalIndex(str(path), tokenizer=WORD_TOKENIZER,
+                                 substring=collection_type == "conversation")
+            complete = index.get_info(_SPARSE_BACKFILL_KEY) == "1"
+        except Exception as e:
+            print(f"⚠️ Index BM25 indisponible ({collection_type}): {e}")
+            index, complete = None, True
+        self._sparse_indexes[collection_type] = index
+        if not complete:
+            self._backfill_sparse(collection_type, index)
+        return index
+
+    @staticmethod
+    def _sparse_group(collection_type: str, metadata: Optional[Dict[str, Any]]) -> str:
+        keys = _SPARSE_GROUP_KEYS.get(collection_type, ())
+        metadata = metadata or {}
+        return "".join(f"{metadata.get(k, '')}|" for k in keys)
+
+    @staticmethod
+    def _sparse_prefix(collection_type: str,
+                       where: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Préfixe de groupe équivalent à un filtre `where` d'égalités (None si
+        le filtre ne se traduit pas en préfixe)."""
+        if not where:
+            return None
+        clauses = where.get("$and", [where]) if isinstance(where, dict) else []
+        flat: Dict[str, Any] = {}
+        for clause in clauses:
+            if not isinstance(clause, dict):
+                return None
+            for key, value in clause.items():
+                if key.startswith("$") or isinstance(value, dict):
+                    return None
+                flat[key] = value
+        prefix = ""
+        for key in _SPARSE_GROUP_KEYS.get(collection_type, ()):
+            if key not in flat:
+                break
+            prefix += f"{flat.pop(key)}|"
+        return prefix if prefix and not flat else None
+
+    def index_sparse(
+        self, collection_type: str, ids: List[str], documents: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        """Ajoute/remplace des entrées (texte en clair) dans l'index BM25.
+
+        À appeler à chaque écriture dans la collection ChromaDB correspondante.
+        """
+        index = self.sparse_index(collection_type)
+        if index is None or not ids:
+            return
+        metadatas = metadatas or [{} for _ in ids]
+        try:
+            index.upsert(ids, documents, groups=[
+                self._sparse_group(collection_type, m) for m in metadatas
+            ])
+        except Exception as e:
+            print(f"⚠️ Erreur index BM25 ({collection_type}): {e}")
+
+    def remove_sparse(
+        self, collection_type: str, ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Retire des entrées de l'index BM25, par ids ou par filtre `where`
+        (mêmes filtres d'égalité que la suppression ChromaDB)."""
+        index = self.sparse_index(collection_type)
+        if index is None:
+            return
+        try:
+            if ids:
+                index.delete(ids)
+            if where:
+                prefix = self._sparse_prefix(collection_type, where)
+                if prefix is None:
+                    print(f"⚠️ Filtre non supporté par l'index BM25: {where}")
+                else:
+                    index.delete_group_prefix(prefix)
+        except Exception as e:
+            print(f"⚠️ Erreur index BM25 ({collection_type}): {e}")
+
+    def _backfill_sparse(self, collection_type: str, index) -> None:
+        """Remplit l'index BM25 depuis la collection ChromaDB (upsert idempotent :
+        un remplissage interrompu peut être repris) puis marque sa fin."""
+        collection = self._collection_for(collection_type)
+        if collection is None:
+            return
+        page, offset, total = 1000, 0, 0
+        try:
+            while True:
+                data = collection.get(
+                    include=["documents", "metadatas"], limit=page, offset=offset
+                )
+                ids = data.get("ids") or []
+                if not ids:
+                    break
+                docs = data.get("documents") or []
+                metas = data.get("metadatas") or []
+                rows = [
+                    (ids[i], docs[i], metas[i] or {})
+                    for i in range(len(ids))
+                    if docs[i] and not (metas[i] or {}).get("encrypted", False)
+                ]
+                index.upsert(
+                    [r[0] for r in rows], [r[1] for r in rows],
+                    groups=[self._sparse_group(collection_type, r[2]) for r in rows],
+                )
+                total += len(rows)
+                offset += len(ids)
+                if len(ids) < page:
+                    break
+        except Exception as e:
+            print(f"⚠️ Remplissage index BM25 ({collection_type}) interrompu: {e}")
+            return  # pas de marque de fin : repris à la prochaine ouverture
+        index.set_info(_SPARSE_BACKFILL_KEY, "1")
+        if total:
+            print(f"🔎 Index BM25 '{collection_type}' construit: {total} entrées")
+
+    def _fuse_sparse(
+        self, query: str, keywords: Optional[List[str]],
+        dense: List[Dict[str, Any]], collection_type: str, collection,
+        where: Optional[Dict[str, Any]], fetch_n: int,
+    ) -> List[Dict[str, Any]]:
+        """Fusionne le classement dense et le classement BM25 (Reciprocal Rank
+        Fusion : score = Σ 1 / (k + rang)). Les candidats trouvés seulement par
+        BM25 sont lus dans ChromaDB (qui applique aussi le filtre `where`)."""
+        index = self.sparse_index(collection_type)
+        if index is None:
+            return dense
+        terms = query_terms(query, *(keywords or []))
+        try:
+            ranked = index.rank(
+                terms, limit=fetch_n,
+                group_prefix=self._sparse_prefix(collection_type, where),
+            )
+        except Exception as e:
+            print(f"⚠️ Erreur recherche BM25: {e}")
+            return dense
+        if not ranked:
+            return dense
+
+        by_id = {r["chunk_id"]: r for r in dense}
+        missing = [cid for cid, _ in ranked if cid not in by_id]
+        if missing:
+            get_kwargs = {"ids": missing, "include": ["documents", "metadatas"]}
+            if where:
+                get_kwargs["where"] = where
+            data = collection.get(**get_kwargs)
+            for i, cid in enumerate(data.get("ids") or []):
+                meta = data["metadatas"][i] or {}
+                content = data["documents"][i]
+                if meta.get("encrypted", False):
+                    content = self._decrypt(content)
+                by_id[cid] = {
+                    "chunk_id": cid, "content": content,
+                    "metadata": meta, "distance": None,
+                }
+
+        fused: Dict[str, float] = {}
+        for rank, r in enumerate(dense):
+            fused[r["chunk_id"]] = 1.0 / (self.rrf_k + rank + 1)
+        for rank, (cid, score) in enumerate(ranked):
+            if cid not in by_id:
+                continue  # écarté par le filtre where ou absent de ChromaDB
+            by_id[cid]["bm25_score"] = score
+            fused[cid] = fused.get(cid, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+
+        ordered = sorted(fused, key=fused.get, reverse=True)[:fetch_n]
+        for cid in ordered:
+            by_id[cid]["rrf_score"] = fused[cid]
+        return [by_id[cid] for cid in ordered]
+
     def get_relevant_context(
-        self, query: str, max_chunks: int = 5, collection_type: str = "document"
+        self, query: str, max_chunks: int = 5, collection_type: str = "document",
+        mode: Optional[str] = None, keywords: Optional[List[str]] = None,
     ) -> str:
         """
         Récupère le contexte le plus pertinent (API compatible avec ancien système)
@@ -589,13 +1219,15 @@ class VectorMemory:
             query: Requête de recherche
             max_chunks: Nombre maximum de chunks finaux (après reranking)
             collection_type: Type de collection
+            mode: "dense" ou "hybrid" (voir search_similar)
+            keywords: Termes supplémentaires pour la partie BM25
 
         Returns:
             Contexte consolidé
         """
         results = self.search_similar(
             query, n_results=max_chunks, collection_type=collection_type,
-            rerank=True,
+            rerank=True, mode=mode, keywords=keywords,
         )
 
         if not results:
@@ -752,7 +1384,7 @@ class VectorMemory:
         stored_text = self._encrypt(new_text) if self.enable_encryption else new_text
         try:
             if self.embedding_model:
-                embedding = self.embedding_model.encode(new_text).tolist()
+                embedding = self.encode_batch([new_text])[0]
                 collection.update(
                     ids=[entry_id],
                     documents=[stored_text],
@@ -760,6 +1392,10 @@ class VectorMemory:
                 )
             else:
                 collection.update(ids=[entry_id], documents=[stored_text])
+            if self.sparse_index(collection_type) is not None:
+                meta = collection.get(ids=[entry_id], include=["metadatas"])
+                metas = meta.get("metadatas") or [{}]
+                self.index_sparse(collection_type, [entry_id], [new_text], metas[:1])
             return True
         except Exception as e:
             print(f"⚠️ Erreur update_entry: {e}")
@@ -780,6 +1416,7 @@ class VectorMemory:
             return False
         try:
             collection.delete(ids=[entry_id])
+            self.remove_sparse(collection_type, ids=[entry_id])
             return True
         except Exception as e:
             print(f"⚠️ Erreur delete_entry: {e}")
@@ -821,6 +1458,7 @@ class VectorMemory:
                     self.document_collection.delete(ids=doc_info["chunks"])
                 except Exception as e:
                     print(f"⚠️ Erreur suppression chunks: {e}")
+                self.remove_sparse("document", ids=doc_info["chunks"])
 
             tokens_freed += doc_info["total_tokens"]
             self.current_tokens -= doc_info["total_tokens"]
@@ -846,6 +1484,19 @@ class VectorMemory:
             "tokenizer": "tiktoken" if self.tokenizer else "fallback",
         }
 
+        if self.embedding_cache is not None:
+            try:
+                stats["embedding_cache"] = self.embedding_cache.get_stats()
+            except Exception:
+                pass
+
+        if self.reranker is not None:
+            stats["rerank"] = {
+                **self.rerank_stats,
+                "cache_entries": len(self._rerank_cache),
+                "batch_size": self.rerank_batch_size,
+            }
+
         # Ajouter les stats de compression si disponibles
         if self.compression_monitor:
             compression_stats = self.compression_monitor.get_stats()
@@ -881,7 +1532,11 @@ class VectorMemory:
             except Exception as e:
                 print(f"⚠️ Erreur clear conversations: {e}")
 
-        if self.codebase_collection:
+        if QUANTIZED_STORE_AVAILABLE and isinstance(
+            self.codebase_collection, QuantizedCollection
+        ):
+            self.codebase_collection.clear()
+        elif self.codebase_collection:
             try:
                 self.chroma_client.delete_collection("codebase")
                 self.codebase_collection = self.chroma_client.create_collection(
@@ -890,6 +1545,14 @@ class VectorMemory:
             except Exception as e:
                 print(f"⚠️ Erreur clear codebase: {e}")
 
+        for collection_type in _SPARSE_GROUP_KEYS:
+            index = self.sparse_index(collection_type)
+            if index is not None:
+                try:
+                    index.clear()
+                except Exception as e:
+                    print(f"⚠️ Erreur clear index BM25: {e}")
+
         self.documents = {}
         self.current_tokens = 0
         self.stats = {
@@ -898,6 +1561,7 @@ class VectorMemory:
             "total_tokens": 0,
             "last_updated": datetime.now().isoformat(),
             "encryption_enabled": self.enable_encryption,
+            "last_ingest_chunks_per_second": 0.0,
         }
 
         print("🧹 Mémoire vidée")
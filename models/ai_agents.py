@@ -6,7 +6,9 @@ Chaque agent a une expertise et un comportement spécifique
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 import re
+import sqlite3
 
+from core.response_cache import get_response_cache
 from models.local_llm import LocalLLM
 from models.internet_search import EnhancedInternetSearchEngine
 
@@ -89,9 +91,7 @@ class AIAgent:
             print(f"⚙️ Agent {self.name} exécute la tâche...")
 
             # Générer la réponse
-            response = self.llm.generate(
-                prompt=full_prompt, system_prompt=self.system_prompt
-            )
+            response = self._generate(full_prompt)
 
             if response:
                 # Enregistrer dans l'historique
@@ -161,9 +161,7 @@ class AIAgent:
             print(f"⚙️ Agent {self.name} exécute la tâche (streaming)...")
 
             # Générer la réponse avec streaming
-            response = self.llm.generate_stream(
-                prompt=full_prompt, system_prompt=self.system_prompt, on_token=on_token
-            )
+            response = self._generate(full_prompt, on_token=on_token, stream=True)
 
             if response:
                 # Enregistrer dans l'historique
@@ -204,6 +202,53 @@ class AIAgent:
                 "error": str(e),
             }
 
+    def _generate(self, full_prompt: str, on_token=None, stream: bool = False) -> Optional[str]:
+        """
+        Génère la réponse, en passant par le cache de réponses s'il est activé
+
+        Une tâche planifiée relancée à l'identique (même agent, même prompt)
+        est servie depuis le cache tant que l'entrée n'a pas expiré.
+        """
+        cache = get_response_cache()
+        # La réponse dépend aussi de l'historique du LLM (generate l'injecte) :
+        # il fait partie du contexte de la clé, avec le prompt système
+        context = "\n".join(
+            [self.system_prompt or ""]
+            + [f"{m.get('role')}: {m.get('content')}"
+               for m in getattr(self.llm, "conversation_history", None) or []]
+        )
+        key = (self.llm.model, full_prompt, context, self.llm.gen_temperature)
+        if cache is not None:
+            try:
+                cached = cache.lookup(*key)
+            except sqlite3.Error as e:
+                print(f"⚠️ Agent {self.name} : cache de réponses ignoré ({e})")
+                cached = None
+            if cached is not None:
+                print(f"⚡ Agent {self.name} : réponse servie depuis le cache")
+                if on_token:
+                    on_token(cached)
+                # Comme generate(save_history=True) : l'échange rejoint l'historique
+                self.llm.add_to_history("user", full_prompt)
+                self.llm.add_to_history("assistant", cached)
+                return cached
+
+        if stream:
+            response = self.llm.generate_stream(
+                prompt=full_prompt, system_prompt=self.system_prompt, on_token=on_token
+            )
+        else:
+            response = self.llm.generate(
+                prompt=full_prompt, system_prompt=self.system_prompt
+            )
+        if cache is not None and response:
+            model, prompt, context, temperature = key
+            try:
+                cache.store(model, prompt, response, context, temperature)
+            except sqlite3.Error as e:
+                print(f"⚠️ Agent {self.name} : réponse non mise en cache ({e})")
+        return response
+
     def _build_prompt(self, task: str, context: Optional[Dict]) -> str:
         """Construit le prompt enrichi avec contexte"""
         prompt_parts = [f"TÂCHE: {task}"]
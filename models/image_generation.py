@@ -37,6 +37,7 @@ from typing import Any, Callable, Dict, Optional
 import requests
 
 from core.config import get_config
+from core.ollama_client import get_ollama_client
 
 # NB : torch / diffusers / torch_directml sont des dépendances OPTIONNELLES
 # (backend "diffusers" uniquement). Elles sont importées PARESSEUSEMENT dans les
@@ -757,7 +758,7 @@ class ImageGenerator:
 
 def _resilient_post(url: str, **kwargs) -> requests.Response:
     timeout = kwargs.pop("timeout", 300)
-    return requests.post(url, timeout=timeout, **kwargs)
+    return get_ollama_client().post(url, timeout=timeout, **kwargs)
 
 
 if TENACITY_AVAILABLE:
@@ -6,11 +6,17 @@ Support de l'historique de conversation pour un contexte persistant.
 import json
 import re
 import threading as _threading
-import time as _time
-from typing import Callable, Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 
 import requests
 
+from core.context_budget import ContextBudget
+from core.history_summarizer import HistorySummarizer, get_summary_cache
+from core.ollama_client import get_ollama_client
+from core.prompt_assembly import observe_prompt, stable_tools, with_volatile
+from core.tool_dispatch import run_tool_calls
+from core.tool_stream import ToolCallStreamParser, iter_chunks
+
 # [OPTIM] Retry résilient sur les appels réseau Ollama
 try:
     from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
@@ -20,9 +26,10 @@ except ImportError:
 
 
 def _resilient_post(url, **kwargs):
-    """requests.post avec retry automatique via tenacity (si disponible)."""
+    """POST via le client Ollama partagé (keep-alive, créneaux), avec retry
+    automatique via tenacity (si disponible)."""
     timeout = kwargs.pop("timeout", 1200)
-    return requests.post(url, timeout=timeout, **kwargs)
+    return get_ollama_client().post(url, timeout=timeout, **kwargs)
 
 
 if TENACITY_AVAILABLE:
@@ -86,12 +93,37 @@ class LocalLLM:
         self.max_history_length = 200  # Garder les 200 derniers échanges
         self._streamed_already = False  # Flag pour tracking du streaming vision
 
-        # 📝 Résumé glissant : résumé compressé des anciens messages
+        # 📝 Résumé glissant : résumé compressé des anciens messages, calculé
+        # en arrière-plan puis substitué en tête d'historique
         self._conversation_summary: str = ""
-        # Seuil en tokens estimés avant déclenchement du résumé (laisser ~8k pour réponse+prompt)
-        self._summary_threshold_tokens: int = 24000
+        # Message de tête portant le résumé, et empreinte des messages bruts
+        # qu'il couvre (clé du cache de résumés par workspace)
+        self._summary_message: Optional[Dict[str, str]] = None
+        self._summary_chain: str = ""
+        # Tête d'historique au lancement du job de résumé en cours
+        self._summary_job_head: Optional[Dict[str, str]] = None
+        self._history_lock = _threading.RLock()
         # Taille cible après résumé (en nombre de messages à conserver "vivants")
         self._keep_recent_messages: int = 20
+        # Workspace courant (branché par AIEngine) : partitionne le cache de résumés
+        self.workspace_resolver: Optional[Callable[[], Optional[str]]] = None
+        _prefetch, _cache_path = 0.8, "data/summary_cache.db"
+        try:
+            from core.config import get_config
+            _cfg = get_config()
+            _prefetch = float(_cfg.get("llm.local.context_budget.prefetch_ratio", 0.8))
+            _cache_path = str(_cfg.get("llm.local.context_budget.summary_cache", _cache_path))
+        except Exception:
+            pass
+        self._summary_prefetch_ratio = _prefetch
+        self._summarizer = HistorySummarizer(
+            self._summarize_messages, cache=get_summary_cache(_cache_path)
+        )
+        # 📏 Budget de contexte en tokens (recréé si le modèle ou num_ctx change)
+        self._context_budget: Optional[ContextBudget] = None
+        # Taille du dernier prompt système envoyé : l'historique partage la
+        # fenêtre avec lui, le seuil de résumé en tient compte.
+        self._last_system_tokens: int = 0
 
         if self.is_ollama_available:
             # Vérifier si le modèle personnalisé existe, sinon utiliser qwen3.5:4b
@@ -137,7 +169,7 @@ class LocalLLM:
                 "keep_alive": "1h",
                 "options": {"num_predict": 1, "temperature": 0.0},
             }
-            requests.post(self.ollama_url, json=data, timeout=60)
+            get_ollama_client().post(self.ollama_url, json=data, timeout=60)
             print(f"🔥 [LocalLLM] Warmup terminé — modèle '{self.model}' chargé en VRAM")
         except Exception as exc:
             print(f"⚠️ [LocalLLM] Warmup échoué (non bloquant) : {exc}")
@@ -145,7 +177,7 @@ class LocalLLM:
     def _check_model_exists(self, model_name):
         """Vérifie si le modèle existe dans Ollama"""
         try:
-            response = requests.get(
+            response = get_ollama_client().get(
                 self.ollama_url.replace("/api/generate", "/api/tags"), timeout=2
             )
             if response.status_code == 200:
@@ -189,7 +221,7 @@ class LocalLLM:
         if not self.is_ollama_available:
             return []
         try:
-            response = requests.get(
+            response = get_ollama_client().get(
                 self.ollama_url.replace("/api/generate", "/api/tags"), timeout=5
             )
             if response.status_code == 200:
@@ -206,35 +238,61 @@ class LocalLLM:
         """Vérifie si le serveur Ollama répond"""
         try:
             # On tente juste un ping rapide (GET sur la racine ou une API légère)
-            response = requests.get(
+            response = get_ollama_client().get(
                 self.ollama_url.replace("/api/generate", ""), timeout=2
             )
             return response.status_code == 200
         except Exception:
             return False
 
-    def generate(self, prompt, system_prompt=None, save_history=True, use_history=True):
+    @property
+    def context_budget(self) -> ContextBudget:
+        """Budget de contexte du modèle courant (num_ctx réglable à chaud)."""
+        budget = self._context_budget
+        if budget is None or budget.num_ctx != self.gen_num_ctx or budget.model != self.model:
+            budget = ContextBudget(self.gen_num_ctx, model=self.model)
+            self._context_budget = budget
+        return budget
+
+    def _build_messages(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        tools: Optional[List[Dict]] = None,
+        use_history: bool = True,
+        context: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        Messages /api/chat : historique élagué au budget de tokens restant.
+        Le contexte de la requête (faits, extraits, documents) suit
+        l'historique pour que le prompt système reste un préfixe stable.
+        """
+        budget = self.context_budget
+        self._last_system_tokens = budget.count(system_prompt or "")
+        if not use_history:
+            return budget.fit_messages(system_prompt, [], prompt, tools, context)
+        # Un résumé prêt est substitué avant la requête, jamais attendu
+        self.apply_pending_summary()
+        with self._history_lock:
+            history = list(self.conversation_history)
+        return budget.fit_messages(system_prompt, history, prompt, tools, context)
+
+    def generate(self, prompt, system_prompt=None, save_history=True, use_history=True,
+                 context=None):
         """
         Génère une réponse avec contexte de conversation.
         Utilise l'API /api/chat pour maintenir l'historique.
+        context : contexte propre à la requête, placé après l'historique.
         Retourne None si Ollama n'est pas disponible (pour déclencher le fallback).
         """
         if not self.is_ollama_available:
             return None
 
-        # Construire les messages avec historique
-        messages = []
-
-        # Ajouter le system prompt s'il existe
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-
-        # Ajouter l'historique de conversation
-        if use_history:
-            messages.extend(self.conversation_history)
-
-        # Ajouter le message actuel de l'utilisateur
-        messages.append({"role": "user", "content": prompt})
+        # Construire les messages : system prompt, historique tenant dans le
+        # budget de tokens, message actuel de l'utilisateur
+        messages = self._build_messages(
+            prompt, system_prompt, use_history=use_history, context=context
+        )
 
         data = {
             "model": self.model,
@@ -252,11 +310,12 @@ class LocalLLM:
 
         try:
             print(
-                f"⏳ [LocalLLM] Génération avec contexte ({len(self.conversation_history) if use_history else 0} messages précédents)..."
+                f"⏳ [LocalLLM] Génération avec contexte ({len(messages)} messages)..."
             )
             response = _resilient_post(self.chat_url, json=data, timeout=self.timeout)
             if response.status_code == 200:
                 result = response.json()
+                observe_prompt(self.context_budget, "local_llm.generate", messages, None, result)
                 assistant_response = result.get("message", {}).get("content", "")
 
                 if assistant_response and save_history:
@@ -289,10 +348,12 @@ class LocalLLM:
         is_interrupted_callback: Optional[Callable] = None,
         on_thinking_token: Optional[Callable] = None,
         on_thinking_complete: Optional[Callable] = None,
+        context: Optional[str] = None,
     ) -> str:
         """
         Génère une réponse en streaming réel depuis Ollama.
         Appelle on_token(chunk) pour chaque token de réponse.
+        context : contexte propre à la requête, placé après l'historique.
 
         Si on_thinking_token est fourni, active le thinking natif Qwen3.5 :
           - "think": True dans la requête → Ollama streame les tokens de
@@ -306,11 +367,7 @@ class LocalLLM:
         if not self.is_ollama_available:
             return ""
 
-        messages: List[Dict] = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        messages.extend(self.conversation_history)
-        messages.append({"role": "user", "content": prompt})
+        messages = self._build_messages(prompt, system_prompt, context=context)
 
         # Activer le thinking natif Qwen3.5 uniquement quand le widget est disponible
         native_thinking = on_thinking_token is not None
@@ -326,10 +383,6 @@ class LocalLLM:
         full_response = ""
         _thinking_complete_fired = False  # Garantit un seul appel au callback
 
-        # 📊 Mesure TTFT (Time To First Token) pour diagnostiquer la latence
-        _ttft_start = _time.time()
-        _ttft_logged = False
-
         try:
             with _resilient_post(
                 self.chat_url, json=data, timeout=self.timeout, stream=True
@@ -351,18 +404,12 @@ class LocalLLM:
                     # dans message.thinking (champ séparé de message.content)
                     thinking_tok = msg.get("thinking", "")
                     if thinking_tok and on_thinking_token:
-                        if not _ttft_logged:
-                            _ttft_logged = True
-                            print(f"⏱️  [TTFT] generate_stream : {_time.time() - _ttft_start:.2f}s avant 1er token (thinking)")
                         if on_thinking_token(thinking_tok) is False:
                             break
                     # Réponse finale : au premier content token, signaler la fin
                     # du thinking pour que le widget passe à « Raisonnement ✓ »
                     token = msg.get("content", "")
                     if token:
-                        if not _ttft_logged:
-                            _ttft_logged = True
-                            print(f"⏱️  [TTFT] generate_stream : {_time.time() - _ttft_start:.2f}s avant 1er token")
                         if not _thinking_complete_fired and on_thinking_complete:
                             _thinking_complete_fired = True
                             on_thinking_complete()
@@ -372,6 +419,9 @@ class LocalLLM:
                             if result is False:
                                 break
                     if chunk.get("done"):
+                        observe_prompt(
+                            self.context_budget, "local_llm.generate_stream", messages, None, chunk
+                        )
                         break
         except Exception as exc:
             print(f"⚠️ [LocalLLM] generate_stream exception: {exc}")
@@ -413,7 +463,9 @@ class LocalLLM:
             "messages": messages,
             "stream": True,
             "keep_alive": "1h",  # [OPTIM] Persistance modèle en VRAM
-            "options": {"temperature": 0.7, "num_ctx": 8192, "num_keep": -1},  # [OPTIM] num_keep: préserver system prompt
+            # num_ctx identique aux autres appels : une valeur différente
+            # recharge le modèle et perd son cache KV
+            "options": {"temperature": 0.7, "num_ctx": self.gen_num_ctx, "num_keep": -1},  # [OPTIM] num_keep: préserver system prompt
         }
 
         print(f"🧠 [THINKING STREAM] Démarrage — modèle: {self.model} | chat_url: {self.chat_url}")
@@ -462,6 +514,8 @@ class LocalLLM:
         system_prompt: Optional[str] = None,
         on_token: Optional[Callable] = None,
         max_tool_iterations: int = 10,
+        context: Optional[str] = None,
+        is_read_only: Optional[Callable[[str], bool]] = None,
     ) -> Dict:
         """
         Boucle agentique : Ollama choisit et appelle des outils, puis génère
@@ -481,6 +535,11 @@ class LocalLLM:
             system_prompt:      Prompt système optionnel
             on_token:           Callback de streaming pour la réponse finale
             max_tool_iterations: Garde-fou contre les boucles infinies
+            context:            Contexte de la requête (faits, extraits),
+                                placé après l'historique
+            is_read_only:       Callable(tool_name) → bool ; les outils en
+                                lecture seule d'un même tour s'exécutent
+                                en parallèle (core/tool_dispatch)
 
         Returns:
             Dict {
@@ -492,12 +551,10 @@ class LocalLLM:
         if not self.is_ollama_available:
             return {"response": None, "tool_calls": [], "success": False}
 
-        # Construction du contexte initial
-        messages: List[Dict] = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        messages.extend(self.conversation_history)
-        messages.append({"role": "user", "content": prompt})
+        # Construction du contexte initial (le schéma des outils compte aussi,
+        # sous forme canonique pour rester un préfixe stable)
+        tools = stable_tools(tools)
+        messages = self._build_messages(prompt, system_prompt, tools, context=context)
 
         tool_calls_log: List[Dict] = []
 
@@ -532,6 +589,9 @@ class LocalLLM:
 
                 result = response.json()
                 message = result.get("message", {})
+                observe_prompt(
+                    self.context_budget, "local_llm.generate_with_tools", messages, tools, result
+                )
 
             except Exception as exc:
                 print(f"⚠️ [LocalLLM] Exception tool-calling: {exc}")
@@ -564,32 +624,17 @@ class LocalLLM:
             # Ajouter la réponse partielle de l'assistant au contexte
             messages.append(message)
 
-            for tool_call in message.get("tool_calls", []):
-                func = tool_call.get("function", {})
-                tool_name = func.get("name", "")
-                arguments = func.get("arguments", {})
-
-                # Nettoyage des arguments si le modèle a halluciné le schéma
-                cleaned_args = {}
-                for k, v in arguments.items():
-                    if isinstance(v, dict) and "type" in v and "description" in v:
-                        if "description" in v and v["description"] != "La requête de recherche":
-                            cleaned_args[k] = v["description"]
-                        else:
-                            continue
-                    else:
-                        cleaned_args[k] = v
-                arguments = cleaned_args
-
+            calls = self._native_tool_calls(message)
+            for tool_name, arguments in calls:
                 print(
                     f"🔧 [LocalLLM] Tool call: {tool_name}({json.dumps(arguments)[:80]})"
                 )
 
-                # Exécution de l'outil
-                try:
-                    tool_result = tool_executor(tool_name, arguments)
-                except Exception as exc:
-                    tool_result = f"[Erreur lors de l'exécution de {tool_name}]: {exc}"
+            # Exécution des outils (lectures indépendantes en parallèle)
+            outcomes = run_tool_calls(calls, tool_executor, is_read_only=is_read_only)
+            for (tool_name, arguments), tool_result in zip(calls, outcomes):
+                if isinstance(tool_result, Exception):
+                    tool_result = f"[Erreur lors de l'exécution de {tool_name}]: {tool_result}"
 
                 tool_calls_log.append({
                     "tool": tool_name,
@@ -611,6 +656,28 @@ class LocalLLM:
         )
         return {"response": None, "tool_calls": tool_calls_log, "success": False}
 
+    @staticmethod
+    def _native_tool_calls(message: Dict) -> List[Tuple[str, Dict]]:
+        """[(nom, arguments)] des tool_calls d'un message Ollama, arguments nettoyés."""
+        calls: List[Tuple[str, Dict]] = []
+        for tool_call in message.get("tool_calls", []):
+            func = tool_call.get("function", {})
+            tool_name = func.get("name", "")
+            arguments = func.get("arguments", {})
+
+            # Nettoyage des arguments si le modèle a halluciné le schéma
+            cleaned_args = {}
+            for k, v in arguments.items():
+                if isinstance(v, dict) and "type" in v and "description" in v:
+                    if "description" in v and v["description"] != "La requête de recherche":
+                        cleaned_args[k] = v["description"]
+                    else:
+                        continue
+                else:
+                    cleaned_args[k] = v
+            calls.append((tool_name, cleaned_args))
+        return calls
+
     # ------------------------------------------------------------------
     # Détection des "text tool calls" (llama3.2 bug workaround)
     # ------------------------------------------------------------------
@@ -709,21 +776,29 @@ class LocalLLM:
         on_tool_call: Optional[Callable] = None,
         is_interrupted_callback: Optional[Callable] = None,
         max_tool_iterations: int = 10,
+        context: Optional[str] = None,
+        is_read_only: Optional[Callable[[str], bool]] = None,
     ) -> Dict:
         """
         Version streaming de generate_with_tools.
-        - Les appels d'outils sont non-streamés (nécessaire pour l'API Ollama)
-        - La réponse finale est streamée token par token via on_token
+        - Le premier appel est streamé : une réponse en texte est transmise à
+          on_token au fil de la génération, un appel d'outil (tool_calls ou
+          JSON écrit en texte) est retenu (core/tool_stream)
+        - Après des appels d'outils, la synthèse est streamée via on_token
         - Gère le fallback "text tool call" (llama3.2 écrit le JSON au lieu de
           remplir le champ tool_calls)
 
         Args:
             on_tool_call: Callback(tool_name, args) appelé avant chaque exécution
                           (pour afficher "Je recherche..." dans l'UI)
+            context:      Contexte de la requête, placé après l'historique
+            is_read_only: Callable(tool_name) → bool (voir generate_with_tools)
         """
         if not self.is_ollama_available:
             return {"response": None, "tool_calls": [], "success": False}
 
+        tools = stable_tools(tools)
+
         # Noms des outils disponibles (pour détecter les text tool calls)
         known_tool_names: List[str] = [
             t.get("function", {}).get("name", "")
@@ -731,11 +806,7 @@ class LocalLLM:
             if isinstance(t, dict)
         ]
 
-        messages: List[Dict] = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        messages.extend(self.conversation_history)
-        messages.append({"role": "user", "content": prompt})
+        messages = self._build_messages(prompt, system_prompt, tools, context=context)
 
         tool_calls_log: List[Dict] = []
 
@@ -743,67 +814,24 @@ class LocalLLM:
             if is_interrupted_callback and is_interrupted_callback():
                 break
 
-            # Après au moins un appel d'outil, ne plus passer les outils à Ollama
-            # pour l'étape de synthèse. Sans outils disponibles, le modèle est
-            # forcé de synthétiser depuis les résultats déjà injectés.
-            tools_for_this_call = [] if tool_calls_log else tools
-
-            # Lors de la synthèse, remplacer le message système pour éviter que
-            # le modèle réponde « je n'ai pas accès aux données en temps réel »
-            # malgré les résultats déjà injectés.
-            if tool_calls_log and messages and messages[0].get("role") == "system":
-                messages[0] = {
-                    "role": "system",
-                    "content": (
-                        "Les informations demandées ont été récupérées en temps réel "
-                        "via des outils externes. Tu DOIS utiliser UNIQUEMENT ces données "
-                        "pour répondre à la question. "
-                        "Ne dis JAMAIS que tu n'as pas accès aux données en temps réel "
-                        "car tu viens de les recevoir. "
-                        "Réponds de façon précise, factuelle et concise en te basant "
-                        "sur les résultats fournis par les outils."
-                    ),
-                }
-
             # Phase de synthèse (après tool calls) : vrai streaming Ollama
             if tool_calls_log:
-                data_synthesis = {
-                    "model": self.model,
-                    "messages": messages,
-                    "stream": True,
-                    "think": False,
-                    "keep_alive": "1h",  # [OPTIM] Persistance modèle en VRAM
-                    "options": {"temperature": self.gen_temperature, "num_ctx": self.gen_num_ctx, "num_predict": 4096, "num_keep": -1},  # [OPTIM] num_keep: préserver system prompt
-                }
-                full_response = ""
-                try:
-                    with _resilient_post(
-                        self.chat_url, json=data_synthesis, timeout=self.timeout, stream=True
-                    ) as resp:
-                        if resp.status_code != 200:
-                            print(f"⚠️ [LocalLLM] synthesis stream HTTP {resp.status_code}")
-                            break
-                        for raw_line in resp.iter_lines():
-                            if is_interrupted_callback and is_interrupted_callback():
-                                break
-                            if not raw_line:
-                                continue
-                            try:
-                                chunk_data = json.loads(raw_line)
-                            except json.JSONDecodeError:
-                                continue
-                            token = chunk_data.get("message", {}).get("content", "")
-                            if token:
-                                full_response += token
-                                if on_token:
-                                    result = on_token(token)
-                                    if result is False:
-                                        break
-                            if chunk_data.get("done"):
-                                break
-                except Exception as exc:
-                    print(f"⚠️ [LocalLLM] synthesis stream error: {exc}")
-
+                # Consigne de synthèse en fin de prompt (le prompt système et
+                # les outils restent ceux des tours précédents : le cache KV
+                # d'Ollama couvre tout le début) pour éviter que le modèle
+                # réponde « je n'ai pas accès aux données en temps réel ».
+                synthesis_messages = with_volatile(messages, (
+                    "Les informations demandées ont été récupérées en temps réel "
+                    "via des outils externes. Tu DOIS utiliser UNIQUEMENT ces données "
+                    "pour répondre à la question. "
+                    "Ne dis JAMAIS que tu n'as pas accès aux données en temps réel "
+                    "car tu viens de les recevoir. N'appelle plus aucun outil. "
+                    "Réponds de façon précise, factuelle et concise en te basant "
+                    "sur les résultats fournis par les outils."
+                ))
+                full_response = self._stream_tool_synthesis(
+                    synthesis_messages, tools, on_token, is_interrupted_callback
+                )
                 if full_response:
                     self.add_to_history("user", prompt)
                     self.add_to_history("assistant", full_response)
@@ -814,59 +842,66 @@ class LocalLLM:
                     }
                 break  # synthèse échouée
 
-            # Phase d'appel d'outils : non-streamé (requis pour détecter tool_calls JSON)
-            data_no_stream = {
+            # Phase d'appel d'outils : streamée, le texte part vers on_token
+            # dès qu'il est identifié comme tel, un appel d'outil est retenu.
+            data_stream = {
                 "model": self.model,
                 "messages": messages,
-                "tools": tools_for_this_call,
-                "stream": False,
+                "tools": tools,
+                "stream": True,
                 "think": False,
                 "keep_alive": "1h",  # [OPTIM] Persistance modèle en VRAM
                 "options": {"temperature": self.gen_temperature, "num_ctx": self.gen_num_ctx, "num_predict": 4096, "num_keep": -1},  # [OPTIM] num_keep: préserver system prompt
             }
+            parser = ToolCallStreamParser(on_token)
 
             try:
-                response = _resilient_post(
-                    self.chat_url, json=data_no_stream, timeout=self.timeout
-                )
-                if response.status_code != 200:
-                    print(f"⚠️ [LocalLLM] HTTP {response.status_code} à iter {iteration}")
-                    break
-                result = response.json()
-                message = result.get("message", {})
+                with _resilient_post(
+                    self.chat_url, json=data_stream, timeout=self.timeout, stream=True
+                ) as response:
+                    if response.status_code != 200:
+                        print(f"⚠️ [LocalLLM] HTTP {response.status_code} à iter {iteration}")
+                        break
+                    for chunk_data in iter_chunks(response.iter_lines()):
+                        if is_interrupted_callback and is_interrupted_callback():
+                            break
+                        keep_streaming = parser.feed(chunk_data.get("message", {}))
+                        if chunk_data.get("done"):
+                            observe_prompt(
+                                self.context_budget, "local_llm.generate_with_tools_stream",
+                                messages, tools, chunk_data,
+                            )
+                            break
+                        if not keep_streaming:
+                            break
             except Exception as exc:
                 print(f"⚠️ [LocalLLM] Exception tool-stream: {exc}")
                 break
 
+            message: Dict = {"role": "assistant", "content": parser.content}
+            if parser.tool_calls:
+                message["tool_calls"] = parser.tool_calls
+
             # ----------------------------------------------------------------
             # Cas 1 : tool_calls natif (API Ollama)
             # ----------------------------------------------------------------
             if message.get("tool_calls"):
                 messages.append(message)
-                for tool_call in message["tool_calls"]:
-                    func = tool_call.get("function", {})
-                    tool_name = func.get("name", "")
-                    arguments = func.get("arguments", {})
-
-                    # Nettoyage des arguments si le modèle a halluciné le schéma
-                    cleaned_args = {}
-                    for k, v in arguments.items():
-                        if isinstance(v, dict) and "type" in v and "description" in v:
-                            if "description" in v and v["description"] != "La requête de recherche":
-                                cleaned_args[k] = v["description"]
-                            else:
-                                continue
-                        else:
-                            cleaned_args[k] = v
-                    arguments = cleaned_args
-
-                    # NE PAS appeler on_tool_call ici : tool_executor (ai_engine.py)
-                    # le fait après optimisation de la requête, évitant le double affichage.
+                calls = self._native_tool_calls(message)
+                # NE PAS appeler on_tool_call ici : tool_executor (ai_engine.py)
+                # le fait après optimisation de la requête, évitant le double affichage.
+                for tool_name, _arguments in calls:
                     print(f"🔧 [LocalLLM] Stream tool call: {tool_name}")
-                    try:
-                        tool_result = tool_executor(tool_name, arguments)
-                    except Exception as exc:
-                        tool_result = f"[Erreur {tool_name}]: {exc}"
+                outcomes = run_tool_calls(
+                    calls, tool_executor,
+                    is_read_only=is_read_only,
+                    is_interrupted=is_interrupted_callback,
+                )
+                if is_interrupted_callback and is_interrupted_callback():
+                    break
+                for (tool_name, arguments), tool_result in zip(calls, outcomes):
+                    if isinstance(tool_result, Exception):
+                        tool_result = f"[Erreur {tool_name}]: {tool_result}"
 
                     tool_calls_log.append({
                         "tool": tool_name,
@@ -889,7 +924,9 @@ class LocalLLM:
             #          (bug connu llama3.2 / mistral)
             # ----------------------------------------------------------------
             final_text = message.get("content", "")
-            text_tc = self.parse_text_tool_call(final_text, known_tool_names)
+            text_tc = None
+            if not parser.streamed:
+                text_tc = self.parse_text_tool_call(final_text, known_tool_names)
 
             if text_tc and iteration < max_tool_iterations - 1:
                 tool_name = text_tc["name"]
@@ -931,7 +968,8 @@ class LocalLLM:
                 # Garde-fou (approche regex indépendante de _parse_text_tool_call) :
                 # si le modèle a retourné du JSON de tool call en texte brut,
                 # on l'intercepte AVANT de le streamer.
-                if final_text.strip().startswith("{") and iteration < max_tool_iterations - 1:
+                if (not parser.streamed and final_text.strip().startswith("{")
+                        and iteration < max_tool_iterations - 1):
                     _pattern = (
                         r'"name"\s*:\s*"('
                         + "|".join(re.escape(n) for n in known_tool_names if n)
@@ -992,15 +1030,10 @@ class LocalLLM:
                         })
                         continue  # relancer la boucle pour la synthèse finale
 
-                if on_token:
-                    words = final_text.split(" ")
-                    for i, word in enumerate(words):
-                        if is_interrupted_callback and is_interrupted_callback():
-                            break
-                        chunk = word + (" " if i < len(words) - 1 else "")
-                        should_continue = on_token(chunk)
-                        if should_continue is False:
-                            break
+                # Contenu retenu (JSON qui n'était pas un appel d'outil) :
+                # transmis d'un bloc, le reste a déjà été streamé.
+                if on_token and not parser.streamed:
+                    on_token(final_text)
                 self.add_to_history("user", prompt)
                 self.add_to_history("assistant", final_text)
             return {
@@ -1011,15 +1044,84 @@ class LocalLLM:
 
         return {"response": None, "tool_calls": tool_calls_log, "success": False}
 
+    def _stream_tool_synthesis(
+        self,
+        messages: List[Dict],
+        tools: List[Dict],
+        on_token: Optional[Callable],
+        is_interrupted_callback: Optional[Callable],
+    ) -> str:
+        """
+        Synthèse streamée après des appels d'outils. Les outils restent dans la
+        requête (préfixe identique aux tours précédents) ; si le modèle tente
+        malgré tout un appel d'outil sans produire de texte, une seconde
+        tentative est faite sans outils.
+        """
+        full_response = ""
+        for attempt_tools in (tools, None) if tools else (None,):
+            data = {
+                "model": self.model,
+                "messages": messages,
+                "stream": True,
+                "think": False,
+                "keep_alive": "1h",  # [OPTIM] Persistance modèle en VRAM
+                "options": {"temperature": self.gen_temperature, "num_ctx": self.gen_num_ctx, "num_predict": 4096, "num_keep": -1},  # [OPTIM] num_keep: préserver system prompt
+            }
+            if attempt_tools:
+                data["tools"] = attempt_tools
+            tool_called = False
+            try:
+                with _resilient_post(
+                    self.chat_url, json=data, timeout=self.timeout, stream=True
+                ) as resp:
+                    if resp.status_code != 200:
+                        print(f"⚠️ [LocalLLM] synthesis stream HTTP {resp.status_code}")
+                        return ""
+                    for raw_line in resp.iter_lines():
+                        if is_interrupted_callback and is_interrupted_callback():
+                            return full_response
+                        if not raw_line:
+                            continue
+                        try:
+                            chunk_data = json.loads(raw_line)
+                        except json.JSONDecodeError:
+                            continue
+                        message = chunk_data.get("message", {})
+                        if message.get("tool_calls"):
+                            tool_called = True
+                        token = message.get("content", "")
+                        if token:
+                            full_response += token
+                            if on_token:
+                                result = on_token(token)
+                                if result is False:
+                                    return full_response
+                        if chunk_data.get("done"):
+                            observe_prompt(
+                                self.context_budget, "local_llm.synthesis",
+                                messages, attempt_tools, chunk_data,
+                            )
+                            break
+            except Exception as exc:
+                print(f"⚠️ [LocalLLM] synthesis stream error: {exc}")
+                return full_response
+            if full_response or not tool_called:
+                break
+            print("⚠️ [LocalLLM] Appel d'outil pendant la synthèse → relance sans outils")
+        return full_response
+
     # ------------------------------------------------------------------
     # Gestion de l'historique avec résumé glissant
     # ------------------------------------------------------------------
 
-    @staticmethod
-    def _estimate_tokens(messages: List[Dict[str, str]]) -> int:
-        """Estime le nombre de tokens d'une liste de messages (≈4 chars/token)."""
-        total_chars = sum(len(m.get("content", "")) for m in messages)
-        return total_chars // 4
+    def _estimate_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """Tokens d'une liste de messages (tiktoken, calibré sur le modèle)."""
+        return self.context_budget.count_messages(messages)
+
+    def _summary_threshold_tokens(self) -> int:
+        """Seuil de résumé : part du budget de prompt laissée par le prompt système."""
+        budget = self.context_budget
+        return max(budget.compact_threshold - self._last_system_tokens, budget.prompt_budget // 4)
 
     def _build_summary_prompt(self, messages_to_summarize: List[Dict[str, str]]) -> str:
         """Construit le prompt de résumé pour les messages anciens."""
@@ -1034,85 +1136,119 @@ class LocalLLM:
             f"{conversation_text}"
         )
 
-    def _compress_old_history(self):
-        """
-        Résume les messages les plus anciens de l'historique via Ollama
-        et remplace les messages résumés par un unique message système.
-        """
-        if len(self.conversation_history) < self.max_history_length // 2:
-            return  # Pas assez de messages pour résumer
-
-        # Séparer : anciens messages à résumer / récents à conserver
-        split_point = len(self.conversation_history) - self._keep_recent_messages
-        if split_point <= 0:
-            return
-
-        old_messages = self.conversation_history[:split_point]
-        recent_messages = self.conversation_history[split_point:]
-
-        print(f"📝 [LocalLLM] Résumé glissant : compression de {len(old_messages)} anciens messages...")
-
-        # Appel Ollama pour résumer l'ancienne partie
-        summary_text = None
+    def _summarize_messages(self, messages: List[Dict[str, str]]) -> Optional[str]:
+        """Résume des messages via Ollama (appelé par le thread de résumé)."""
+        budget = self.context_budget
+        print(f"📝 [LocalLLM] Résumé glissant (arrière-plan) : {len(messages)} anciens messages...")
         try:
-            summary_prompt = self._build_summary_prompt(old_messages)
+            # Le texte à résumer doit tenir dans la fenêtre, réponse comprise
+            summary_prompt = budget.truncate(
+                self._build_summary_prompt(messages), budget.prompt_budget
+            )
             data = {
                 "model": self.model,
                 "messages": [{"role": "user", "content": summary_prompt}],
                 "stream": False,
                 "think": False,
                 "keep_alive": "1h",  # [OPTIM] Persistance modèle en VRAM
-                "options": {"temperature": 0.3, "num_ctx": 32768, "num_predict": 512, "num_keep": -1},  # [OPTIM] num_keep: préserver system prompt
+                "options": {"temperature": 0.3, "num_ctx": self.gen_num_ctx, "num_predict": 512, "num_keep": -1},  # [OPTIM] num_keep: préserver system prompt
             }
             response = _resilient_post(self.chat_url, json=data, timeout=60)
             if response.status_code == 200:
-                summary_text = response.json().get("message", {}).get("content", "").strip()
+                return response.json().get("message", {}).get("content", "").strip() or None
         except Exception as e:
             print(f"⚠️ [LocalLLM] Résumé impossible: {e}")
+        return None
 
-        # Construire le nouvel historique : résumé précédent + nouveau résumé + messages récents
-        if summary_text:
-            # Combiner avec l'éventuel résumé précédent
-            if self._conversation_summary:
-                combined = f"{self._conversation_summary}\n{summary_text}"
-                # Résumer les deux résumés si combiné trop long
-                if len(combined) > 2000:
-                    self._conversation_summary = summary_text
-                else:
-                    self._conversation_summary = combined
-            else:
-                self._conversation_summary = summary_text
+    def _workspace_key(self) -> str:
+        try:
+            workspace = self.workspace_resolver() if self.workspace_resolver else None
+        except Exception:
+            workspace = None
+        return workspace or "default"
 
-            summary_message = {
+    def schedule_summary(self, force: bool = False) -> bool:
+        """
+        Lance en arrière-plan le résumé des anciens messages quand l'historique
+        atteint prefetch_ratio de son seuil (ou tout de suite si force=True).
+
+        Les messages récents conservés tiennent dans la moitié du seuil, pour
+        que le résumé libère réellement de la place. Retourne True si un job
+        a été lancé.
+        """
+        with self._history_lock:
+            history = list(self.conversation_history)
+            threshold = self._summary_threshold_tokens()
+            if not force and self._estimate_tokens(history) < threshold * self._summary_prefetch_ratio:
+                return False
+            head = history[0] if history and history[0] is self._summary_message else None
+            raw = history[1:] if head is not None else history
+            recent = self.context_budget.fit_history(
+                raw[-self._keep_recent_messages:], threshold // 2
+            )
+            covered = raw[: len(raw) - len(recent)]
+            if not covered:
+                return False
+            started = self._summarizer.schedule(
+                self._workspace_key(),
+                covered,
+                previous_chain=self._summary_chain if head is not None else "",
+                previous_summary=self._conversation_summary if head is not None else "",
+            )
+            if started:
+                self._summary_job_head = head
+            return started
+
+    def apply_pending_summary(self, timeout: Optional[float] = 0) -> bool:
+        """
+        Substitue le résumé calculé en arrière-plan aux messages qu'il couvre,
+        en un seul remplacement de la liste. Ignoré si l'historique a changé
+        entre-temps (effacement, réalignement après édition).
+        """
+        result = self._summarizer.take_result(timeout=timeout)
+        if result is None:
+            return False
+        with self._history_lock:
+            head = self._summary_job_head
+            expected = ([head] if head is not None else []) + result["covered"]
+            current = self.conversation_history
+            if len(current) < len(expected) or any(
+                a is not b for a, b in zip(current, expected)
+            ):
+                return False
+            self._conversation_summary = result["summary"]
+            self._summary_chain = result["chain"]
+            self._summary_message = {
                 "role": "system",
                 "content": f"[Résumé de la conversation précédente] {self._conversation_summary}",
             }
-            self.conversation_history = [summary_message] + recent_messages
-            print(f"✅ [LocalLLM] Historique compressé → 1 résumé + {len(recent_messages)} messages récents")
-        else:
-            # Fallback simple : tronquer sans résumé
-            self.conversation_history = recent_messages
-            print(f"🔄 [LocalLLM] Historique tronqué à {len(recent_messages)} messages (résumé indisponible)")
+            self.conversation_history = [self._summary_message] + current[len(expected):]
+        origin = "cache" if result["cached"] else "Ollama"
+        print(
+            f"✅ [LocalLLM] Historique compressé ({origin}) → 1 résumé + "
+            f"{len(self.conversation_history) - 1} messages récents"
+        )
+        return True
 
     def add_to_history(self, role: str, content: str):
-        """Ajoute un message à l'historique et déclenche le résumé glissant si nécessaire."""
-        self.conversation_history.append({"role": role, "content": content})
+        """Ajoute un message à l'historique ; le résumé glissant est préparé en
+        arrière-plan, sans jamais bloquer l'appelant."""
+        with self._history_lock:
+            self.conversation_history.append({"role": role, "content": content})
+            if len(self.conversation_history) > self.max_history_length * 2:
+                # Garde-fou sur le nombre brut de messages
+                self.conversation_history = self.conversation_history[
+                    -self.max_history_length * 2 :
+                ]
+                print(
+                    f"🔄 [LocalLLM] Historique tronqué à {len(self.conversation_history)} messages"
+                )
 
-        # Déclencher la compression si le contexte estimé dépasse le seuil
-        estimated_tokens = self._estimate_tokens(self.conversation_history)
-        if estimated_tokens > self._summary_threshold_tokens:
-            print(
-                f"⚡ [LocalLLM] Contexte estimé {estimated_tokens:,} tokens > seuil "
-                f"{self._summary_threshold_tokens:,} → résumé glissant..."
-            )
-            self._compress_old_history()
-        elif len(self.conversation_history) > self.max_history_length * 2:
-            # Garde-fou sur le nombre brut de messages
-            self.conversation_history = self.conversation_history[
-                -self.max_history_length * 2 :
-            ]
+        self.apply_pending_summary()
+        if not self._summarizer.pending and self.schedule_summary():
             print(
-                f"🔄 [LocalLLM] Historique tronqué à {len(self.conversation_history)} messages"
+                f"⚡ [LocalLLM] Historique à {self._summary_prefetch_ratio:.0%} du seuil "
+                f"{self._summary_threshold_tokens():,} tokens → résumé en arrière-plan"
             )
 
     @staticmethod
@@ -1447,7 +1583,7 @@ class LocalLLM:
         vision_models = ["minicpm-v", "llama3.2-vision", "llava", "llava:13b", "llava:7b", "bakllava", "moondream"]
 
         try:
-            response = requests.get(
+            response = get_ollama_client().get(
                 self.ollama_url.replace("/api/generate", "/api/tags"), timeout=5
             )
             if response.status_code == 200:
@@ -1473,7 +1609,12 @@ class LocalLLM:
 
     def clear_history(self):
         """Efface l'historique de conversation"""
-        self.conversation_history.clear()
+        with self._history_lock:
+            self.conversation_history.clear()
+            self._conversation_summary = ""
+            self._summary_message = None
+            self._summary_chain = ""
+            self._summarizer.discard()
         print("🗑️ [LocalLLM] Historique de conversation effacé")
 
     def get_last_user_message(self) -> str:
@@ -251,56 +251,43 @@ class ContextManagementMixin:
             keywords = self._extract_question_keywords(query)
             print(f"🔑 [ULTRA] Mots-clés extraits: {keywords}")
 
-            # 🎯 ÉTAPE 2: Recherche multi-stratégie
-            all_context_parts = []
-
-            # Stratégie 1: Recherche avec mots-clés enrichis
-            enhanced_query = " ".join(keywords)
-            context1 = self.context_manager.get_relevant_context(
-                enhanced_query, max_chunks=15  # Plus de chunks pour avoir plus de choix
-            )
-            if context1 and len(context1.strip()) > 50:
-                all_context_parts.append(context1)
-
-            # Stratégie 2: Recherche avec la requête originale
-            context2 = self.context_manager.get_relevant_context(query, max_chunks=15)
-            if context2 and len(context2.strip()) > 50 and context2 != context1:
-                all_context_parts.append(context2)
-
-            # Stratégie 3: Recherche avec des termes spécifiques selon le type de question
+            # 🎯 ÉTAPE 2: Termes exacts propres au type de question (pour BM25)
             query_lower = query.lower()
-            specific_searches = []
+            specific_terms = []
 
             if "version" in query_lower:
-                specific_searches.extend(
+                specific_terms.extend(
                     ["version 5.0.0", "configuration version", '"version"']
                 )
             if "performance" in query_lower or "temps" in query_lower:
-                specific_searches.extend(
+                specific_terms.extend(
                     ["temps de réponse < 3", "performance", "3 secondes"]
                 )
             if "algorithme" in query_lower or "tri" in query_lower:
-                specific_searches.extend(["merge_sort", "tri fusion", "insertion sort"])
+                specific_terms.extend(["merge_sort", "tri fusion", "insertion sort"])
             if "turing" in query_lower:
-                specific_searches.extend(["Alan Turing 1950", "Test de Turing"])
+                specific_terms.extend(["Alan Turing 1950", "Test de Turing"])
             if "langage" in query_lower and (
                 "ia" in query_lower or "débuter" in query_lower
             ):
-                specific_searches.extend(
+                specific_terms.extend(
                     ["Python scikit-learn", "pandas", "recommandé pour débuter"]
                 )
             if "token" in query_lower or "million" in query_lower:
-                specific_searches.extend(
+                specific_terms.extend(
                     ["10000000 tokens", "10M tokens", "context_size"]
                 )
 
-            for specific_query in specific_searches:
-                context_specific = self.context_manager.get_relevant_context(
-                    specific_query, max_chunks=5
-                )
-                if context_specific and len(context_specific.strip()) > 50:
-                    if context_specific not in all_context_parts:
-                        all_context_parts.append(context_specific)
+            # 🎯 ÉTAPE 3: UNE seule recherche hybride (dense + BM25 fusionnés par
+            # RRF) : la question pour l'embedding, mots-clés et termes exacts
+            # pour l'index creux — au lieu d'une requête par stratégie.
+            all_context_parts = []
+            context = self.context_manager.get_relevant_context(
+                query, max_chunks=15, mode="hybrid",
+                keywords=list(keywords) + specific_terms,
+            )
+            if context and len(context.strip()) > 50:
+                all_context_parts.append(context)
 
             # Combiner tous les contextes trouvés
             if all_context_parts:
@@ -309,7 +296,7 @@ class ContextManagementMixin:
                     f"✅ [ULTRA] Contexte combiné: {len(combined_context)} caractères de {len(all_context_parts)} sources"
                 )
 
-                # 🎯 ÉTAPE 3: Post-traitement pour extraire les passages les plus pertinents
+                # 🎯 ÉTAPE 4: Post-traitement pour extraire les passages les plus pertinents
                 refined_context = self._refine_ultra_context(
                     combined_context, query, keywords
                 )
@@ -31,6 +31,7 @@ from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from PIL import Image
 
+from core.admission import admission_context, run_in_context
 from core.agent_orchestrator import AgentOrchestrator
 from models.ai_agents import AVAILABLE_AGENTS, AIAgent
 from models.local_llm import LocalLLM
@@ -597,7 +598,31 @@ class AgentRelayService:
         fonction thread-safe fournie par le serveur (planifie l'envoi WS
         chiffré sur la boucle asyncio). `image_path`/`file_paths` sont les
         pièces jointes éventuelles (déjà résolues depuis les file_ids).
+
+        Les appels au modèle passent en classe « batch » de la file
+        d'admission (core/admission.py) : un chat interactif reste prioritaire.
         """
+        with self._batch_admission(exec_id):
+            self._run_workflow(exec_id, task, nodes, connections, emit,
+                               image_path=image_path, file_paths=file_paths)
+
+    def _batch_admission(self, exec_id: str):
+        """Contexte d'admission « batch » d'une exécution, annulable via interrupt()."""
+        return admission_context(
+            "batch", session_id=exec_id,
+            is_interrupted=lambda: self._interrupted(exec_id),
+        )
+
+    def _run_workflow(
+        self,
+        exec_id: str,
+        task: str,
+        nodes: List[Dict[str, Any]],
+        connections: List[Dict[str, Any]],
+        emit: Callable[[Dict[str, Any]], None],
+        image_path: Optional[str] = None,
+        file_paths: Optional[List[str]] = None,
+    ) -> None:
         with self._exec_lock:
             if self._busy:
                 emit({"type": "agent_exec_error", "exec_id": exec_id,
@@ -682,7 +707,8 @@ class AgentRelayService:
                                 results_by_node[nid] = result.get("result", "")
 
                     for nid in nids:
-                        t = threading.Thread(target=run_one, args=(nid,), daemon=True)
+                        t = threading.Thread(target=run_in_context(run_one),
+                                             args=(nid,), daemon=True)
                         threads.append(t)
                         t.start()
                     for t in threads:
@@ -777,7 +803,19 @@ class AgentRelayService:
         rounds: int,
         emit: Callable[[Dict[str, Any]], None],
     ) -> None:
-        """Exécute un débat et stream les tours via `emit`."""
+        """Exécute un débat et stream les tours via `emit` (classe « batch »)."""
+        with self._batch_admission(exec_id):
+            self._run_debate(exec_id, agent_a, agent_b, topic, rounds, emit)
+
+    def _run_debate(
+        self,
+        exec_id: str,
+        agent_a: str,
+        agent_b: str,
+        topic: str,
+        rounds: int,
+        emit: Callable[[Dict[str, Any]], None],
+    ) -> None:
         with self._exec_lock:
             if self._busy:
                 emit({"type": "agent_exec_error", "exec_id": exec_id,
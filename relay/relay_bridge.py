@@ -8,6 +8,7 @@ entre l'interface mobile (via WebSocket) et l'interface Tkinter locale.
 import asyncio
 import threading
 import time
+import zlib
 from collections import deque
 from dataclasses import dataclass, field
 from datetime import datetime
@@ -30,6 +31,134 @@ _CHUNK_THROTTLE_SEC = 0.05
 # Nombre max de streams actifs conservés (protection mémoire).
 _ACTIVE_STREAM_MAX = 20
 
+# Protocole de streaming WS négocié par client_hello.stream_protocol :
+#   1 : chaque chunk porte le texte cumulatif (clients historiques)
+#   2 : chunk_delta numérotés (texte ajouté seulement, depuis l'état
+#       base_seq s'il est présent, seq - 1 sinon), chunk_snapshot
+#       (texte complet + somme de contrôle) au premier envoi, à la
+#       reconnexion ou quand le texte ne prolonge pas le précédent
+STREAM_PROTOCOL_VERSION = 2
+# Un delta sur N porte la somme de contrôle du texte cumulé : un client
+# désynchronisé le détecte et demande un snapshot (message « resume »).
+_CHECKSUM_EVERY = 16
+
+
+def stream_checksum(text: str) -> str:
+    """CRC32 (hexadécimal) du texte encodé en UTF-8."""
+    return f"{zlib.crc32(text.encode('utf-8')):08x}"
+
+
+@dataclass
+class StreamChunk:
+    """Mise à jour d'une génération en cours, diffusée aux WebSockets."""
+
+    message_id: str
+    seq: int
+    text: str           # texte cumulatif (protocole 1, snapshots)
+    delta: str          # texte ajouté depuis le chunk seq - 1
+    snapshot: bool = False
+    checksum: Optional[str] = None
+    segment_index: Optional[int] = None
+    # État (seq) auquel s'applique le delta : seq - 1, sauf pour des deltas
+    # fusionnés dans une file d'envoi (voir coalesce)
+    base_seq: Optional[int] = None
+
+    def coalesce(self, newer: "StreamChunk") -> "StreamChunk":
+        """Mise à jour unique équivalente à self suivi de newer (même flux)."""
+        if self.snapshot or newer.snapshot:
+            return StreamChunk(
+                newer.message_id, newer.seq, newer.text, newer.text,
+                snapshot=True, checksum=stream_checksum(newer.text),
+                segment_index=newer.segment_index,
+            )
+        checksum = newer.checksum
+        if checksum is None and self.checksum is not None:
+            checksum = stream_checksum(newer.text)
+        return StreamChunk(
+            newer.message_id, newer.seq, newer.text, self.delta + newer.delta,
+            checksum=checksum, segment_index=newer.segment_index,
+            base_seq=self.seq - 1 if self.base_seq is None else self.base_seq,
+        )
+
+    def to_payload(self, protocol: int) -> Dict[str, Any]:
+        """Message WS (avant chiffrement) pour un client du protocole donné."""
+        if protocol < STREAM_PROTOCOL_VERSION:
+            payload: Dict[str, Any] = {
+                "type": "chunk",
+                "message_id": self.message_id,
+                "text": self.text,
+                "timestamp": datetime.now().isoformat(),
+            }
+        elif self.snapshot:
+            payload = {
+                "type": "chunk_snapshot",
+                "message_id": self.message_id,
+                "seq": self.seq,
+                "text": self.text,
+                "checksum": self.checksum or stream_checksum(self.text),
+            }
+        else:
+            payload = {
+                "type": "chunk_delta",
+                "message_id": self.message_id,
+                "seq": self.seq,
+                "text": self.delta,
+            }
+            if self.base_seq is not None and self.base_seq != self.seq - 1:
+                payload["base_seq"] = self.base_seq
+            if self.checksum:
+                payload["checksum"] = self.checksum
+        if self.segment_index is not None:
+            payload["segment_index"] = self.segment_index
+        return payload
+
+
+class DeltaStream:
+    """Numérotation et deltas du texte cumulatif d'une génération.
+
+    Mémorise le texte déjà diffusé : chaque avance produit le texte ajouté
+    depuis, ou un snapshot si le nouveau texte ne le prolonge pas.
+    """
+
+    def __init__(self, message_id: str, segment_index: Optional[int] = None):
+        self.message_id = message_id
+        self.segment_index = segment_index
+        self.seq = 0
+        self.sent = ""
+
+    def advance(self, text: str) -> Optional[StreamChunk]:
+        """Chunk suivant pour ce texte cumulatif (None si rien n'a changé)."""
+        if self.seq and text == self.sent:
+            return None
+        self.seq += 1
+        snapshot = not text.startswith(self.sent)
+        delta = text if snapshot else text[len(self.sent):]
+        self.sent = text
+        checksum = None
+        if snapshot or self.seq % _CHECKSUM_EVERY == 0:
+            checksum = stream_checksum(text)
+        return StreamChunk(
+            self.message_id, self.seq, text, delta,
+            snapshot=snapshot, checksum=checksum, segment_index=self.segment_index,
+        )
+
+    def snapshot(self) -> StreamChunk:
+        """État diffusé courant, pour (re)synchroniser un client."""
+        return StreamChunk(
+            self.message_id, self.seq, self.sent, self.sent,
+            snapshot=True, checksum=stream_checksum(self.sent),
+            segment_index=self.segment_index,
+        )
+
+
+@dataclass
+class _ActiveStream:
+    """Génération en cours : dernier texte soumis et état diffusé."""
+
+    text: str
+    updated_at: float
+    deltas: DeltaStream
+
 
 @dataclass
 class RelayMessage:
@@ -116,17 +245,18 @@ class RelayBridge:
         self._pending_responses: Dict[str, Tuple[str, float]] = {}
         self._pending_lock = threading.Lock()
 
-        # Streams en cours : message_id -> (texte_partiel_cumulatif, timestamp).
-        # Permet au mobile qui reconnecte en plein milieu de récupérer l'état
-        # courant de la génération.
-        self._active_streams: Dict[str, Tuple[str, float]] = {}
+        # Streams en cours : message_id -> texte partiel cumulatif, horodatage
+        # et état diffusé (numéro de séquence, texte déjà envoyé). Permet au
+        # mobile qui reconnecte en plein milieu de récupérer l'état courant
+        # de la génération.
+        self._active_streams: Dict[str, _ActiveStream] = {}
         self._active_stream_lock = threading.Lock()
         self._last_chunk_ts: float = 0.0
 
         # Callbacks déclenchés dès qu'une réponse est soumise (broadcast WS).
         self._response_callbacks: List[Callable[[str, str], None]] = []
         # Callbacks déclenchés pour chaque chunk de streaming (broadcast WS).
-        self._chunk_callbacks: List[Callable[[str, str], None]] = []
+        self._chunk_callbacks: List[Callable[[StreamChunk], None]] = []
         # Callbacks déclenchés quand une image générée doit être poussée au
         # mobile (broadcast WS, chiffré). Signature : (message_id, image_path).
         self._image_callbacks: List[Callable[[str, str], None]] = []
@@ -290,9 +420,10 @@ class RelayBridge:
         Appelé depuis le thread GUI à chaque token reçu pendant le streaming.
         Le texte passé doit être le cumul complet depuis le début de la
         réponse (pas un delta). Les appels sont throttlés pour limiter la
-        charge WS/tunnel. L'état courant est aussi mémorisé dans
-        `_active_streams` pour qu'un mobile reconnecté en plein milieu
-        puisse récupérer l'état de la génération.
+        charge WS/tunnel ; chaque broadcast transmet un StreamChunk (texte
+        ajouté depuis le précédent, numéroté). L'état courant est aussi
+        mémorisé dans `_active_streams` pour qu'un mobile reconnecté en
+        plein milieu puisse récupérer l'état de la génération.
         """
         effective_id = message_id or self._latest_message_id
         if not effective_id:
@@ -300,19 +431,27 @@ class RelayBridge:
 
         now = time.time()
         with self._active_stream_lock:
-            self._active_streams[effective_id] = (partial_text, now)
-            self._gc_active_streams()
-
-        # Throttle : limite le débit global de broadcast. Le dernier chunk
-        # pourra être omis, mais `submit_ai_response` enverra de toute façon
-        # le texte final complet.
-        if now - self._last_chunk_ts < _CHUNK_THROTTLE_SEC:
-            return
-        self._last_chunk_ts = now
+            stream = self._active_streams.get(effective_id)
+            if stream is None:
+                stream = _ActiveStream(partial_text, now, DeltaStream(effective_id))
+                self._active_streams[effective_id] = stream
+                self._gc_active_streams()
+            stream.text = partial_text
+            stream.updated_at = now
+
+            # Throttle : limite le débit global de broadcast. Le dernier chunk
+            # pourra être omis, mais `submit_ai_response` enverra de toute
+            # façon le texte final complet.
+            if now - self._last_chunk_ts < _CHUNK_THROTTLE_SEC:
+                return
+            chunk = stream.deltas.advance(partial_text)
+            if chunk is None:
+                return
+            self._last_chunk_ts = now
 
         for cb in list(self._chunk_callbacks):
             try:
-                cb(effective_id, partial_text)
+                cb(chunk)
             except Exception as e:
                 logger.error("Erreur callback chunk broadcast: %s", e)
 
@@ -473,13 +612,13 @@ class RelayBridge:
     # Streams actifs (génération en cours)
     # ------------------------------------------------------------------
 
-    def on_chunk(self, callback: Callable[[str, str], None]) -> None:
-        """Enregistre un callback (message_id, partial_text) appelé à chaque
-        chunk de streaming soumis via submit_ai_chunk. Utilisé par le
-        serveur pour broadcaster l'état courant de la génération aux WS."""
+    def on_chunk(self, callback: Callable[[StreamChunk], None]) -> None:
+        """Enregistre un callback (StreamChunk) appelé à chaque chunk de
+        streaming diffusé via submit_ai_chunk. Utilisé par le serveur pour
+        broadcaster l'état courant de la génération aux WS."""
         self._chunk_callbacks.append(callback)
 
-    def remove_chunk_callback(self, callback: Callable[[str, str], None]) -> None:
+    def remove_chunk_callback(self, callback: Callable[[StreamChunk], None]) -> None:
         """Supprime un callback de chunk enregistré."""
         self._chunk_callbacks = [
             cb for cb in self._chunk_callbacks if cb != callback
@@ -493,7 +632,7 @@ class RelayBridge:
         while len(self._active_streams) > _ACTIVE_STREAM_MAX:
             oldest = min(
                 self._active_streams.items(),
-                key=lambda kv: kv[1][1],
+                key=lambda kv: kv[1].updated_at,
             )[0]
             self._active_streams.pop(oldest, None)
 
@@ -508,4 +647,14 @@ class RelayBridge:
             return None
         with self._active_stream_lock:
             entry = self._active_streams.get(message_id)
-        return entry[0] if entry else None
+        return entry.text if entry else None
+
+    def get_stream_snapshot(self, message_id: str) -> Optional[StreamChunk]:
+        """Snapshot (texte diffusé, numéro de séquence) d'une génération en
+        cours, ou None. Envoyé aux clients du protocole 2 qui reprennent
+        un stream : les deltas suivants s'appliquent à ce texte."""
+        if not message_id:
+            return None
+        with self._active_stream_lock:
+            entry = self._active_streams.get(message_id)
+            return entry.deltas.snapshot() if entry else None
@@ -34,8 +34,15 @@ from core.agentic_executor import AgenticExecutor, RemoteToolExecutor
 from core.config import get_config
 from utils.logger import setup_logger
 
-from .relay_bridge import RelayBridge, RelayMessage
+from .relay_bridge import (
+    STREAM_PROTOCOL_VERSION,
+    DeltaStream,
+    RelayBridge,
+    RelayMessage,
+    StreamChunk,
+)
 from .agent_relay import AgentRelayService
+from .send_queue import ClientSendQueue
 
 # Page de routage statique (GitHub Pages) qui ping les tunnels côté client
 # et redirige vers le premier vivant. Évite que le téléphone soit bloqué
@@ -116,6 +123,8 @@ class RelayServer:
             self._response_timeout = 500.0
         if self._response_timeout <= 0:
             self._response_timeout = 500.0
+        # Files d'envoi par WebSocket (voir relay/send_queue.py)
+        self._send_queue_config: Dict[str, Any] = config.get("send_queue") or {}
 
         # Générer un token d'authentification
         self._auth_token: str = ""
@@ -168,6 +177,9 @@ class RelayServer:
 
         # WebSocket clients connectés
         self._ws_clients: List[WebSocket] = []
+        # File d'envoi bornée de chaque WS (protocole de streaming négocié,
+        # tâche d'envoi dédiée). Tous les envois vers un WS y passent.
+        self._send_queues: Dict[Any, ClientSendQueue] = {}
 
         # Boucle asyncio du serveur (initialisée à l'accept de la première
         # connexion WS) pour broadcaster depuis un thread GUI.
@@ -285,6 +297,10 @@ class RelayServer:
         plain = json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
         return {"e": self._b64u_encode(self.encrypt_bytes(plain))}
 
+    def encrypt_text(self, obj: Any) -> str:
+        """Message WS prêt à envoyer : enveloppe chiffrée sérialisée."""
+        return json.dumps(self.encrypt_json(obj), separators=(",", ":"))
+
     def decrypt_json(self, wrapper: Dict[str, Any]) -> Any:
         """Inverse de `encrypt_json`. Lève si le format est invalide."""
         if not isinstance(wrapper, dict) or "e" not in wrapper:
@@ -511,6 +527,9 @@ class RelayServer:
                 "uptime_seconds": uptime,
                 "engine_ready": server.ai_engine is not None,
                 "connected_clients": len(server.ws_clients),
+                "clients": [
+                    queue.get_stats() for queue in list(server._send_queues.values())
+                ],
             }
 
         # =================================================================
@@ -749,6 +768,7 @@ class RelayServer:
                 return
 
             await websocket.accept()
+            send_queue = server._open_send_queue(websocket)
             server.ws_clients.append(websocket)
             server.bridge.connected_clients = len(server.ws_clients)
             logger.info(
@@ -756,9 +776,9 @@ class RelayServer:
             )
 
             async def _send_encrypted(payload: Dict[str, Any]) -> None:
-                """Sérialise + chiffre + envoie un message WS."""
-                wrapper = server.encrypt_json(payload)
-                await websocket.send_text(json.dumps(wrapper, separators=(",", ":")))
+                """Sérialise + chiffre + met en file un message WS."""
+                if not send_queue.send(payload):
+                    raise RuntimeError("WebSocket is not connected")
 
             # ----------------------------------------------------------------
             # État par-WS pour le mode agentique "VS Code".
@@ -772,6 +792,7 @@ class RelayServer:
             # ----------------------------------------------------------------
             client_kind: str = "mobile"
             workspace_info: str = ""
+            stream_protocol: int = 1
             pending_tool_calls: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
             # Historique de conversation côté agent (mode VS Code uniquement).
             # Conservé pour la durée de la connexion WS pour que le modèle
@@ -791,16 +812,15 @@ class RelayServer:
             agentic_tasks: List[asyncio.Task] = []
 
             # ----------------------------------------------------------------
-            # Émission sérialisée des événements de la page « Agents ».
+            # Émission des événements de la page « Agents ».
             #
             # Les workflows/débats s'exécutent dans des threads (orchestrateur
             # bloquant). Plusieurs threads peuvent streamer en parallèle (étape
-            # parallèle d'un workflow). Pour éviter que deux `send_text`
-            # concurrents s'entrelacent sur le même WebSocket, tous les
-            # événements agents transitent par une file unique drainée par une
-            # seule coroutine. Les threads y poussent via call_soon_threadsafe.
+            # parallèle d'un workflow). Leurs événements sont déposés dans la
+            # file d'envoi du WS via call_soon_threadsafe : une seule tâche
+            # écrit sur le WebSocket, et un agent_section_chunk encore en file
+            # est remplacé par le suivant de la même section.
             # ----------------------------------------------------------------
-            agent_send_queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
             agent_loop = asyncio.get_event_loop()
             # exec_ids des workflows/débats lancés sur ce WS (pour interruption
             # à la déconnexion).
@@ -809,22 +829,10 @@ class RelayServer:
             def agent_emit_threadsafe(event: Dict[str, Any]) -> None:
                 """Pousse un événement agent depuis un thread worker."""
                 try:
-                    agent_loop.call_soon_threadsafe(
-                        agent_send_queue.put_nowait, event
-                    )
+                    agent_loop.call_soon_threadsafe(send_queue.send, event)
                 except Exception:
                     pass
 
-            async def _agent_drainer() -> None:
-                while True:
-                    event = await agent_send_queue.get()
-                    try:
-                        await _send_encrypted(event)
-                    except Exception:
-                        # WS mort : on cesse de drainer, le finally nettoiera.
-                        break
-            agent_drainer_task = asyncio.create_task(_agent_drainer())
-
             try:
                 while True:
                     data = await websocket.receive_text()
@@ -860,11 +868,17 @@ class RelayServer:
                         wi = msg_data.get("workspace_info", "")
                         if isinstance(wi, str):
                             workspace_info = wi[:4000]  # cap pour éviter prompt-injection démesurée
+                        requested = msg_data.get("stream_protocol", 1)
+                        if isinstance(requested, int) and requested >= 1:
+                            stream_protocol = min(requested, STREAM_PROTOCOL_VERSION)
+                            send_queue.protocol = stream_protocol
+                        send_queue.client_kind = client_kind
                         await _send_encrypted({
                             "type": "hello_ack",
                             "server": "myai-relay",
                             "client_kind": client_kind,
                             "agentic_enabled": client_kind == "vscode",
+                            "stream_protocol": stream_protocol,
                         })
                         logger.info(
                             "Client identifié : kind=%s, workspace_info=%d chars",
@@ -913,7 +927,7 @@ class RelayServer:
                         await server.handle_agent_message(
                             msg_type=msg_type,
                             msg_data=msg_data,
-                            emit_async=agent_send_queue.put_nowait,
+                            emit_async=send_queue.send,
                             emit_threadsafe=agent_emit_threadsafe,
                             loop=agent_loop,
                             tasks=agentic_tasks,
@@ -991,6 +1005,7 @@ class RelayServer:
                             workspace_info=workspace_info,
                             history=vscode_history,
                             server=server,
+                            send_queue=send_queue,
                         ))
                         agentic_tasks.append(task)
                         # Auto-nettoyage : retirer la tâche de la liste
@@ -1076,8 +1091,12 @@ class RelayServer:
                         # Deux cas possibles :
                         #   - la réponse est déjà complète → type "response"
                         #   - la génération est encore en cours → type "chunk"
-                        #     (état courant du stream) ; les chunks suivants
-                        #     arriveront ensuite via le broadcast.
+                        #     (état courant du stream) ou, en protocole 2,
+                        #     "chunk_snapshot" (texte diffusé, numéro de
+                        #     séquence, somme de contrôle) ; les deltas
+                        #     suivants arriveront ensuite via le broadcast.
+                        # Un client du protocole 2 envoie aussi « resume »
+                        # quand il détecte un trou dans les deltas.
                         last_id = msg_data.get("last_message_id", "") or ""
                         pending = server.bridge.consume_pending_response(last_id)
                         if pending is not None:
@@ -1088,6 +1107,17 @@ class RelayServer:
                                 "timestamp": datetime.now().isoformat(),
                                 "resumed": True,
                             })
+                        elif stream_protocol >= STREAM_PROTOCOL_VERSION:
+                            snapshot = server.bridge.get_stream_snapshot(last_id)
+                            if snapshot is not None:
+                                # Fusionné avec un delta du même flux encore
+                                # en file, le snapshot le remplace.
+                                send_queue.put_chunk(snapshot)
+                            else:
+                                await _send_encrypted({
+                                    "type": "resume_empty",
+                                    "message_id": last_id,
+                                })
                         else:
                             partial = server.bridge.get_active_stream(last_id)
                             if partial is not None:
@@ -1132,13 +1162,9 @@ class RelayServer:
                     if not task.done():
                         task.cancel()
                 # Interrompre les exécutions d'agents en cours sur ce WS et
-                # arrêter le drainer d'événements agents.
+                # arrêter sa tâche d'envoi.
                 server.interrupt_agent_execs(active_agent_execs)
-                if not agent_drainer_task.done():
-                    agent_drainer_task.cancel()
-                if websocket in server.ws_clients:
-                    server.ws_clients.remove(websocket)
-                server.bridge.connected_clients = len(server.ws_clients)
+                send_queue.stop()
 
     # ------------------------------------------------------------------
     # Page « Agents » (mobile) — dispatch des messages WebSocket
@@ -1392,37 +1418,68 @@ class RelayServer:
     # Cycle de vie du serveur
     # ------------------------------------------------------------------
 
-    def _broadcast_chunk(self, message_id: str, text: str) -> None:
+    def _open_send_queue(self, websocket: Any) -> ClientSendQueue:
+        """Crée et démarre la file d'envoi d'un WS accepté (boucle du serveur)."""
+        cfg = self._send_queue_config
+        queue = ClientSendQueue(
+            websocket,
+            encrypt=self.encrypt_text,
+            max_messages=int(cfg.get("max_messages", 256)),
+            send_timeout=float(cfg.get("send_timeout", 20)),
+            slow_client=str(cfg.get("slow_client", "degrade")),
+            on_close=self._on_send_queue_closed,
+        )
+        self._send_queues[websocket] = queue
+        queue.start()
+        return queue
+
+    def _on_send_queue_closed(self, queue: ClientSendQueue) -> None:
+        """File fermée (déconnexion, WS mort ou client trop lent) : retrait du client."""
+        if self._send_queues.get(queue.websocket) is queue:
+            del self._send_queues[queue.websocket]
+        if queue.websocket in self._ws_clients:
+            self._ws_clients.remove(queue.websocket)
+        self._bridge.connected_clients = len(self._ws_clients)
+
+    def _broadcast_text(self, text: str, what: str) -> bool:
+        """Dépose un message chiffré dans la file de chaque WS (depuis n'importe quel thread)."""
+
+        def _deliver() -> None:
+            for queue in list(self._send_queues.values()):
+                queue.put_text(text)
+
+        try:
+            self._loop.call_soon_threadsafe(_deliver)
+            return True
+        except Exception as e:
+            logger.debug("Broadcast %s WS impossible : %s", what, e)
+            return False
+
+    def _broadcast_chunk(self, chunk: StreamChunk) -> None:
         """Callback déclenché par le bridge à chaque chunk de streaming.
 
         Broadcaste l'état courant de la génération à tous les WebSockets
         connectés, pour que le mobile voie la réponse se construire en
-        direct comme sur le GUI desktop. Le texte est cumulatif.
+        direct comme sur le GUI desktop. Les clients du protocole 2 ne
+        reçoivent que le texte ajouté (chunk_delta), les autres le texte
+        cumulatif. Chaque variante n'est chiffrée qu'une fois ; un client
+        lent dont la file contient encore un chunk de ce message reçoit un
+        seul chunk fusionné.
         """
-        if not self._loop or not self._ws_clients:
+        if not self._loop or not self._send_queues:
             return
-        payload = json.dumps(self.encrypt_json({
-            "type": "chunk",
-            "message_id": message_id,
-            "text": text,
-            "timestamp": datetime.now().isoformat(),
-        }), separators=(",", ":"))
+        queues = list(self._send_queues.values())
+        payloads: Dict[int, str] = {}
+        for queue in queues:
+            if queue.protocol not in payloads:
+                payloads[queue.protocol] = self.encrypt_text(chunk.to_payload(queue.protocol))
 
-        async def _push():
-            dead: List[WebSocket] = []
-            for ws in list(self._ws_clients):
-                try:
-                    await ws.send_text(payload)
-                except Exception:
-                    dead.append(ws)
-            for ws in dead:
-                if ws in self._ws_clients:
-                    self._ws_clients.remove(ws)
-            if dead:
-                self._bridge.connected_clients = len(self._ws_clients)
+        def _deliver() -> None:
+            for queue in queues:
+                queue.put_chunk(chunk, payloads.get(queue.protocol))
 
         try:
-            asyncio.run_coroutine_threadsafe(_push(), self._loop)
+            self._loop.call_soon_threadsafe(_deliver)
         except Exception as e:
             logger.debug("Broadcast chunk WS impossible : %s", e)
 
@@ -1433,37 +1490,15 @@ class RelayServer:
         ce qui permet à un mobile reconnecté pendant la génération de
         recevoir la réponse même si son WS d'origine est mort.
         """
-        if not self._loop or not self._ws_clients:
+        if not self._loop or not self._send_queues:
             return
-        payload = json.dumps(self.encrypt_json({
+        self._broadcast_text(self.encrypt_text({
             "type": "response",
             "message": text,
             "message_id": message_id,
             "timestamp": datetime.now().isoformat(),
             "broadcast": True,
-        }), separators=(",", ":"))
-
-        async def _push():
-            dead: List[WebSocket] = []
-            for ws in list(self._ws_clients):
-                try:
-                    await ws.send_text(payload)
-                except Exception:
-                    # WS mort (iOS a fermé brutalement) : marquer pour
-                    # retrait immédiat afin que le compteur de clients
-                    # connectés redevienne cohérent sans attendre que le
-                    # handler receive_text() échoue à son tour.
-                    dead.append(ws)
-            for ws in dead:
-                if ws in self._ws_clients:
-                    self._ws_clients.remove(ws)
-            if dead:
-                self._bridge.connected_clients = len(self._ws_clients)
-
-        try:
-            asyncio.run_coroutine_threadsafe(_push(), self._loop)
-        except Exception as e:
-            logger.debug("Broadcast WS impossible : %s", e)
+        }), "réponse")
 
     def _broadcast_image(self, message_id: str, image_path: str) -> None:
         """🎨 Callback bridge : pousse une image générée à tous les WS (chiffrée).
@@ -1473,7 +1508,7 @@ class RelayServer:
         donc l'image transite chiffrée de bout en bout, exactement comme les
         pièces jointes uploadées depuis le mobile.
         """
-        if not self._loop or not self._ws_clients:
+        if not self._loop or not self._send_queues:
             return
         try:
             with open(image_path, "rb") as f:
@@ -1487,33 +1522,16 @@ class RelayServer:
         ext = os.path.splitext(filename)[1].lower().lstrip(".") or "png"
         mime = "image/jpeg" if ext in ("jpg", "jpeg") else f"image/{ext}"
 
-        payload = json.dumps(self.encrypt_json({
+        payload = self.encrypt_text({
             "type": "ai_image",
             "message_id": message_id,
             "filename": filename,
             "mime": mime,
             "data": b64,
             "timestamp": datetime.now().isoformat(),
-        }), separators=(",", ":"))
-
-        async def _push():
-            dead: List[WebSocket] = []
-            for ws in list(self._ws_clients):
-                try:
-                    await ws.send_text(payload)
-                except Exception:
-                    dead.append(ws)
-            for ws in dead:
-                if ws in self._ws_clients:
-                    self._ws_clients.remove(ws)
-            if dead:
-                self._bridge.connected_clients = len(self._ws_clients)
-
-        try:
-            asyncio.run_coroutine_threadsafe(_push(), self._loop)
+        })
+        if self._broadcast_text(payload, "image"):
             logger.info("Image IA broadcastée aux WS (E2EE) : %s (%d octets)", filename, len(raw))
-        except Exception as e:
-            logger.debug("Broadcast image WS impossible : %s", e)
 
     # ------------------------------------------------------------------
     # Scheduler proactif (tâches planifiées)
@@ -1546,13 +1564,13 @@ class RelayServer:
     def _broadcast_scheduled_result(self, result: Dict[str, Any]) -> None:
         """Diffuse la fin d'une tâche planifiée aux WebSockets connectés.
 
-        Appelé depuis un thread worker du scheduler ; planifie l'envoi chiffré
-        sur la boucle asyncio (modèle de `_broadcast_chunk`). Le chemin du
-        fichier de résultat (local au PC) n'est pas transmis au mobile.
+        Appelé depuis un thread worker du scheduler ; dépose le message chiffré
+        dans la file d'envoi de chaque WS (modèle de `_broadcast_response`). Le
+        chemin du fichier de résultat (local au PC) n'est pas transmis au mobile.
         """
-        if not self._loop or not self._ws_clients:
+        if not self._loop or not self._send_queues:
             return
-        payload = json.dumps(self.encrypt_json({
+        self._broadcast_text(self.encrypt_text({
             "type": "scheduled_task_result",
             "task_id": result.get("task_id"),
             "name": result.get("name"),
@@ -1560,23 +1578,7 @@ class RelayServer:
             "status_text": result.get("status_text"),
             "summary": result.get("summary"),
             "finished_at": result.get("finished_at"),
-        }), separators=(",", ":"))
-
-        async def _push():
-            dead: List[WebSocket] = []
-            for ws in list(self._ws_clients):
-                try:
-                    await ws.send_text(payload)
-                except Exception:
-                    dead.append(ws)
-            for ws in dead:
-                if ws in self._ws_clients:
-                    self._ws_clients.remove(ws)
-
-        try:
-            asyncio.run_coroutine_threadsafe(_push(), self._loop)
-        except Exception as e:
-            logger.debug("Broadcast scheduled_task_result impossible : %s", e)
+        }), "scheduled_task_result")
 
     def start(self, start_tunnel: bool = True) -> None:
         """Démarre le serveur Relay et optionnellement le tunnel."""
@@ -1645,6 +1647,7 @@ class RelayServer:
 
         # Fermer les WebSocket clients
         self._ws_clients.clear()
+        self._send_queues.clear()
 
         self._running = False
         self._start_time = None
@@ -2018,6 +2021,7 @@ async def _handle_vscode_chat(
     workspace_info: str,
     history: List[Dict[str, str]],
     server: "RelayServer",
+    send_queue: Optional[ClientSendQueue] = None,
 ) -> None:
     """Exécute la boucle agentique pour un message ``chat`` venant de l'extension.
 
@@ -2074,8 +2078,13 @@ async def _handle_vscode_chat(
     # immédiatement (sinon le client ne saurait pas qu'une nouvelle bulle
     # doit être créée et collerait le texte de la nouvelle itération à la
     # bulle précédente).
+    # En protocole 2, seul le texte ajouté depuis le chunk précédent du
+    # segment est envoyé (chunk_delta numéroté, voir relay_bridge). Les
+    # chunks passent par la file d'envoi du WS, qui fusionne ceux d'un même
+    # segment encore en attente.
     last_chunk_at = 0.0
     last_segment = -1
+    segments: Dict[int, DeltaStream] = {}
 
     def on_chunk(visible_text: str, segment_index: int = 0) -> None:
         nonlocal last_chunk_at, last_segment
@@ -2083,19 +2092,21 @@ async def _handle_vscode_chat(
         new_segment = segment_index != last_segment
         if not new_segment and now - last_chunk_at < 0.05:
             return
+        stream = segments.get(segment_index)
+        if stream is None:
+            stream = segments[segment_index] = DeltaStream(message_id, segment_index)
+        chunk = stream.advance(visible_text)
+        if chunk is None:
+            return
         last_chunk_at = now
         last_segment = segment_index
         try:
-            asyncio.run_coroutine_threadsafe(
-                send_encrypted({
-                    "type": "chunk",
-                    "message_id": message_id,
-                    "text": visible_text,
-                    "segment_index": segment_index,
-                    "timestamp": datetime.now().isoformat(),
-                }),
-                loop,
-            )
+            if send_queue is not None:
+                loop.call_soon_threadsafe(send_queue.put_chunk, chunk)
+            else:
+                asyncio.run_coroutine_threadsafe(
+                    send_encrypted(chunk.to_payload(1)), loop,
+                )
         except Exception as exc:
             logger.debug("Push chunk vers VS Code échoué : %s", exc)
 
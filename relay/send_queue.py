@@ -0,0 +1,305 @@
+"""
+Files d'envoi WebSocket du Relay : une file bornée par client, vidée par
+une tâche d'envoi dédiée.
+
+Les broadcasts (chunks de streaming, réponses, images, tâches planifiées)
+attendaient ``ws.send_text`` client après client : un mobile lent derrière
+un mauvais tunnel retardait tous les autres, et les coroutines d'envoi
+s'empilaient sans limite sur la boucle. Désormais chaque broadcast chiffre
+une fois son message puis le dépose dans la file de chaque client ; seule
+la tâche d'envoi du client attend le réseau. Les messages d'un même
+WebSocket partent dans l'ordre de dépôt (les deltas du protocole 2 en
+dépendent).
+
+Une mise à jour de streaming encore en file est remplacée par la suivante
+du même flux au lieu de s'ajouter : deltas fusionnés (StreamChunk.coalesce),
+texte cumulatif remplacé (agent_section_chunk). Un client lent reçoit donc
+moins de messages, mais toujours l'état le plus récent.
+
+File pleine (relay.send_queue.max_messages), selon relay.send_queue.slow_client :
+  - "disconnect" : le WebSocket est fermé (code 1013) ; le client se
+    reconnecte et reprend par « resume » ;
+  - "degrade" : les mises à jour de streaming en attente sont abandonnées et
+    plus aucune n'est mise en file jusqu'à ce que la file se soit vidée de
+    moitié (la réponse finale arrive toujours, un client du protocole 2
+    redemande un snapshot). Si la file reste pleine, le client est fermé.
+Un envoi bloqué plus de relay.send_queue.send_timeout secondes ferme aussi
+le WebSocket.
+"""
+
+import asyncio
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional
+
+from utils.logger import setup_logger
+
+from .relay_bridge import StreamChunk
+
+logger = setup_logger("RelaySendQueue")
+
+_DEFAULT_MAX_MESSAGES = 256
+_DEFAULT_SEND_TIMEOUT = 20.0
+SLOW_CLIENT_POLICIES = ("disconnect", "degrade")
+_DEFAULT_SLOW_CLIENT = "degrade"
+# Latences conservées par client pour /api/health
+_LATENCY_WINDOW = 200
+# Code de fermeture WebSocket « réessayer plus tard » (RFC 6455)
+_CLOSE_TRY_AGAIN = 1013
+
+_client_ids = itertools.count(1)
+
+
+def supersede_key(payload: Dict[str, Any]) -> Optional[Hashable]:
+    """Clé des messages dont le suivant rend le précédent inutile (texte cumulatif)."""
+    if payload.get("type") == "agent_section_chunk":
+        return ("agent", payload.get("exec_id"), payload.get("section_id"))
+    return None
+
+
+def _latency_summary(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    last = len(ordered) - 1
+    return {
+        "p50": round(ordered[min(last, len(ordered) // 2)], 2),
+        "p90": round(ordered[min(last, int(0.9 * len(ordered)))], 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+@dataclass
+class _Outgoing:
+    """Message en file : texte chiffré, ou chunk chiffré au moment de l'envoi."""
+
+    text: Optional[str]
+    enqueued_at: float
+    key: Optional[Hashable] = None
+    chunk: Optional[StreamChunk] = None
+
+
+class ClientSendQueue:
+    """File d'envoi bornée d'un WebSocket et sa tâche d'envoi.
+
+    Les méthodes de dépôt s'appellent depuis la boucle asyncio du serveur
+    (call_soon_threadsafe depuis un autre thread).
+    """
+
+    def __init__(
+        self,
+        websocket: Any,
+        encrypt: Callable[[Dict[str, Any]], str],
+        max_messages: int = _DEFAULT_MAX_MESSAGES,
+        send_timeout: float = _DEFAULT_SEND_TIMEOUT,
+        slow_client: str = _DEFAULT_SLOW_CLIENT,
+        on_close: Optional[Callable[["ClientSendQueue"], None]] = None,
+    ) -> None:
+        """
+        Args:
+            websocket: WebSocket accepté (send_text / close).
+            encrypt: sérialise et chiffre un message (RelayServer.encrypt_text).
+            max_messages: messages en file au plus.
+            send_timeout: durée max d'un envoi avant fermeture du WebSocket.
+            slow_client: politique quand la file est pleine (SLOW_CLIENT_POLICIES).
+            on_close: appelé une fois quand la file est fermée.
+        """
+        if slow_client not in SLOW_CLIENT_POLICIES:
+            logger.warning("Politique slow_client inconnue : %s (degrade)", slow_client)
+            slow_client = _DEFAULT_SLOW_CLIENT
+        self.websocket = websocket
+        self.client_id = f"ws-{next(_client_ids)}"
+        self.client_kind = "mobile"
+        self.protocol = 1
+        self.closed = False
+        self.degraded = False
+        self._encrypt = encrypt
+        self._max_messages = max(1, int(max_messages))
+        self._send_timeout = float(send_timeout)
+        self._slow_client = slow_client
+        self._on_close = on_close
+        self._items: Deque[_Outgoing] = deque()
+        self._pending: Dict[Hashable, _Outgoing] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._latency_ms: Deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self._send_ms: Deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self._counters = {"sent": 0, "coalesced": 0, "dropped": 0, "max_depth": 0}
+
+    # ------------------------------------------------------------------
+    # Dépôt
+    # ------------------------------------------------------------------
+
+    def send(self, payload: Dict[str, Any]) -> bool:
+        """Chiffre et met en file un message (False si le client est fermé)."""
+        if self.closed:
+            return False
+        return self.put_text(self._encrypt(payload), supersede_key(payload))
+
+    def put_text(self, text: str, key: Optional[Hashable] = None) -> bool:
+        """Met en file un message déjà chiffré ; il remplace le message de même clé en attente."""
+        if self.closed:
+            return False
+        if key is not None:
+            pending = self._pending.get(key)
+            if pending is not None:
+                pending.text = text
+                self._counters["coalesced"] += 1
+                return True
+            if self.degraded:
+                self._counters["dropped"] += 1
+                return True
+        return self._append(_Outgoing(text, time.monotonic(), key=key))
+
+    def put_chunk(self, chunk: StreamChunk, text: Optional[str] = None) -> bool:
+        """Met en file une mise à jour de streaming, fusionnée avec celle du flux en attente.
+
+        Args:
+            chunk: mise à jour diffusée par le bridge ou la boucle agentique.
+            text: chunk déjà chiffré pour self.protocol (sinon chiffré à l'envoi).
+        """
+        if self.closed:
+            return False
+        key = ("stream", chunk.message_id, chunk.segment_index)
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending.chunk = pending.chunk.coalesce(chunk)
+            pending.text = None
+            self._counters["coalesced"] += 1
+            return True
+        if self.degraded:
+            self._counters["dropped"] += 1
+            return True
+        return self._append(_Outgoing(text, time.monotonic(), key=key, chunk=chunk))
+
+    def _append(self, item: _Outgoing) -> bool:
+        if len(self._items) >= self._max_messages:
+            if self._slow_client == "degrade":
+                self._degrade()
+                if item.key is not None:
+                    self._counters["dropped"] += 1
+                    return True
+            if len(self._items) >= self._max_messages:
+                logger.warning(
+                    "Client Relay %s trop lent (%d messages en file) : déconnexion",
+                    self.client_id, len(self._items),
+                )
+                self._mark_closed()
+                asyncio.ensure_future(self._close_websocket(_CLOSE_TRY_AGAIN, "Client trop lent"))
+                return False
+        self._items.append(item)
+        if item.key is not None:
+            self._pending[item.key] = item
+        self._counters["max_depth"] = max(self._counters["max_depth"], len(self._items))
+        self._wakeup.set()
+        return True
+
+    def _degrade(self) -> None:
+        """Abandonne les mises à jour de streaming en file et suspend les suivantes."""
+        if not self.degraded:
+            logger.warning(
+                "Client Relay %s lent : streaming suspendu (%d messages en file)",
+                self.client_id, len(self._items),
+            )
+        self.degraded = True
+        streams = [queued for queued in self._items if queued.key is not None]
+        for queued in streams:
+            self._items.remove(queued)
+            self._pending.pop(queued.key, None)
+        self._counters["dropped"] += len(streams)
+
+    # ------------------------------------------------------------------
+    # Envoi
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Démarre la tâche d'envoi (dans la boucle du serveur)."""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self) -> None:
+        while not self.closed:
+            if not self._items:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            item = self._items.popleft()
+            if item.key is not None:
+                self._pending.pop(item.key, None)
+            text = item.text
+            if text is None:
+                text = self._encrypt(item.chunk.to_payload(self.protocol))
+            started = time.monotonic()
+            try:
+                await asyncio.wait_for(self.websocket.send_text(text), self._send_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(
+                    "Client Relay %s : envoi bloqué plus de %.0f s, déconnexion",
+                    self.client_id, self._send_timeout,
+                )
+                await self.close(_CLOSE_TRY_AGAIN, "Envoi trop lent")
+                return
+            except Exception as exc:
+                # WS mort (iOS a fermé brutalement) : le handler nettoiera
+                logger.debug("Envoi WS %s impossible : %s", self.client_id, exc)
+                self._mark_closed()
+                return
+            done = time.monotonic()
+            self._send_ms.append((done - started) * 1000)
+            self._latency_ms.append((done - item.enqueued_at) * 1000)
+            self._counters["sent"] += 1
+            if self.degraded and len(self._items) <= self._max_messages // 2:
+                self.degraded = False
+                logger.info("Client Relay %s rattrapé : streaming rétabli", self.client_id)
+
+    async def close(self, code: Optional[int] = None, reason: str = "") -> None:
+        """Ferme la file (et le WebSocket si un code est donné)."""
+        if self.closed:
+            return
+        self._mark_closed()
+        if code is not None:
+            await self._close_websocket(code, reason)
+
+    async def _close_websocket(self, code: int, reason: str) -> None:
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception as exc:
+            logger.debug("Fermeture WS %s : %s", self.client_id, exc)
+
+    def stop(self) -> None:
+        """Fin de connexion : ferme la file et annule la tâche d'envoi."""
+        self._mark_closed()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def _mark_closed(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self._items.clear()
+        self._pending.clear()
+        self._wakeup.set()
+        if self._on_close is not None:
+            try:
+                self._on_close(self)
+            except Exception as exc:
+                logger.debug("on_close de %s en erreur : %s", self.client_id, exc)
+
+    # ------------------------------------------------------------------
+    # Statistiques
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Profondeur de file, compteurs et latences (ms) du client, pour /api/health."""
+        return {
+            "client": self.client_id,
+            "kind": self.client_kind,
+            "stream_protocol": self.protocol,
+            "queue_depth": len(self._items),
+            "degraded": self.degraded,
+            **self._counters,
+            "latency_ms": _latency_summary(list(self._latency_ms)),
+            "send_ms": _latency_summary(list(self._send_ms)),
+        }
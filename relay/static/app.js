@@ -153,6 +153,15 @@ let attachmentCounter = 0;
 let streamingMessageId = null;
 let streamingMessageEl = null;
 
+// Protocole de streaming 2 (annoncé dans client_hello) : le serveur envoie
+// des chunk_delta numérotés (texte ajouté seulement) et des chunk_snapshot
+// (texte complet + CRC32). message_id -> {seq, text, resyncing}.
+const STREAM_PROTOCOL = 2;
+let streamStates = {};
+// Traitement des messages WS dans l'ordre d'arrivée (les deltas doivent
+// s'appliquer dans l'ordre, le déchiffrement est asynchrone).
+let wsInbound = Promise.resolve();
+
 // Le scroll auto pendant le streaming ne doit pas se battre contre
 // l'utilisateur qui a fait défiler vers le haut pour relire quelque chose.
 // On considère "collé au bas" s'il y a moins de 80px sous la viewport.
@@ -202,6 +211,16 @@ function connect() {
       loadHistory();
     }
 
+    // (0) Annoncer le protocole de streaming par deltas (avant tout resume).
+    streamStates = {};
+    wsSendEncrypted({
+      type: 'client_hello',
+      client_kind: 'mobile',
+      stream_protocol: STREAM_PROTOCOL,
+    }).catch(function (e) {
+      console.warn('[Relay] client_hello failed:', e);
+    });
+
     // (1b) Charger la bibliothèque de prompts (slash commands) pour l'autocomplétion "/".
     loadPrompts();
 
@@ -225,75 +244,16 @@ function connect() {
     }
   };
 
-  ws.onmessage = async function (event) {
-    var data;
-    try {
-      var wrapper = JSON.parse(event.data);
-      data = await decryptEnvelope(wrapper);
-    } catch (err) {
-      console.error('[Relay] Message WS rejeté (E2EE invalide) :', err);
-      return;
-    }
-
-    if (data.type === 'response') {
-      // Déduplication : si on a déjà rendu ce message_id (ex. reçu via
-      // broadcast ET via resume), ignorer le doublon.
-      var mid = data.message_id || '';
-      if (mid && renderedMessageIds.has('ai:' + mid)) {
-        // Nettoyer toute bulle de streaming résiduelle pour ce message.
-        if (streamingMessageId === mid) finalizeStreaming(mid, null, null);
-        return;
-      }
-      if (mid) renderedMessageIds.add('ai:' + mid);
-
-      removeTyping();
-      isWaiting = false;
-      // Si on reçoit la réponse à notre dernier message, on peut
-      // oublier son id (il n'y a plus rien en attente à reprendre).
-      if (mid && mid === lastSentMessageId) {
-        lastSentMessageId = null;
-      }
-      // Si on était en train de streamer ce message, on finalise la bulle
-      // existante au lieu d'en créer une nouvelle (évite le doublon visuel).
-      finalizeStreaming(mid, data.message, data.timestamp);
-      updateSendButton();
-    } else if (data.type === 'chunk') {
-      // Chunk de streaming : texte cumulatif courant de la génération.
-      var cmid = data.message_id || '';
-      if (!cmid) return;
-      // Si la réponse finale a déjà été rendue, ignorer les chunks tardifs.
-      if (renderedMessageIds.has('ai:' + cmid)) return;
-      removeTyping();
-      updateStreamingBubble(cmid, data.text || '');
-    } else if (data.type === 'ack') {
-      // Le serveur confirme avoir reçu notre message. On mémorise son id
-      // pour pouvoir demander la réponse en cas de reconnexion, et on
-      // marque le message utilisateur comme déjà rendu (évite un doublon
-      // si l'historique est rechargé ensuite).
-      if (data.message_id) {
-        lastSentMessageId = data.message_id;
-        renderedMessageIds.add('user:' + data.message_id);
-      }
-    } else if (data.type === 'ai_image') {
-      // 🎨 Image générée (texte → image) reçue chiffrée dans l'enveloppe WS.
-      // `data.data` est le PNG en base64 ; on l'affiche en data: URI.
-      removeTyping();
-      isWaiting = false;
-      addImageMessage(data.data, data.mime || 'image/png', data.filename || '', data.timestamp);
-      updateSendButton();
-    } else if (data.type === 'resume_empty') {
-      // Le serveur n'a pas de réponse en attente pour notre dernier id.
-      // Soit la réponse est déjà arrivée, soit elle n'a pas encore fini
-      // de se générer — on continue simplement d'attendre le broadcast.
-      console.log('[Relay] Resume: aucune réponse en attente côté serveur');
-    } else if (typeof data.type === 'string' && data.type.indexOf('agent') === 0) {
-      // Messages de la page « Agents » (agents_list_result, agent_section_*,
-      // agent_exec_*, agent_create_result, ...). Délégués au module agents.js.
-      if (window.AgentsUI && typeof window.AgentsUI.onMessage === 'function') {
-        window.AgentsUI.onMessage(data);
-      }
-    }
-    // type === 'pong' → rien à faire
+  ws.onmessage = function (event) {
+    // Déchiffrement lancé tout de suite, traitement dans l'ordre d'arrivée.
+    var decrypted = Promise.resolve().then(function () {
+      return decryptEnvelope(JSON.parse(event.data));
+    });
+    wsInbound = wsInbound.then(function () {
+      return decrypted.then(handleIncoming, function (err) {
+        console.error('[Relay] Message WS rejeté (E2EE invalide) :', err);
+      });
+    });
   };
 
   ws.onclose = function (event) {
@@ -309,6 +269,132 @@ function connect() {
   };
 }
 
+function handleIncoming(data) {
+  if (data.type === 'response') {
+    // Déduplication : si on a déjà rendu ce message_id (ex. reçu via
+    // broadcast ET via resume), ignorer le doublon.
+    var mid = data.message_id || '';
+    if (mid && renderedMessageIds.has('ai:' + mid)) {
+      // Nettoyer toute bulle de streaming résiduelle pour ce message.
+      if (streamingMessageId === mid) finalizeStreaming(mid, null, null);
+      return;
+    }
+    if (mid) renderedMessageIds.add('ai:' + mid);
+    delete streamStates[mid];
+
+    removeTyping();
+    isWaiting = false;
+    // Si on reçoit la réponse à notre dernier message, on peut
+    // oublier son id (il n'y a plus rien en attente à reprendre).
+    if (mid && mid === lastSentMessageId) {
+      lastSentMessageId = null;
+    }
+    // Si on était en train de streamer ce message, on finalise la bulle
+    // existante au lieu d'en créer une nouvelle (évite le doublon visuel).
+    finalizeStreaming(mid, data.message, data.timestamp);
+    updateSendButton();
+  } else if (data.type === 'chunk') {
+    // Chunk de streaming : texte cumulatif courant de la génération.
+    var cmid = data.message_id || '';
+    if (!cmid) return;
+    // Si la réponse finale a déjà été rendue, ignorer les chunks tardifs.
+    if (renderedMessageIds.has('ai:' + cmid)) return;
+    removeTyping();
+    updateStreamingBubble(cmid, data.text || '');
+  } else if (data.type === 'chunk_delta' || data.type === 'chunk_snapshot') {
+    applyStreamUpdate(data);
+  } else if (data.type === 'ack') {
+    // Le serveur confirme avoir reçu notre message. On mémorise son id
+    // pour pouvoir demander la réponse en cas de reconnexion, et on
+    // marque le message utilisateur comme déjà rendu (évite un doublon
+    // si l'historique est rechargé ensuite).
+    if (data.message_id) {
+      lastSentMessageId = data.message_id;
+      renderedMessageIds.add('user:' + data.message_id);
+    }
+  } else if (data.type === 'ai_image') {
+    // 🎨 Image générée (texte → image) reçue chiffrée dans l'enveloppe WS.
+    // `data.data` est le PNG en base64 ; on l'affiche en data: URI.
+    removeTyping();
+    isWaiting = false;
+    addImageMessage(data.data, data.mime || 'image/png', data.filename || '', data.timestamp);
+    updateSendButton();
+  } else if (data.type === 'resume_empty') {
+    // Le serveur n'a pas de réponse en attente pour notre dernier id.
+    // Soit la réponse est déjà arrivée, soit elle n'a pas encore fini
+    // de se générer — on continue simplement d'attendre le broadcast.
+    console.log('[Relay] Resume: aucune réponse en attente côté serveur');
+    if (data.message_id && streamStates[data.message_id]) {
+      streamStates[data.message_id].resyncing = false;
+    }
+  } else if (typeof data.type === 'string' && data.type.indexOf('agent') === 0) {
+    // Messages de la page « Agents » (agents_list_result, agent_section_*,
+    // agent_exec_*, agent_create_result, ...). Délégués au module agents.js.
+    if (window.AgentsUI && typeof window.AgentsUI.onMessage === 'function') {
+      window.AgentsUI.onMessage(data);
+    }
+  }
+  // type === 'pong' / 'hello_ack' → rien à faire
+}
+
+// ── STREAMING PAR DELTAS (protocole 2) ──────────────
+var CRC32_TABLE = (function () {
+  var table = new Uint32Array(256);
+  for (var n = 0; n < 256; n++) {
+    var c = n;
+    for (var k = 0; k < 8; k++) c = (c & 1) ? (0xEDB88320 ^ (c >>> 1)) : (c >>> 1);
+    table[n] = c >>> 0;
+  }
+  return table;
+})();
+
+// CRC32 (hex, 8 caractères) du texte en UTF-8, comme relay_bridge.stream_checksum.
+function streamChecksum(text) {
+  var bytes = new TextEncoder().encode(text);
+  var crc = 0xFFFFFFFF;
+  for (var i = 0; i < bytes.length; i++) {
+    crc = CRC32_TABLE[(crc ^ bytes[i]) & 0xFF] ^ (crc >>> 8);
+  }
+  return ((crc ^ 0xFFFFFFFF) >>> 0).toString(16).padStart(8, '0');
+}
+
+// Trou dans la séquence ou somme de contrôle fausse : redemander l'état
+// courant (le serveur répond par un chunk_snapshot, ou la réponse finale).
+function requestStreamResync(mid) {
+  var state = streamStates[mid];
+  if (state && state.resyncing) return;
+  streamStates[mid] = { seq: -1, text: '', resyncing: true };
+  wsSendEncrypted({ type: 'resume', last_message_id: mid }).catch(function (e) {
+    console.warn('[Relay] Resync send failed:', e);
+  });
+}
+
+function applyStreamUpdate(data) {
+  var mid = data.message_id || '';
+  if (!mid || renderedMessageIds.has('ai:' + mid)) return;
+  var state = streamStates[mid] || { seq: 0, text: '', resyncing: false };
+  var text;
+  if (data.type === 'chunk_snapshot') {
+    text = data.text || '';
+  } else {
+    if (state.resyncing) return;
+    // base_seq : deltas fusionnés par la file d'envoi d'un client lent
+    var base = typeof data.base_seq === 'number' ? data.base_seq : data.seq - 1;
+    if (state.seq !== base) {
+      requestStreamResync(mid);
+      return;
+    }
+    text = state.text + (data.text || '');
+  }
+  if (data.checksum && streamChecksum(text) !== data.checksum) {
+    requestStreamResync(mid);
+    return;
+  }
+  streamStates[mid] = { seq: data.seq, text: text, resyncing: false };
+  removeTyping();
+  updateStreamingBubble(mid, text);
+}
+
 function scheduleReconnect() {
   if (reconnectTimer) return;
   reconnectAttempts++;
@@ -97,11 +97,13 @@ class Benchmark10M:
 
             # Mesures multiples pour précision
             times = []
+            chunks_created = 0
+            chunk_rates = []
             for i in range(3):
                 gc.collect()  # Nettoyage mémoire pour mesures précises
 
                 start = time.perf_counter()
-                context_mgr.add_document(
+                add_result = context_mgr.add_document(
                     content=content,
                     document_name=f"benchmark_{size}_{i}",
                     metadata={"type": "benchmark", "importance": "medium"},
@@ -109,16 +111,24 @@ class Benchmark10M:
                 elapsed = time.perf_counter() - start
                 times.append(elapsed)
 
+                # Débit d'ingestion mesuré par VectorMemory (chunks/s)
+                chunks_created = add_result.get("chunks_created", chunks_created)
+                throughput = add_result.get("throughput", {})
+                if throughput.get("chunks_per_second"):
+                    chunk_rates.append(throughput["chunks_per_second"])
+
             # Statistiques
             avg_time = statistics.mean(times)
             std_dev = statistics.stdev(times) if len(times) > 1 else 0
             tokens_per_sec = size / avg_time
+            chunks_per_sec = statistics.mean(chunk_rates) if chunk_rates else 0
 
             storage_results[size] = {
                 "avg_time_seconds": round(avg_time, 4),
                 "std_deviation": round(std_dev, 4),
                 "tokens_per_second": round(tokens_per_sec, 0),
-                # "chunks_created": len(chunk_ids),  # Removed unused variable
+                "chunks_created": chunks_created,
+                "chunks_per_second": round(chunks_per_sec, 1),
                 "efficiency_score": round(
                     tokens_per_sec / 1000, 2
                 ),  # Score sur 1000 tokens/sec
@@ -126,6 +136,7 @@ class Benchmark10M:
 
             print(f"    ⏱️  {avg_time:.3f}s ± {std_dev:.3f}s")
             print(f"    ⚡ {tokens_per_sec:,.0f} tokens/sec")
+            print(f"    🧩 {chunks_per_sec:,.1f} chunks/sec ({chunks_created:,} chunks)")
 
         return storage_results
 
@@ -495,6 +506,8 @@ class Benchmark10M:
         if storage:
             max_tps = max(data.get("tokens_per_second", 0) for data in storage.values())
             print(f"📦 Stockage Max: {max_tps:,.0f} tokens/sec")
+            max_cps = max(data.get("chunks_per_second", 0) for data in storage.values())
+            print(f"🧩 Ingestion Max: {max_cps:,.1f} chunks/sec")
 
         # Performance recherche
         search = metrics.get("search_performance", {})
@@ -0,0 +1,189 @@
+"""
+Tests unitaires pour core/admission.py : priorités, tourniquet entre
+sessions, annulation en file d'attente et métriques.
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from core.admission import (
+    AdmissionQueue,
+    AdmissionRequest,
+    RequestCancelled,
+    admission_context,
+    current_request,
+    is_generation_url,
+    run_in_context,
+)
+
+
+def _wait_for_depth(queue: AdmissionQueue, depth: int) -> None:
+    deadline = time.monotonic() + 2
+    while queue.get_stats()["queue_depth"] < depth:
+        assert time.monotonic() < deadline, "file d'attente jamais remplie"
+        time.sleep(0.01)
+
+
+def _start_waiters(queue, requests_, order):
+    """Un thread par demande, mis en file dans l'ordre de la liste."""
+    threads = []
+    for index, request in enumerate(requests_):
+        def run(request=request):
+            ticket = queue.acquire(request)
+            order.append((request.priority, request.session_id))
+            queue.release(ticket)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        threads.append(thread)
+        _wait_for_depth(queue, index + 1)
+    return threads
+
+
+class TestContext:
+
+    def test_default_is_interactive(self):
+        assert current_request().priority == "interactive"
+
+    def test_context_is_scoped_and_propagated(self):
+        seen = []
+        with admission_context("batch", session_id="tâche"):
+            worker = threading.Thread(
+                target=run_in_context(lambda: seen.append(current_request()))
+            )
+            worker.start()
+            worker.join()
+        assert current_request().priority == "interactive"
+        assert (seen[0].priority, seen[0].session_id) == ("batch", "tâche")
+
+    def test_unknown_priority_rejected(self):
+        with pytest.raises(ValueError):
+            with admission_context("urgent"):
+                pass
+
+    def test_generation_urls(self):
+        assert is_generation_url("http://localhost:11434/api/chat")
+        assert is_generation_url("http://localhost:11434/api/generate")
+        assert not is_generation_url("http://localhost:11434/api/tags")
+
+
+class TestAdmissionQueue:
+
+    def test_higher_priority_served_first(self):
+        queue = AdmissionQueue(max_concurrent=1)
+        holder = queue.acquire(AdmissionRequest("batch", "b0"))
+        order = []
+        threads = _start_waiters(queue, [
+            AdmissionRequest("batch", "b1"),
+            AdmissionRequest("api", "a1"),
+            AdmissionRequest("interactive", "gui"),
+            AdmissionRequest("relay", "mobile"),
+        ], order)
+        queue.release(holder)
+        for thread in threads:
+            thread.join(2)
+        assert [p for p, _ in order] == ["interactive", "relay", "api", "batch"]
+
+    def test_sessions_share_a_class_round_robin(self):
+        queue = AdmissionQueue(max_concurrent=1)
+        holder = queue.acquire(AdmissionRequest("batch", "x"))
+        order = []
+        threads = _start_waiters(queue, [
+            AdmissionRequest("batch", "a"),
+            AdmissionRequest("batch", "a"),
+            AdmissionRequest("batch", "a"),
+            AdmissionRequest("batch", "b"),
+        ], order)
+        queue.release(holder)
+        for thread in threads:
+            thread.join(2)
+        assert [s for _, s in order] == ["a", "b", "a", "a"]
+
+    def test_interrupted_waiter_leaves_the_queue(self):
+        queue = AdmissionQueue(max_concurrent=1)
+        holder = queue.acquire(AdmissionRequest("interactive", "gui"))
+        stop = threading.Event()
+        errors = []
+
+        def run():
+            try:
+                queue.acquire(AdmissionRequest("relay", "mobile", stop.is_set))
+            except RequestCancelled as exc:
+                errors.append(exc)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        _wait_for_depth(queue, 1)
+        stop.set()
+        thread.join(2)
+        assert errors
+        stats = queue.get_stats()
+        assert stats["queue_depth"] == 0
+        assert stats["classes"]["relay"]["cancelled"] == 1
+        queue.release(holder)
+        assert queue.get_stats()["active"] == 0
+
+    def test_nested_call_in_same_thread_does_not_wait(self):
+        queue = AdmissionQueue(max_concurrent=1)
+        outer = queue.acquire(AdmissionRequest())
+        inner = queue.acquire(AdmissionRequest())
+        assert queue.get_stats()["active"] == 2
+        queue.release(inner)
+        queue.release(outer)
+        queue.release(outer)  # deuxième release sans effet
+        assert queue.get_stats()["active"] == 0
+
+    def test_async_waiter_served_by_priority(self):
+        queue = AdmissionQueue(max_concurrent=1)
+
+        async def scenario():
+            holder = await queue.acquire_async(AdmissionRequest("batch", "b"))
+            order = []
+
+            async def wait(request):
+                ticket = await queue.acquire_async(request)
+                order.append(request.priority)
+                queue.release(ticket)
+
+            tasks = [asyncio.create_task(wait(AdmissionRequest("api", "a")))]
+            await asyncio.sleep(0.05)
+            tasks.append(asyncio.create_task(wait(AdmissionRequest("interactive", "g"))))
+            await asyncio.sleep(0.05)
+            assert queue.get_stats()["queue_depth"] == 2
+            queue.release(holder)
+            await asyncio.gather(*tasks)
+            return order
+
+        assert asyncio.run(scenario()) == ["interactive", "api"]
+        assert queue.get_stats()["active"] == 0
+
+    def test_async_cancellation_releases_nothing_twice(self):
+        queue = AdmissionQueue(max_concurrent=1)
+
+        async def scenario():
+            holder = await queue.acquire_async(AdmissionRequest("batch", "b"))
+            task = asyncio.create_task(queue.acquire_async(AdmissionRequest("api", "a")))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            queue.release(holder)
+
+        asyncio.run(scenario())
+        stats = queue.get_stats()
+        assert stats["active"] == 0 and stats["queue_depth"] == 0
+
+    def test_wait_metrics(self):
+        queue = AdmissionQueue(max_concurrent=1)
+        holder = queue.acquire(AdmissionRequest("batch", "b"))
+        order = []
+        threads = _start_waiters(queue, [AdmissionRequest("interactive", "gui")], order)
+        time.sleep(0.05)
+        queue.release(holder)
+        threads[0].join(2)
+        interactive = queue.get_stats()["classes"]["interactive"]
+        assert interactive["admitted"] == 1
+        assert interactive["max_wait_seconds"] >= 0.05
@@ -0,0 +1,205 @@
+"""
+Tests unitaires pour core/context_budget.py et son usage dans LocalLLM /
+ChatOrchestrator (aucun serveur Ollama requis : les appels sont simulés).
+
+Les assertions ne dépendent pas de la présence de tiktoken : le repli
+≈4 caractères/token reste monotone.
+"""
+
+import itertools
+
+import pytest
+
+import models.local_llm as local_llm
+from core.chat_orchestrator import ChatOrchestrator
+from core.history_summarizer import SummaryCache
+from core.context_budget import (
+    ContextBudget,
+    calibrate,
+    calibration_ratio,
+    count_message_tokens,
+    count_tokens,
+)
+
+_models = itertools.count()
+
+
+def _model() -> str:
+    """Nom de modèle neuf : la calibration est globale au processus."""
+    return f"test-model-{next(_models)}"
+
+
+def _history(n: int, words: int = 60):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant",
+         "content": f"message {i} " + "mot " * words}
+        for i in range(n)
+    ]
+
+
+class _FakeResponse:
+    status_code = 200
+
+    def __init__(self, body):
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+class TestContextBudget:
+
+    def test_prompt_budget_reserves_response(self):
+        budget = ContextBudget(8192, response_reserve=2048)
+        assert budget.prompt_budget == 6144
+        # Petite fenêtre : la réserve est plafonnée à la moitié
+        assert ContextBudget(1024, response_reserve=2048).prompt_budget == 512
+
+    def test_fit_history_keeps_most_recent_within_budget(self):
+        budget = ContextBudget(8192, model=_model())
+        history = _history(30)
+        per_message = budget.count_messages(history[-1:])
+        kept = budget.fit_history(history, per_message * 5)
+        assert kept == history[-5:]
+
+    def test_fit_history_keeps_leading_summary(self):
+        budget = ContextBudget(8192, model=_model())
+        summary = {"role": "system", "content": "[Résumé de la conversation précédente] x"}
+        history = [summary] + _history(30)
+        allowance = budget.count_messages([summary]) + budget.count_messages(history[-3:])
+        kept = budget.fit_history(history, allowance)
+        assert kept[0] is summary
+        assert kept[1:] == history[-3:]
+
+    def test_fit_messages_respects_prompt_budget(self):
+        budget = ContextBudget(4096, model=_model(), response_reserve=1024)
+        messages = budget.fit_messages("système", _history(200), "question")
+        assert messages[0]["role"] == "system"
+        assert messages[-1] == {"role": "user", "content": "question"}
+        assert budget.count_messages(messages) <= budget.prompt_budget
+        assert len(messages) > 2
+
+    def test_calibration_scales_counts_and_rejects_outliers(self):
+        model = _model()
+        budget = ContextBudget(8192, model=model)
+        messages = _history(4)
+        raw = count_message_tokens(messages)
+        assert budget.count_messages(messages) == raw
+
+        budget.observe(messages, raw * 10)  # prompt tronqué / cache KV : ignoré
+        assert calibration_ratio(model) == 1.0
+
+        budget.observe(messages, int(raw * 1.5))
+        assert calibration_ratio(model) == pytest.approx(1.5, rel=0.01)
+        assert budget.count_messages(messages) == pytest.approx(raw * 1.5, rel=0.01)
+
+        calibrate(model, raw, None)  # réponse sans prompt_eval_count
+        assert calibration_ratio(model) == pytest.approx(1.5, rel=0.01)
+
+    def test_truncate_caps_injected_context(self):
+        budget = ContextBudget(8192, model=_model())
+        text = "extrait " * 2000
+        capped = budget.truncate(text, 100)
+        assert text.startswith(capped)
+        assert count_tokens(capped) <= 100
+        assert budget.truncate("court", 100) == "court"
+
+
+class TestChatOrchestratorBudget:
+
+    def test_initial_messages_pruned_by_tokens(self):
+        budget = ContextBudget(2048, model=_model(), response_reserve=512)
+        messages = ChatOrchestrator()._build_initial_messages(
+            system_prompt="système", user_input="question",
+            history=_history(40), budget=budget,
+        )
+        assert budget.count_messages(messages) <= budget.prompt_budget
+        assert messages[-2] == _history(40)[-1]
+
+    def test_compaction_triggered_by_tokens(self):
+        scheduled = []
+
+        class FakeLLM:
+            model = _model()
+            gen_num_ctx = 2048
+
+            def schedule_summary(self, force=False):
+                scheduled.append(force)
+                return True
+
+        orchestrator = ChatOrchestrator()
+        budget = ContextBudget(2048, model=FakeLLM.model, response_reserve=512)
+
+        # Peu de messages mais longs : l'ancien seuil en nombre de messages
+        # n'aurait jamais déclenché la compaction.
+        long_history = _history(6, words=700)
+        messages = orchestrator._build_initial_messages(
+            "système", "question", long_history, budget=budget)
+        compacted = orchestrator._compact_context_if_needed(messages, FakeLLM(), budget=budget)
+        assert scheduled == [True]  # résumé demandé en arrière-plan, pas attendu
+        assert compacted[0] == messages[0] and compacted[-1] == messages[-1]
+        assert budget.count_messages(compacted) <= budget.compact_threshold
+
+        # Beaucoup de messages courts : sous le seuil, pas de compaction
+        short = orchestrator._build_initial_messages(
+            "système", "question", _history(30, words=2), budget=budget)
+        assert orchestrator._compact_context_if_needed(short, FakeLLM(), budget=budget) == short
+        assert scheduled == [True]
+
+
+class TestLocalLLMBudget:
+
+    @pytest.fixture
+    def llm(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(local_llm.LocalLLM, "_check_ollama_availability", lambda self: False)
+        monkeypatch.setattr(
+            local_llm, "get_summary_cache", lambda _path: SummaryCache(str(tmp_path / "s.db"))
+        )
+        instance = local_llm.LocalLLM(model=_model())
+        instance.gen_num_ctx = 4096
+        return instance
+
+    def test_budget_follows_num_ctx(self, llm):
+        assert llm.context_budget.num_ctx == 4096
+        llm.gen_num_ctx = 8192  # Panneau Réglages
+        assert llm.context_budget.num_ctx == 8192
+
+    def test_history_summarized_when_over_token_budget(self, llm, monkeypatch):
+        calls = []
+
+        def fake_post(url, json=None, **_kwargs):
+            calls.append(json)
+            return _FakeResponse({"message": {"content": "résumé court"}})
+
+        monkeypatch.setattr(local_llm, "_resilient_post", fake_post)
+
+        # Dix messages seulement : l'ancien garde-fou (max_history_length // 2)
+        # empêchait tout résumé malgré le dépassement en tokens.
+        for message in _history(10, words=400):
+            llm.add_to_history(message["role"], message["content"])
+        llm.apply_pending_summary(timeout=5)
+
+        assert calls
+        assert calls[0]["options"]["num_ctx"] == llm.gen_num_ctx
+        assert llm.conversation_history[0]["role"] == "system"
+
+    def test_generate_fits_history_and_calibrates(self, llm, monkeypatch):
+        sent = []
+
+        def fake_post(url, json=None, **_kwargs):
+            sent.append(json)
+            raw = count_message_tokens(json["messages"])
+            return _FakeResponse({
+                "message": {"content": "ok"},
+                "prompt_eval_count": int(raw * 1.2),
+            })
+
+        monkeypatch.setattr(local_llm, "_resilient_post", fake_post)
+        llm.is_ollama_available = True
+        llm.conversation_history = _history(200)
+
+        assert llm.generate("question", system_prompt="système", save_history=False) == "ok"
+        budget = llm.context_budget
+        assert len(sent[0]["messages"]) < 202
+        assert count_message_tokens(sent[0]["messages"]) <= budget.prompt_budget
+        assert calibration_ratio(llm.model) == pytest.approx(1.2, rel=0.01)
@@ -0,0 +1,99 @@
+"""
+Tests unitaires pour core/context_gathering.py : sources lancées en
+parallèle, échéance par source, valeur par défaut en cas d'échec.
+"""
+
+import threading
+import time
+
+from core.context_gathering import ContextGathering
+
+
+def _slow(value, delay):
+    def run():
+        time.sleep(delay)
+        return value
+    return run
+
+
+class TestContextGathering:
+
+    def test_sources_run_concurrently(self):
+        start = time.monotonic()
+        gathering = ContextGathering({
+            "a": (_slow("A", 0.2), ""),
+            "b": (_slow("B", 0.2), ""),
+            "c": (_slow("C", 0.2), ""),
+        }, timeouts={"a": 2, "b": 2, "c": 2})
+        assert gathering.results() == {"a": "A", "b": "B", "c": "C"}
+        assert time.monotonic() - start < 0.5
+
+    def test_slow_source_is_dropped_at_its_deadline(self):
+        release = threading.Event()
+
+        def stuck():
+            release.wait(5)
+            return "trop tard"
+
+        start = time.monotonic()
+        gathering = ContextGathering({
+            "fast": (_slow("ok", 0.0), ""),
+            "stuck": (stuck, "défaut"),
+        }, timeouts={"fast": 1, "stuck": 0.1})
+        results = gathering.results()
+        release.set()
+        assert results == {"fast": "ok", "stuck": "défaut"}
+        assert gathering.dropped == {"stuck"}
+        assert time.monotonic() - start < 1
+
+    def test_deadline_counts_from_start(self):
+        gathering = ContextGathering({
+            "language": (_slow("fr", 0.0), "fr"),
+            "codebase": (_slow("extraits", 0.15), ""),
+        }, timeouts={"language": 1, "codebase": 0.3})
+        # Le temps passé ailleurs entre-temps réduit l'attente restante,
+        # sans abandonner une source terminée dans son échéance
+        assert gathering.result("language") == "fr"
+        time.sleep(0.2)
+        assert gathering.result("codebase") == "extraits"
+
+    def test_failing_source_returns_default(self):
+        def broken():
+            raise RuntimeError("base indisponible")
+
+        gathering = ContextGathering({"knowledge_base": (broken, "")}, timeouts={"knowledge_base": 1})
+        assert gathering.results() == {"knowledge_base": ""}
+        assert gathering.dropped == set()
+
+    def test_result_is_memoized(self):
+        calls = []
+        gathering = ContextGathering(
+            {"a": (lambda: calls.append(1) or "A", "")}, timeouts={"a": 1}
+        )
+        assert gathering.result("a") == "A"
+        assert gathering.results() == {"a": "A"}
+        assert calls == [1]
+
+    def test_source_without_deadline_is_awaited(self):
+        gathering = ContextGathering({
+            "documents": (_slow("extraits", 0.2), ""),
+        }, timeouts={"documents": None})
+        assert gathering.results() == {"documents": "extraits"}
+        assert gathering.dropped == set()
+
+    def test_abandoned_sources_do_not_starve_next_request(self):
+        release = threading.Event()
+
+        def stuck():
+            release.wait(5)
+            return "trop tard"
+
+        # Requêtes précédentes dont les sources restent bloquées
+        for _ in range(10):
+            ContextGathering({"codebase": (stuck, "")}, timeouts={"codebase": 0.01}).results()
+        try:
+            gathering = ContextGathering({"language": (_slow("fr", 0.0), "défaut")},
+                                         timeouts={"language": 0.5})
+            assert gathering.result("language") == "fr"
+        finally:
+            release.set()
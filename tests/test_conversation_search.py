@@ -25,7 +25,11 @@ class _FakeEmbedding(list):
 
 
 class _FakeModel:
+    def __init__(self):
+        self.encoded = []
+
     def encode(self, text):
+        self.encoded.append(text)
         # Vecteur factice deterministe (longueur du texte) - non utilise pour le
         # scoring, juste pour respecter l'API encode().tolist().
         return _FakeEmbedding([float(len(text))])
@@ -35,12 +39,17 @@ class _FakeCollection:
     def __init__(self):
         # id -> {"document": str, "metadata": dict}
         self.store = {}
+        self.get_calls = []
 
     def add(self, ids, embeddings, documents, metadatas):
         for i, _id in enumerate(ids):
             self.store[_id] = {"document": documents[i], "metadata": metadatas[i]}
 
-    def delete(self, where=None):
+    def delete(self, ids=None, where=None):
+        if ids is not None:
+            for _id in ids:
+                self.store.pop(_id, None)
+            return
         if not where:
             self.store.clear()
             return
@@ -50,8 +59,9 @@ class _FakeCollection:
         for k in to_del:
             del self.store[k]
 
-    def get(self, include=None):
-        ids = list(self.store.keys())
+    def get(self, ids=None, include=None):
+        self.get_calls.append(ids)
+        ids = list(self.store.keys()) if ids is None else [i for i in ids if i in self.store]
         return {
             "ids": ids,
             "documents": [self.store[i]["document"] for i in ids],
@@ -185,6 +195,72 @@ def test_reindex_picks_up_modifications(env):
     assert len(vm.conversation_collection.store) > count_before
 
 
+def test_reindex_only_embeds_delta(env):
+    """Seuls les messages ajoutes/modifies sont encodes, seuls les disparus purges."""
+    sm, vm, cs = env
+    history = [{"text": f"Message numero {i} de la conversation", "is_user": i % 2 == 0}
+               for i in range(20)]
+    ws_id = _make_ws(sm, "Long", history)
+    assert cs.reindex(force=False)["messages"] == 20
+    vm.embedding_model.encoded.clear()
+
+    # Un message ajoute : un seul encodage
+    history.append({"text": "Nouveau message ajoute a la fin", "is_user": True})
+    sm.save_workspace(ws_id, {"conversation_history": history})
+    stats = cs.reindex(force=False)
+    assert stats["messages"] == 1
+    assert vm.embedding_model.encoded == ["Nouveau message ajoute a la fin"]
+
+    # Un message edite + le dernier supprime
+    vm.embedding_model.encoded.clear()
+    history[3]["text"] = "Message numero 3 corrige"
+    history.pop()
+    sm.save_workspace(ws_id, {"conversation_history": history})
+    stats = cs.reindex(force=False)
+    assert stats["messages"] == 1
+    assert stats["deleted"] == 1
+    assert vm.embedding_model.encoded == ["Message numero 3 corrige"]
+
+    store = vm.conversation_collection.store
+    assert len(store) == 20
+    assert store[f"conv_{ws_id}_3"]["document"] == "Message numero 3 corrige"
+    assert f"conv_{ws_id}_20" not in store
+
+
+def test_reindex_reads_only_appended_messages(env, monkeypatch):
+    """Historique seulement allonge : seule la fin est relue depuis le disque."""
+    sm, vm, cs = env
+    history = [{"text": f"Message numero {i} de la conversation", "is_user": True}
+               for i in range(10)]
+    ws_id = _make_ws(sm, "Journal", history)
+    cs.reindex(force=False)
+
+    history.append({"text": "Message ajoute apres le premier passage", "is_user": False})
+    sm.save_workspace(ws_id, {"conversation_history": history})
+    pages = []
+    original = sm.load_history
+    monkeypatch.setattr(sm, "load_workspace", lambda *a, **k: pytest.fail("relecture complete"))
+    monkeypatch.setattr(sm, "load_history", lambda ws, start=0, limit=None: (
+        pages.append(start) or original(ws, start=start, limit=limit)))
+    assert cs.reindex(force=False)["messages"] == 1
+    assert pages == [10]
+    assert f"conv_{ws_id}_10" in vm.conversation_collection.store
+
+
+def test_force_reindex_rebuilds_workspace(env):
+    sm, vm, cs = env
+    ws_id = _make_ws(sm, "Force", [
+        {"text": "Premier message de la conversation", "is_user": True},
+    ])
+    cs.reindex(force=False)
+    # Entree orpheline (ex. ancien index) : la reconstruction forcee la retire
+    vm.conversation_collection.store[f"conv_{ws_id}_99"] = {
+        "document": "orphelin", "metadata": {"workspace_id": ws_id}}
+    stats = cs.reindex(force=True)
+    assert stats["messages"] == 1
+    assert list(vm.conversation_collection.store) == [f"conv_{ws_id}_0"]
+
+
 def test_deleted_workspace_is_purged(env):
     sm, vm, cs = env
     ws_id = _make_ws(sm, "Temporaire", [
@@ -296,6 +372,42 @@ def test_exact_word_never_missed_even_outside_semantic_topn():
         assert "kubernetes" in res[0]["excerpt"].lower()
 
 
+def test_exact_word_uses_inverted_index_not_full_collection(env):
+    """Le chemin mot-exact consulte l'index inverse puis lit les seuls
+    candidats dans la collection, jamais la collection entiere."""
+    sm, vm, cs = env
+    if cs._lexical is None:
+        pytest.skip("SQLite sans FTS5/trigram")
+    ws_id = _make_ws(sm, "Infra", [
+        {"text": f"Message de routine numero {i}", "is_user": True} for i in range(30)
+    ] + [{"text": "Le certificat letsencrypt a expire", "is_user": False}])
+    cs.reindex(force=False)
+
+    hits = cs._lexical_full_scan("LetsEncrypt")
+    assert [h["chunk_id"] for h in hits] == [f"conv_{ws_id}_30"]
+    assert None not in vm.conversation_collection.get_calls
+
+    # Suivi incremental : message edite -> ancien texte introuvable
+    history = sm.load_workspace(ws_id)["conversation_history"]
+    history[30]["text"] = "Le certificat a ete renouvele"
+    sm.save_workspace(ws_id, {"conversation_history": history})
+    cs.reindex(force=False)
+    assert cs._lexical_full_scan("letsencrypt") == []
+    assert len(cs._lexical_full_scan("renouvele")) == 1
+
+
+def test_lexical_index_rebuilt_when_missing(env):
+    sm, _, cs = env
+    if cs._lexical is None:
+        pytest.skip("SQLite sans FTS5/trigram")
+    _make_ws(sm, "Perdu", [{"text": "Sauvegarde restic quotidienne", "is_user": True}])
+    cs.reindex(force=False)
+    cs._lexical.clear()  # base supprimee / premiere execution apres mise a jour
+    stats = cs.reindex(force=False)
+    assert stats["messages"] == 1
+    assert len(cs._lexical_full_scan("restic")) == 1
+
+
 def test_exact_word_other_language_case_insensitive():
     """Mot exact dans une autre langue + casse differente."""
     with tempfile.TemporaryDirectory() as tmp:
@@ -0,0 +1,84 @@
+"""
+Tests pour core/embedding_cache.py (cache d'embeddings persistant).
+
+Utilise un faux modele d'embeddings deterministe : aucun modele ML requis.
+"""
+
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from core.embedding_cache import EmbeddingCache, normalize_text
+
+
+class _FakeModel:
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, **_kwargs):
+        self.encoded.extend(texts)
+        return np.array([[float(len(t)), 0.5, -1.25] for t in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def cache():
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmp:
+        yield EmbeddingCache(str(Path(tmp) / "emb.db"), max_entries=3)
+
+
+def test_normalize_text_collapses_whitespace():
+    assert normalize_text("  a\n\tb  ") == "a b"
+
+
+def test_encode_hits_and_misses(cache):
+    model = _FakeModel()
+    vecs = cache.encode(model, "m", ["un", "deux", "un"])
+    assert model.encoded == ["un", "deux"]
+    assert vecs[0] == vecs[2] == [2.0, 0.5, -1.25]
+
+    cache.encode(model, "m", ["deux", "un"])
+    assert model.encoded == ["un", "deux"]
+    stats = cache.get_stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 3
+    assert stats["entries"] == 2
+
+
+def test_model_name_is_part_of_key(cache):
+    model = _FakeModel()
+    cache.encode(model, "m1", ["texte"])
+    cache.encode(model, "m2", ["texte"])
+    assert model.encoded == ["texte", "texte"]
+
+
+def test_lru_eviction(cache):
+    model = _FakeModel()
+    for text in ("a", "b", "c"):
+        cache.encode(model, "m", [text])
+    cache.encode(model, "m", ["a"])          # "a" redevient recent
+    cache.encode(model, "m", ["d"])          # evince "b" (le moins recent)
+    assert cache.get_stats()["entries"] == 3
+    hits = cache.get_many("m", ["a", "b", "c", "d"])
+    assert hits[1] is None
+    assert all(v is not None for i, v in enumerate(hits) if i != 1)
+
+
+def test_persistence_across_instances():
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmp:
+        db = str(Path(tmp) / "emb.db")
+        EmbeddingCache(db).encode(_FakeModel(), "m", ["persistant"])
+        model = _FakeModel()
+        EmbeddingCache(db).encode(model, "m", ["persistant"])
+        assert model.encoded == []
+
+
+def test_single_connection_reused(cache):
+    cache.encode(_FakeModel(), "m", ["a", "b"])
+    conn = cache._conn  # pylint: disable=protected-access
+    cache.get_many("m", ["a"])
+    cache.get_stats()
+    assert cache._conn is conn  # pylint: disable=protected-access
+    cache.close()
+    assert cache.get_many("m", ["a"])[0] == [1.0, 0.5, -1.25]
@@ -279,3 +279,280 @@ def test_progress_callback(env):
                          progress_cb=lambda d, t, p: seen.append((d, t, p)))
     assert seen
     assert seen[-1][0] == seen[-1][1]  # done == total a la fin
+
+
+def test_pipeline_many_files_small_queues(env):
+    tmp, vm, indexer = env
+    # Files tres petites : verifie que le pipeline borne ne se bloque pas.
+    indexer._queue_size = 2  # pylint: disable=protected-access
+    indexer._embed_batch = 3  # pylint: disable=protected-access
+    root = tmp / "big"
+    root.mkdir()
+    for i in range(40):
+        (root / f"mod_{i}.py").write_text(
+            f"def f{i}():\n    return {i}\n\n# fin {i}\n", encoding="utf-8")
+    seen = []
+    res = indexer.index_folder("ws1", str(root),
+                               progress_cb=lambda d, t, p: seen.append((d, t, p)))
+    assert res["status"] == "success"
+    assert res["files_indexed"] == 40
+    assert res["chunks"] == 80
+    assert [d for d, _, _ in seen] == list(range(1, 41))
+    indexed = {m["metadata"]["file_path"]
+               for m in vm.codebase_collection.store.values()}
+    assert len(indexed) == 40
+
+
+def test_pipeline_process_pool_extraction(env):
+    tmp, vm, indexer = env
+    indexer._workers = 2  # pylint: disable=protected-access
+    root = _make_project(tmp / "proj")
+    (root / "table.csv").write_text("nom,age\nalice,30\nbob,25\n", encoding="utf-8")
+    res = indexer.index_folder("ws1", str(root))
+    assert res["status"] == "success"
+    assert res["files_indexed"] == 4
+    indexed = {m["metadata"]["file_path"]
+               for m in vm.codebase_collection.store.values()}
+    assert "table.csv" in indexed
+
+
+def test_apply_changes_only_touches_changed_paths(env):
+    tmp, vm, indexer = env
+    root = _make_project(tmp / "proj")
+    (root / "pkg").mkdir()
+    (root / "pkg" / "a.py").write_text("A = 1\n", encoding="utf-8")
+    (root / "pkg" / "b.py").write_text("B = 2\n", encoding="utf-8")
+    folder = indexer.index_folder("ws1", str(root))["folder"]
+
+    (root / "main.py").write_text("print('edited')\n", encoding="utf-8")
+    (root / "new.py").write_text("NEW = True\n", encoding="utf-8")
+    (root / "utils.py").unlink()
+    (root / "node_modules" / "lib.js").write_text("// bruit", encoding="utf-8")
+    res = indexer.apply_changes(
+        "ws1", folder, ["main.py", "new.py", "utils.py", "node_modules/lib.js"])
+    assert res["files_indexed"] == 2
+    assert res["files_removed"] == 1
+
+    # Suppression d'un sous-dossier entier : tout son contenu est purge.
+    for child in (root / "pkg").iterdir():
+        child.unlink()
+    (root / "pkg").rmdir()
+    res = indexer.apply_changes("ws1", folder, ["pkg"])
+    assert res["files_removed"] == 2
+
+    indexed = {m["metadata"]["file_path"]
+               for m in vm.codebase_collection.store.values()}
+    assert indexed == {"main.py", "README.md", "new.py"}
+    status = indexer.get_status("ws1")
+    assert set(status["folders"][0]["files"]) == {"main.py", "README.md", "new.py"}
+
+
+def test_watcher_coalesces_and_flushes(env):
+    from core.folder_watcher import FolderWatcher
+
+    tmp, vm, indexer = env
+    root = _make_project(tmp / "proj")
+    folder = indexer.index_folder("ws1", str(root))["folder"]
+    watcher = FolderWatcher(indexer, debounce_seconds=0, use_watchdog=False)
+    assert watcher.watch("ws1", folder)
+
+    (root / "utils.py").write_text("def mul(a, b):\n    return a * b\n", encoding="utf-8")
+    for _ in range(5):  # rafale sur le meme fichier -> une seule mise a jour
+        watcher.notify(str(root / "utils.py"))
+    watcher.notify(str(root / ".git" / "index"))  # ignore des la reception
+    totals = watcher.flush()
+    assert totals["files_indexed"] == 1
+    assert watcher.get_stats()["pending"] == 0
+    contents = [v["document"] for v in vm.codebase_collection.store.values()
+                if v["metadata"]["file_path"] == "utils.py"]
+    assert any("mul" in c for c in contents)
+
+
+def test_watcher_polling_backend_detects_changes(env):
+    import time
+
+    from core.folder_watcher import FolderWatcher
+
+    tmp, vm, indexer = env
+    root = _make_project(tmp / "proj")
+    folder = indexer.index_folder("ws1", str(root))["folder"]
+    watcher = FolderWatcher(indexer, debounce_seconds=0.1, poll_interval=0.2,
+                            use_watchdog=False)
+    watcher.watch("ws1", folder)
+    watcher.start()
+    try:
+        (root / "README.md").unlink()
+        deadline = time.time() + 5
+        while time.time() < deadline and watcher.stats["files_removed"] == 0:
+            time.sleep(0.05)
+    finally:
+        watcher.stop()
+    assert watcher.stats["files_removed"] == 1
+    indexed = {m["metadata"]["file_path"]
+               for m in vm.codebase_collection.store.values()}
+    assert "README.md" not in indexed
+
+
+def test_large_file_streamed_in_parts(env):
+    tmp, vm, indexer = env
+    # Lots de 2 chunks : un fichier de 7 paragraphes part en plusieurs morceaux.
+    indexer._embed_batch = 2  # pylint: disable=protected-access
+    root = tmp / "gros"
+    root.mkdir()
+    target = root / "long.md"
+    target.write_text("\n\n".join(f"Paragraphe {i}." for i in range(7)), encoding="utf-8")
+
+    res = indexer.index_folder("ws1", str(root))
+    assert res["chunks"] == 7
+    metas = [m["metadata"] for m in vm.codebase_collection.store.values()]
+    assert sorted(m["chunk_index"] for m in metas) == list(range(7))
+
+    # Reindexation plus courte : aucun chunk obsolete ne subsiste.
+    target.write_text("\n\n".join(f"Nouveau {i}." for i in range(3)), encoding="utf-8")
+    n = indexer._index_file("ws1", str(root), root, target)  # pylint: disable=protected-access
+    assert n == 3
+    docs = sorted(m["document"] for m in vm.codebase_collection.store.values())
+    assert docs == [f"Nouveau {i}." for i in range(3)]
+
+
+def test_failed_write_stops_file_at_first_batch(env):
+    tmp, vm, indexer = env
+    indexer._embed_batch = 2  # pylint: disable=protected-access
+    root = tmp / "gros"
+    root.mkdir()
+    target = root / "long.md"
+    target.write_text("\n\n".join(f"Ancien {i}." for i in range(3)), encoding="utf-8")
+    indexer.index_folder("ws1", str(root))
+
+    target.write_text("\n\n".join(f"Nouveau {i}." for i in range(7)), encoding="utf-8")
+    col = vm.codebase_collection
+    real_add = col.add
+
+    def _add_failing_once(**kwargs):
+        col.add = real_add  # seul le premier lot echoue
+        raise RuntimeError("disque plein")
+
+    # Chemin direct : arret au premier lot, pas de chunks 2..6 sans 0/1
+    col.add = _add_failing_once
+    assert indexer._index_file("ws1", str(root), root, target) is None  # pylint: disable=protected-access
+    assert not [v for v in col.store.values() if v["document"].startswith("Nouveau")]
+
+    # Pipeline : meme regle, le fichier compte en echec et sera retente
+    col.add = _add_failing_once
+    res = indexer.index_folder("ws1", str(root))
+    assert res["files_failed"] == 1 and res["files_indexed"] == 0
+    assert not [v for v in col.store.values() if v["document"].startswith("Nouveau")]
+    res = indexer.index_folder("ws1", str(root))
+    assert res["files_indexed"] == 1
+    docs = sorted(v["document"] for v in col.store.values())
+    assert docs == [f"Nouveau {i}." for i in range(7)]
+
+
+def test_failed_embedding_batch_is_retried(env):
+    tmp, vm, indexer = env
+    root = tmp / "proj"
+    root.mkdir()
+    target = root / "notes.md"
+    target.write_text("OLD_CONTENT", encoding="utf-8")
+    indexer.index_folder("ws1", str(root))
+
+    target.write_text("NEW_CONTENT, plus long", encoding="utf-8")
+    real_encode = vm.embedding_model.encode
+    vm.embedding_model.encode = lambda text: (_ for _ in ()).throw(RuntimeError("GPU"))
+    res = indexer.index_folder("ws1", str(root))
+    assert res["files_failed"] == 1
+    assert res["files_indexed"] == 0
+    # L'ancienne version reste indexee, avec son ancien hash au manifeste
+    docs = [v["document"] for v in vm.codebase_collection.store.values()]
+    assert docs == ["OLD_CONTENT"]
+
+    vm.embedding_model.encode = real_encode
+    res = indexer.index_folder("ws1", str(root))
+    assert res["files_indexed"] == 1 and res["files_skipped"] == 0
+    docs = [v["document"] for v in vm.codebase_collection.store.values()]
+    assert docs == ["NEW_CONTENT, plus long"]
+
+
+def test_failed_first_part_skips_later_parts(env):
+    tmp, vm, indexer = env
+    indexer._embed_batch = 2  # pylint: disable=protected-access
+    root = tmp / "gros"
+    root.mkdir()
+    target = root / "long.md"
+    target.write_text("\n\n".join(f"Ancien {i}." for i in range(3)), encoding="utf-8")
+    indexer.index_folder("ws1", str(root))
+
+    target.write_text("\n\n".join(f"Nouveau {i}." for i in range(7)), encoding="utf-8")
+    real_encode = vm.embedding_model.encode
+    calls = {"n": 0}
+
+    def _flaky(text):
+        calls["n"] += 1
+        if calls["n"] == 1:  # premier lot du fichier -> echec
+            raise RuntimeError("GPU")
+        return real_encode(text)
+
+    vm.embedding_model.encode = _flaky
+    res = indexer.index_folder("ws1", str(root))
+    assert res["files_failed"] == 1
+    docs = sorted(v["document"] for v in vm.codebase_collection.store.values())
+    assert docs == [f"Ancien {i}." for i in range(3)]
+
+
+def test_apply_changes_failure_keeps_previous_entry(env):
+    tmp, vm, indexer = env
+    indexer._embed_batch = 2  # pylint: disable=protected-access
+    root = tmp / "gros"
+    root.mkdir()
+    target = root / "long.md"
+    target.write_text("\n\n".join(f"Ancien {i}." for i in range(3)), encoding="utf-8")
+    folder = indexer.index_folder("ws1", str(root))["folder"]
+
+    target.write_text("\n\n".join(f"Nouveau {i}." for i in range(7)), encoding="utf-8")
+    col = vm.codebase_collection
+    real_add = col.add
+
+    def _add_failing_once(**kwargs):
+        col.add = real_add
+        raise RuntimeError("disque plein")
+
+    col.add = _add_failing_once
+    res = indexer.apply_changes("ws1", folder, ["long.md"])
+    assert res["files_failed"] == 1 and res["files_indexed"] == 0
+    assert not [v for v in col.store.values() if v["document"].startswith("Nouveau")]
+
+    # Le nouveau hash n'a pas ete enregistre : l'evenement suivant reindexe
+    res = indexer.apply_changes("ws1", folder, ["long.md"])
+    assert res["files_indexed"] == 1 and res["files_skipped"] == 0
+    docs = sorted(v["document"] for v in col.store.values())
+    assert docs == [f"Nouveau {i}." for i in range(7)]
+
+
+def test_watcher_root_under_excluded_dir_name(env):
+    from core.folder_watcher import FolderWatcher
+
+    tmp, vm, indexer = env
+    # Dossier attache sous un parent nomme "build" : ses evenements comptent.
+    root = _make_project(tmp / "build" / "proj")
+    folder = indexer.index_folder("ws1", str(root))["folder"]
+    watcher = FolderWatcher(indexer, debounce_seconds=0, use_watchdog=False)
+    watcher.watch("ws1", folder)
+    (root / "main.py").write_text("print('rebuilt')\n", encoding="utf-8")
+    watcher.notify(str(root / "main.py"))
+    watcher.notify(str(root / "node_modules" / "lib.js"))
+    assert watcher.get_stats()["pending"] == 1
+    assert watcher.flush()["files_indexed"] == 1
+
+
+def test_ensure_watching_switches_workspace(env):
+    tmp, _, indexer = env
+    indexer._watch_enabled = True  # pylint: disable=protected-access
+    indexer.index_folder("ws1", str(_make_project(tmp / "p1")))
+    indexer.index_folder("ws2", str(_make_project(tmp / "p2")))
+    try:
+        assert indexer.ensure_watching("ws1")
+        assert indexer.ensure_watching("ws2")
+        watcher = indexer._watcher  # pylint: disable=protected-access
+        assert watcher.watched_workspaces() == {"ws2"}
+    finally:
+        indexer.stop_watching()
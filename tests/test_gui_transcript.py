@@ -0,0 +1,61 @@
+"""
+Tests de la fenêtre de rendu virtualisée de la conversation GUI
+(interfaces/gui/transcript.py) : pages matérialisées, plafond de widgets,
+hauteurs des cales, cache des pré-traitements.
+"""
+
+import pytest
+
+transcript = pytest.importorskip(
+    "interfaces.gui.transcript", reason="dépendances GUI non installées"
+)
+TranscriptWindow = transcript.TranscriptWindow
+
+
+def test_opening_materializes_only_the_last_page():
+    window = TranscriptWindow(page_size=20, max_materialized=60)
+    assert window.reset(1000) == range(980, 1000)
+    assert window.follows_end and window.bounds(1001) == (980, 1001)
+
+
+def test_scrolling_up_keeps_widget_count_bounded():
+    window = TranscriptWindow(page_size=20, max_materialized=60)
+    window.reset(1000)
+    materialized = set(range(980, 1000))
+    for _ in range(10):
+        materialized |= set(window.extend_up())
+        materialized -= set(window.trim(1000, keep_end=False))
+        assert len(materialized) <= 60
+    start, end = window.bounds(1000)
+    assert materialized == set(range(start, end)) and start == 780
+    assert not window.follows_end
+
+    # Retour en bas : la fenêtre rejoint la fin et suit les nouveaux messages
+    while not window.follows_end:
+        materialized |= set(window.extend_down(1000))
+        materialized -= set(window.trim(1000, keep_end=True))
+    assert materialized == set(range(940, 1000))
+
+
+def test_jump_to_centers_a_page():
+    window = TranscriptWindow(page_size=20, max_materialized=60)
+    window.reset(1000)
+    assert window.jump_to(500, 1000) == range(490, 510)
+    assert window.jump_to(995, 1000) == range(980, 1000) and window.follows_end
+
+
+def test_spacer_heights_use_measures_then_estimate():
+    window = TranscriptWindow(page_size=5, max_materialized=10)
+    assert window.height(range(3)) == 3 * transcript.DEFAULT_ESTIMATED_HEIGHT
+    window.record_height(0, 100)
+    window.record_height(1, 300)
+    assert window.height(range(3)) == 100 + 300 + 200
+
+
+def test_render_model_cache_is_bounded_lru():
+    cache = transcript.RenderModelCache(max_entries=2)
+    for text in ("a", "b"):
+        cache.put(text, transcript.BubbleRenderModel(display_text=text))
+    assert cache.get("a").display_text == "a"
+    cache.put("c", transcript.BubbleRenderModel(display_text="c"))
+    assert cache.get("b") is None and len(cache) == 2
@@ -0,0 +1,174 @@
+"""
+Tests unitaires pour core/history_summarizer.py et le résumé d'arrière-plan
+de LocalLLM (appels Ollama simulés).
+"""
+
+import threading
+
+import pytest
+
+import models.local_llm as local_llm
+from core.history_summarizer import (
+    HistorySummarizer,
+    SummaryCache,
+    chain_hashes,
+    merge_summaries,
+)
+
+
+def _history(n: int, words: int = 400):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant",
+         "content": f"message {i} " + "mot " * words}
+        for i in range(n)
+    ]
+
+
+class _FakeResponse:
+    status_code = 200
+
+    def __init__(self, body):
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+class TestSummaryCache:
+
+    def test_chain_hashes_depend_only_on_content(self):
+        msgs = _history(3, words=1)
+        copy = [dict(m) for m in msgs]
+        assert chain_hashes("", msgs) == chain_hashes("", copy)
+        assert chain_hashes("", msgs[:2]) == chain_hashes("", msgs)[:2]
+        assert chain_hashes("x", msgs) != chain_hashes("", msgs)
+
+    def test_lookup_longest_prefix(self, tmp_path):
+        cache = SummaryCache(str(tmp_path / "s.db"))
+        chains = chain_hashes("", _history(5, words=1))
+        cache.put("ws", chains[1], 2, "court")
+        cache.put("ws", chains[3], 4, "long")
+        assert cache.lookup_longest("ws", chains) == (3, "long")
+        assert cache.lookup_longest("autre", chains) is None
+        assert cache.get_stats() == {"entries": 2, "hits": 1, "misses": 1}
+        cache.close()
+
+    def test_merge_summaries_bounded(self):
+        assert merge_summaries("", "b") == "b"
+        assert merge_summaries("a", "b") == "a\nb"
+        assert merge_summaries("a" * 2000, "b") == "b"
+
+
+class TestHistorySummarizer:
+
+    def test_partial_cache_hit_summarizes_only_the_tail(self, tmp_path):
+        cache = SummaryCache(str(tmp_path / "s.db"))
+        msgs = _history(6, words=1)
+        cache.put("ws", chain_hashes("", msgs)[2], 3, "début")
+        seen = []
+
+        def summarize(messages):
+            seen.append(messages)
+            return "fin"
+
+        summarizer = HistorySummarizer(summarize, cache=cache)
+        assert summarizer.schedule("ws", msgs)
+        assert not summarizer.schedule("ws", msgs)  # un seul job à la fois
+        result = summarizer.take_result(timeout=5)
+        assert seen == [msgs[3:]]
+        assert result["summary"] == "début\nfin"
+        assert not result["cached"]
+        summarizer.shutdown()
+        cache.close()
+
+
+class TestLocalLLMBackgroundSummary:
+
+    @pytest.fixture
+    def make_llm(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(local_llm.LocalLLM, "_check_ollama_availability", lambda self: False)
+        cache = SummaryCache(str(tmp_path / "s.db"))
+        monkeypatch.setattr(local_llm, "get_summary_cache", lambda _path: cache)
+
+        def make():
+            llm = local_llm.LocalLLM(model="test-summary")
+            llm.gen_num_ctx = 4096
+            llm.workspace_resolver = lambda: "ws-1"
+            return llm
+
+        yield make
+        cache.close()
+
+    def test_add_to_history_does_not_wait_for_summary(self, make_llm, monkeypatch):
+        release = threading.Event()
+        calls = []
+
+        def slow_post(url, json=None, **_kwargs):
+            calls.append(json)
+            release.wait(5)
+            return _FakeResponse({"message": {"content": "résumé"}})
+
+        monkeypatch.setattr(local_llm, "_resilient_post", slow_post)
+        llm = make_llm()
+        for message in _history(10):
+            llm.add_to_history(message["role"], message["content"])
+
+        # Le résumé tourne encore : l'historique est intact et utilisable
+        assert len(llm.conversation_history) == 10
+        assert not llm.apply_pending_summary()
+
+        release.set()
+        assert llm.apply_pending_summary(timeout=5)
+        assert llm.conversation_history[0]["content"].endswith("résumé")
+        assert llm.conversation_history[-1]["content"].startswith("message 9 ")
+        assert len(calls) == 1
+
+    def test_result_dropped_if_history_rewritten(self, make_llm, monkeypatch):
+        release = threading.Event()
+
+        def slow_post(url, json=None, **_kwargs):
+            release.wait(5)
+            return _FakeResponse({"message": {"content": "résumé"}})
+
+        monkeypatch.setattr(local_llm, "_resilient_post", slow_post)
+        llm = make_llm()
+        for message in _history(10):
+            llm.add_to_history(message["role"], message["content"])
+        assert llm.schedule_summary() is False  # job déjà en cours
+
+        # Historique remplacé pendant le calcul du résumé (recherche internet
+        # qui isole puis restaure l'historique, réalignement après édition...)
+        llm.conversation_history = [{"role": "user", "content": "autre"}]
+        release.set()
+        assert not llm.apply_pending_summary(timeout=5)
+        assert llm.conversation_history == [{"role": "user", "content": "autre"}]
+
+    def test_reloaded_conversation_reuses_cached_summary(self, make_llm, monkeypatch):
+        release = threading.Event()
+        calls = []
+
+        def fake_post(url, json=None, **_kwargs):
+            calls.append(json["messages"][0]["content"])
+            release.wait(5)
+            return _FakeResponse({"message": {"content": "résumé"}})
+
+        monkeypatch.setattr(local_llm, "_resilient_post", fake_post)
+        history = _history(10)
+
+        first = make_llm()
+        for message in history:
+            first.add_to_history(message["role"], message["content"])
+        release.set()
+        assert first.apply_pending_summary(timeout=5)
+        assert len(calls) == 1 and "message 0 " in calls[0]
+        summary_message = first.conversation_history[0]
+
+        # Conversation rechargée (rejouée comme _rewind_engine_history) : le
+        # début déjà résumé est relu depuis le cache, jamais renvoyé à Ollama
+        second = make_llm()
+        second.clear_history()
+        for message in history:
+            second.add_to_history(message["role"], message["content"])
+        second.apply_pending_summary(timeout=5)
+        assert second.conversation_history[0]["content"].startswith(summary_message["content"])
+        assert all("message 0 " not in prompt for prompt in calls[1:])
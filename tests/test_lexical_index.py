@@ -0,0 +1,44 @@
+"""
+Tests pour core/lexical_index.py (index inverse FTS5 trigramme).
+"""
+
+import sqlite3
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from core.lexical_index import LexicalIndex
+
+
+@pytest.fixture
+def index():
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            yield LexicalIndex(str(Path(tmp) / "lex.db"))
+        except sqlite3.OperationalError:
+            pytest.skip("SQLite sans FTS5/trigram")
+
+
+def test_substring_and_case_insensitive(index):
+    index.upsert(["a", "b"], ["Le Pipeline de CI", "Rien a voir"], group_id="ws")
+    assert index.search(["pipe"]) == ["a"]
+    assert index.search(["PIPELINE", "ci"]) == ["a"]
+    assert index.search(["pipeline", "absent"]) == []
+
+
+def test_short_terms_only(index):
+    index.upsert(["a", "b"], ["code en Go", "code en Rust"])
+    assert index.search(["go"]) == ["a"]
+
+
+def test_upsert_replaces_and_group_delete(index):
+    index.upsert(["a"], ["ancien texte"], group_id="ws1")
+    index.upsert(["a"], ["nouveau texte"], group_id="ws1")
+    index.upsert(["b"], ["nouveau aussi"], group_id="ws2")
+    assert index.search(["ancien"]) == []
+    assert index.search(["nouveau"]) == ["a", "b"]
+    index.delete_group("ws1")
+    assert index.search(["nouveau"]) == ["b"]
+    index.delete(["b"])
+    assert index.count() == 0
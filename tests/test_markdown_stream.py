@@ -0,0 +1,92 @@
+"""
+Tests du tokenizer Markdown incrémental du streaming
+(interfaces/gui/markdown_stream.py) : runs identiques quel que soit le
+découpage en tokens, lignes partielles, blocs de code, tableaux.
+"""
+
+import pytest
+
+markdown_stream = pytest.importorskip(
+    "interfaces.gui.markdown_stream", reason="dépendances GUI non installées"
+)
+MarkdownStreamTokenizer = markdown_stream.MarkdownStreamTokenizer
+
+TEXT = (
+    "## **Titre** ici\n"
+    "Du **gras**, *ital*, `code` et [lien](http://x.y).\n"
+    "* item **b**\n"
+    "---\n"
+    "| a | b |\n|---|---|\n| 1 | 2 |\n"
+    "\n"
+    "```python\nprint('**x**')\n```\n"
+    "Fin.\n"
+)
+
+
+def _tokenize(text, size):
+    tokenizer = MarkdownStreamTokenizer()
+    for i in range(0, len(text), size):
+        tokenizer.feed(text[i:i + size])
+    tokenizer.close()
+    return tokenizer.runs_since(0)[0]
+
+
+def _summary(text, runs):
+    return [(run.tag, text[run.start:run.end]) for run in runs]
+
+
+def test_runs_do_not_depend_on_token_boundaries():
+    runs = _tokenize(TEXT, len(TEXT))
+    assert _tokenize(TEXT, 1) == runs and _tokenize(TEXT, 7) == runs
+    summary = _summary(TEXT, runs)
+    assert summary[:4] == [
+        ("title_2", "**Titre** ici"), ("bold", "gras"), ("italic", "ital"), ("code", "code"),
+    ]
+    assert ("link", "lien") in summary and ("bullet", "* item **b**") in summary
+    assert ("hr", "---") in summary
+    assert ("code_block", "print('**x**')") in summary
+    # Rien n'est formaté dans le bloc de code
+    assert ("bold", "x") not in summary
+    heading = runs[0]
+    assert [TEXT[a:b] for a, b in heading.hidden] == ["## ", "**", "**"]
+
+
+def test_inline_run_waits_for_the_next_character():
+    tokenizer = MarkdownStreamTokenizer()
+    tokenizer.feed("Un *a*")
+    assert tokenizer.runs_since(0) == ([], 0)
+    tokenizer.feed("*")  # « *a** » : pas d'italique
+    assert tokenizer.runs_since(0) == ([], 0)
+
+    tokenizer = MarkdownStreamTokenizer()
+    tokenizer.feed("Un **gras**")
+    tokenizer.feed(" suite")
+    runs, cursor = tokenizer.runs_since(0)
+    assert [run.tag for run in runs] == ["bold"] and cursor == 1
+    tokenizer.feed("\n")
+    # La fin de ligne n'émet pas le gras une seconde fois
+    assert tokenizer.runs_since(cursor) == ([], 1)
+
+
+def test_line_runs_and_table_emitted_when_complete():
+    tokenizer = MarkdownStreamTokenizer()
+    tokenizer.feed("# Titre **gras**")
+    assert tokenizer.runs_since(0)[0] == []
+    tokenizer.feed("\n| a | b |\n|---|---|\n| 1 | 2 |\n")
+    assert [run.tag for run in tokenizer.runs_since(0)[0]] == ["title_1"]
+    tokenizer.feed("Après\n")
+    table = tokenizer.runs_since(1)[0][0]
+    assert table.tag == "table" and table.rows == ("| a | b |", "|---|---|", "| 1 | 2 |")
+    assert table.line == tokenizer.line_start(len("# Titre **gras**\n| a | b |\n|---|---|\n| 1 | 2 |\n"))
+
+
+def test_truncate_keeps_offsets_aligned():
+    tokenizer = MarkdownStreamTokenizer()
+    tokenizer.feed("Avant\n\n")
+    tokenizer.truncate(len("Avant"))
+    assert tokenizer.length == 5
+    tokenizer.feed("\n\nLe **gras**.")
+    text = "Avant\n\nLe **gras**."
+    bold = tokenizer.runs_since(0)[0][-1]
+    assert bold.tag == "bold" and text[bold.start:bold.end] == "gras"
+    assert tokenizer.line_start(bold.start) == len("Avant\n\n")
@@ -0,0 +1,156 @@
+"""
+Tests unitaires pour core/ollama_client.py (serveur HTTP local factice)
+"""
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from core.ollama_client import OllamaClient, OllamaHTTPError
+from core.tracing import get_tracer, span
+
+
+class _FakeOllama(BaseHTTPRequestHandler):
+    """Imite /api/chat (flux NDJSON), /api/tags et un endpoint lent."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, *_args):
+        pass
+
+    def _reply(self, status, body: bytes, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.peers.add(self.client_address)
+        if self.path == "/api/tags":
+            self._reply(200, json.dumps({"models": [{"name": "m1"}]}).encode())
+        else:
+            self._reply(404, b"not found")
+
+    def do_POST(self):
+        self.server.peers.add(self.client_address)
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if self.path == "/slow":
+            with self.server.lock:
+                self.server.active += 1
+                self.server.peak = max(self.server.peak, self.server.active)
+            time.sleep(0.05)
+            with self.server.lock:
+                self.server.active -= 1
+            self._reply(200, b'{"ok": true}')
+        elif self.path == "/api/chat":
+            lines = [{"message": {"content": w}} for w in payload.get("words", [])]
+            lines.append({"done": True, "prompt_eval_count": 12,
+                          "prompt_eval_duration": 30_000_000,
+                          "eval_count": 50, "eval_duration": 2_000_000_000})
+            body = "\n".join(json.dumps(line) for line in lines).encode() + b"\n"
+            self._reply(200, body, "application/x-ndjson")
+        else:
+            self._reply(500, b"boom")
+
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _FakeOllama)
+    srv.daemon_threads = True
+    srv.peers, srv.lock, srv.active, srv.peak = set(), threading.Lock(), 0, 0
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv, f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_sync_calls_reuse_connection(server):
+    srv, base = server
+    client = OllamaClient(max_in_flight=2)
+    for _ in range(5):
+        assert client.get(f"{base}/api/tags", timeout=5).json()["models"][0]["name"] == "m1"
+    assert len(srv.peers) == 1
+    stats = client.get_stats()
+    assert stats["calls"] == 5
+    assert stats["by_endpoint"]["/api/tags"]["calls"] == 5
+
+
+def test_max_in_flight_is_enforced(server):
+    srv, base = server
+    client = OllamaClient(max_in_flight=2)
+    threads = [threading.Thread(target=client.post, args=(f"{base}/slow",),
+                                kwargs={"json": {}, "timeout": 5}) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert srv.peak <= 2
+    assert client.get_stats()["calls"] == 6
+
+
+def test_stream_slot_released_on_close(server):
+    _, base = server
+    client = OllamaClient(max_in_flight=1)
+    with client.post(f"{base}/api/chat", json={"words": ["a", "b"]},
+                     timeout=5, stream=True) as resp:
+        lines = [json.loads(line) for line in resp.iter_lines() if line]
+    assert [l.get("message", {}).get("content") for l in lines[:-1]] == ["a", "b"]
+    # Le créneau unique doit être libre : cet appel ne doit pas bloquer
+    assert client.post(f"{base}/slow", json={}, timeout=5).status_code == 200
+    assert all(v == 0 for v in client.get_stats()["in_flight"].values())
+
+
+def test_async_face(server):
+    srv, base = server
+    client = OllamaClient(max_in_flight=2)
+
+    async def scenario():
+        chunks = [c async for c in client.astream(
+            f"{base}/api/chat", {"words": ["x", "y", "z"]}, timeout=5)]
+        tags = await client.aget(f"{base}/api/tags", timeout=5)
+        await asyncio.gather(*(client.apost(f"{base}/slow", {}, timeout=5)
+                               for _ in range(5)))
+        with pytest.raises(OllamaHTTPError) as err:
+            await client.apost(f"{base}/missing", {}, timeout=5)
+        await client.aclose()
+        return chunks, tags, err.value.status
+
+    chunks, tags, status = asyncio.run(scenario())
+    assert [c["message"]["content"] for c in chunks if "message" in c] == ["x", "y", "z"]
+    assert tags["models"][0]["name"] == "m1"
+    assert status == 500
+    assert srv.peak <= 2
+    stats = client.get_stats()
+    assert stats["calls"] == 8
+    assert stats["errors"] == 1
+
+
+def test_generation_calls_are_traced(server):
+    _, base = server
+    client = OllamaClient(max_in_flight=1)
+    spans = []
+    tracer = get_tracer()
+    tracer.add_listener(spans.append)
+    try:
+        with span("turn", kind="request") as root:
+            with client.post(f"{base}/api/chat", json={"model": "m1", "words": ["a"]},
+                             timeout=5, stream=True) as resp:
+                list(resp.iter_lines())
+            client.get(f"{base}/api/tags", timeout=5)
+    finally:
+        tracer.remove_listener(spans.append)
+    llm = [s for s in spans if s["kind"] == "llm"]
+    assert len(llm) == 1 and llm[0]["name"] == "llm.chat"
+    assert llm[0]["parent_id"] == root.span_id
+    attributes = llm[0]["attributes"]
+    assert attributes["model"] == "m1"
+    assert attributes["ttft_ms"] >= 0 and attributes["queue_wait_ms"] >= 0
+    assert attributes["prompt_eval_ms"] == 30.0
+    assert attributes["tokens_per_sec"] == 25.0
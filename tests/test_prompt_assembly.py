@@ -0,0 +1,293 @@
+"""
+Tests unitaires pour core/prompt_assembly.py : préfixe stable des requêtes
+/api/chat de ChatOrchestrator et LocalLLM (appels Ollama simulés).
+"""
+
+import itertools
+import json
+
+import pytest
+
+import core.chat_orchestrator as chat_orchestrator
+import models.local_llm as local_llm
+from core.chat_orchestrator import ChatOrchestrator
+from core.context_budget import ContextBudget, calibration_ratio, count_message_tokens
+from core.history_summarizer import SummaryCache
+from core.prompt_assembly import (
+    CONTEXT_MARKER,
+    VOLATILE_MARKER,
+    PromptStats,
+    is_volatile,
+    stable_tools,
+    with_volatile,
+)
+
+_models = itertools.count()
+
+
+def _model() -> str:
+    return f"test-prefix-{next(_models)}"
+
+
+def _tool(name: str) -> dict:
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": f"outil {name}",
+            "parameters": {"type": "object", "properties": {"query": {"type": "string"}}},
+        },
+    }
+
+
+class _FakeStream:
+    """Réponse streamée d'Ollama : une ligne JSON par chunk."""
+
+    status_code = 200
+
+    def __init__(self, chunks):
+        self._lines = [json.dumps(c).encode("utf-8") for c in chunks]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_lines(self):
+        return iter(self._lines)
+
+
+def _done(content="", tool_calls=None, prompt_eval_count=0):
+    message = {"role": "assistant", "content": content}
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+    return {"message": message, "done": True, "prompt_eval_count": prompt_eval_count,
+            "prompt_eval_duration": 5_000_000}
+
+
+class TestHelpers:
+
+    def test_stable_tools_is_order_independent(self):
+        first = stable_tools([_tool("b"), _tool("a")])
+        second = stable_tools([_tool("a"), _tool("b")])
+        assert json.dumps(first) == json.dumps(second)
+        assert [t["function"]["name"] for t in first] == ["a", "b"]
+
+    def test_with_volatile_keeps_a_single_trailing_block(self):
+        messages = [{"role": "system", "content": "s"}, {"role": "user", "content": "q"}]
+        first = with_volatile(messages, "état 1")
+        first.append({"role": "assistant", "content": "a"})
+        second = with_volatile(first, "état 2")
+        assert [m["content"] for m in second if is_volatile(m)] == [f"{VOLATILE_MARKER}\nétat 2"]
+        assert second[:-1] == messages + [{"role": "assistant", "content": "a"}]
+
+    def test_context_follows_history(self):
+        budget = ContextBudget(8192, model=_model())
+        history = [{"role": "user", "content": "h1"}, {"role": "assistant", "content": "h2"}]
+        messages = budget.fit_messages("système", history, "question", context="faits")
+        assert messages[0] == {"role": "system", "content": "système"}
+        assert messages[1:3] == history
+        assert messages[3]["content"] == f"{CONTEXT_MARKER}\nfaits"
+        assert messages[4] == {"role": "user", "content": "question"}
+
+
+class TestPromptStats:
+
+    def test_reused_prefix_skips_calibration(self):
+        model = _model()
+        budget = ContextBudget(8192, model=model)
+        stats = PromptStats()
+        tools = [_tool("a")]
+        first = [{"role": "system", "content": "s " * 50}, {"role": "user", "content": "q"}]
+        raw = count_message_tokens(first, tools)
+
+        cold = stats.record(budget, "test", first, tools, {"prompt_eval_count": int(raw * 1.5)})
+        assert cold["reusable_tokens"] == 0
+        assert calibration_ratio(model) == pytest.approx(1.5, rel=0.01)
+
+        second = first + [{"role": "assistant", "content": "r"}, {"role": "user", "content": "q2"}]
+        warm = stats.record(budget, "test", second, tools, {"prompt_eval_count": 12,
+                                                            "prompt_eval_duration": 2_000_000})
+        assert warm["reusable_tokens"] == budget.count_messages(first, tools)
+        assert warm["prompt_eval_ms"] == 2.0
+        # 12 tokens évalués seulement : mesure partielle, calibration inchangée
+        assert calibration_ratio(model) == pytest.approx(1.5, rel=0.01)
+
+        other_tools = stats.record(budget, "test", second, [_tool("b")], {})
+        assert other_tools["reusable_tokens"] == 0
+        assert stats.get_stats()["calls"] == 3
+
+
+class TestChatOrchestratorPrefix:
+
+    def test_system_prompt_and_tools_stay_byte_stable(self, monkeypatch):
+        sent = []
+        replies = iter([
+            [_done(tool_calls=[{"function": {"name": "a", "arguments": {"query": "x"}}}])],
+            [_done(content="Voici la réponse intermédiaire.")],
+            [{"message": {"content": "Réponse finale "}},
+             _done(content="complète et sourcée.")],
+        ])
+
+        def fake_post(url, json=None, **_kwargs):
+            sent.append(json)
+            return _FakeStream(next(replies))
+
+        monkeypatch.setattr(chat_orchestrator, "_resilient_post", fake_post)
+
+        class FakeLLM:
+            is_ollama_available = True
+            model = _model()
+            chat_url = "http://ollama/api/chat"
+            timeout = 5
+            gen_temperature = 0.2
+            gen_num_ctx = 8192
+            conversation_history = [
+                {"role": "user", "content": "bonjour"},
+                {"role": "assistant", "content": "salut"},
+            ]
+
+            def add_to_history(self, role, content):
+                pass
+
+            def parse_text_tool_call(self, text, names):
+                return None
+
+        result = ChatOrchestrator().run(
+            user_input="quelle est la météo ?",
+            tools=[_tool("b"), _tool("a")],
+            tool_executor=lambda name, args: "résultat " * 10,
+            llm=FakeLLM(),
+            system_prompt="système stable",
+            context="faits de la base",
+        )
+        assert result == "Réponse finale complète et sourcée."
+        assert len(sent) == 3
+
+        # Prompt système, outils et num_ctx identiques sur tous les appels
+        assert {json.dumps(p["messages"][0]) for p in sent} == {
+            json.dumps({"role": "system", "content": "système stable"})
+        }
+        assert {json.dumps(p.get("tools")) for p in sent} == {
+            json.dumps(stable_tools([_tool("a"), _tool("b")]))
+        }
+        assert {p["options"]["num_ctx"] for p in sent} == {8192}
+
+        # Contexte de la requête après l'historique, avant la question
+        first = sent[0]["messages"]
+        assert first[1:3] == FakeLLM.conversation_history
+        assert first[3]["content"].startswith(CONTEXT_MARKER)
+        assert first[4] == {"role": "user", "content": "quelle est la météo ?"}
+
+        # Chaque appel prolonge le précédent ; seul le dernier message
+        # (scratchpad puis consignes de synthèse) est volatil
+        for before, after in zip(sent, sent[1:]):
+            stable = [m for m in before["messages"] if not is_volatile(m)]
+            assert after["messages"][:len(stable)] == stable
+            assert [is_volatile(m) for m in after["messages"]].count(True) == 1
+            assert is_volatile(after["messages"][-1])
+
+    def test_blocked_tool_keeps_schema(self, monkeypatch):
+        sent = []
+        replies = iter([
+            [_done(tool_calls=[{"function": {"name": "calculate", "arguments": {"expression": "1"}}}])],
+            [_done(tool_calls=[{"function": {"name": "calculate", "arguments": {"expression": "2"}}}])],
+            [_done(content="Explication directe sans outil, suffisamment longue.")],
+            [_done(content="Explication directe sans outil, suffisamment longue.")],
+        ])
+
+        def fake_post(url, json=None, **_kwargs):
+            sent.append(json)
+            return _FakeStream(next(replies))
+
+        monkeypatch.setattr(chat_orchestrator, "_resilient_post", fake_post)
+        executed = []
+
+        class FakeLLM:
+            is_ollama_available = True
+            model = _model()
+            chat_url = "http://ollama/api/chat"
+            timeout = 5
+            gen_temperature = 0.2
+            gen_num_ctx = 8192
+            conversation_history = []
+
+            def add_to_history(self, role, content):
+                pass
+
+            def parse_text_tool_call(self, text, names):
+                return None
+
+        ChatOrchestrator().run(
+            user_input="explique la différence entre TCP et UDP",
+            tools=[_tool("calculate"), _tool("web_search")],
+            tool_executor=lambda name, args: executed.append(name) or "x",
+            llm=FakeLLM(),
+            system_prompt="système",
+        )
+        assert executed == []
+        assert len({json.dumps(p.get("tools")) for p in sent}) == 1
+        tool_messages = [m for m in sent[1]["messages"] if m["role"] == "tool"]
+        assert tool_messages and "indisponible" in tool_messages[0]["content"]
+
+
+class TestLocalLLMPrefix:
+
+    @pytest.fixture
+    def llm(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(local_llm.LocalLLM, "_check_ollama_availability", lambda self: False)
+        monkeypatch.setattr(
+            local_llm, "get_summary_cache", lambda _path: SummaryCache(str(tmp_path / "s.db"))
+        )
+        instance = local_llm.LocalLLM(model=_model())
+        instance.gen_num_ctx = 8192
+        instance.is_ollama_available = True
+        return instance
+
+    def test_tool_synthesis_keeps_system_prompt_and_tools(self, llm, monkeypatch):
+        sent = []
+
+        streams = iter([
+            [_done(tool_calls=[{"function": {"name": "a", "arguments": {"query": "météo"}}}])],
+            [_done(content="Il fait beau aujourd'hui.")],
+        ])
+
+        def fake_post(url, json=None, **kwargs):
+            sent.append(json)
+            return _FakeStream(next(streams))
+
+        monkeypatch.setattr(local_llm, "_resilient_post", fake_post)
+        result = llm.generate_with_tools_stream(
+            prompt="météo ?",
+            tools=[_tool("b"), _tool("a")],
+            tool_executor=lambda name, args: "soleil",
+            system_prompt="système stable",
+            context="faits",
+        )
+        assert result["success"]
+        assert len(sent) == 2
+        assert sent[0]["messages"][0] == sent[1]["messages"][0]
+        assert sent[0]["tools"] == sent[1]["tools"]
+        assert sent[1]["messages"][:len(sent[0]["messages"])] == sent[0]["messages"]
+        assert is_volatile(sent[1]["messages"][-1])
+
+    def test_synthesis_retried_without_tools_if_model_calls_one(self, llm, monkeypatch):
+        sent = []
+        streams = iter([
+            [_done(tool_calls=[{"function": {"name": "a", "arguments": {"query": "x"}}}])],
+            [_done(tool_calls=[{"function": {"name": "a", "arguments": {}}}])],
+            [_done(content="Réponse sans outil.")],
+        ])
+
+        def fake_post(url, json=None, **kwargs):
+            sent.append(json)
+            return _FakeStream(next(streams))
+
+        monkeypatch.setattr(local_llm, "_resilient_post", fake_post)
+        result = llm.generate_with_tools_stream(
+            prompt="question", tools=[_tool("a")],
+            tool_executor=lambda name, args: "r", system_prompt="système",
+        )
+        assert result["response"] == "Réponse sans outil."
+        assert "tools" in sent[1] and "tools" not in sent[2]
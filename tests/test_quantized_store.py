@@ -0,0 +1,103 @@
+"""
+Tests pour memory/quantized_store.py (store vectoriel int8 / float16 memory-mappé).
+"""
+
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from memory.quantized_store import QuantizedCollection, measure_recall
+
+
+def _corpus(n=2000, dim=64, seed=1):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    ids = [f"id{i}" for i in range(n)]
+    metas = [{"workspace_id": "ws1" if i % 2 else "ws2", "file_path": f"f{i % 7}.py"}
+             for i in range(n)]
+    docs = [f"chunk {i}" for i in range(n)]
+    return vectors, ids, docs, metas
+
+
+@pytest.fixture
+def tmpdir():
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmp:
+        yield Path(tmp)
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_recall_against_float32_baseline(tmpdir, dtype):
+    vectors, ids, docs, metas = _corpus()
+    store = QuantizedCollection(str(tmpdir / dtype), dtype=dtype)
+    store.add(ids, vectors.tolist(), docs, metas)
+    assert store.count() == len(ids)
+    assert measure_recall(vectors, store, ids, k=10, n_queries=50) >= 0.95
+
+
+def test_int8_is_about_four_times_smaller(tmpdir):
+    vectors, ids, docs, metas = _corpus(n=4096, dim=384)
+    store = QuantizedCollection(str(tmpdir / "q"), dtype="int8")
+    store.add(ids, vectors.tolist(), docs, metas)
+    matrix_bytes = sum((tmpdir / "q" / f).stat().st_size
+                       for f in ("vectors.int8", "scales.f32"))
+    assert matrix_bytes * 3.5 < vectors.nbytes
+
+
+def test_query_where_get_and_persistence(tmpdir):
+    vectors, ids, docs, metas = _corpus(n=300)
+    store = QuantizedCollection(str(tmpdir / "q"))
+    store.add(ids, vectors.tolist(), docs, metas)
+
+    res = store.query([vectors[3].tolist()], n_results=5, where={"workspace_id": "ws1"})
+    assert res["ids"][0][0] == "id3"
+    assert res["distances"][0][0] < 0.01
+    assert all(m["workspace_id"] == "ws1" for m in res["metadatas"][0])
+
+    got = store.get(ids=["id3", "absent"], include=["documents", "embeddings"])
+    assert got["ids"] == ["id3"] and got["documents"] == ["chunk 3"]
+    assert len(got["embeddings"][0]) == 64
+
+    reopened = QuantizedCollection(str(tmpdir / "q"))
+    assert reopened.count() == 300
+    assert reopened.query([vectors[3].tolist()], n_results=1)["ids"][0] == ["id3"]
+
+
+def test_delete_where_update_and_compaction(tmpdir):
+    vectors, ids, docs, metas = _corpus(n=3000)
+    store = QuantizedCollection(str(tmpdir / "q"))
+    store.add(ids, vectors.tolist(), docs, metas)
+
+    store.delete(where={"$and": [{"workspace_id": "ws2"}, {"file_path": "f0.py"}]})
+    remaining = store.get(where={"workspace_id": "ws2"})["metadatas"]
+    assert remaining and all(m["file_path"] != "f0.py" for m in remaining)
+
+    store.delete(where={"workspace_id": "ws2"})  # > 30% de lignes mortes -> compaction
+    assert store.count() == 1500
+    assert store.get_stats()["allocated_rows"] == 1500
+    assert store.query([vectors[5].tolist()], n_results=1)["ids"][0] == ["id5"]
+
+    store.update(ids=["id5"], documents=["modifié"])
+    assert store.get(ids=["id5"])["documents"] == ["modifié"]
+    assert store.query([vectors[5].tolist()], n_results=1)["ids"][0] == ["id5"]
+
+
+def test_compaction_interrupted_after_commit_is_finished_on_reopen(tmpdir, monkeypatch):
+    vectors, ids, docs, metas = _corpus(n=3000)
+    store = QuantizedCollection(str(tmpdir / "q"))
+    store.add(ids, vectors.tolist(), docs, metas)
+    store.delete(where={"workspace_id": "ws2"})
+
+    # Arrêt brutal simulé : renumérotation validée, fichiers pas encore remplacés
+    monkeypatch.setattr(QuantizedCollection, "_finish_compact", lambda self: None)
+    store._conn.execute("DELETE FROM rows WHERE id = 'id1'")  # pylint: disable=protected-access
+    store._conn.commit()  # pylint: disable=protected-access
+    store.compact()
+    assert (tmpdir / "q" / "vectors.int8.compact").exists()
+    monkeypatch.undo()
+
+    reopened = QuantizedCollection(str(tmpdir / "q"))
+    assert not (tmpdir / "q" / "vectors.int8.compact").exists()
+    assert reopened.count() == 1499
+    assert reopened.query([vectors[5].tolist()], n_results=1)["ids"][0] == ["id5"]
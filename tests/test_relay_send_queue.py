@@ -0,0 +1,207 @@
+"""
+Tests des files d'envoi WebSocket du Relay (relay/send_queue.py) : fusion
+des mises à jour de streaming, isolement d'un client lent, politiques
+« degrade » / « disconnect », statistiques exposées par /api/health.
+"""
+
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import relay.relay_server as relay_server
+from relay.relay_bridge import DeltaStream, RelayBridge, StreamChunk, stream_checksum
+from relay.relay_server import RelayServer
+from relay.send_queue import ClientSendQueue
+
+
+@pytest.fixture(autouse=True)
+def _reset_bridge(monkeypatch):
+    monkeypatch.setattr(RelayBridge, "_instance", None)
+
+
+def _encrypt(payload):
+    return json.dumps(payload)
+
+
+class _FakeWebSocket:
+    """WebSocket simulé ; bloqué tant que gate n'est pas ouverte."""
+
+    def __init__(self, blocked=False):
+        self.sent = []
+        self.closed_with = None
+        self.gate = asyncio.Event()
+        if not blocked:
+            self.gate.set()
+
+    async def send_text(self, text):
+        await self.gate.wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000, reason=""):
+        self.closed_with = code
+
+
+async def _drain():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def _apply(state, payload):
+    """Client protocole 2 : (seq, texte) après le message, ou None (trou)."""
+    seq, text = state
+    if payload["type"] == "chunk_snapshot":
+        text = payload["text"]
+    elif payload.get("base_seq", payload["seq"] - 1) != seq:
+        return None
+    else:
+        text += payload["text"]
+    if "checksum" in payload and stream_checksum(text) != payload["checksum"]:
+        return None
+    return payload["seq"], text
+
+
+class TestCoalescing:
+
+    def test_pending_deltas_merged_into_one(self):
+        async def scenario():
+            ws = _FakeWebSocket(blocked=True)
+            queue = ClientSendQueue(ws, _encrypt)
+            queue.protocol = 2
+            queue.start()
+            stream = DeltaStream("m1")
+            first = stream.advance("Un")
+            queue.put_chunk(first)
+            await _drain()  # le premier envoi est en cours (bloqué)
+            text = "Un"
+            for word in (" deux", " trois", " quatre"):
+                text += word
+                queue.put_chunk(stream.advance(text))
+            ws.gate.set()
+            await _drain()
+            return ws.sent, queue.get_stats(), first, text
+
+        sent, stats, first, text = asyncio.run(scenario())
+        assert len(sent) == 2 and sent[1]["base_seq"] == 1
+        state = _apply((0, ""), first.to_payload(2))
+        assert _apply(state, sent[1]) == (4, text)
+        assert stats["coalesced"] == 2 and stats["sent"] == 2
+
+    def test_snapshot_supersedes_pending_delta(self):
+        pending = DeltaStream("m1")
+        pending.advance("Bonjour")
+        merged = pending.advance("Bonjour à").coalesce(pending.snapshot())
+        assert merged.snapshot and merged.text == "Bonjour à"
+        chunk = StreamChunk("m1", 5, "abc", "c", checksum="x")
+        assert chunk.coalesce(StreamChunk("m1", 6, "abcd", "d")).checksum == stream_checksum("abcd")
+
+    def test_agent_section_chunks_superseded(self):
+        async def scenario():
+            ws = _FakeWebSocket(blocked=True)
+            queue = ClientSendQueue(ws, _encrypt)
+            queue.start()
+            queue.send({"type": "agent_exec_start", "exec_id": "e1"})
+            for text in ("a", "ab", "abc"):
+                queue.send({"type": "agent_section_chunk", "exec_id": "e1",
+                            "section_id": "n1", "text": text})
+            ws.gate.set()
+            await _drain()
+            return ws.sent
+
+        sent = asyncio.run(scenario())
+        assert [m.get("text") for m in sent] == [None, "abc"]
+
+
+class TestSlowClients:
+
+    def test_slow_client_does_not_delay_the_others(self):
+        server = RelayServer(config={})
+
+        async def scenario():
+            server._loop = asyncio.get_running_loop()
+            slow, fast = _FakeWebSocket(blocked=True), _FakeWebSocket()
+            for ws in (slow, fast):
+                server._ws_clients.append(ws)
+                server._open_send_queue(ws)
+            server._broadcast_response("m1", "Réponse finale")
+            await _drain()
+            return slow, fast
+
+        slow, fast = asyncio.run(scenario())
+        assert server.decrypt_json(fast.sent[0])["message"] == "Réponse finale"
+        assert slow.sent == []
+
+    def test_degrade_drops_stream_updates_but_keeps_responses(self):
+        async def scenario():
+            ws = _FakeWebSocket(blocked=True)
+            queue = ClientSendQueue(ws, _encrypt, max_messages=3, slow_client="degrade")
+            queue.start()
+            queue.send({"type": "response", "message_id": "m0"})
+            await _drain()
+            queue.put_chunk(DeltaStream("m1").advance("a"))
+            queue.put_chunk(DeltaStream("m2").advance("b"))
+            queue.send({"type": "ai_image", "message_id": "m3"})
+            accepted = queue.send({"type": "response", "message_id": "m1"})
+            queue.put_chunk(DeltaStream("m4").advance("c"))
+            degraded = queue.degraded
+            ws.gate.set()
+            await _drain()
+            return ws.sent, queue.get_stats(), accepted, degraded
+
+        sent, stats, accepted, degraded = asyncio.run(scenario())
+        assert accepted and degraded
+        assert [m["type"] for m in sent] == ["response", "ai_image", "response"]
+        assert stats["dropped"] == 3 and not stats["degraded"]
+
+    def test_disconnect_policy_closes_the_websocket(self):
+        closed = []
+
+        async def scenario():
+            ws = _FakeWebSocket(blocked=True)
+            queue = ClientSendQueue(
+                ws, _encrypt, max_messages=1, slow_client="disconnect", on_close=closed.append,
+            )
+            queue.start()
+            queue.send({"type": "pong"})
+            await _drain()
+            queue.send({"type": "pong"})
+            accepted = queue.send({"type": "pong"})
+            await _drain()
+            return ws, queue, accepted
+
+        ws, queue, accepted = asyncio.run(scenario())
+        assert not accepted and queue.closed
+        assert ws.closed_with == 1013 and closed == [queue]
+
+    def test_stuck_send_times_out(self):
+        async def scenario():
+            ws = _FakeWebSocket(blocked=True)
+            queue = ClientSendQueue(ws, _encrypt, send_timeout=0.01)
+            queue.start()
+            queue.send({"type": "pong"})
+            await asyncio.sleep(0.05)
+            return ws, queue
+
+        ws, queue = asyncio.run(scenario())
+        assert queue.closed and ws.closed_with == 1013
+
+
+@pytest.mark.skipif(not relay_server._FASTAPI_AVAILABLE, reason="FastAPI/uvicorn non installé")
+def test_health_reports_queue_depth_and_latency():
+    server = RelayServer(config={})
+
+    async def fill():
+        ws = _FakeWebSocket()
+        queue = server._open_send_queue(ws)
+        queue.protocol = 2
+        queue.send({"type": "pong"})
+        await _drain()
+
+    asyncio.run(fill())
+    client = TestClient(server._app)
+    clients = client.get("/api/health").json()["clients"]
+    assert len(clients) == 1
+    stats = clients[0]
+    assert stats["stream_protocol"] == 2 and stats["sent"] == 1
+    assert stats["queue_depth"] == 0 and "p90" in stats["latency_ms"]
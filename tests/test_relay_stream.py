@@ -0,0 +1,132 @@
+"""
+Tests du protocole de streaming par deltas du Relay : numérotation et
+sommes de contrôle (DeltaStream), diffusion par le bridge, variantes
+chiffrées par protocole dans RelayServer._broadcast_chunk.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+import relay.relay_bridge as relay_bridge
+from relay.relay_bridge import DeltaStream, RelayBridge, StreamChunk, stream_checksum
+from relay.relay_server import RelayServer
+
+
+def _apply(state, payload):
+    """Client protocole 2 minimal : (seq, texte) après le message, ou None."""
+    seq, text = state
+    if payload["type"] == "chunk_snapshot":
+        text = payload["text"]
+    elif payload.get("base_seq", payload["seq"] - 1) != seq:
+        return None
+    else:
+        text += payload["text"]
+    if "checksum" in payload and stream_checksum(text) != payload["checksum"]:
+        return None
+    return payload["seq"], text
+
+
+class TestDeltaStream:
+
+    def test_deltas_rebuild_the_text(self):
+        stream = DeltaStream("m1")
+        state = (0, "")
+        text = ""
+        for index in range(40):
+            text += f"mot{index} 🤖 "
+            state = _apply(state, stream.advance(text).to_payload(2))
+        assert state == (40, text)
+
+    def test_periodic_checksum_and_unchanged_text(self):
+        stream = DeltaStream("m1")
+        chunks = [stream.advance("x" * n) for n in range(1, 33)]
+        assert [c.seq for c in chunks if c.checksum] == [16, 32]
+        assert stream.advance("x" * 32) is None
+
+    def test_rewritten_text_sends_a_snapshot(self):
+        stream = DeltaStream("m1")
+        stream.advance("Bonjour")
+        chunk = stream.advance("Salut")
+        payload = chunk.to_payload(2)
+        assert payload["type"] == "chunk_snapshot"
+        assert payload["text"] == "Salut" and payload["checksum"] == stream_checksum("Salut")
+
+    def test_legacy_clients_get_cumulative_text(self):
+        chunk = StreamChunk("m1", 3, "abc", "c", segment_index=1)
+        payload = chunk.to_payload(1)
+        assert payload["type"] == "chunk" and payload["text"] == "abc"
+        assert payload["segment_index"] == 1 and "seq" not in payload
+
+    def test_gap_detected_by_client(self):
+        stream = DeltaStream("m1")
+        stream.advance("a")
+        second = stream.advance("ab").to_payload(2)
+        assert _apply((0, ""), second) is None
+
+
+@pytest.fixture
+def bridge(monkeypatch):
+    monkeypatch.setattr(RelayBridge, "_instance", None)
+    monkeypatch.setattr(relay_bridge, "_CHUNK_THROTTLE_SEC", 0.0)
+    return RelayBridge()
+
+
+class TestBridge:
+
+    def test_chunks_and_resume_snapshot(self, bridge):
+        received = []
+        bridge.on_chunk(received.append)
+        bridge.submit_ai_chunk("La réponse", "m1")
+        bridge.submit_ai_chunk("La réponse arrive", "m1")
+        assert [c.delta for c in received] == ["La réponse", " arrive"]
+        snapshot = bridge.get_stream_snapshot("m1").to_payload(2)
+        assert (snapshot["seq"], snapshot["text"]) == (2, "La réponse arrive")
+        # Un client repris au snapshot applique les deltas suivants
+        bridge.submit_ai_chunk("La réponse arrive ici.", "m1")
+        state = _apply((0, ""), snapshot)
+        assert _apply(state, received[-1].to_payload(2)) == (3, "La réponse arrive ici.")
+        bridge.submit_ai_response("La réponse arrive ici.", "m1")
+        assert bridge.get_stream_snapshot("m1") is None
+
+    def test_delta_protocol_cuts_bytes_by_an_order_of_magnitude(self, bridge):
+        received = []
+        bridge.on_chunk(received.append)
+        text = ""
+        for index in range(2000):
+            text += f"token{index % 10} "
+            bridge.submit_ai_chunk(text, "m1")
+        assert len(text) >= 14_000
+        cumulative = sum(len(json.dumps(c.to_payload(1))) for c in received)
+        deltas = sum(len(json.dumps(c.to_payload(2))) for c in received)
+        assert cumulative > 10 * deltas
+
+
+class _FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+
+def test_broadcast_encrypts_each_protocol_once(bridge):
+    server = RelayServer(config={})
+    legacy, modern, other = _FakeWebSocket(), _FakeWebSocket(), _FakeWebSocket()
+
+    async def scenario():
+        server._loop = asyncio.get_running_loop()
+        for ws in (legacy, modern, other):
+            server._open_send_queue(ws)
+        server._send_queues[modern].protocol = 2
+        server._send_queues[other].protocol = 2
+        server._broadcast_chunk(DeltaStream("m1").advance("Bonjour"))
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert modern.sent == other.sent
+    assert server.decrypt_json(json.loads(legacy.sent[0]))["type"] == "chunk"
+    payload = server.decrypt_json(json.loads(modern.sent[0]))
+    assert (payload["type"], payload["seq"], payload["text"]) == ("chunk_delta", 1, "Bonjour")
@@ -0,0 +1,169 @@
+"""
+Tests unitaires pour core/response_cache.py : clé exacte, similarité,
+expiration, éviction, contournement après un outil à effet de bord.
+"""
+
+import sqlite3
+import time
+
+import models.ai_agents as ai_agents
+from core.response_cache import (
+    ResponseCache,
+    get_response_cache,
+    has_side_effects,
+    normalize_prompt,
+)
+
+_VOCAB = ["capitale", "france", "quelle", "est", "la", "de", "paris", "recette", "crêpes"]
+
+
+def _bag_of_words(texts):
+    """Encodeur déterministe : présence de chaque mot du vocabulaire."""
+    vectors = []
+    for text in texts:
+        words = normalize_prompt(text).replace("?", " ").split()
+        vectors.append([float(word in words) for word in _VOCAB])
+    return vectors
+
+
+def _cache(tmp_path, **kwargs):
+    kwargs.setdefault("encoder", _bag_of_words)
+    return ResponseCache(db_path=str(tmp_path / "responses.db"), **kwargs)
+
+
+class TestResponseCache:
+
+    def test_normalized_prompt_hits(self, tmp_path):
+        cache = _cache(tmp_path, encoder=None)
+        cache.store("qwen", "Quelle est la capitale de la France ?", "Paris.", "ctx", 0.7)
+        assert cache.lookup("qwen", "  quelle est la   capitale de la france", "ctx", 0.7) == "Paris."
+        stats = cache.get_stats()
+        assert (stats["hits"], stats["similar_hits"], stats["misses"]) == (1, 0, 0)
+        cache.close()
+
+    def test_model_context_and_temperature_are_part_of_the_key(self, tmp_path):
+        cache = _cache(tmp_path)
+        cache.store("qwen", "capitale de la france", "Paris.", "ctx", 0.7)
+        assert cache.lookup("llama", "capitale de la france", "ctx", 0.7) is None
+        assert cache.lookup("qwen", "capitale de la france", "autre contexte", 0.7) is None
+        assert cache.lookup("qwen", "capitale de la france", "ctx", 0.2) is None
+        assert cache.get_stats()["misses"] == 3
+        cache.close()
+
+    def test_near_duplicate_served_above_threshold(self, tmp_path):
+        cache = _cache(tmp_path, similarity_threshold=0.8)
+        cache.store("qwen", "quelle est la capitale de la france", "Paris.", "ctx")
+        assert cache.lookup("qwen", "la capitale de la france est", "ctx") == "Paris."
+        assert cache.lookup("qwen", "recette de crêpes", "ctx") is None
+        stats = cache.get_stats()
+        assert stats["similar_hits"] == 1
+        assert stats["hit_rate"] == 0.5
+        cache.close()
+
+    def test_entries_expire(self, tmp_path):
+        cache = _cache(tmp_path, ttl_seconds=0.05)
+        cache.store("qwen", "capitale de la france", "Paris.")
+        time.sleep(0.1)
+        assert cache.lookup("qwen", "capitale de la france") is None
+        cache.close()
+
+    def test_least_recently_used_entry_is_evicted(self, tmp_path):
+        cache = _cache(tmp_path, encoder=None, max_entries=2)
+        cache.store("qwen", "a", "A")
+        cache.store("qwen", "b", "B")
+        assert cache.lookup("qwen", "a") == "A"
+        cache.store("qwen", "c", "C")
+        assert cache.lookup("qwen", "b") is None
+        assert cache.lookup("qwen", "a") == "A"
+        stats = cache.get_stats()
+        assert stats["entries"] == 2 and stats["evictions"] == 1
+        cache.close()
+
+    def test_side_effects_bypass_the_cache(self, tmp_path):
+        cache = _cache(tmp_path)
+        assert not cache.store("qwen", "crée notes.txt", "Fichier créé.", side_effects=True)
+        assert not cache.store("qwen", "question", "   ")
+        assert cache.lookup("qwen", "crée notes.txt") is None
+        assert cache.get_stats()["bypassed"] == 2
+        cache.close()
+
+    def test_has_side_effects(self):
+        read_only = {"web_search", "read_local_file"}.__contains__
+        assert not has_side_effects([], None)
+        assert not has_side_effects(["web_search", "read_local_file"], read_only)
+        assert has_side_effects(["web_search", "write_local_file"], read_only)
+        assert has_side_effects(["web_search"], None)
+
+    def test_disabled_by_default(self):
+        assert get_response_cache() is None
+
+
+class TestAgentCache:
+
+    @staticmethod
+    def _agent(calls):
+        class FakeLLM:
+            model = "qwen"
+            gen_temperature = 0.3
+
+            def __init__(self):
+                self.conversation_history = []
+
+            def add_to_history(self, role, content):
+                self.conversation_history.append({"role": role, "content": content})
+
+            def generate_stream(self, prompt, system_prompt=None, on_token=None):
+                calls.append(prompt)
+                on_token("Rapport du jour")
+                self.add_to_history("user", prompt)
+                self.add_to_history("assistant", "Rapport du jour")
+                return "Rapport du jour"
+
+        agent = object.__new__(ai_agents.AIAgent)
+        agent.name = "Analyste"
+        agent.system_prompt = "Tu es analyste."
+        agent.llm = FakeLLM()
+        return agent
+
+    def test_repeated_task_is_served_from_cache(self, tmp_path, monkeypatch):
+        cache = _cache(tmp_path, encoder=None)
+        monkeypatch.setattr(ai_agents, "get_response_cache", lambda: cache)
+        calls = []
+
+        tokens = []
+        first = self._agent(calls)._generate("TÂCHE: rapport", on_token=tokens.append, stream=True)
+        # Tâche relancée par un agent neuf (historique vide) : servie du cache
+        agent = self._agent(calls)
+        second = agent._generate("TÂCHE: rapport", on_token=tokens.append, stream=True)
+        assert first == second == "Rapport du jour"
+        assert tokens == ["Rapport du jour", "Rapport du jour"]
+        assert len(calls) == 1
+        # L'échange servi du cache rejoint l'historique, comme une génération
+        assert [m["role"] for m in agent.llm.conversation_history] == ["user", "assistant"]
+        cache.close()
+
+    def test_history_is_part_of_the_key(self, tmp_path, monkeypatch):
+        cache = _cache(tmp_path, encoder=None)
+        monkeypatch.setattr(ai_agents, "get_response_cache", lambda: cache)
+        calls = []
+
+        agent = self._agent(calls)
+        agent._generate("TÂCHE: rapport", on_token=lambda _t: None, stream=True)
+        # Même prompt, mais l'historique a changé : nouvelle génération
+        agent._generate("TÂCHE: rapport", on_token=lambda _t: None, stream=True)
+        assert len(calls) == 2
+        cache.close()
+
+    def test_cache_errors_do_not_break_generation(self, monkeypatch):
+        class BrokenCache:
+            def lookup(self, *args):
+                raise sqlite3.OperationalError("database is locked")
+
+            def store(self, *args, **kwargs):
+                raise sqlite3.OperationalError("database is locked")
+
+        monkeypatch.setattr(ai_agents, "get_response_cache", BrokenCache)
+        calls = []
+        result = self._agent(calls)._generate("TÂCHE: rapport", on_token=lambda _t: None,
+                                              stream=True)
+        assert result == "Rapport du jour" and len(calls) == 1
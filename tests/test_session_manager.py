@@ -0,0 +1,168 @@
+"""
+Tests unitaires pour le stockage des workspaces (core/session_manager.py,
+core/workspace_history.py) : journal en ajout seul, snapshots, reprise
+apres crash, migration de l'ancien state.json, chargement pagine.
+"""
+
+import json
+
+import pytest
+
+from core.session_manager import SessionManager
+from core.workspace_history import JOURNAL_FILE, SNAPSHOT_FILE
+
+
+def _messages(start, stop):
+    return [{"text": f"message {i}", "is_user": i % 2 == 0, "mid": f"m{i}"}
+            for i in range(start, stop)]
+
+
+@pytest.fixture
+def sm(tmp_path):
+    return SessionManager(workspaces_dir=str(tmp_path), compact_every=50)
+
+
+def _reopen(sm):
+    """Nouveau gestionnaire sur le meme dossier (rien en memoire)."""
+    return SessionManager(workspaces_dir=str(sm._workspaces_dir), compact_every=50)
+
+
+class TestJournal:
+
+    def test_appends_only_write_new_messages(self, sm):
+        ws_id = sm.create_workspace("Long")
+        folder = sm._workspaces_dir / ws_id
+        history = _messages(0, 10)
+        sm.save_workspace(ws_id, {"conversation_history": history})
+        snapshot_mtime = (folder / SNAPSHOT_FILE).stat().st_mtime_ns
+        journal_size = (folder / JOURNAL_FILE).stat().st_size
+
+        history += _messages(10, 11)
+        assert sm.save_workspace(ws_id, {"conversation_history": history})
+        assert (folder / SNAPSHOT_FILE).stat().st_mtime_ns == snapshot_mtime
+        added = (folder / JOURNAL_FILE).stat().st_size - journal_size
+        assert 0 < added < 200
+        assert "conversation_history" not in json.loads(
+            (folder / "state.json").read_text(encoding="utf-8"))
+
+        state = _reopen(sm).load_workspace(ws_id)
+        assert state["conversation_history"] == history
+        assert state["metadata"]["message_count"] == 11
+
+    def test_edit_rewrites_snapshot_and_bumps_revision(self, sm):
+        ws_id = sm.create_workspace("Edition")
+        history = _messages(0, 5)
+        sm.save_workspace(ws_id, {"conversation_history": history})
+        state = sm.load_workspace(ws_id)
+        state["conversation_history"][1]["text"] = "modifie"
+        del state["conversation_history"][3]
+        assert sm.save_workspace(ws_id, state)
+
+        reloaded = _reopen(sm).load_workspace(ws_id)["conversation_history"]
+        assert [m["text"] for m in reloaded] == [
+            "message 0", "modifie", "message 2", "message 4"]
+        assert sm.list_workspaces()[0]["history_revision"] == 1
+
+    def test_journal_compacted_into_snapshot(self, sm):
+        ws_id = sm.create_workspace("Compaction")
+        folder = sm._workspaces_dir / ws_id
+        history = []
+        for start in range(0, 60, 6):
+            history += _messages(start, start + 6)
+            sm.save_workspace(ws_id, {"conversation_history": history})
+        lines = (folder / JOURNAL_FILE).read_text(encoding="utf-8").splitlines()
+        assert len(lines) < 50
+        assert _reopen(sm).load_history(ws_id) == history
+        assert sm.list_workspaces()[0]["history_revision"] == 0
+
+    def test_sections_saved_without_history_key(self, sm):
+        ws_id = sm.create_workspace("Dossiers")
+        sm.save_workspace(ws_id, {"conversation_history": _messages(0, 3)})
+        state = sm.load_workspace(ws_id, with_history=False)
+        assert "conversation_history" not in state
+        state["attached_folders"] = ["/projet"]
+        sm.save_workspace(ws_id, state)
+        reloaded = _reopen(sm).load_workspace(ws_id)
+        assert reloaded["attached_folders"] == ["/projet"]
+        assert len(reloaded["conversation_history"]) == 3
+
+
+class TestRecovery:
+
+    def test_torn_journal_line_is_dropped(self, sm):
+        ws_id = sm.create_workspace("Crash")
+        folder = sm._workspaces_dir / ws_id
+        history = _messages(0, 4)
+        sm.save_workspace(ws_id, {"conversation_history": history})
+        with open(folder / JOURNAL_FILE, "a", encoding="utf-8") as fh:
+            fh.write('{"g": 1, "i": 4, "m": {"text": "mess')
+
+        reopened = _reopen(sm)
+        assert reopened.load_history(ws_id) == history
+        history += _messages(4, 6)
+        reopened.save_workspace(ws_id, {"conversation_history": history})
+        assert _reopen(sm).load_history(ws_id) == history
+
+    def test_stale_generation_lines_ignored(self, sm):
+        ws_id = sm.create_workspace("Generation")
+        folder = sm._workspaces_dir / ws_id
+        history = _messages(0, 3)
+        sm.save_workspace(ws_id, {"conversation_history": history})
+        journal = (folder / JOURNAL_FILE).read_text(encoding="utf-8")
+        # Crash entre l'ecriture du snapshot et la remise a zero du journal
+        sm.save_workspace(ws_id, {"conversation_history": history[:2]})
+        (folder / JOURNAL_FILE).write_text(journal, encoding="utf-8")
+        assert _reopen(sm).load_history(ws_id) == history[:2]
+
+
+class TestMigration:
+
+    def test_legacy_state_json_migrated(self, sm):
+        folder = sm._workspaces_dir / "ancien-1234"
+        folder.mkdir()
+        history = _messages(0, 7)
+        (folder / "metadata.json").write_text(json.dumps({
+            "id": "ancien-1234", "name": "Ancien", "last_modified": "2026-01-01",
+            "message_count": 7,
+        }), encoding="utf-8")
+        (folder / "state.json").write_text(json.dumps({
+            "conversation_history": history,
+            "attached_folders": ["/docs"],
+            "turn_branches": {"m0": [{"text": "variante"}]},
+            "metadata": {"name": "Ancien"},
+        }), encoding="utf-8")
+
+        state = sm.load_workspace("ancien-1234")
+        assert state["conversation_history"] == history
+        assert state["attached_folders"] == ["/docs"]
+        assert state["turn_branches"] == {"m0": [{"text": "variante"}]}
+        assert (folder / SNAPSHOT_FILE).is_file()
+        migrated = json.loads((folder / "state.json").read_text(encoding="utf-8"))
+        assert "conversation_history" not in migrated
+
+    def test_corrupt_legacy_state_not_migrated(self, sm):
+        folder = sm._workspaces_dir / "casse-1234"
+        folder.mkdir()
+        (folder / "metadata.json").write_text(json.dumps({"id": "casse-1234"}), encoding="utf-8")
+        (folder / "state.json").write_text('{"conversation_history": [', encoding="utf-8")
+        assert sm.load_workspace("casse-1234") is None
+        assert not (folder / SNAPSHOT_FILE).exists()
+
+
+class TestPaging:
+
+    def test_history_pages(self, sm):
+        ws_id = sm.create_workspace("Pages")
+        history = _messages(0, 30)
+        sm.save_workspace(ws_id, {"conversation_history": history})
+        assert sm.load_history(ws_id, start=10, limit=5) == history[10:15]
+        assert sm.load_history(ws_id, start=-3) == history[-3:]
+        state = sm.load_workspace(ws_id, history_limit=8)
+        assert state["conversation_history"] == history[-8:]
+        assert state["history_offset"] == 22
+
+    def test_loaded_messages_are_copies(self, sm):
+        ws_id = sm.create_workspace("Copies")
+        sm.save_workspace(ws_id, {"conversation_history": _messages(0, 2)})
+        sm.load_history(ws_id)[0]["text"] = "modifie sans sauvegarde"
+        assert sm.load_history(ws_id)[0]["text"] == "message 0"
@@ -0,0 +1,200 @@
+"""
+Tests unitaires pour core/tool_dispatch.py : exécution parallèle des outils
+en lecture seule, ordre des résultats, sérialisation des écritures.
+"""
+
+import itertools
+import json
+import threading
+import time
+
+import core.chat_orchestrator as chat_orchestrator
+from core.chat_orchestrator import ChatOrchestrator
+from core.mcp_client import MCPManager
+from core.tool_dispatch import _batches, run_tool_calls
+
+_models = itertools.count()
+
+READ_ONLY = {"web_search", "read_local_file", "search_memory"}
+
+
+def _is_read_only(name: str) -> bool:
+    return name in READ_ONLY
+
+
+class _Recorder:
+    """tool_executor qui mesure le nombre d'appels simultanés."""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.events = []
+
+    def __call__(self, name, arguments):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.events.append(("start", name))
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+            self.events.append(("end", name))
+        if arguments.get("fail"):
+            raise RuntimeError("échec simulé")
+        return f"{name}:{arguments.get('query', '')}"
+
+
+class TestBatches:
+
+    def test_consecutive_reads_grouped_writes_alone(self):
+        calls = [
+            ("web_search", {}), ("read_local_file", {}),
+            ("write_local_file", {}),
+            ("search_memory", {}), ("web_search", {}),
+            ("move_local_file", {}), ("move_local_file", {}),
+        ]
+        assert _batches(calls, _is_read_only) == [[0, 1], [2], [3, 4], [5], [6]]
+
+    def test_without_predicate_everything_is_serial(self):
+        calls = [("web_search", {}), ("web_search", {})]
+        assert _batches(calls, None) == [[0], [1]]
+
+
+class TestRunToolCalls:
+
+    def test_reads_run_concurrently_in_call_order(self):
+        recorder = _Recorder()
+        calls = [("web_search", {"query": str(i)}) for i in range(4)]
+        results = run_tool_calls(calls, recorder, is_read_only=_is_read_only, max_workers=4)
+        assert results == [f"web_search:{i}" for i in range(4)]
+        assert recorder.peak == 4
+
+    def test_write_waits_for_previous_reads(self):
+        recorder = _Recorder()
+        calls = [
+            ("web_search", {"query": "a"}), ("read_local_file", {"query": "b"}),
+            ("write_local_file", {"query": "c"}),
+            ("web_search", {"query": "d"}),
+        ]
+        run_tool_calls(calls, recorder, is_read_only=_is_read_only, max_workers=4)
+        write_start = recorder.events.index(("start", "write_local_file"))
+        write_end = recorder.events.index(("end", "write_local_file"))
+        # Écriture seule : aucun autre appel ne démarre ni ne termine pendant qu'elle tourne
+        assert write_end == write_start + 1
+        assert recorder.events.index(("end", "read_local_file")) < write_start
+
+    def test_concurrency_of_one_is_serial(self):
+        recorder = _Recorder(delay=0.01)
+        calls = [("web_search", {}) for _ in range(3)]
+        run_tool_calls(calls, recorder, is_read_only=_is_read_only, max_workers=1)
+        assert recorder.peak == 1
+
+    def test_exception_returned_in_place(self):
+        recorder = _Recorder(delay=0.0)
+        calls = [("web_search", {"query": "ok"}), ("web_search", {"fail": True})]
+        results = run_tool_calls(calls, recorder, is_read_only=_is_read_only, max_workers=2)
+        assert results[0] == "web_search:ok"
+        assert isinstance(results[1], RuntimeError)
+
+    def test_interruption_skips_remaining_batches(self):
+        recorder = _Recorder(delay=0.0)
+        calls = [("write_local_file", {}), ("move_local_file", {})]
+        results = run_tool_calls(
+            calls, recorder, is_read_only=_is_read_only,
+            is_interrupted=lambda: bool(recorder.events), max_workers=2,
+        )
+        assert results[0] == "write_local_file:"
+        assert results[1] is None
+
+
+class TestMCPManagerReadOnly:
+
+    def test_only_declared_local_tools_are_read_only(self):
+        manager = MCPManager()
+        manager.register_local_tool("lire", "lit", {}, lambda: "x", read_only=True)
+        manager.register_local_tool("ecrire", "écrit", {}, lambda: "x")
+        assert manager.is_read_only("lire")
+        assert not manager.is_read_only("ecrire")
+        assert not manager.is_read_only("outil_externe")
+
+
+class _FakeStream:
+    status_code = 200
+
+    def __init__(self, body):
+        self._lines = [json.dumps(body).encode("utf-8")]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_lines(self):
+        return iter(self._lines)
+
+
+def _done(content="", tool_calls=None):
+    message = {"role": "assistant", "content": content}
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+    return {"message": message, "done": True}
+
+
+class TestChatOrchestratorConcurrency:
+
+    def test_parallel_reads_keep_message_order(self, monkeypatch):
+        sent = []
+        calls = [
+            {"function": {"name": "web_search", "arguments": {"query": q}}}
+            for q in ("lent", "rapide", "rapide")
+        ]
+        replies = iter([
+            _done(tool_calls=calls),
+            _done(content="Réponse intermédiaire suffisamment détaillée."),
+            _done(content="Réponse finale complète et sourcée."),
+        ])
+
+        def fake_post(url, json=None, **_kwargs):
+            sent.append(json)
+            return _FakeStream(next(replies))
+
+        monkeypatch.setattr(chat_orchestrator, "_resilient_post", fake_post)
+
+        def executor(name, arguments):
+            # Le premier appel termine après le second : l'ordre doit tenir
+            time.sleep(0.1 if arguments["query"] == "lent" else 0.0)
+            return f"résultat {arguments['query']}"
+
+        class FakeLLM:
+            is_ollama_available = True
+            model = f"test-dispatch-{next(_models)}"
+            chat_url = "http://ollama/api/chat"
+            timeout = 5
+            gen_temperature = 0.2
+            gen_num_ctx = 8192
+            conversation_history = []
+
+            def add_to_history(self, role, content):
+                pass
+
+            def parse_text_tool_call(self, text, names):
+                return None
+
+        ChatOrchestrator().run(
+            user_input="quelle est la météo ?",
+            tools=[{"type": "function", "function": {"name": "web_search"}}],
+            tool_executor=executor,
+            llm=FakeLLM(),
+            system_prompt="système",
+            is_read_only=_is_read_only,
+        )
+        tool_messages = [m["content"] for m in sent[1]["messages"] if m["role"] == "tool"]
+        assert tool_messages[0] == "résultat lent"
+        assert tool_messages[1] == "résultat rapide"
+        # Troisième appel identique au deuxième : détection de boucle conservée,
+        # avec le résultat de l'appel exécuté dans le même tour
+        assert tool_messages[2].startswith("AVERTISSEMENT ORCHESTRATEUR")
+        assert "résultat rapide" in tool_messages[2]
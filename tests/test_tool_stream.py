@@ -0,0 +1,234 @@
+"""
+Tests unitaires pour core/tool_stream.py : texte streamé sans tampon,
+appels d'outils (structurés ou écrits en JSON) retenus, un seul appel au
+modèle pour un tour sans outil (ChatOrchestrator et LocalLLM simulés).
+"""
+
+import itertools
+import json
+
+import pytest
+
+import core.chat_orchestrator as chat_orchestrator
+import models.local_llm as local_llm
+from core.chat_orchestrator import ChatOrchestrator
+from core.history_summarizer import SummaryCache
+from core.tool_stream import ToolCallStreamParser, classify_prefix
+
+_models = itertools.count()
+
+
+def _tool(name: str) -> dict:
+    return {"type": "function", "function": {"name": name, "description": name}}
+
+
+def _chunks(*tokens, tool_calls=None):
+    """Un chunk par token, tool_calls éventuels dans le dernier (done)."""
+    chunks = [{"message": {"role": "assistant", "content": t}, "done": False} for t in tokens]
+    done = {"role": "assistant", "content": ""}
+    if tool_calls:
+        done["tool_calls"] = tool_calls
+    chunks.append({"message": done, "done": True})
+    return chunks
+
+
+class _FakeStream:
+    """Réponse streamée d'Ollama ; consumed compte les lignes lues."""
+
+    status_code = 200
+
+    def __init__(self, chunks):
+        self._lines = [json.dumps(c).encode("utf-8") for c in chunks]
+        self.consumed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_lines(self):
+        for line in self._lines:
+            self.consumed += 1
+            yield line
+
+
+class TestClassifyPrefix:
+
+    @pytest.mark.parametrize("text, expected", [
+        ("Bonjour", "text"),
+        ("  \n", None),
+        ('{"name"', "hold"),
+        ("[", None),
+        ("[Titre](https://exemple.fr)", "text"),
+        ('[{"name"', "hold"),
+        ("``", None),
+        ("`x`", "text"),
+        ("```js", None),
+        ("```python\n", "text"),
+        ("```json\n", None),
+        ('```json\n{"name"', "hold"),
+        ('```\n[{"name"', "hold"),
+    ])
+    def test_prefixes(self, text, expected):
+        assert classify_prefix(text) == expected
+
+
+class TestParser:
+
+    def test_text_forwarded_token_by_token(self):
+        tokens = []
+        parser = ToolCallStreamParser(tokens.append)
+        for token in (" ", "La ", "réponse", " arrive."):
+            parser.feed({"content": token})
+        assert tokens == [" La ", "réponse", " arrive."]
+        assert parser.streamed and parser.content == " La réponse arrive."
+
+    def test_text_encoded_tool_call_is_held(self):
+        tokens = []
+        parser = ToolCallStreamParser(tokens.append)
+        for token in ('{"na', 'me": "web_search", ', '"arguments": {"query": "météo"}}'):
+            parser.feed({"content": token})
+        assert tokens == [] and not parser.streamed
+        assert json.loads(parser.content)["name"] == "web_search"
+
+    def test_json_without_tool_keys_released_after_limit(self):
+        tokens = []
+        parser = ToolCallStreamParser(tokens.append, hold_limit=20)
+        parser.feed({"content": '{"ville": "Paris", '})
+        assert tokens == []
+        parser.feed({"content": '"pays": "France"}'})
+        assert "".join(tokens) == parser.content
+
+    def test_structured_tool_calls_stop_forwarding(self):
+        tokens = []
+        parser = ToolCallStreamParser(tokens.append)
+        parser.feed({"content": "", "tool_calls": [{"function": {"name": "a"}}]})
+        parser.feed({"content": "Je cherche."})
+        assert tokens == [] and parser.tool_calls
+
+    def test_on_token_false_stops_the_stream(self):
+        parser = ToolCallStreamParser(lambda _token: False)
+        assert parser.feed({"content": "Stop"}) is False
+        assert parser.stopped
+
+
+class _FakeLLM:
+    is_ollama_available = True
+    chat_url = "http://ollama/api/chat"
+    timeout = 5
+    gen_temperature = 0.2
+    gen_num_ctx = 8192
+    conversation_history = []
+
+    def __init__(self):
+        self.model = f"test-tool-stream-{next(_models)}"
+        self.history = []
+
+    def add_to_history(self, role, content):
+        self.history.append((role, content))
+
+    parse_text_tool_call = staticmethod(local_llm.LocalLLM.parse_text_tool_call)
+
+
+_TOOL_RESULT = "TCP : protocole de transport fiable, orienté connexion (RFC 9293)."
+
+
+class TestChatOrchestrator:
+
+    def _run(self, monkeypatch, replies, on_token, executed, streams):
+        def fake_post(url, json=None, **_kwargs):
+            streams.append(_FakeStream(next(replies)))
+            return streams[-1]
+
+        monkeypatch.setattr(chat_orchestrator, "_resilient_post", fake_post)
+        return ChatOrchestrator().run(
+            user_input="explique le protocole TCP",
+            tools=[_tool("web_search")],
+            tool_executor=lambda name, args: executed.append((name, args)) or _TOOL_RESULT,
+            llm=_FakeLLM(),
+            system_prompt="système",
+            on_token=on_token,
+        )
+
+    def test_plain_answer_streamed_from_the_first_token(self, monkeypatch):
+        words = ["TCP ", "garantit ", "l'ordre ", "et ", "la ", "livraison ", "des ", "paquets."]
+        tokens, executed, streams = [], [], []
+
+        def on_token(token):
+            # (lignes lues au moment de la transmission, token)
+            tokens.append((streams[0].consumed, token))
+
+        answer = self._run(monkeypatch, iter([_chunks(*words)]), on_token, executed, streams)
+        assert answer == "".join(words)
+        assert [token for _, token in tokens] == words
+        assert tokens[0][0] == 1  # transmis dès le premier chunk
+        assert len(streams) == 1 and not executed
+
+    def test_text_tool_call_executed_not_streamed(self, monkeypatch):
+        tokens, executed, streams = [], [], []
+        replies = iter([
+            _chunks('```json\n{"name": "web_search", ', '"arguments": {"query": "TCP"}}\n```'),
+            _chunks("Réponse du tour suivant, remplacée par la synthèse."),
+            _chunks("TCP est un protocole fiable, orienté connexion, qui garantit l'ordre."),
+        ])
+        answer = self._run(monkeypatch, replies, tokens.append, executed, streams)
+        assert executed == [("web_search", {"query": "TCP"})]
+        assert not any("web_search" in t for t in tokens)
+        assert answer.startswith("TCP est un protocole")
+
+    def test_held_json_answer_sent_once_without_second_call(self, monkeypatch):
+        tokens, executed, streams = [], [], []
+        replies = iter([_chunks('{"protocole": "TCP", ', '"fiable": true, "ordre": "garanti"}')])
+        answer = self._run(monkeypatch, replies, tokens.append, executed, streams)
+        assert tokens == [answer] and json.loads(answer)["protocole"] == "TCP"
+        assert len(streams) == 1 and not executed
+
+
+class TestLocalLLM:
+
+    @pytest.fixture
+    def llm(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(local_llm.LocalLLM, "_check_ollama_availability", lambda self: False)
+        monkeypatch.setattr(
+            local_llm, "get_summary_cache", lambda _path: SummaryCache(str(tmp_path / "s.db"))
+        )
+        instance = local_llm.LocalLLM(model=f"test-tool-stream-{next(_models)}")
+        instance.gen_num_ctx = 8192
+        instance.is_ollama_available = True
+        return instance
+
+    def test_plain_answer_streamed_in_a_single_call(self, llm, monkeypatch):
+        sent = []
+
+        def fake_post(url, json=None, **kwargs):
+            sent.append(kwargs.get("stream"))
+            return _FakeStream(_chunks("Il ", "fait ", "beau."))
+
+        monkeypatch.setattr(local_llm, "_resilient_post", fake_post)
+        tokens = []
+        result = llm.generate_with_tools_stream(
+            prompt="bonjour", tools=[_tool("web_search")],
+            tool_executor=lambda name, args: "x", on_token=tokens.append,
+        )
+        assert result["response"] == "Il fait beau."
+        assert tokens == ["Il ", "fait ", "beau."]
+        assert sent == [True]
+
+    def test_text_tool_call_then_synthesis(self, llm, monkeypatch):
+        streams = iter([
+            _chunks('{"name": "web_search", "parameters": {"query": "météo"}}'),
+            _chunks("Soleil ", "toute la journée."),
+        ])
+        monkeypatch.setattr(
+            local_llm, "_resilient_post", lambda url, json=None, **kw: _FakeStream(next(streams))
+        )
+        tokens, executed = [], []
+        result = llm.generate_with_tools_stream(
+            prompt="météo ?", tools=[_tool("web_search")],
+            tool_executor=lambda name, args: executed.append(args) or "soleil",
+            on_token=tokens.append,
+        )
+        assert executed == [{"query": "météo"}]
+        assert tokens == ["Soleil ", "toute la journée."]
+        assert result["tool_calls"][0]["tool"] == "web_search"
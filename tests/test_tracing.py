@@ -0,0 +1,122 @@
+"""
+Tests unitaires pour core/tracing.py : imbrication des spans (y compris
+entre threads), fichier JSONL tournant, percentiles et écouteurs.
+"""
+
+import json
+import threading
+import time
+
+import pytest
+
+from core.admission import run_in_context
+from core.tracing import Tracer, annotate, current_span, llm_metrics
+from interfaces.resource_monitor import ResourceMonitor
+
+
+class TestSpans:
+
+    def test_nested_spans_share_the_trace(self):
+        tracer = Tracer(path=None)
+        spans = []
+        tracer.add_listener(spans.append)
+        with tracer.span("turn", kind="request") as root:
+            annotate(route="orchestrator")
+            with tracer.span("context.codebase", kind="retrieval"):
+                assert current_span().name == "context.codebase"
+            assert current_span() is root
+        assert current_span() is None
+        child, parent = spans
+        assert child["parent_id"] == parent["span_id"]
+        assert child["trace_id"] == parent["trace_id"]
+        assert parent["attributes"] == {"route": "orchestrator"}
+
+    def test_span_follows_copied_context_into_threads(self):
+        tracer = Tracer(path=None)
+        spans = []
+        tracer.add_listener(spans.append)
+
+        def tool():
+            with tracer.span("tool.web_search", kind="tool"):
+                pass
+
+        with tracer.span("turn") as root:
+            worker = threading.Thread(target=run_in_context(tool))
+            worker.start()
+            worker.join()
+        assert spans[0]["name"] == "tool.web_search"
+        assert spans[0]["parent_id"] == root.span_id
+
+    def test_exception_marks_the_span(self):
+        tracer = Tracer(path=None)
+        with pytest.raises(RuntimeError):
+            with tracer.span("tool.write_local_file"):
+                raise RuntimeError("disque plein")
+        assert tracer.get_stats()["spans"]["tool.write_local_file"]["errors"] == 1
+        assert current_span() is None
+
+
+class TestTracer:
+
+    def test_spans_written_as_jsonl_with_rotation(self, tmp_path):
+        path = tmp_path / "traces.jsonl"
+        tracer = Tracer(path=str(path), max_bytes=400, backup_count=2)
+        for index in range(10):
+            with tracer.span("routing", index=index):
+                pass
+        tracer.close()
+        records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+        assert records and all(r["name"] == "routing" for r in records)
+        assert (tmp_path / "traces.jsonl.1").exists()
+        assert not (tmp_path / "traces.jsonl.3").exists()
+
+    def test_percentiles_by_name_and_llm_metrics(self):
+        tracer = Tracer(path=None)
+        for value in range(1, 101):
+            llm = tracer.start_span("llm.chat", kind="llm")
+            llm.set(ttft_ms=float(value), tokens_per_sec=20.0)
+            tracer.end_span(llm)
+        stats = tracer.get_stats()
+        assert stats["spans"]["llm.chat"]["count"] == 100
+        assert stats["llm"]["ttft_ms"]["p50"] == 51.0
+        assert stats["llm"]["ttft_ms"]["p99"] == 100.0
+        assert stats["llm"]["tokens_per_sec"]["max"] == 20.0
+        assert "queue_wait_ms" not in stats["llm"]
+
+    def test_failing_listener_does_not_break_tracing(self):
+        tracer = Tracer(path=None)
+
+        def broken(_span):
+            raise ValueError("écouteur en panne")
+
+        tracer.add_listener(broken)
+        with tracer.span("routing"):
+            pass
+        assert tracer.get_stats()["spans"]["routing"]["count"] == 1
+
+    def test_llm_metrics_from_final_chunk(self):
+        metrics = llm_metrics({
+            "done": True, "prompt_eval_count": 40, "prompt_eval_duration": 120_000_000,
+            "eval_count": 30, "eval_duration": 1_500_000_000,
+        })
+        assert metrics == {
+            "prompt_eval_count": 40, "prompt_eval_ms": 120.0,
+            "eval_count": 30, "eval_ms": 1500.0, "tokens_per_sec": 20.0,
+        }
+        assert llm_metrics({"message": {"content": "x"}}) == {}
+
+
+def test_resource_monitor_fed_by_llm_spans():
+    tracer = Tracer(path=None)
+    monitor = ResourceMonitor()
+    tracer.add_listener(monitor.record_span)
+    with tracer.span("routing"):
+        pass
+    llm = tracer.start_span("llm.chat", kind="llm")
+    llm.set(tokens_per_sec=42.0)
+    time.sleep(0.01)
+    tracer.end_span(llm)
+    metrics = monitor.get_metrics()
+    assert metrics["tokens_per_sec"] == 42.0
+    assert metrics["inference_ms"] >= 10
+    assert monitor.history["tps"] == [42.0]
@@ -2,11 +2,14 @@
 Tests unitaires pour memory/vector_memory.py
 """
 
+import itertools
+import re
 import tempfile
 from pathlib import Path
 
 import pytest
 
+from memory import vector_memory
 from memory.vector_memory import VectorMemory
 
 
@@ -184,6 +187,393 @@ class TestSearch:
         assert len(context) > 0
 
 
+class _FakeVectors(list):
+    def tolist(self):
+        return [list(v) for v in self]
+
+
+class _CountingModel:
+    """Faux modèle d'embeddings qui compte les appels à encode."""
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, **_kwargs):
+        self.calls.append(len(texts))
+        return _FakeVectors([[float(len(t)), 1.0] for t in texts])
+
+
+class _RecordingCollection:
+    """Fausse collection ChromaDB qui enregistre les appels à add."""
+
+    def __init__(self):
+        self.add_calls = []
+        self.metadatas = []
+
+    def add(self, ids, embeddings, documents, metadatas):
+        self.add_calls.append(len(ids))
+        self.metadatas.extend(metadatas)
+
+
+class TestBatchedIngest:
+    """Tests de l'ingestion par mini-batchs (encode groupé + add groupé)"""
+
+    @pytest.fixture
+    def memory(self):
+        """Mémoire avec faux modèle et fausse collection."""
+        with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmpdir:
+            mem = VectorMemory(
+                chunk_size=20, chunk_overlap=5, storage_dir=tmpdir,
+                embedding_batch_size=4,
+            )
+            mem.embedding_model = _CountingModel()
+            mem.document_collection = _RecordingCollection()
+            mem.embedding_cache = None
+            yield mem
+
+    def test_split_with_counts_matches_split(self, memory):
+        """Le découpage avec comptage renvoie les mêmes chunks que split_into_chunks."""
+        text = "Un deux trois quatre cinq six sept huit neuf dix. " * 20
+        with_counts = memory.split_into_chunks_with_counts(text)
+        assert [c for c, _ in with_counts] == memory.split_into_chunks(text)
+        assert all(0 < n <= memory.chunk_size for _, n in with_counts)
+
+    def test_add_document_batches_encode_and_add(self, memory):
+        """Les embeddings sont calculés par batchs et stockés en un seul add."""
+        text = "Un deux trois quatre cinq six sept huit neuf dix. " * 20
+        result = memory.add_document(text, "Batch Doc")
+
+        assert result["status"] == "success"
+        n_chunks = result["chunks_created"]
+        assert n_chunks > 4
+        assert sum(memory.embedding_model.calls) == n_chunks
+        assert max(memory.embedding_model.calls) <= 4
+        assert memory.document_collection.add_calls == [n_chunks]
+        assert result["throughput"]["chunks_per_second"] >= 0
+
+
+class _PieceTokenizer:
+    """Faux tokenizer dont le découpage dépend du contexte (mots coupés par
+    paquets de 4 caractères) : un segment coupé au milieu d'un mot produit
+    des tokens différents en fin de tampon."""
+
+    _PIECE = re.compile(r"\s*\S{1,4}|\s+")
+
+    def __init__(self):
+        self.vocab = {}
+        self.pieces = []
+
+    def encode(self, text):
+        ids = []
+        for piece in self._PIECE.findall(text):
+            if piece not in self.vocab:
+                self.vocab[piece] = len(self.pieces)
+                self.pieces.append(piece)
+            ids.append(self.vocab[piece])
+        return ids
+
+    def decode(self, tokens):
+        return "".join(self.pieces[t] for t in tokens)
+
+    def decode_with_offsets(self, tokens):
+        offsets, pos = [], 0
+        for t in tokens:
+            offsets.append(pos)
+            pos += len(self.pieces[t])
+        return self.decode(tokens), offsets
+
+
+def _reference_token_windows(memory, text):
+    """Découpage historique : tout le texte tokenisé, puis fenêtres."""
+    tokens = memory.tokenizer.encode(text)
+    step = memory.chunk_size - memory.chunk_overlap
+    return [memory.tokenizer.decode(tokens[s:s + memory.chunk_size])
+            for s in range(0, len(tokens), step)]
+
+
+def _reference_word_windows(memory, text):
+    words = text.split()
+    size = int(memory.chunk_size / 0.75)
+    step = size - int(memory.chunk_overlap / 0.75)
+    return [" ".join(words[s:s + size]) for s in range(0, len(words), step)]
+
+
+class TestStreamingChunker:
+    """Tests du découpage en flux (iter_chunks)"""
+
+    TEXT = " ".join(
+        f"mot{i} identifiant_{i * 7} x{'y' * (i % 9)}" for i in range(400)
+    ) + "\n\nfin."
+
+    @pytest.fixture
+    def memory(self):
+        with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmpdir:
+            mem = VectorMemory(chunk_size=20, chunk_overlap=5, storage_dir=tmpdir)
+            mem.tokenizer = _PieceTokenizer()
+            yield mem
+
+    @pytest.mark.parametrize("segment_chars", [7, 64, 1000, 100000])
+    def test_token_windows_match_full_tokenization(self, memory, segment_chars):
+        """Les fenêtres produites par segments sont celles du découpage complet."""
+        chunks = list(memory.iter_chunks(self.TEXT, segment_chars=segment_chars))
+        assert [c for c, _, _ in chunks] == _reference_token_windows(memory, self.TEXT)
+        for text, count, (start, end) in chunks:
+            assert self.TEXT[start:end] == text
+            assert 0 < count <= memory.chunk_size
+
+    @pytest.mark.parametrize("segment_chars", [5, 64, 100000])
+    def test_word_fallback_matches_full_split(self, memory, segment_chars):
+        """Sans tokenizer, les fenêtres de mots sont inchangées."""
+        memory.tokenizer = None
+        chunks = list(memory.iter_chunks(self.TEXT, segment_chars=segment_chars))
+        assert [c for c, _, _ in chunks] == _reference_word_windows(memory, self.TEXT)
+        for text, _, (start, end) in chunks:
+            assert self.TEXT[start:end].split() == text.split()
+
+    def test_iterable_input(self, memory):
+        """Un itérable de morceaux (fichier lu par blocs) donne les mêmes chunks."""
+        pieces = [self.TEXT[i:i + 333] for i in range(0, len(self.TEXT), 333)]
+        assert list(memory.iter_chunks(pieces)) == list(memory.iter_chunks(self.TEXT))
+
+    def test_chunks_are_lazy(self, memory):
+        """Le premier chunk arrive sans lire tout le texte (ici infini)."""
+        read = []
+
+        def endless():
+            for i in itertools.count():
+                read.append(i)
+                yield f"segment {i} avec quelques mots. "
+
+        first = next(memory.iter_chunks(endless(), segment_chars=256))
+        assert first[1] == memory.chunk_size
+        assert len(read) < 50
+
+    def test_add_document_streams_in_batches(self, memory, monkeypatch):
+        """add_document encode et stocke les chunks par lots successifs."""
+        monkeypatch.setattr(vector_memory, "_INGEST_FLUSH_CHUNKS", 8)
+        memory.embedding_model = _CountingModel()
+        memory.document_collection = _RecordingCollection()
+        memory.embedding_cache = None
+
+        result = memory.add_document(self.TEXT, "Flux")
+
+        n_chunks = result["chunks_created"]
+        assert n_chunks == len(_reference_token_windows(memory, self.TEXT))
+        assert max(memory.document_collection.add_calls) <= 8
+        assert sum(memory.document_collection.add_calls) == n_chunks
+        metas = memory.document_collection.metadatas
+        assert [m["chunk_index"] for m in metas] == list(range(n_chunks))
+        assert metas[0]["char_start"] == 0
+        assert metas[-1]["char_end"] == len(self.TEXT)
+
+
+class TestEmbeddingCacheIntegration:
+    """encode_batch passe par le cache d'embeddings persistant"""
+
+    def test_repeated_texts_are_encoded_once(self):
+        """Un texte déjà vu (même modulo espaces) n'est pas ré-encodé."""
+        with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmpdir:
+            mem = VectorMemory(storage_dir=tmpdir, embedding_batch_size=8)
+            if mem.embedding_cache is None:
+                pytest.skip("Cache d'embeddings désactivé")
+            mem.embedding_model = _CountingModel()
+
+            first = mem.encode_batch(["alpha", "beta", "alpha"])
+            assert mem.embedding_model.calls == [2]
+            again = mem.encode_batch(["alpha ", "beta", "gamma"])
+            assert mem.embedding_model.calls == [2, 1]
+            assert again[:2] == first[:2]
+            stats = mem.get_stats()["embedding_cache"]
+            assert stats["hits"] >= 2
+
+
+class _DenseBlindCollection:
+    """Fausse collection : la requête dense renvoie toujours les mêmes
+    voisins (dans l'ordre d'insertion), quel que soit le texte demandé."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def add(self, ids, embeddings, documents, metadatas):
+        for i, d, m in zip(ids, documents, metadatas):
+            self.rows[i] = (d, m)
+
+    @staticmethod
+    def _match(meta, where):
+        return not where or all(meta.get(k) == v for k, v in where.items())
+
+    def query(self, query_embeddings, n_results, where=None):
+        ids = [i for i, (_, m) in self.rows.items() if self._match(m, where)][:n_results]
+        return {
+            "ids": [ids],
+            "documents": [[self.rows[i][0] for i in ids]],
+            "metadatas": [[self.rows[i][1] for i in ids]],
+            "distances": [[0.5] * len(ids)],
+        }
+
+    def get(self, ids=None, where=None, include=None, limit=None, offset=0):
+        keys = list(self.rows) if ids is None else [i for i in ids if i in self.rows]
+        keys = [i for i in keys if self._match(self.rows[i][1], where)]
+        keys = keys[offset:offset + limit] if limit else keys
+        return {
+            "ids": keys,
+            "documents": [self.rows[i][0] for i in keys],
+            "metadatas": [self.rows[i][1] for i in keys],
+        }
+
+    def delete(self, ids=None, where=None):
+        for i in ids or []:
+            self.rows.pop(i, None)
+
+
+class TestHybridSearch:
+    """Recherche hybride dense + BM25 (fusion RRF)"""
+
+    @pytest.fixture
+    def memory(self):
+        with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmpdir:
+            mem = VectorMemory(storage_dir=tmpdir)
+            mem.embedding_model = _CountingModel()
+            mem.embedding_cache = None
+            mem.reranker = None
+            mem.codebase_collection = _DenseBlindCollection()
+            if mem.sparse_index("codebase") is None:
+                pytest.skip("Index BM25 (SQLite FTS5) indisponible")
+            ids, docs, metas = [], [], []
+            for i in range(10):
+                ids.append(f"c{i}")
+                docs.append(f"Paragraphe générique numéro {i} sans intérêt")
+                metas.append({"workspace_id": "ws1", "folder_path": "/p",
+                              "file_path": f"f{i}.py"})
+            ids.append("target")
+            docs.append("def merge_sort(items): tri fusion stable")
+            metas.append({"workspace_id": "ws2", "folder_path": "/q",
+                          "file_path": "sort.py"})
+            mem.codebase_collection.add(ids, None, docs, metas)
+            mem.index_sparse("codebase", ids, docs, metas)
+            yield mem
+
+    def test_hybrid_finds_exact_term_missed_by_dense(self, memory):
+        dense = memory.search_similar("merge_sort", n_results=3,
+                                      collection_type="codebase", mode="dense")
+        assert "target" not in [r["chunk_id"] for r in dense]
+        hybrid = memory.search_similar("merge_sort", n_results=3,
+                                       collection_type="codebase", mode="hybrid")
+        by_id = {r["chunk_id"]: r for r in hybrid}
+        assert "target" in by_id
+        assert by_id["target"]["bm25_score"] > 0
+        assert len(hybrid) == 3
+
+    def test_keywords_feed_sparse_side(self, memory):
+        res = memory.search_similar("comment trier une liste", n_results=2,
+                                    collection_type="codebase", mode="hybrid",
+                                    keywords=["merge_sort"])
+        assert "target" in [r["chunk_id"] for r in res]
+
+    def test_where_filter_applies_to_sparse_hits(self, memory):
+        res = memory.search_similar("merge_sort", n_results=3,
+                                    collection_type="codebase", mode="hybrid",
+                                    where={"workspace_id": "ws1"})
+        assert "target" not in [r["chunk_id"] for r in res]
+
+    def test_delete_entry_updates_sparse_index(self, memory):
+        assert memory.delete_entry("target", "codebase")
+        assert memory.sparse_index("codebase").rank(["merge_sort"]) == []
+
+
+    def test_interrupted_backfill_is_resumed(self, memory):
+        memory.sparse_index("codebase").clear()  # index neuf, sans marque de fin
+        memory._sparse_indexes.clear()  # pylint: disable=protected-access
+        real_get = memory.codebase_collection.get
+        memory.codebase_collection.get = lambda **_kw: (_ for _ in ()).throw(
+            RuntimeError("arrêt brutal"))
+        assert memory.sparse_index("codebase").rank(["merge_sort"]) == []
+
+        memory._sparse_indexes.clear()  # pylint: disable=protected-access
+        memory.codebase_collection.get = real_get
+        index = memory.sparse_index("codebase")
+        assert [i for i, _ in index.rank(["merge_sort"])] == ["target"]
+        assert index.get_info("backfill_complete") == "1"
+
+    def test_conversation_index_shared_with_exact_word_search(self, memory):
+        from core.conversation_search import ConversationSearch
+
+        memory.conversation_collection = _DenseBlindCollection()
+        search = ConversationSearch(vector_memory=memory, session_manager=None)
+        assert search._lexical is memory.sparse_index("conversation")  # pylint: disable=protected-access
+        memory.index_sparse("conversation", ["m1"], ["Renouvellement LetsEncrypt"],
+                            [{"workspace_id": "ws1"}])
+        assert search._lexical.search(["encrypt"]) == ["m1"]  # pylint: disable=protected-access
+        assert [i for i, _ in search._lexical.rank(["letsencrypt"])] == ["m1"]  # pylint: disable=protected-access
+        assert not (memory.storage_dir / "conversation_lexical.db").exists()
+
+
+class _CountingReranker:
+    """Faux CrossEncoder : score = longueur du contenu, compte les paires."""
+
+    def __init__(self):
+        self.pairs = 0
+        self.batch_sizes = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.pairs += len(pairs)
+        self.batch_sizes.append(batch_size)
+        return [float(len(doc)) for _, doc in pairs]
+
+
+class TestRerankCache:
+    """Cache LRU des scores de reranking, taille de lot, saut sur marge décisive"""
+
+    @pytest.fixture
+    def memory(self):
+        with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmpdir:
+            mem = VectorMemory(storage_dir=tmpdir)
+            mem.embedding_model = _CountingModel()
+            mem.embedding_cache = None
+            mem.reranker = _CountingReranker()
+            mem.rerank_batch_size = 7
+            mem.search_mode = "dense"
+            mem.document_collection = _DenseBlindCollection()
+            docs = [f"chunk {'x' * i}" for i in range(12)]
+            mem.document_collection.add(
+                [f"d{i}" for i in range(12)], None, docs,
+                [{"document_id": "doc"} for _ in docs],
+            )
+            yield mem
+
+    def test_repeated_pairs_are_scored_once(self, memory):
+        first = memory.search_similar("question", n_results=3)
+        assert memory.reranker.pairs == 9
+        assert memory.reranker.batch_sizes == [7]
+        again = memory.search_similar("question", n_results=3)
+        assert memory.reranker.pairs == 9  # tout vient du cache
+        assert [r["chunk_id"] for r in again] == [r["chunk_id"] for r in first]
+        memory.search_similar("autre question", n_results=3)
+        assert memory.reranker.pairs == 18
+        assert memory.rerank_stats["cache_hits"] == 9
+
+    def test_cache_is_bounded(self, memory):
+        memory.rerank_cache_size = 5
+        memory.search_similar("question", n_results=3)
+        assert len(memory._rerank_cache) == 5
+
+    def test_skip_when_dense_margin_decisive(self, memory):
+        memory.rerank_skip_margin = 0.1
+        orig_query = memory.document_collection.query
+
+        def query(**kwargs):
+            res = orig_query(**kwargs)
+            n = len(res["ids"][0])
+            res["distances"] = [[0.1, 0.12, 0.15] + [0.6] * (n - 3)]
+            return res
+
+        memory.document_collection.query = query
+        res = memory.search_similar("question", n_results=3)
+        assert memory.reranker.pairs == 0
+        assert memory.rerank_stats["skipped"] == 1
+        assert [r["chunk_id"] for r in res] == ["d0", "d1", "d2"]
+
+
 class TestEncryption:
     """Tests de chiffrement"""
 
@@ -0,0 +1,102 @@
+"""Migration de la collection ChromaDB "codebase" vers le store quantifié.
+
+Copie une fois pour toutes les vecteurs, textes et métadonnées de la collection
+"codebase" (dossiers attachés, core.folder_indexer) dans un
+memory.quantized_store.QuantizedCollection (int8 ou float16), puis mesure :
+
+  - le recall@k du store quantifié par rapport à une recherche exacte float32
+    sur les vecteurs d'origine ;
+  - la taille sur disque avant / après.
+
+Une fois la migration validée, activer le store dans config.yaml :
+    optimization.rag.codebase_store: "int8"   # ou "float16"
+
+Usage :
+    python tools/migrate_codebase_store.py                          # int8
+    python tools/migrate_codebase_store.py --dtype float16 --k 10
+    python tools/migrate_codebase_store.py --storage-dir memory/vector_store --force
+"""
+
+from __future__ import annotations
+
+import argparse
+import shutil
+import sys
+from pathlib import Path
+
+# La racine du projet doit etre sur sys.path avant tout import de My_AI :
+# le script est lance depuis tools/, qui n'est pas le repertoire du package.
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import numpy as np  # noqa: E402
+
+from memory.quantized_store import (  # noqa: E402
+    QuantizedCollection,
+    measure_recall,
+    migrate_from_chroma,
+)
+
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--storage-dir", default="memory/vector_store",
+                        help="repertoire de VectorMemory (contient chroma_db/)")
+    parser.add_argument("--dtype", choices=("int8", "float16"), default="int8")
+    parser.add_argument("--k", type=int, default=10, help="k du recall@k")
+    parser.add_argument("--queries", type=int, default=200,
+                        help="nombre de requetes pour mesurer le recall")
+    parser.add_argument("--force", action="store_true",
+                        help="remplace un store quantifie existant")
+    args = parser.parse_args()
+
+    try:
+        import chromadb
+    except ImportError:
+        print("❌ ChromaDB requis pour lire la collection source (pip install chromadb)")
+        return 1
+
+    storage = Path(args.storage_dir)
+    chroma_dir = storage / "chroma_db"
+    target_dir = storage / "codebase_quantized"
+    if not chroma_dir.is_dir():
+        print(f"❌ Base ChromaDB introuvable: {chroma_dir}")
+        return 1
+    if target_dir.exists():
+        if not args.force:
+            print(f"❌ {target_dir} existe deja (utiliser --force pour le remplacer)")
+            return 1
+        shutil.rmtree(target_dir)
+
+    client = chromadb.PersistentClient(path=str(chroma_dir))
+    source = client.get_or_create_collection(name="codebase",
+                                             metadata={"hnsw:space": "cosine"})
+    print(f"📦 Collection codebase : {source.count()} entrees")
+
+    target = QuantizedCollection(str(target_dir), dtype=args.dtype)
+    migrated = migrate_from_chroma(source, target)
+    print(f"✅ {migrated} entrees migrees vers {target_dir} ({args.dtype})")
+    if not migrated:
+        return 0
+
+    # Recall@k contre la recherche exacte float32 sur les vecteurs d'origine
+    data = source.get(include=["embeddings"])
+    vectors = np.asarray(data["embeddings"], dtype=np.float32)
+    recall = measure_recall(vectors, target, list(data["ids"]),
+                            k=args.k, n_queries=args.queries)
+    float32_bytes = vectors.nbytes
+    print(f"🎯 Recall@{args.k} vs float32 : {recall:.3f}")
+    print(f"💾 Vecteurs float32 : {float32_bytes / 1e6:.1f} Mo | "
+          f"store {args.dtype} (avec textes/metadonnees) : {target.disk_bytes() / 1e6:.1f} Mo | "
+          f"chroma_db complet : {_dir_size(chroma_dir) / 1e6:.1f} Mo")
+    print(f"➡️  Activer : optimization.rag.codebase_store: \"{args.dtype}\" dans config.yaml")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -15,6 +15,38 @@ const RECONNECT_MAX_MS = 30000;
 // de cloudflared. Un ping plus fréquent garde la connexion vivante au prix
 // d'un petit overhead réseau.
 const KEEPALIVE_MS = 15000;
+// Streaming protocol announced in client_hello: 2 = numbered chunk_delta
+// messages (appended text only) plus checksummed chunk_snapshot messages.
+// Deltas are rebuilt here into cumulative `chunk` payloads, so listeners
+// see the same messages as with protocol 1.
+const STREAM_PROTOCOL = 2;
+
+interface StreamState {
+  seq: number;
+  text: string;
+  resyncing: boolean;
+}
+
+const CRC32_TABLE = (() => {
+  const table = new Uint32Array(256);
+  for (let n = 0; n < 256; n++) {
+    let c = n;
+    for (let k = 0; k < 8; k++) {
+      c = c & 1 ? 0xedb88320 ^ (c >>> 1) : c >>> 1;
+    }
+    table[n] = c >>> 0;
+  }
+  return table;
+})();
+
+/** CRC32 (8 hex chars) of the UTF-8 text — same as relay_bridge.stream_checksum. */
+export function streamChecksum(text: string): string {
+  let crc = 0xffffffff;
+  for (const byte of Buffer.from(text, 'utf-8')) {
+    crc = CRC32_TABLE[(crc ^ byte) & 0xff] ^ (crc >>> 8);
+  }
+  return ((crc ^ 0xffffffff) >>> 0).toString(16).padStart(8, '0');
+}
 
 export interface UploadResult {
   fileId: string;
@@ -45,6 +77,11 @@ export class RelayClient extends EventEmitter {
   private requestTimeoutMs: number;
   private closed = false;
   private clientHello: ClientHelloPayload | null = null;
+  // Stream state per `${message_id}#${segment_index}` (protocol 2).
+  private streams = new Map<string, StreamState>();
+  // Incoming messages are handled in arrival order (deltas must apply in
+  // sequence, decryption is asynchronous).
+  private inbound: Promise<void> = Promise.resolve();
 
   constructor(creds: RelayCredentials, requestTimeoutSeconds: number) {
     super();
@@ -324,6 +361,7 @@ export class RelayClient extends EventEmitter {
 
     ws.on('open', () => {
       this.reconnectAttempts = 0;
+      this.streams.clear();
       this.emit('connected', base);
       this.startKeepalive();
       // Identify the client as VS Code if a client_hello was registered.
@@ -331,6 +369,7 @@ export class RelayClient extends EventEmitter {
       if (this.clientHello) {
         this.sendEncrypted({
           type: 'client_hello',
+          stream_protocol: STREAM_PROTOCOL,
           ...this.clientHello,
         }).catch((err) => {
           // eslint-disable-next-line no-console
@@ -340,10 +379,12 @@ export class RelayClient extends EventEmitter {
     });
 
     ws.on('message', (data) => {
-      this.handleWsMessage(data).catch((err) => {
-        // eslint-disable-next-line no-console
-        console.error('[RelayClient] message handling failed:', err);
-      });
+      this.inbound = this.inbound
+        .then(() => this.handleWsMessage(data))
+        .catch((err) => {
+          // eslint-disable-next-line no-console
+          console.error('[RelayClient] message handling failed:', err);
+        });
     });
 
     ws.on('close', (code, reason) => {
@@ -383,7 +424,80 @@ export class RelayClient extends EventEmitter {
       this.emit('error', new Error(`E2EE decrypt failed: ${(err as Error).message}`));
       return;
     }
-    this.emit('message', payload);
+    const message = this.applyStreamUpdate(payload);
+    if (message) {
+      this.emit('message', message);
+    }
+  }
+
+  /**
+   * Turns protocol-2 stream messages into cumulative `chunk` payloads.
+   * Returns null when the update cannot be applied (gap in the sequence or
+   * checksum mismatch): a `resume` is sent and the relay answers with a
+   * snapshot, or with the final response.
+   */
+  private applyStreamUpdate(payload: IncomingPayload): IncomingPayload | null {
+    const messageId = payload.message_id ?? '';
+    if (payload.type === 'response' && messageId) {
+      for (const key of [...this.streams.keys()]) {
+        if (key.startsWith(`${messageId}#`)) {
+          this.streams.delete(key);
+        }
+      }
+      return payload;
+    }
+    if (payload.type === 'resume_empty' && messageId) {
+      for (const [key, state] of this.streams) {
+        if (key.startsWith(`${messageId}#`)) {
+          state.resyncing = false;
+        }
+      }
+      return payload;
+    }
+    if (payload.type !== 'chunk_delta' && payload.type !== 'chunk_snapshot') {
+      return payload;
+    }
+    if (!messageId || typeof payload.seq !== 'number') {
+      return null;
+    }
+    const key = `${messageId}#${payload.segment_index ?? 0}`;
+    const state = this.streams.get(key) ?? { seq: 0, text: '', resyncing: false };
+    let text: string;
+    if (payload.type === 'chunk_snapshot') {
+      text = payload.text ?? '';
+    } else {
+      if (state.resyncing) {
+        return null;
+      }
+      // base_seq: deltas merged by the relay's send queue for a slow client
+      const base = payload.base_seq ?? payload.seq - 1;
+      if (state.seq !== base) {
+        this.requestStreamResync(key, messageId);
+        return null;
+      }
+      text = state.text + (payload.text ?? '');
+    }
+    if (payload.checksum && streamChecksum(text) !== payload.checksum) {
+      this.requestStreamResync(key, messageId);
+      return null;
+    }
+    this.streams.set(key, { seq: payload.seq, text, resyncing: false });
+    const message: IncomingPayload = { ...payload, type: 'chunk', text };
+    delete message.seq;
+    delete message.base_seq;
+    delete message.checksum;
+    return message;
+  }
+
+  private requestStreamResync(key: string, messageId: string): void {
+    if (this.streams.get(key)?.resyncing) {
+      return;
+    }
+    this.streams.set(key, { seq: -1, text: '', resyncing: true });
+    this.sendEncrypted({ type: 'resume', last_message_id: messageId }).catch((err) => {
+      // eslint-disable-next-line no-console
+      console.warn('[RelayClient] stream resync failed:', err);
+    });
   }
 
   private async sendEncrypted(obj: unknown): Promise<void> {
@@ -15,6 +15,8 @@ export interface IncomingPayload {
   type:
     | 'response'
     | 'chunk'
+    | 'chunk_delta'
+    | 'chunk_snapshot'
     | 'ack'
     | 'pong'
     | 'resume_empty'
@@ -33,6 +35,14 @@ export interface IncomingPayload {
   // séparée par segment pour intercaler les cartes d'outils dans le bon
   // ordre, comme Claude Code.
   segment_index?: number;
+  // Protocole de streaming 2 (chunk_delta / chunk_snapshot) : numéro de
+  // séquence par segment (base_seq : état auquel s'applique un delta
+  // fusionné par la file d'envoi du relay, seq - 1 par défaut) et CRC32 du
+  // texte cumulé. relayClient.ts les convertit en `chunk` cumulatifs avant
+  // de les émettre.
+  seq?: number;
+  base_seq?: number;
+  checksum?: string;
   // tool_use
   call_id?: string;
   name?: string;
@@ -41,6 +51,7 @@ export interface IncomingPayload {
   server?: string;
   client_kind?: string;
   agentic_enabled?: boolean;
+  stream_protocol?: number;
 }
 
 export interface HistoryItem {